@@ -1,8 +1,14 @@
 # backend/portal/admin.py
 
-from django.contrib import admin
+from django.contrib import admin, messages
 from django.contrib.auth.admin import UserAdmin
+from django.core.exceptions import PermissionDenied
+from django.shortcuts import redirect
+from django.template.response import TemplateResponse
+from django.urls import path
 from django.utils import timezone
+from .forms import ImportarInmueblesForm
+from .importacion import ErrorImportacion, Importacion, detectar_formato, leer_filas
 from .models import *
 
 # Register your models here.
@@ -28,6 +34,50 @@ class InmuebleAdmin(admin.ModelAdmin):
             obj.fecha_creacion = timezone.now()
         obj.save()
 
+    def get_urls(self):
+        return [
+            path('importar/', self.admin_site.admin_view(self.importar_view), name='portal_inmueble_importar'),
+        ] + super().get_urls()
+
+    def importar_view(self, request):
+        if not self.has_add_permission(request):
+            raise PermissionDenied
+        importacion = None
+        form = ImportarInmueblesForm(request.POST or None, request.FILES or None)
+        if request.method == 'POST' and form.is_valid():
+            archivo = form.cleaned_data['archivo']
+            try:
+                importacion = Importacion(
+                    propietario=form.cleaned_data['propietario'],
+                    publicar=form.cleaned_data['publicar'],
+                ).ejecutar(leer_filas(archivo, detectar_formato(archivo.name), comprimido=archivo.name.endswith('.gz')))
+            except ErrorImportacion as e:
+                form.add_error('archivo', str(e))
+            else:
+                if importacion.interrumpida:
+                    self.message_user(
+                        request,
+                        f'Importación interrumpida ({importacion.interrumpida}); '
+                        f'{importacion.insertadas} inmuebles importados antes del error',
+                        messages.ERROR,
+                    )
+                else:
+                    self.message_user(
+                        request,
+                        f'{importacion.insertadas} inmuebles importados, {importacion.rechazadas} filas rechazadas',
+                        messages.WARNING if importacion.rechazadas else messages.SUCCESS,
+                    )
+                if not importacion.rechazadas and not importacion.interrumpida:
+                    return redirect('admin:portal_inmueble_changelist')
+
+        return TemplateResponse(request, 'admin/portal/inmueble/importar.html', {
+            **self.admin_site.each_context(request),
+            'opts': self.model._meta,
+            'title': 'Importar inmuebles',
+            'form': form,
+            'importacion': importacion,
+        })
+
 
 @admin.register(SolicitudArriendo)
 class SolicitudArriendoAdmin(admin.ModelAdmin):
@@ -0,0 +1,216 @@
+# backend/portal/alertas.py
+
+"""
+Alertas de búsquedas guardadas.
+
+Cuando un inmueble pasa a publicado, un trigger lo encola en
+EventoPublicacion y hace NOTIFY portal_alertas. El worker
+(``manage.py procesar_alertas``) mantiene en memoria un índice invertido de
+las búsquedas activas:
+
+- ubicación: comuna -> búsquedas de esa comuna; región -> búsquedas de la
+  región sin comuna; más las búsquedas sin ubicación.
+- tipo: tipo_inmueble -> búsquedas; más las sin tipo.
+- precio: tramo de precio -> búsquedas cuyo rango toca el tramo; más las
+  sin precio.
+
+Para cada inmueble publicado se toman los candidatos de ubicación, se
+filtran por pertenencia a los conjuntos de su tipo y de su tramo de precio
+y solo esos se verifican con el criterio completo. Nunca se recorren todas
+las búsquedas guardadas.
+"""
+
+import bisect
+import logging
+import select
+import time
+from datetime import timedelta
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .models import AlertaBusqueda, BusquedaGuardada, EventoPublicacion, Inmueble
+
+logger = logging.getLogger(__name__)
+
+CANAL = 'portal_alertas'
+# Límites inferiores de los tramos de precio (pesos); el último tramo no tiene tope
+TRAMOS_PRECIO = [
+    0, 150_000, 200_000, 250_000, 300_000, 350_000, 400_000, 450_000, 500_000, 600_000,
+    700_000, 800_000, 1_000_000, 1_300_000, 1_700_000, 2_500_000,
+]
+COLUMNAS_BUSQUEDA = [
+    'id', 'region_codigo', 'comuna_codigo', 'tipo_inmueble', 'precio_min', 'precio_max', 'habitaciones', 'banos',
+]
+COLUMNAS_INMUEBLE = ['id', 'region_codigo', 'comuna_codigo', 'tipo_inmueble', 'precio_mensual', 'habitaciones', 'banos']
+MARGEN_SINCRONIZACION = timedelta(seconds=5)
+
+
+def tramo(precio):
+    return bisect.bisect_right(TRAMOS_PRECIO, precio) - 1
+
+
+class Criterio:
+    __slots__ = ('region', 'comuna', 'tipo', 'precio_min', 'precio_max', 'habitaciones', 'banos')
+
+    def __init__(self, region, comuna, tipo, precio_min, precio_max, habitaciones, banos):
+        self.region = region or None
+        self.comuna = comuna or None
+        self.tipo = tipo or None
+        self.precio_min = float(precio_min) if precio_min is not None else None
+        self.precio_max = float(precio_max) if precio_max is not None else None
+        self.habitaciones = habitaciones or None
+        self.banos = banos or None
+
+    def coincide(self, region, comuna, tipo, precio, habitaciones, banos):
+        return (
+            (self.comuna is None or self.comuna == comuna)
+            and (self.region is None or self.region == region)
+            and (self.tipo is None or self.tipo == tipo)
+            and (self.precio_min is None or precio >= self.precio_min)
+            and (self.precio_max is None or precio <= self.precio_max)
+            and (self.habitaciones is None or habitaciones >= self.habitaciones)
+            and (self.banos is None or banos >= self.banos)
+        )
+
+
+class IndiceBusquedas:
+    """Índice invertido de búsquedas guardadas (ubicación, tipo y tramos de precio)"""
+
+    def __init__(self):
+        self.criterios = {}  # id -> Criterio
+        self.por_comuna = {}
+        self.por_region = {}  # búsquedas con región y sin comuna
+        self.ubicacion_libre = set()
+        self.por_tipo = {}
+        self.tipo_libre = set()
+        self.por_tramo = [set() for _ in TRAMOS_PRECIO]
+        self.precio_libre = set()
+
+    def __len__(self):
+        return len(self.criterios)
+
+    def _conjuntos(self, criterio):
+        """Los conjuntos del índice donde va una búsqueda"""
+        if criterio.comuna:
+            yield self.por_comuna.setdefault(criterio.comuna, set())
+        elif criterio.region:
+            yield self.por_region.setdefault(criterio.region, set())
+        else:
+            yield self.ubicacion_libre
+        yield self.por_tipo.setdefault(criterio.tipo, set()) if criterio.tipo else self.tipo_libre
+        if criterio.precio_min is None and criterio.precio_max is None:
+            yield self.precio_libre
+        else:
+            desde = tramo(criterio.precio_min) if criterio.precio_min is not None else 0
+            hasta = tramo(criterio.precio_max) if criterio.precio_max is not None else len(TRAMOS_PRECIO) - 1
+            yield from self.por_tramo[desde:hasta + 1]
+
+    def agregar(self, pk, criterio):
+        self.quitar(pk)
+        self.criterios[pk] = criterio
+        for conjunto in self._conjuntos(criterio):
+            conjunto.add(pk)
+
+    def quitar(self, pk):
+        criterio = self.criterios.pop(pk, None)
+        if criterio is not None:
+            for conjunto in self._conjuntos(criterio):
+                conjunto.discard(pk)
+
+    def candidatos(self, region, comuna, tipo, precio):
+        """Búsquedas que calzan en ubicación, tipo y tramo de precio (antes de verificar)"""
+        vacio = set()
+        tipos = (self.por_tipo.get(tipo, vacio), self.tipo_libre)
+        precios = (self.por_tramo[tramo(precio)], self.precio_libre)
+        resultado = set()
+        # Intersecciones entre conjuntos (en C, recorriendo siempre el más chico)
+        for ubicacion in (self.por_comuna.get(comuna, vacio), self.por_region.get(region, vacio), self.ubicacion_libre):
+            if ubicacion:
+                for por_tipo in tipos:
+                    for por_precio in precios:
+                        resultado |= ubicacion.intersection(por_tipo, por_precio)
+        return resultado
+
+    def coincidencias(self, region, comuna, tipo, precio, habitaciones, banos):
+        precio = float(precio)
+        return [
+            pk for pk in self.candidatos(region, comuna, tipo, precio)
+            if self.criterios[pk].coincide(region, comuna, tipo, precio, habitaciones, banos)
+        ]
+
+
+class MotorAlertas:
+    """Estado del worker: el índice, su sincronización y el procesamiento de la cola"""
+
+    def __init__(self, batch_size=200):
+        self.batch_size = batch_size
+        self.indice = IndiceBusquedas()
+        self.marca = None
+
+    def cargar(self):
+        """Construye el índice desde cero con las búsquedas activas"""
+        self.indice = IndiceBusquedas()
+        self.marca = timezone.now() - MARGEN_SINCRONIZACION
+        for pk, *campos in BusquedaGuardada.objects.filter(activa=True).values_list(*COLUMNAS_BUSQUEDA).iterator():
+            self.indice.agregar(pk, Criterio(*campos))
+        logger.info(f"Saved-search index loaded (Índice de búsquedas cargado): {len(self.indice)} búsquedas")
+
+    def sincronizar(self):
+        """Aplica las búsquedas creadas, editadas o desactivadas desde la última vez"""
+        desde, self.marca = self.marca, timezone.now() - MARGEN_SINCRONIZACION
+        cambiadas = BusquedaGuardada.objects.filter(actualizado__gt=desde).values_list('activa', *COLUMNAS_BUSQUEDA)
+        for activa, pk, *campos in cambiadas:
+            if activa:
+                self.indice.agregar(pk, Criterio(*campos))
+            else:
+                self.indice.quitar(pk)
+
+    def procesar_lote(self):
+        """Consume un lote de la cola; devuelve cuántos eventos procesó"""
+        with transaction.atomic():
+            eventos = list(
+                EventoPublicacion.objects.select_for_update(skip_locked=True)
+                .order_by('id').values_list('id', 'inmueble_id')[:self.batch_size]
+            )
+            if not eventos:
+                return 0
+            inmuebles = Inmueble.publicados().filter(pk__in={i for _, i in eventos}).values_list(*COLUMNAS_INMUEBLE)
+            pares = []
+            for pk, *datos in inmuebles:
+                pares.extend((busqueda, pk) for busqueda in self.indice.coincidencias(*datos))
+            if pares:
+                # Las búsquedas borradas desde la última sincronización no generan alertas
+                vigentes = set(BusquedaGuardada.objects.filter(
+                    pk__in={b for b, _ in pares}, activa=True,
+                ).values_list('id', flat=True))
+                AlertaBusqueda.objects.bulk_create(
+                    [AlertaBusqueda(busqueda_id=b, inmueble_id=i) for b, i in pares if b in vigentes],
+                    ignore_conflicts=True,
+                )
+            EventoPublicacion.objects.filter(pk__in=[e for e, _ in eventos]).delete()
+        logger.info(f"Publish events processed (Eventos de publicación procesados): {len(eventos)}, {len(pares)} alertas")
+        return len(eventos)
+
+    def esperar(self, segundos, detener):
+        """Bloquea hasta un NOTIFY del trigger, hasta que pasen `segundos` o hasta que pidan detenerse"""
+        conexion = connection.connection
+        limite = time.monotonic() + segundos
+        # Por tramos de 1 s: tras una señal, select() sigue esperando (PEP 475)
+        while not detener() and time.monotonic() < limite:
+            if select.select([conexion], [], [], min(1.0, limite - time.monotonic()))[0]:
+                conexion.poll()
+                conexion.notifies.clear()
+                return
+
+    def ejecutar(self, espera=5.0, una_vez=False, detener=lambda: False):
+        self.cargar()
+        with connection.cursor() as cursor:
+            cursor.execute(f'LISTEN {CANAL}')
+        while not detener():
+            self.sincronizar()
+            while self.procesar_lote():
+                pass
+            if una_vez:
+                break
+            self.esperar(espera, detener)
@@ -1,19 +1,28 @@
 # backend/portal/api_views.py
 
-from django.http import JsonResponse
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import Http404, JsonResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.utils.decorators import method_decorator
 from django.views import View
-import json
 from .services import ChileanLocationService
+from .http_client import cliente_dpa
+from .forms import BusquedaInmuebleForm
+from .models import EstadisticaPrecio, Inmueble
+from .pagination import KeysetPaginator, CursorInvalido
+from .search import facetas, filtrar_inmuebles
+from .middleware import EstadisticasConsultas
+from .payloads import respuesta_json
+from .recomendaciones import Similares
+from .estadisticas import EstadisticasPrecios
 
 @method_decorator(csrf_exempt, name='dispatch')
 class RegionAPIView(View):
     """API View para obtener regiones de Chile"""
     
     def get(self, request):
-        regiones = ChileanLocationService.get_regiones()
-        return JsonResponse(regiones, safe=False)
+        return ChileanLocationService.payloads().regiones.respuesta(request)
 
 @method_decorator(csrf_exempt, name='dispatch')
 class ComunaAPIView(View):
@@ -21,10 +30,232 @@ class ComunaAPIView(View):
     
     def get(self, request):
         region_code = request.GET.get('region')
+        payloads = ChileanLocationService.payloads()
         
         if region_code:
-            comunas = ChileanLocationService.get_comunas_by_region(region_code)
+            payload = payloads.comunas_de(region_code)
         else:
-            comunas = ChileanLocationService.get_all_comunas()
+            payload = payloads.comunas
         
-        return JsonResponse(comunas, safe=False)
\ No newline at end of file
+        return payload.respuesta(request)
+
+@method_decorator(staff_member_required, name='dispatch')
+class MetricasDPAAPIView(View):
+    """Métricas del cliente HTTP de la API DPA (pool, circuit breaker, latencia)"""
+
+    def get(self, request):
+        return JsonResponse(cliente_dpa().metricas())
+
+@method_decorator(staff_member_required, name='dispatch')
+class MetricasConsultasAPIView(View):
+    """Consultas SQL por vista: promedio, máximo, presupuesto y N+1 detectados"""
+
+    def get(self, request):
+        return JsonResponse(EstadisticasConsultas.resumen())
+
+class InmuebleBusquedaAPIView(View):
+    """API View de búsqueda facetada de inmuebles publicados"""
+    paginate_by = 20
+    campos = [
+        'id', 'nombre', 'direccion', 'comuna_codigo', 'comuna_nombre', 'region_codigo',
+        'region_nombre', 'tipo_inmueble', 'precio_mensual', 'habitaciones', 'banos',
+        'estacionamientos', 'm2_construidos', 'm2_totales', 'creado',
+    ]
+
+    def get(self, request):
+        form = BusquedaInmuebleForm(request.GET)
+        if not form.is_valid():
+            return JsonResponse({'errores': form.errors}, status=400)
+
+        queryset = filtrar_inmuebles(Inmueble.publicados(), form.cleaned_data)
+        paginator = KeysetPaginator(queryset.only(*self.campos), self.paginate_by, orden=request.GET.get('orden'))
+        try:
+            page = paginator.page(request.GET.get('cursor'), parametros=request.GET)
+        except CursorInvalido:
+            return JsonResponse({'errores': {'cursor': ['Cursor inválido']}}, status=400)
+
+        resultados = [
+            {
+                'id': i.id,
+                'nombre': i.nombre,
+                'direccion': i.direccion,
+                'comuna_codigo': i.comuna_codigo,
+                'comuna_nombre': i.comuna_nombre,
+                'region_codigo': i.region_codigo,
+                'region_nombre': i.region_nombre,
+                'tipo_inmueble': i.tipo_inmueble,
+                'precio_mensual': str(i.precio_mensual),
+                'habitaciones': i.habitaciones,
+                'banos': i.banos,
+                'estacionamientos': i.estacionamientos,
+                'm2_construidos': i.m2_construidos,
+                'm2_totales': i.m2_totales,
+            }
+            for i in page.object_list
+        ]
+        return JsonResponse({
+            'resultados': resultados,
+            'siguiente': page.cursor_siguiente,
+            'anterior': page.cursor_anterior,
+            'facetas': facetas(queryset),
+        })
+
+def _fecha(valor):
+    return valor.isoformat() if valor else None
+
+
+# campo público -> (columnas que necesita, cómo se obtiene del objeto)
+CAMPOS_INMUEBLE = {
+    'id': (('id',), lambda i: i.id),
+    'nombre': (('nombre',), lambda i: i.nombre),
+    'descripcion': (('descripcion',), lambda i: i.descripcion),
+    'direccion': (('direccion',), lambda i: i.direccion),
+    'comuna_codigo': (('comuna_codigo',), lambda i: i.comuna_codigo),
+    'comuna_nombre': (('comuna_nombre',), lambda i: i.comuna_nombre),
+    'region_codigo': (('region_codigo',), lambda i: i.region_codigo),
+    'region_nombre': (('region_nombre',), lambda i: i.region_nombre),
+    'tipo_inmueble': (('tipo_inmueble',), lambda i: i.tipo_inmueble),
+    'precio_mensual': (('precio_mensual',), lambda i: str(i.precio_mensual)),
+    'habitaciones': (('habitaciones',), lambda i: i.habitaciones),
+    'banos': (('banos',), lambda i: i.banos),
+    'estacionamientos': (('estacionamientos',), lambda i: i.estacionamientos),
+    'm2_construidos': (('m2_construidos',), lambda i: i.m2_construidos),
+    'm2_totales': (('m2_totales',), lambda i: i.m2_totales),
+    # La portada viene en el mismo JOIN (select_related), sin N+1
+    'portada_url': (('portada__imagen',), lambda i: i.portada_url or None),
+    'creado': (('creado',), lambda i: _fecha(i.creado)),
+    'actualizado': (('actualizado',), lambda i: _fecha(i.actualizado)),
+}
+
+
+class InmuebleAPIMixin:
+    """
+    Base de la API pública v1 de inmuebles: solo publicados
+    (Inmueble.publicados(), igual que el listado para visitantes) y
+    ?fields=a,b,c para pedir solo algunos campos; el queryset hace
+    .only() de las columnas necesarias.
+    """
+    campos_por_defecto = list(CAMPOS_INMUEBLE)
+
+    def elegir_campos(self, request):
+        pedidos = request.GET.get('fields')
+        if not pedidos:
+            return self.campos_por_defecto
+        campos = list(dict.fromkeys(c.strip() for c in pedidos.split(',') if c.strip()))
+        desconocidos = [c for c in campos if c not in CAMPOS_INMUEBLE]
+        if desconocidos or not campos:
+            raise ValueError(f'Campos desconocidos: {", ".join(desconocidos) or pedidos}')
+        return campos
+
+    def queryset(self, campos, extra=()):
+        columnas = {'id', *extra}
+        for campo in campos:
+            columnas.update(CAMPOS_INMUEBLE[campo][0])
+        queryset = Inmueble.publicados()
+        if 'portada_url' in campos:
+            columnas.add('portada')
+            queryset = queryset.select_related('portada')
+        return queryset.only(*columnas)
+
+    def serializar(self, inmueble, campos):
+        return {campo: CAMPOS_INMUEBLE[campo][1](inmueble) for campo in campos}
+
+
+class InmuebleListAPIView(InmuebleAPIMixin, View):
+    """
+    GET /api/v1/inmuebles/: inmuebles publicados paginados por cursor.
+    Acepta los filtros de la búsqueda (q, comuna_codigo, rango_precio...),
+    ?orden=, ?limite= (máx. 100), ?cursor= y ?fields=.
+    """
+    campos_por_defecto = [c for c in CAMPOS_INMUEBLE if c not in ('descripcion', 'actualizado')]
+    limite_por_defecto = 20
+    limite_maximo = 100
+
+    def get(self, request):
+        try:
+            campos = self.elegir_campos(request)
+            limite = int(request.GET.get('limite', self.limite_por_defecto))
+            if not 1 <= limite <= self.limite_maximo:
+                raise ValueError(f'limite debe estar entre 1 y {self.limite_maximo}')
+        except ValueError as e:
+            return JsonResponse({'errores': {'parametros': [str(e)]}}, status=400)
+
+        form = BusquedaInmuebleForm(request.GET)
+        if not form.is_valid():
+            return JsonResponse({'errores': form.errors}, status=400)
+
+        # Las columnas de orden siempre se cargan: el paginador las lee para el cursor
+        queryset = filtrar_inmuebles(self.queryset(campos, extra=('creado', 'precio_mensual')), form.cleaned_data)
+        paginator = KeysetPaginator(queryset, limite, orden=request.GET.get('orden'))
+        try:
+            page = paginator.page(request.GET.get('cursor'), parametros=request.GET)
+        except CursorInvalido:
+            return JsonResponse({'errores': {'cursor': ['Cursor inválido']}}, status=400)
+
+        return respuesta_json(request, {
+            'resultados': [self.serializar(i, campos) for i in page.object_list],
+            'siguiente': page.cursor_siguiente,
+            'anterior': page.cursor_anterior,
+        })
+
+
+class InmuebleDetailAPIView(InmuebleAPIMixin, View):
+    """GET /api/v1/inmuebles/<id>/: un inmueble publicado, con ?fields= y Last-Modified"""
+
+    def get(self, request, pk):
+        try:
+            campos = self.elegir_campos(request)
+        except ValueError as e:
+            return JsonResponse({'errores': {'parametros': [str(e)]}}, status=400)
+
+        inmueble = self.queryset(campos, extra=('actualizado',)).filter(pk=pk).first()
+        if inmueble is None:
+            raise Http404('Inmueble no encontrado')
+        # Cambiar la portada no toca `actualizado`: el ETag (hash del cuerpo) sí lo refleja
+        return respuesta_json(request, self.serializar(inmueble, campos), last_modified=inmueble.actualizado)
+
+
+class InmuebleSimilaresAPIView(InmuebleAPIMixin, View):
+    """GET /api/v1/inmuebles/<id>/similares/: los publicados más parecidos de la misma región"""
+    campos_por_defecto = InmuebleListAPIView.campos_por_defecto
+
+    def get(self, request, pk):
+        try:
+            campos = self.elegir_campos(request)
+            k = int(request.GET.get('k', settings.RECOMENDACIONES['K']))
+            if not 1 <= k <= 50:
+                raise ValueError('k debe estar entre 1 y 50')
+        except ValueError as e:
+            return JsonResponse({'errores': {'parametros': [str(e)]}}, status=400)
+
+        inmueble = Inmueble.publicados().filter(pk=pk).only('id').first()
+        if inmueble is None:
+            raise Http404('Inmueble no encontrado')
+        return respuesta_json(request, {
+            'resultados': [self.serializar(i, campos) for i in Similares.para(inmueble, k)],
+        })
+
+
+class EstadisticasPreciosAPIView(View):
+    """
+    GET /api/v1/estadisticas/precios/: resumen de precios por comuna, tipo y
+    habitaciones (4 = 4 o más). Filtros: region_codigo, comuna_codigo,
+    tipo_inmueble, habitaciones.
+    """
+    campos = [
+        'comuna_codigo', 'comuna_nombre', 'region_codigo', 'region_nombre', 'tipo_inmueble', 'habitaciones',
+        'cantidad', 'precio_promedio', 'precio_mediana', 'precio_p25', 'precio_p75',
+        'cantidad_m2', 'precio_m2_promedio', 'precio_m2_mediana', 'actualizado',
+    ]
+
+    def get(self, request):
+        filas = EstadisticasPrecios.filtrar(EstadisticaPrecio.objects.all(), request.GET).values_list(*self.campos)
+        resultados = []
+        for fila in filas:
+            item = dict(zip(self.campos, fila))
+            for campo in ('precio_promedio', 'precio_mediana', 'precio_p25', 'precio_p75',
+                          'precio_m2_promedio', 'precio_m2_mediana'):
+                item[campo] = None if item[campo] is None else str(item[campo])
+            item['actualizado'] = item['actualizado'].isoformat()
+            resultados.append(item)
+        return respuesta_json(request, {'resultados': resultados}, cache_control='public, max-age=300')
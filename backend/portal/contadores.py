@@ -0,0 +1,71 @@
+# backend/portal/contadores.py
+
+"""
+Contadores de la plataforma para el home.
+
+Los valores viven en la tabla Contador y los mantienen triggers de
+PostgreSQL (migración 0012), así que cubren también bulk_create y
+queryset.update/delete. El home los lee desde la caché (una lectura de la
+tabla cada CONTADORES_CACHE_TTL segundos) y nunca hace COUNT(*).
+`reconciliar()` recalcula los conteos reales para corregir cualquier deriva
+(TRUNCATE, escrituras con los triggers deshabilitados, etc.).
+"""
+
+import logging
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Contador, Inmueble, PerfilUsuario, Region, SolicitudArriendo
+
+logger = logging.getLogger(__name__)
+
+# contador -> queryset con el conteo real
+CONTADORES = {
+    'inmuebles_publicados': lambda: Inmueble.objects.filter(esta_publicado=True),
+    'usuarios': lambda: PerfilUsuario.objects.all(),
+    'regiones': lambda: Region.objects.all(),
+    'solicitudes': lambda: SolicitudArriendo.objects.all(),
+}
+
+
+class Contadores:
+    CACHE_KEY = 'portal:contadores'
+
+    @classmethod
+    def valores(cls):
+        """Diccionario contador -> valor, desde la caché o una lectura de la tabla"""
+        valores = cache.get(cls.CACHE_KEY)
+        if valores is None:
+            valores = dict.fromkeys(CONTADORES, 0)
+            valores.update(Contador.objects.filter(nombre__in=CONTADORES).values_list('nombre', 'valor'))
+            cache.set(cls.CACHE_KEY, valores, settings.CONTADORES_CACHE_TTL)
+        return valores
+
+    @classmethod
+    def invalidar(cls):
+        cache.delete(cls.CACHE_KEY)
+
+    @classmethod
+    @transaction.atomic
+    def reconciliar(cls):
+        """Recalcula cada contador con COUNT(*) y devuelve {contador: (antes, real)}"""
+        diferencias = {}
+        ahora = timezone.now()
+        for nombre, queryset in CONTADORES.items():
+            # Bloquear la fila antes de contar: las escrituras concurrentes
+            # esperan y su delta se aplica sobre el conteo real
+            contador, _ = Contador.objects.select_for_update().get_or_create(nombre=nombre)
+            real = queryset().count()
+            if contador.valor != real:
+                logger.warning(
+                    f"Counter drift corrected (Deriva de contador corregida): {nombre} {contador.valor} -> {real}"
+                )
+                diferencias[nombre] = (contador.valor, real)
+            contador.valor = real
+            contador.reconciliado = ahora
+            contador.save(update_fields=['valor', 'reconciliado'])
+        cls.invalidar()
+        return diferencias
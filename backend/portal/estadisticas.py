@@ -0,0 +1,218 @@
+# backend/portal/estadisticas.py
+
+"""
+Resumen de precios de arriendo por (comuna, tipo, habitaciones).
+
+Los triggers de la migración 0013 anotan en EstadisticaPrecioPendiente
+cada grupo tocado por un INSERT/UPDATE/DELETE sobre portal_inmueble;
+`EstadisticasPrecios.actualizar()` toma esos grupos por lotes, lee los
+precios de sus inmuebles publicados ya ordenados por grupo y calcula
+cantidad, promedio, mediana, p25/p75 y precio por m² de todos los grupos
+del lote a la vez con NumPy (reduceat + interpolación de percentiles por
+índice), sin un ciclo Python por grupo.
+"""
+
+import logging
+import time
+from decimal import Decimal
+
+import numpy as np
+from django.db import connection, transaction
+
+from .models import EstadisticaPrecio, EstadisticaPrecioPendiente
+
+logger = logging.getLogger(__name__)
+
+CAMPOS_CALCULADOS = [
+    'comuna_nombre', 'region_codigo', 'region_nombre', 'cantidad', 'precio_promedio', 'precio_mediana',
+    'precio_p25', 'precio_p75', 'cantidad_m2', 'precio_m2_promedio', 'precio_m2_mediana', 'actualizado',
+]
+
+# Saca un lote de grupos pendientes. Se borran al tomarlos: si otra
+# transacción cambia un inmueble del grupo mientras tanto, su trigger vuelve
+# a insertar el grupo (espera a este commit por la restricción única)
+SQL_TOMAR = """
+DELETE FROM portal_estadisticapreciopendiente
+WHERE id IN (
+    SELECT id FROM portal_estadisticapreciopendiente ORDER BY id LIMIT %s FOR UPDATE SKIP LOCKED
+)
+RETURNING comuna_codigo, tipo_inmueble, habitaciones
+"""
+
+SQL_PRECIOS = f"""
+SELECT
+    dense_rank() OVER (ORDER BY comuna_codigo, tipo_inmueble, LEAST(habitaciones, {EstadisticaPrecio.MAX_HABITACIONES})),
+    comuna_codigo, tipo_inmueble, LEAST(habitaciones, {EstadisticaPrecio.MAX_HABITACIONES}),
+    comuna_nombre, region_codigo, region_nombre, precio_mensual, m2_construidos
+FROM portal_inmueble
+WHERE esta_publicado
+  AND (comuna_codigo, tipo_inmueble, LEAST(habitaciones, {EstadisticaPrecio.MAX_HABITACIONES}))
+      IN (SELECT * FROM unnest(%s::varchar[], %s::varchar[], %s::int[]))
+ORDER BY 1, precio_mensual
+"""
+
+SQL_TODOS = f"""
+INSERT INTO portal_estadisticapreciopendiente (comuna_codigo, tipo_inmueble, habitaciones)
+    SELECT DISTINCT comuna_codigo, tipo_inmueble, LEAST(habitaciones, {EstadisticaPrecio.MAX_HABITACIONES})
+    FROM portal_inmueble WHERE esta_publicado AND comuna_codigo IS NOT NULL
+    UNION
+    SELECT comuna_codigo, tipo_inmueble, habitaciones FROM portal_estadisticaprecio
+ON CONFLICT DO NOTHING
+"""
+
+
+def percentiles_por_grupo(valores, inicios, cantidades, q):
+    """
+    Percentil q (0-1) de cada grupo, con `valores` ordenados dentro de cada
+    grupo y los grupos contiguos. Interpolación lineal, igual que np.percentile.
+    """
+    posicion = inicios + q * (cantidades - 1)
+    abajo = np.floor(posicion).astype(np.int64)
+    arriba = np.ceil(posicion).astype(np.int64)
+    return valores[abajo] + (valores[arriba] - valores[abajo]) * (posicion - abajo)
+
+
+def resumir(grupos, precios, m2):
+    """
+    Estadísticas por grupo. `grupos` son enteros con las filas de cada grupo
+    contiguas y `precios` ordenados dentro del grupo. Devuelve (índice de la
+    primera fila de cada grupo, dict de arreglos por estadística).
+    """
+    n = len(grupos)
+    inicios = np.flatnonzero(np.r_[True, grupos[1:] != grupos[:-1]])
+    cantidades = np.diff(np.r_[inicios, n])
+    resultado = {
+        'cantidad': cantidades,
+        'precio_promedio': np.add.reduceat(precios, inicios) / cantidades,
+        'precio_mediana': percentiles_por_grupo(precios, inicios, cantidades, 0.5),
+        'precio_p25': percentiles_por_grupo(precios, inicios, cantidades, 0.25),
+        'precio_p75': percentiles_por_grupo(precios, inicios, cantidades, 0.75),
+    }
+
+    # Precio por m²: solo filas con m², reordenadas por (grupo, precio/m²)
+    con_m2 = m2 > 0
+    grupo_m2 = grupos[con_m2]
+    por_m2 = precios[con_m2] / m2[con_m2]
+    orden = np.lexsort((por_m2, grupo_m2))
+    grupo_m2, por_m2 = grupo_m2[orden], por_m2[orden]
+    cantidad_m2 = np.zeros(len(inicios), dtype=np.int64)
+    promedio_m2 = np.full(len(inicios), np.nan)
+    mediana_m2 = np.full(len(inicios), np.nan)
+    if len(por_m2):
+        # Posición de cada grupo con m² dentro de la lista de grupos
+        indice = np.searchsorted(grupos[inicios], grupo_m2)
+        inicios_m2 = np.flatnonzero(np.r_[True, grupo_m2[1:] != grupo_m2[:-1]])
+        cantidades_m2 = np.diff(np.r_[inicios_m2, len(por_m2)])
+        destino = indice[inicios_m2]
+        cantidad_m2[destino] = cantidades_m2
+        promedio_m2[destino] = np.add.reduceat(por_m2, inicios_m2) / cantidades_m2
+        mediana_m2[destino] = percentiles_por_grupo(por_m2, inicios_m2, cantidades_m2, 0.5)
+    resultado.update(cantidad_m2=cantidad_m2, precio_m2_promedio=promedio_m2, precio_m2_mediana=mediana_m2)
+    return inicios, resultado
+
+
+def _decimal(valor):
+    return None if np.isnan(valor) else Decimal(f'{valor:.2f}')
+
+
+class EstadisticasPrecios:
+
+    @classmethod
+    def marcar_todos(cls):
+        """Marca como pendientes todos los grupos (para reconstruir el resumen completo)"""
+        with connection.cursor() as cursor:
+            cursor.execute(SQL_TODOS)
+            return cursor.rowcount
+
+    @classmethod
+    def actualizar(cls, batch_size=500):
+        """Recalcula los grupos pendientes por lotes; devuelve un resumen"""
+        inicio = time.perf_counter()
+        grupos = filas = eliminados = 0
+        while True:
+            with transaction.atomic():
+                procesados = cls._lote(batch_size)
+            if procesados is None:
+                break
+            grupos += procesados[0]
+            filas += procesados[1]
+            eliminados += procesados[2]
+        resumen = {
+            'grupos': grupos, 'inmuebles': filas, 'eliminados': eliminados,
+            'segundos': round(time.perf_counter() - inicio, 2),
+        }
+        if grupos:
+            logger.info(f"Price rollup refreshed (Resumen de precios actualizado): {resumen}")
+        return resumen
+
+    @classmethod
+    def _lote(cls, batch_size):
+        with connection.cursor() as cursor:
+            cursor.execute(SQL_TOMAR, [batch_size])
+            pendientes = cursor.fetchall()
+            if not pendientes:
+                return None
+            comunas, tipos, habitaciones = (list(c) for c in zip(*pendientes))
+            cursor.execute(SQL_PRECIOS, [comunas, tipos, habitaciones])
+            filas = cursor.fetchall()
+
+        nuevos = []
+        if filas:
+            columnas = list(zip(*filas))
+            inicios, stats = resumir(
+                np.asarray(columnas[0], dtype=np.int64),
+                np.asarray(columnas[7], dtype=np.float64),
+                np.asarray(columnas[8], dtype=np.float64),
+            )
+            for n, fila in enumerate(inicios):
+                nuevos.append(EstadisticaPrecio(
+                    comuna_codigo=columnas[1][fila],
+                    tipo_inmueble=columnas[2][fila],
+                    habitaciones=columnas[3][fila],
+                    comuna_nombre=columnas[4][fila] or '',
+                    region_codigo=columnas[5][fila] or '',
+                    region_nombre=columnas[6][fila] or '',
+                    cantidad=int(stats['cantidad'][n]),
+                    precio_promedio=_decimal(stats['precio_promedio'][n]),
+                    precio_mediana=_decimal(stats['precio_mediana'][n]),
+                    precio_p25=_decimal(stats['precio_p25'][n]),
+                    precio_p75=_decimal(stats['precio_p75'][n]),
+                    cantidad_m2=int(stats['cantidad_m2'][n]),
+                    precio_m2_promedio=_decimal(stats['precio_m2_promedio'][n]),
+                    precio_m2_mediana=_decimal(stats['precio_m2_mediana'][n]),
+                ))
+            EstadisticaPrecio.objects.bulk_create(
+                nuevos, update_conflicts=True,
+                unique_fields=['comuna_codigo', 'tipo_inmueble', 'habitaciones'],
+                update_fields=CAMPOS_CALCULADOS,
+            )
+
+        # Grupos que quedaron sin inmuebles publicados
+        con_datos = {(e.comuna_codigo, e.tipo_inmueble, e.habitaciones) for e in nuevos}
+        vacios = [p for p in pendientes if p not in con_datos]
+        eliminados = 0
+        if vacios:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "DELETE FROM portal_estadisticaprecio WHERE (comuna_codigo, tipo_inmueble, habitaciones) "
+                    "IN (SELECT * FROM unnest(%s::varchar[], %s::varchar[], %s::int[]))",
+                    [list(c) for c in zip(*vacios)],
+                )
+                eliminados = cursor.rowcount
+        return len(pendientes), len(filas), eliminados
+
+    @classmethod
+    def pendientes(cls):
+        return EstadisticaPrecioPendiente.objects.count()
+
+    @classmethod
+    def filtrar(cls, queryset, parametros):
+        """Filtros de la querystring compartidos por el dashboard y la API"""
+        for campo in ('region_codigo', 'comuna_codigo', 'tipo_inmueble'):
+            if parametros.get(campo):
+                queryset = queryset.filter(**{campo: parametros[campo]})
+        if parametros.get('habitaciones', '').isdigit():
+            queryset = queryset.filter(
+                habitaciones=min(int(parametros['habitaciones']), EstadisticaPrecio.MAX_HABITACIONES),
+            )
+        return queryset.order_by('region_codigo', 'comuna_nombre', 'tipo_inmueble', 'habitaciones')
@@ -0,0 +1,171 @@
+# backend/portal/exportacion.py
+
+"""
+Exportación en streaming de inmuebles y solicitudes a CSV o JSONL.
+
+Las filas se leen con un cursor del lado del servidor
+(``.iterator(chunk_size=...)``) y se serializan en bloques de ~64 KB a
+medida que se envían, así que la memoria del worker no depende del tamaño
+del resultado y los primeros bytes salen apenas llega el primer lote.
+La compresión gzip (opcional) también se hace al vuelo.
+
+Qué filas ve cada usuario lo deciden inmuebles_visibles() y
+solicitudes_visibles(), que comparten los listados, los endpoints de
+exportación y ``manage.py exportar --usuario``.
+"""
+
+import csv
+import zlib
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.http import StreamingHttpResponse
+
+from .models import Inmueble, SolicitudArriendo
+
+# tipo -> columnas exportadas (lookups de values_list)
+COLUMNAS = {
+    'inmuebles': [
+        'id', 'nombre', 'descripcion', 'm2_construidos', 'm2_totales', 'estacionamientos',
+        'habitaciones', 'banos', 'direccion', 'precio_mensual', 'tipo_inmueble',
+        'region_codigo', 'region_nombre', 'comuna_codigo', 'comuna_nombre', 'esta_publicado',
+        'propietario__username', 'creado', 'actualizado',
+    ],
+    'solicitudes': [
+        'uuid', 'inmueble_id', 'inmueble__nombre', 'arrendatario__username',
+        'mensaje', 'estado', 'creado', 'actualizado',
+    ],
+}
+FORMATOS = {
+    'csv': 'text/csv; charset=utf-8',
+    'jsonl': 'application/x-ndjson; charset=utf-8',
+}
+# tipo -> permiso necesario para exportarlo (inmuebles: basta con tener sesión)
+PERMISOS = {
+    'inmuebles': None,
+    'solicitudes': 'portal.gestionar_solicitud',
+}
+CHUNK_SIZE = 2000
+TAMANO_BLOQUE = 64 * 1024
+
+
+def inmuebles_visibles(user, queryset=None):
+    """Inmuebles de `queryset` (por defecto, todos) que `user` puede ver según su rol"""
+    if queryset is None:
+        queryset = Inmueble.objects.all()
+    if user.is_authenticated:
+        # Administradores ven todos los inmuebles
+        if user.has_perm('portal.ver_todos_inmuebles') or user.tipo_usuario == 'ADMINISTRADOR':
+            return queryset
+
+        # Arrendadores ven solo sus inmuebles
+        if user.has_perm('portal.gestionar_inmueble') or user.tipo_usuario == 'ARRENDADOR':
+            return queryset.filter(propietario=user)
+
+    # Arrendatarios y usuarios no autenticados solo ven publicados
+    return Inmueble.publicados(queryset)
+
+
+def solicitudes_visibles(user, queryset=None):
+    """Solicitudes de `queryset` (por defecto, todas) que `user` puede ver según su rol"""
+    if queryset is None:
+        queryset = SolicitudArriendo.objects.all()
+
+    # Administradores ven todas las solicitudes
+    if user.is_superuser or user.has_perm('portal.ver_todos_inmuebles'): # 'ver_todos_inmuebles' como proxy para admin
+        return queryset
+
+    # Arrendadores ven solicitudes de sus inmuebles
+    if user.has_perm('portal.gestionar_inmueble'): # 'gestionar_inmueble' como proxy para arrendador
+        return queryset.filter(inmueble__propietario=user)
+
+    # Arrendatarios ven solo sus propias solicitudes
+    return queryset.filter(arrendatario=user)
+
+
+VISIBLES = {
+    'inmuebles': inmuebles_visibles,
+    'solicitudes': solicitudes_visibles,
+}
+
+
+class _Buffer:
+    """Destino de csv.writer que solo acumula lo escrito"""
+
+    def __init__(self):
+        self.partes = []
+
+    def write(self, texto):
+        self.partes.append(texto)
+
+    def vaciar(self):
+        texto = ''.join(self.partes)
+        self.partes = []
+        return texto
+
+
+def filas(queryset, columnas, chunk_size=CHUNK_SIZE):
+    """
+    Tuplas de `columnas` en orden de pk. La iteración va dentro de una
+    transacción: sin ella el cursor se declara WITH HOLD y PostgreSQL
+    materializa el resultado completo antes de entregar la primera fila.
+    """
+    with transaction.atomic(using=queryset.db):
+        yield from queryset.order_by('pk').values_list(*columnas).iterator(chunk_size=chunk_size)
+
+
+def serializar(tuplas, columnas, formato):
+    """Genera bloques de bytes en el formato pedido"""
+    buffer = _Buffer()
+    if formato == 'csv':
+        escritor = csv.writer(buffer)
+        escritor.writerow(columnas)
+        escribir = escritor.writerow
+    else:
+        codificador = DjangoJSONEncoder(ensure_ascii=False)
+
+        def escribir(tupla):
+            buffer.write(codificador.encode(dict(zip(columnas, tupla))))
+            buffer.write('\n')
+
+    tamano = 0
+    for tupla in tuplas:
+        escribir(tupla)
+        tamano += 1
+        # Revisar el tamaño cada cierta cantidad de filas es más barato que sumar largos
+        if tamano >= 200:
+            tamano = 0
+            if sum(map(len, buffer.partes)) >= TAMANO_BLOQUE:
+                yield buffer.vaciar().encode('utf-8')
+    resto = buffer.vaciar()
+    if resto:
+        yield resto.encode('utf-8')
+
+
+def comprimir(bloques, nivel=6):
+    """gzip al vuelo (wbits=31 agrega la cabecera y el trailer gzip)"""
+    compresor = zlib.compressobj(nivel, zlib.DEFLATED, 31)
+    for bloque in bloques:
+        comprimido = compresor.compress(bloque)
+        if comprimido:
+            yield comprimido
+    yield compresor.flush()
+
+
+def exportar(queryset, tipo, formato='csv', gzip=False):
+    """Iterador de bytes con la exportación de `queryset`"""
+    columnas = COLUMNAS[tipo]
+    bloques = serializar(filas(queryset, columnas), columnas, formato)
+    return comprimir(bloques) if gzip else bloques
+
+
+def respuesta_exportacion(queryset, tipo, formato='csv', gzip=False):
+    nombre = f'{tipo}.{formato}' + ('.gz' if gzip else '')
+    response = StreamingHttpResponse(
+        exportar(queryset, tipo, formato, gzip),
+        content_type='application/gzip' if gzip else FORMATOS[formato],
+    )
+    response['Content-Disposition'] = f'attachment; filename="{nombre}"'
+    # Evita que un proxy (nginx) acumule la respuesta antes de enviarla
+    response['X-Accel-Buffering'] = 'no'
+    return response
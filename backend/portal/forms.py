@@ -3,7 +3,8 @@
 from django import forms
 from django.contrib.auth.forms import UserCreationForm, AuthenticationForm
 from .models import *
-import requests
+from .services import ChileanLocationService
+from .search import RANGOS_PRECIO
 
 class RegionForm(forms.ModelForm):
     class Meta:
@@ -49,39 +50,60 @@ class InmuebleForm(forms.ModelForm):
         ]
 
     def __init__(self, *args, **kwargs):
+        self.user = kwargs.pop('user', None)
         super().__init__(*args, **kwargs)
-        
-        # Cargar opciones de regiones
+
+        # Si no es administrador, ocultar el campo de propietario
+        if self.user and self.user.tipo_usuario != PerfilUsuario.TipoUsuario.ADMINISTRADOR:
+            del self.fields['propietario']
+        else:
+            # Para administradores, filtrar solo usuarios que pueden ser propietarios
+            self.fields['propietario'].queryset = PerfilUsuario.objects.filter(
+                tipo_usuario__in=[PerfilUsuario.TipoUsuario.ADMINISTRADOR, 
+                                 PerfilUsuario.TipoUsuario.ARRENDADOR]
+            )
+
+        # Las opciones salen del índice local de ubicaciones: sin llamadas HTTP
+        self.indice = ChileanLocationService.indice()
         self.fields['region_codigo'].choices = self.get_regiones_choices()
         self.fields['comuna_codigo'].choices = [('', 'Primero selecciona una región')]
-        
-        # Si ya existe la instancia, cargar los valores
+
+        # Región elegida: la enviada en el formulario o la de la instancia
+        if self.is_bound:
+            region_codigo = self.data.get(self.add_prefix('region_codigo'))
+        else:
+            region_codigo = self.instance.region_codigo if self.instance else None
+
         if self.instance and self.instance.region_codigo:
             self.fields['region_codigo'].initial = self.instance.region_codigo
-            # Cargar comunas para la región seleccionada
-            self.fields['comuna_codigo'].choices = self.get_comunas_choices(self.instance.region_codigo)
             if self.instance.comuna_codigo:
                 self.fields['comuna_codigo'].initial = self.instance.comuna_codigo
 
+        if region_codigo:
+            # Cargar comunas para la región seleccionada
+            self.fields['comuna_codigo'].choices = self.get_comunas_choices(region_codigo)
+
     def get_regiones_choices(self):
-        """Obtener choices de regiones desde la API"""
-        try:
-            response = requests.get('https://apis.digital.gob.cl/dpa/regiones', timeout=5)
-            regiones = response.json()
-            choices = [(r['codigo'], r['nombre']) for r in regiones]
-            return [('', 'Selecciona una región')] + choices
-        except:
+        """Obtener choices de regiones desde el índice local"""
+        if not self.indice.regiones_choices:
             return [('', 'Error cargando regiones')]
+        return [('', 'Selecciona una región')] + list(self.indice.regiones_choices)
     
     def get_comunas_choices(self, region_code):
         """Obtener choices de comunas para una región"""
-        try:
-            response = requests.get(f'https://apis.digital.gob.cl/dpa/regiones/{region_code}/comunas', timeout=5)
-            comunas = response.json()
-            choices = [(c['codigo'], c['nombre']) for c in comunas]
-            return [('', 'Selecciona una comuna')] + choices
-        except:
+        comunas = self.indice.comunas_choices.get(region_code)
+        if not comunas:
             return [('', 'Error cargando comunas')]
+        return [('', 'Selecciona una comuna')] + list(comunas)
+
+    def clean(self):
+        cleaned_data = super().clean()
+        region_codigo = cleaned_data.get('region_codigo')
+        comuna_codigo = cleaned_data.get('comuna_codigo')
+
+        if region_codigo and comuna_codigo and self.indice.region_de_comuna(comuna_codigo) != region_codigo:
+            self.add_error('comuna_codigo', 'La comuna no pertenece a la región seleccionada.')
+        return cleaned_data
     
     def save(self, commit=True):
         instance = super().save(commit=False)
@@ -91,39 +113,74 @@ class InmuebleForm(forms.ModelForm):
         comuna_codigo = self.cleaned_data.get('comuna_codigo')
         
         if region_codigo:
-            try:
-                response = requests.get(f'https://apis.digital.gob.cl/dpa/regiones/{region_codigo}', timeout=5)
-                if response.status_code == 200:
-                    instance.region_nombre = response.json().get('nombre', '')
-            except:
-                instance.region_nombre = ''
+            instance.region_nombre = self.indice.nombre_region(region_codigo) or ''
         
         if comuna_codigo:
-            try:
-                response = requests.get(f'https://apis.digital.gob.cl/dpa/comunas/{comuna_codigo}', timeout=5)
-                if response.status_code == 200:
-                    instance.comuna_nombre = response.json().get('nombre', '')
-            except:
-                instance.comuna_nombre = ''
+            instance.comuna_nombre = self.indice.nombre_comuna(comuna_codigo) or ''
         
         if commit:
             instance.save()
+            self.save_m2m()
         
         return instance
 
-    def __init__(self, *args, **kwargs):
-        self.user = kwargs.pop('user', None)
-        super().__init__(*args, **kwargs)
-        
-        # Si no es administrador, ocultar el campo de propietario
-        if self.user and self.user.tipo_usuario != PerfilUsuario.TipoUsuario.ADMINISTRADOR:
-            del self.fields['propietario']
-        else:
-            # Para administradores, filtrar solo usuarios que pueden ser propietarios
-            self.fields['propietario'].queryset = PerfilUsuario.objects.filter(
-                tipo_usuario__in=[PerfilUsuario.TipoUsuario.ADMINISTRADOR, 
-                                 PerfilUsuario.TipoUsuario.ARRENDADOR]
-            )
+class BusquedaInmuebleForm(forms.Form):
+    """Filtros de búsqueda de inmuebles publicados (todos opcionales)"""
+    q = forms.CharField(required=False, max_length=200, strip=True)
+    comuna_codigo = forms.CharField(required=False, max_length=10)
+    region_codigo = forms.CharField(required=False, max_length=10)
+    tipo_inmueble = forms.ChoiceField(
+        required=False,
+        choices=[('', 'Tipo de propiedad')] + list(Inmueble.Tipo_de_inmueble.choices),
+    )
+    precio_min = forms.DecimalField(required=False, min_value=0, max_digits=8, decimal_places=2)
+    precio_max = forms.DecimalField(required=False, min_value=0, max_digits=8, decimal_places=2)
+    rango_precio = forms.ChoiceField(
+        required=False,
+        choices=[('', 'Rango de precio')] + [(clave, etiqueta) for clave, etiqueta, _, _ in RANGOS_PRECIO],
+    )
+    # Mínimos: "al menos N"
+    habitaciones = forms.IntegerField(required=False, min_value=0)
+    banos = forms.IntegerField(required=False, min_value=0)
+    estacionamientos = forms.IntegerField(required=False, min_value=0)
+    m2_construidos_min = forms.FloatField(required=False, min_value=0)
+    m2_construidos_max = forms.FloatField(required=False, min_value=0)
+    m2_totales_min = forms.FloatField(required=False, min_value=0)
+    m2_totales_max = forms.FloatField(required=False, min_value=0)
+
+    def clean(self):
+        cleaned_data = super().clean()
+        for minimo, maximo in [('precio_min', 'precio_max'),
+                               ('m2_construidos_min', 'm2_construidos_max'),
+                               ('m2_totales_min', 'm2_totales_max')]:
+            if cleaned_data.get(minimo) is not None and cleaned_data.get(maximo) is not None \
+                    and cleaned_data[minimo] > cleaned_data[maximo]:
+                self.add_error(maximo, 'El máximo debe ser mayor o igual que el mínimo.')
+        return cleaned_data
+
+class BusquedaGuardadaForm(forms.ModelForm):
+    class Meta:
+        model = BusquedaGuardada
+        fields = ['nombre', 'region_codigo', 'comuna_codigo', 'tipo_inmueble',
+                  'precio_min', 'precio_max', 'habitaciones', 'banos']
+
+    @classmethod
+    def inicial(cls, parametros):
+        """Valores iniciales desde la querystring del listado (rango_precio -> mínimo/máximo)"""
+        inicial = {campo: parametros[campo] for campo in cls._meta.fields if parametros.get(campo)}
+        for clave, etiqueta, minimo, maximo in RANGOS_PRECIO:
+            if parametros.get('rango_precio') == clave:
+                inicial.setdefault('precio_min', minimo)
+                inicial.setdefault('precio_max', maximo)
+                inicial.setdefault('nombre', etiqueta)
+        return inicial
+
+    def clean(self):
+        cleaned_data = super().clean()
+        if cleaned_data.get('precio_min') is not None and cleaned_data.get('precio_max') is not None \
+                and cleaned_data['precio_min'] > cleaned_data['precio_max']:
+            self.add_error('precio_max', 'El máximo debe ser mayor o igual que el mínimo.')
+        return cleaned_data
 
 class ImagenInmuebleForm(forms.ModelForm):
     class Meta:
@@ -134,6 +191,14 @@ class ImagenInmuebleForm(forms.ModelForm):
             'orden': forms.NumberInput(attrs={'min': '0'})
         }
 
+class ImportarInmueblesForm(forms.Form):
+    archivo = forms.FileField(help_text='CSV o JSONL (también .gz) con una fila por inmueble')
+    propietario = forms.ModelChoiceField(
+        queryset=PerfilUsuario.objects.filter(tipo_usuario=PerfilUsuario.TipoUsuario.ARRENDADOR),
+        required=False,
+    )
+    publicar = forms.BooleanField(required=False, help_text='Publicar las filas sin columna esta_publicado')
+
 class SolicitudArriendoForm(forms.ModelForm):
     class Meta:
         model = SolicitudArriendo
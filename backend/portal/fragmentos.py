@@ -0,0 +1,87 @@
+# backend/portal/fragmentos.py
+
+"""
+Caché de fragmentos con versión.
+
+Cada fragmento se guarda bajo ``portal:frag:<nombre>:<versión>``; invalidar
+es cambiar la versión (las señales lo hacen al editar los datos), así no hay
+que borrar claves. Contra estampidas: al expirar o cambiar la versión, un
+solo worker (candado con cache.add) y un solo hilo por proceso (SingleFlight)
+recalculan; el resto sirve la última versión conocida mientras tanto.
+
+Con la caché en memoria por defecto cada proceso tiene sus propias
+versiones; en producción CACHES debe apuntar a una caché compartida.
+"""
+
+import logging
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .singleflight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+# Fragmento de "Propiedades Destacadas" del home
+DESTACADOS = 'destacados'
+
+
+class Fragmentos:
+    PREFIJO = 'portal:frag'
+    CANDADO_TTL = 30
+    _vuelos = SingleFlight()
+
+    @classmethod
+    def _clave(cls, nombre, sufijo):
+        return f'{cls.PREFIJO}:{nombre}:{sufijo}'
+
+    @classmethod
+    def version(cls, nombre):
+        version = cache.get(cls._clave(nombre, 'version'))
+        if version is None:
+            version = time.time_ns()
+            if not cache.add(cls._clave(nombre, 'version'), version, None):
+                version = cache.get(cls._clave(nombre, 'version'), version)
+        return version
+
+    @classmethod
+    def invalidar(cls, nombre):
+        cache.set(cls._clave(nombre, 'version'), time.time_ns(), None)
+
+    @classmethod
+    def ultimo(cls, nombre):
+        """Último valor calculado (aunque su versión ya no sea la vigente)"""
+        return cache.get(cls._clave(nombre, 'ultimo'))
+
+    @classmethod
+    def obtener(cls, nombre, construir, ttl=None):
+        """
+        Devuelve el fragmento vigente; si no está, lo recalcula con
+        `construir()` un solo llamador y los demás reciben el anterior.
+        """
+        ttl = ttl or settings.FRAGMENTOS_TTL
+        clave = cls._clave(nombre, cls.version(nombre))
+        valor = cache.get(clave)
+        if valor is not None:
+            return valor
+
+        candado = f'{clave}:candado'
+        propio = cache.add(candado, 1, cls.CANDADO_TTL)
+        if not propio:
+            anterior = cls.ultimo(nombre)
+            if anterior is not None:
+                return anterior
+            # En frío no hay nada que servir: se calcula igual
+
+        def recalcular():
+            try:
+                valor = construir()
+                cache.set(clave, valor, ttl)
+                cache.set(cls._clave(nombre, 'ultimo'), valor, None)
+                return valor
+            finally:
+                if propio:
+                    cache.delete(candado)
+
+        return cls._vuelos.do(clave, recalcular)
@@ -0,0 +1,396 @@
+# backend/portal/gazetteer.py
+
+"""
+Snapshot local de la División Político Administrativa (DPA) de Chile.
+
+El snapshot es un archivo binario compacto que cada proceso (worker de
+gunicorn) abre con ``mmap``; así todos los workers comparten las mismas
+páginas del page cache del sistema operativo en vez de mantener su propia
+copia de regiones y comunas en memoria.
+
+Formato (little endian):
+
+    cabecera  : magic(4s) version(H) reservado(H) generado(d)
+                n_regiones(I) n_comunas(I) off_strings(I)
+    regiones  : n_regiones x [codigo(8s) off_nombre(I) len_nombre(H)
+                primera_comuna(I) n_comunas(I) lat(d) lng(d)]
+                ordenadas por código
+    comunas   : n_comunas x [codigo(8s) region(8s) padre(8s)
+                off_nombre(I) len_nombre(H) lat(d) lng(d)]
+                agrupadas por región (orden de regiones) y por código
+    indice    : n_comunas x [posicion(I)] ordenado por código de comuna
+    strings   : nombres en UTF-8
+"""
+
+import logging
+import mmap
+import os
+import struct
+import tempfile
+import threading
+import time
+
+from .singleflight import SingleFlight
+
+try:
+    import fcntl
+except ImportError:  # Windows: sin bloqueo entre procesos
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'DPA1'
+VERSION = 1
+
+_HEADER = struct.Struct('<4sHHdIII')
+_REGION = struct.Struct('<8sIHIIdd')
+_COMUNA = struct.Struct('<8s8s8sIHdd')
+_INDICE = struct.Struct('<I')
+
+
+class SnapshotError(Exception):
+    """El archivo no es un snapshot DPA válido"""
+
+
+def _codigo(valor):
+    return str(valor).encode('ascii')[:8].ljust(8, b'\0')
+
+
+def _texto(raw):
+    return raw.rstrip(b'\0').decode('ascii')
+
+
+def _coordenada(valor):
+    try:
+        return float(valor)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+class GazetteerSnapshot:
+    """Lector de solo lectura sobre un snapshot mapeado en memoria"""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            stat = os.fstat(f.fileno())
+            if stat.st_size < _HEADER.size:
+                raise SnapshotError(f"Snapshot demasiado pequeño: {path}")
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, _, generado, n_reg, n_com, off_strings = _HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC or version != VERSION:
+            raise SnapshotError(f"Formato de snapshot desconocido: {path}")
+
+        self.generado = generado
+        self.n_regiones = n_reg
+        self.n_comunas = n_com
+        self.firma = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        self._off_regiones = _HEADER.size
+        self._off_comunas = self._off_regiones + n_reg * _REGION.size
+        self._off_indice = self._off_comunas + n_com * _COMUNA.size
+        self._off_strings = off_strings
+        # Archivo truncado o cabecera corrupta: las tablas o los nombres no caben en el archivo
+        if off_strings != self._off_indice + n_com * _INDICE.size or stat.st_size < off_strings \
+                or off_strings + self._fin_strings() > stat.st_size:
+            self._mm.close()
+            raise SnapshotError(f"Snapshot truncado o corrupto: {path}")
+
+    def _fin_strings(self):
+        """Dónde termina el último nombre, relativo a la sección de strings"""
+        fin = 0
+        for i in range(self.n_regiones):
+            _, off, largo, _, _, _, _ = _REGION.unpack_from(self._mm, self._off_regiones + i * _REGION.size)
+            fin = max(fin, off + largo)
+        for i in range(self.n_comunas):
+            _, _, _, off, largo, _, _ = _COMUNA.unpack_from(self._mm, self._off_comunas + i * _COMUNA.size)
+            fin = max(fin, off + largo)
+        return fin
+
+    @property
+    def edad(self):
+        """Segundos transcurridos desde que se obtuvieron los datos"""
+        return time.time() - self.generado
+
+    def _nombre(self, offset, largo):
+        inicio = self._off_strings + offset
+        return self._mm[inicio:inicio + largo].decode('utf-8')
+
+    def _leer_region(self, i):
+        codigo, off, largo, primera, cantidad, lat, lng = _REGION.unpack_from(
+            self._mm, self._off_regiones + i * _REGION.size
+        )
+        return codigo, off, largo, primera, cantidad, lat, lng
+
+    def _region_dict(self, i):
+        codigo, off, largo, _, _, lat, lng = self._leer_region(i)
+        return {
+            'codigo': _texto(codigo),
+            'tipo': 'region',
+            'nombre': self._nombre(off, largo),
+            'lat': lat,
+            'lng': lng,
+            'codigo_padre': '00',
+        }
+
+    def _comuna_dict(self, i):
+        codigo, _, padre, off, largo, lat, lng = _COMUNA.unpack_from(
+            self._mm, self._off_comunas + i * _COMUNA.size
+        )
+        return {
+            'codigo': _texto(codigo),
+            'tipo': 'comuna',
+            'nombre': self._nombre(off, largo),
+            'lat': lat,
+            'lng': lng,
+            'codigo_padre': _texto(padre),
+        }
+
+    def _buscar_region(self, codigo):
+        clave = _codigo(codigo)
+        bajo, alto = 0, self.n_regiones
+        while bajo < alto:
+            medio = (bajo + alto) // 2
+            inicio = self._off_regiones + medio * _REGION.size
+            actual = self._mm[inicio:inicio + 8]
+            if actual < clave:
+                bajo = medio + 1
+            else:
+                alto = medio
+        inicio = self._off_regiones + bajo * _REGION.size
+        if bajo < self.n_regiones and self._mm[inicio:inicio + 8] == clave:
+            return bajo
+        return None
+
+    def _buscar_comuna(self, codigo):
+        clave = _codigo(codigo)
+        bajo, alto = 0, self.n_comunas
+        while bajo < alto:
+            medio = (bajo + alto) // 2
+            (pos,) = _INDICE.unpack_from(self._mm, self._off_indice + medio * _INDICE.size)
+            inicio = self._off_comunas + pos * _COMUNA.size
+            if self._mm[inicio:inicio + 8] < clave:
+                bajo = medio + 1
+            else:
+                alto = medio
+        if bajo < self.n_comunas:
+            (pos,) = _INDICE.unpack_from(self._mm, self._off_indice + bajo * _INDICE.size)
+            inicio = self._off_comunas + pos * _COMUNA.size
+            if self._mm[inicio:inicio + 8] == clave:
+                return pos
+        return None
+
+    def regiones(self):
+        return [self._region_dict(i) for i in range(self.n_regiones)]
+
+    def region(self, codigo):
+        i = self._buscar_region(codigo)
+        return self._region_dict(i) if i is not None else None
+
+    def comunas(self, region_codigo):
+        i = self._buscar_region(region_codigo)
+        if i is None:
+            return []
+        _, _, _, primera, cantidad, _, _ = self._leer_region(i)
+        return [self._comuna_dict(j) for j in range(primera, primera + cantidad)]
+
+    def comuna(self, codigo):
+        pos = self._buscar_comuna(codigo)
+        return self._comuna_dict(pos) if pos is not None else None
+
+    def region_de_comuna(self, codigo):
+        """Código de la región a la que pertenece la comuna (o None)"""
+        pos = self._buscar_comuna(codigo)
+        if pos is None:
+            return None
+        inicio = self._off_comunas + pos * _COMUNA.size
+        return _texto(self._mm[inicio + 8:inicio + 16])
+
+    def todas_las_comunas(self):
+        return [self._comuna_dict(j) for j in range(self.n_comunas)]
+
+
+def escribir_snapshot(path, regiones, comunas_por_region, generado=None):
+    """
+    Escribe un snapshot de forma atómica (archivo temporal + os.replace),
+    de modo que los lectores nunca vean un archivo a medio escribir.
+    """
+    strings = bytearray()
+
+    def agregar(nombre):
+        raw = (nombre or '').encode('utf-8')
+        off = len(strings)
+        strings.extend(raw)
+        return off, len(raw)
+
+    regiones = sorted(regiones, key=lambda r: _codigo(r['codigo']))
+    bloques_region = []
+    bloques_comuna = []
+    claves_comuna = []
+    for region in regiones:
+        comunas = sorted(
+            comunas_por_region.get(region['codigo'], []),
+            key=lambda c: _codigo(c['codigo'])
+        )
+        off, largo = agregar(region['nombre'])
+        bloques_region.append(_REGION.pack(
+            _codigo(region['codigo']), off, largo, len(bloques_comuna), len(comunas),
+            _coordenada(region.get('lat')), _coordenada(region.get('lng')),
+        ))
+        for comuna in comunas:
+            off, largo = agregar(comuna['nombre'])
+            claves_comuna.append((_codigo(comuna['codigo']), len(bloques_comuna)))
+            bloques_comuna.append(_COMUNA.pack(
+                _codigo(comuna['codigo']), _codigo(region['codigo']),
+                _codigo(comuna.get('codigo_padre', '')), off, largo,
+                _coordenada(comuna.get('lat')), _coordenada(comuna.get('lng')),
+            ))
+
+    indice = [_INDICE.pack(pos) for _, pos in sorted(claves_comuna)]
+    off_strings = (
+        _HEADER.size + len(bloques_region) * _REGION.size
+        + len(bloques_comuna) * _COMUNA.size + len(indice) * _INDICE.size
+    )
+    cabecera = _HEADER.pack(
+        MAGIC, VERSION, 0, generado or time.time(),
+        len(bloques_region), len(bloques_comuna), off_strings,
+    )
+
+    directorio = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directorio, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=directorio, prefix='.dpa-', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(cabecera)
+            f.write(b''.join(bloques_region))
+            f.write(b''.join(bloques_comuna))
+            f.write(b''.join(indice))
+            f.write(strings)
+            f.flush()
+            os.fsync(f.fileno())
+        os.chmod(tmp, 0o644)
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+        raise
+
+
+class GazetteerStore:
+    """
+    Mantiene el snapshot vigente del proceso y lo refresca con TTL y
+    stale-while-revalidate: pasado el TTL se sigue sirviendo el snapshot
+    anterior mientras un hilo en segundo plano lo renueva. Si la API
+    externa falla se conserva el último snapshot bueno.
+    """
+
+    # Cada cuánto se revisa (stat) si otro proceso reemplazó el archivo
+    intervalo_revision = 1.0
+
+    def __init__(self, path, ttl, fetch, reintento=300):
+        self.path = path
+        self.ttl = ttl
+        self.fetch = fetch
+        self.reintento = reintento
+        self._snapshot = None
+        self._proxima_revision = 0.0
+        self._proximo_intento = 0.0
+        self._refrescando = False
+        self._lock = threading.Lock()
+        self._vuelo = SingleFlight()
+
+    def _vigente(self):
+        """(snapshot, hay_que_esperar_descarga) sin hacer I/O de red"""
+        ahora = time.monotonic()
+        if self._snapshot is None or ahora >= self._proxima_revision:
+            self._revisar_archivo(ahora)
+
+        snapshot = self._snapshot
+        if snapshot is None:
+            # Arranque en frío: no hay nada que servir, hay que esperar
+            # (salvo que la API haya fallado hace poco)
+            return None, ahora >= self._proximo_intento
+
+        if snapshot.edad > self.ttl:
+            self._refrescar_en_segundo_plano()
+        return snapshot, False
+
+    def get(self):
+        """Snapshot vigente; sólo bloquea si no existe ninguno todavía"""
+        snapshot, esperar = self._vigente()
+        if esperar:
+            self.refrescar()
+            snapshot = self._snapshot
+        return snapshot
+
+    async def aget(self):
+        """Versión async de `get`: en frío espera la descarga sin bloquear el event loop"""
+        snapshot, esperar = self._vigente()
+        if esperar:
+            await self._vuelo.do_async('snapshot', self._refrescar)
+            snapshot = self._snapshot
+        return snapshot
+
+    def _revisar_archivo(self, ahora):
+        with self._lock:
+            self._proxima_revision = ahora + self.intervalo_revision
+            try:
+                stat = os.stat(self.path)
+            except FileNotFoundError:
+                return
+            firma = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+            if self._snapshot is not None and self._snapshot.firma == firma:
+                return
+            try:
+                self._snapshot = GazetteerSnapshot(self.path)
+            except (OSError, ValueError, struct.error, SnapshotError) as e:
+                logger.error(f"Invalid DPA snapshot (Snapshot DPA inválido) {self.path}: {e}")
+
+    def _refrescar_en_segundo_plano(self):
+        with self._lock:
+            if self._refrescando or time.monotonic() < self._proximo_intento:
+                return
+            self._refrescando = True
+        threading.Thread(target=self.refrescar, name='dpa-refresh', daemon=True).start()
+
+    def refrescar(self):
+        """
+        Descarga la DPA y reemplaza el snapshot. Devuelve True si se escribió
+        uno nuevo. Dentro del proceso las llamadas concurrentes se coalescen
+        en una sola descarga; entre procesos lo evita un bloqueo de archivo.
+        """
+        return self._vuelo.do('snapshot', self._refrescar)
+
+    def _refrescar(self):
+        with self._lock:
+            self._refrescando = True
+        lock_file = None
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            lock_file = open(f"{self.path}.lock", 'a')
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+
+            # Otro worker pudo haberlo renovado mientras esperábamos el bloqueo
+            self._revisar_archivo(time.monotonic())
+            if self._snapshot is not None and self._snapshot.edad <= self.ttl:
+                return False
+
+            regiones, comunas_por_region = self.fetch()
+            if not regiones:
+                raise SnapshotError("La API DPA no devolvió regiones")
+            escribir_snapshot(self.path, regiones, comunas_por_region)
+            self._revisar_archivo(time.monotonic())
+            logger.info(f"DPA snapshot refreshed (Snapshot DPA actualizado): {self.path}")
+            return True
+        except Exception as e:
+            self._proximo_intento = time.monotonic() + self.reintento
+            logger.error(f"Error refreshing DPA snapshot (Error al actualizar el snapshot DPA): {e}")
+            return False
+        finally:
+            if lock_file is not None:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+                lock_file.close()
+            with self._lock:
+                self._refrescando = False
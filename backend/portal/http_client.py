@@ -0,0 +1,236 @@
+# backend/portal/http_client.py
+
+"""
+Cliente HTTP compartido para las APIs externas (DPA).
+
+Una sola ``requests.Session`` por proceso con pool de conexiones keep-alive,
+timeouts por endpoint, reintentos acotados con jitter y un circuit breaker
+que corta las llamadas cuando la tasa de errores supera un umbral; mientras
+está abierto los llamadores siguen sirviendo sus datos en caché (snapshot).
+"""
+
+import logging
+import random
+import threading
+import time
+from collections import deque
+
+import requests
+from requests.adapters import HTTPAdapter
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+ESTADOS_REINTENTABLES = {429, 502, 503, 504}
+
+
+class CircuitOpenError(requests.RequestException):
+    """El circuit breaker está abierto: no se contacta a la API externa"""
+
+
+class CircuitBreaker:
+    """
+    Breaker por tasa de errores en una ventana móvil.
+
+    cerrado -> abierto cuando en la ventana hay al menos `minimo` llamadas
+    y la fracción de errores supera `umbral`; tras `apertura` segundos pasa
+    a semiabierto y deja pasar una llamada de prueba.
+    """
+
+    CERRADO = 'cerrado'
+    ABIERTO = 'abierto'
+    SEMIABIERTO = 'semiabierto'
+
+    def __init__(self, umbral=0.5, minimo=5, ventana=60, apertura=30):
+        self.umbral = umbral
+        self.minimo = minimo
+        self.ventana = ventana
+        self.apertura = apertura
+        self.estado = self.CERRADO
+        self.aperturas = 0
+        self._resultados = deque()
+        self._abierto_desde = 0.0
+        self._prueba_en_curso = False
+        self._lock = threading.Lock()
+
+    def permitir(self):
+        with self._lock:
+            if self.estado == self.CERRADO:
+                return True
+            if self.estado == self.ABIERTO and time.monotonic() - self._abierto_desde >= self.apertura:
+                self.estado = self.SEMIABIERTO
+                self._prueba_en_curso = False
+            if self.estado == self.SEMIABIERTO and not self._prueba_en_curso:
+                self._prueba_en_curso = True
+                return True
+            return False
+
+    def registrar(self, exito):
+        with self._lock:
+            ahora = time.monotonic()
+            if self.estado == self.SEMIABIERTO:
+                self._prueba_en_curso = False
+                if exito:
+                    self.estado = self.CERRADO
+                    self._resultados.clear()
+                else:
+                    self._abrir(ahora)
+                return
+
+            self._resultados.append((ahora, exito))
+            while self._resultados and self._resultados[0][0] < ahora - self.ventana:
+                self._resultados.popleft()
+
+            total = len(self._resultados)
+            errores = sum(1 for _, ok in self._resultados if not ok)
+            if self.estado == self.CERRADO and total >= self.minimo and errores / total >= self.umbral:
+                self._abrir(ahora)
+
+    def _abrir(self, ahora):
+        self.estado = self.ABIERTO
+        self._abierto_desde = ahora
+        self.aperturas += 1
+        self._resultados.clear()
+        logger.warning("Circuit breaker opened (Circuit breaker abierto)")
+
+    def tasa_errores(self):
+        with self._lock:
+            if not self._resultados:
+                return 0.0
+            return sum(1 for _, ok in self._resultados if not ok) / len(self._resultados)
+
+
+class HttpClient:
+    """Cliente con pool, timeouts por endpoint, reintentos y circuit breaker"""
+
+    def __init__(self, pool_maxsize=10, timeouts=None, timeout_por_defecto=(3.05, 10),
+                 reintentos=2, backoff=0.2, backoff_max=2.0, breaker=None):
+        self.timeouts = timeouts or {}
+        self.timeout_por_defecto = timeout_por_defecto
+        self.reintentos = reintentos
+        self.backoff = backoff
+        self.backoff_max = backoff_max
+        self.breaker = breaker or CircuitBreaker()
+
+        self.session = requests.Session()
+        self.adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_maxsize, max_retries=0)
+        self.session.mount('http://', self.adapter)
+        self.session.mount('https://', self.adapter)
+
+        self._lock = threading.Lock()
+        self._latencias = deque(maxlen=1000)
+        self._contadores = {
+            'solicitudes': 0, 'errores': 0, 'reintentos': 0, 'rechazadas_por_breaker': 0,
+        }
+
+    def _contar(self, clave, n=1):
+        with self._lock:
+            self._contadores[clave] += n
+
+    def _espera(self, intento):
+        # Backoff exponencial con "full jitter"
+        return random.uniform(0, min(self.backoff_max, self.backoff * (2 ** intento)))
+
+    def get(self, url, endpoint=None, **kwargs):
+        """
+        GET con reintentos. `endpoint` elige el timeout configurado;
+        lanza CircuitOpenError sin tocar la red si el breaker está abierto.
+        """
+        if not self.breaker.permitir():
+            self._contar('rechazadas_por_breaker')
+            raise CircuitOpenError(f"Circuit breaker abierto para {url}")
+
+        kwargs.setdefault('timeout', self.timeouts.get(endpoint, self.timeout_por_defecto))
+        intento = 0
+        while True:
+            inicio = time.perf_counter()
+            self._contar('solicitudes')
+            try:
+                response = self.session.get(url, **kwargs)
+                if response.status_code in ESTADOS_REINTENTABLES:
+                    response.raise_for_status()
+            except (requests.ConnectionError, requests.Timeout, requests.HTTPError):
+                self._registrar_latencia(endpoint, inicio)
+                if intento < self.reintentos:
+                    intento += 1
+                    self._contar('reintentos')
+                    time.sleep(self._espera(intento))
+                    continue
+                self._contar('errores')
+                self.breaker.registrar(False)
+                raise
+            except Exception:
+                # Cualquier otro error (respuesta cortada, p. ej.) también cuenta como fallo:
+                # si era la llamada de prueba del semiabierto, el breaker no queda trabado
+                self._registrar_latencia(endpoint, inicio)
+                self._contar('errores')
+                self.breaker.registrar(False)
+                raise
+
+            self._registrar_latencia(endpoint, inicio)
+            self.breaker.registrar(response.status_code < 500)
+            return response
+
+    def _registrar_latencia(self, endpoint, inicio):
+        with self._lock:
+            self._latencias.append((endpoint, (time.perf_counter() - inicio) * 1000))
+
+    def pool(self):
+        """Uso del pool de conexiones por host"""
+        pools = []
+        for clave in list(self.adapter.poolmanager.pools.keys()):
+            conexion = self.adapter.poolmanager.pools.get(clave)
+            if conexion is None:
+                continue
+            pools.append({
+                'host': f"{conexion.scheme}://{conexion.host}:{conexion.port}",
+                'conexiones_creadas': conexion.num_connections,
+                'solicitudes': conexion.num_requests,
+                'inactivas': conexion.pool.qsize() if conexion.pool else 0,
+                'maximo': self.adapter._pool_maxsize,
+            })
+        return pools
+
+    def metricas(self):
+        with self._lock:
+            contadores = dict(self._contadores)
+            latencias = sorted(ms for _, ms in self._latencias)
+
+        def percentil(p):
+            if not latencias:
+                return None
+            return round(latencias[min(len(latencias) - 1, int(len(latencias) * p))], 3)
+
+        return {
+            **contadores,
+            'breaker': {
+                'estado': self.breaker.estado,
+                'tasa_errores': round(self.breaker.tasa_errores(), 3),
+                'aperturas': self.breaker.aperturas,
+            },
+            'latencia_ms': {'p50': percentil(0.50), 'p95': percentil(0.95), 'p99': percentil(0.99)},
+            'pool': self.pool(),
+        }
+
+
+_cliente = None
+_cliente_lock = threading.Lock()
+
+
+def cliente_dpa():
+    """Cliente compartido del proceso para la API DPA"""
+    global _cliente
+    if _cliente is None:
+        with _cliente_lock:
+            if _cliente is None:
+                config = settings.DPA_HTTP
+                _cliente = HttpClient(
+                    pool_maxsize=config['POOL_MAXSIZE'],
+                    timeouts=config['TIMEOUTS'],
+                    reintentos=config['REINTENTOS'],
+                    breaker=CircuitBreaker(
+                        umbral=config['UMBRAL_ERRORES'],
+                        apertura=config['APERTURA_SEGUNDOS'],
+                    ),
+                )
+    return _cliente
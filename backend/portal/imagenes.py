@@ -0,0 +1,148 @@
+# backend/portal/imagenes.py
+
+"""
+Variantes redimensionadas de ImagenInmueble.
+
+Al subir una imagen la vista solo guarda el original; la señal post_save
+encola su id (on_commit) en un pool de hilos del proceso, que genera una
+variante por tamaño de VARIANTES en WebP y JPEG, sin EXIF (la orientación
+se aplica antes), y guarda rutas y dimensiones en la fila. Pillow suelta el
+GIL al decodificar, redimensionar y codificar, así que los hilos avanzan
+en paralelo sin bloquear los requests.
+
+Lo que quede sin procesar (un reinicio con la cola a medias, imágenes
+anteriores a esto) lo recoge ``manage.py procesar_imagenes``.
+"""
+
+import io
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import connection
+from PIL import Image, ImageOps
+
+from .storage import liberar_archivos
+
+logger = logging.getLogger(__name__)
+
+# nombre -> ancho máximo en px (el alto sigue la proporción; nunca se agranda)
+VARIANTES = {'thumb': 160, 'card': 480, 'detail': 1280}
+FORMATOS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+    'jpeg': ('JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+CARPETA = 'inmuebles/variantes'
+# Orientaciones EXIF que rotan 90° (ancho y alto se intercambian)
+ROTADAS = {5, 6, 7, 8}
+
+
+def generar_variantes(archivo):
+    """
+    Lee una imagen y devuelve (ancho, alto, variantes) con las dimensiones
+    del original ya orientado y, por variante, (ancho, alto, {formato: bytes}).
+    """
+    with Image.open(archivo) as imagen:
+        ancho, alto = imagen.size
+        if imagen.getexif().get(0x0112) in ROTADAS:
+            ancho, alto = alto, ancho
+        # JPEG: decodifica directo a una escala reducida que aún cubre la variante más grande
+        mayor = max(VARIANTES.values())
+        imagen.draft('RGB', (mayor, mayor))
+        imagen = ImageOps.exif_transpose(imagen)
+        if imagen.mode in ('RGBA', 'LA', 'PA') or 'transparency' in imagen.info:
+            # Transparencia sobre fondo blanco (JPEG no la soporta)
+            imagen = imagen.convert('RGBA')
+            fondo = Image.new('RGB', imagen.size, 'white')
+            fondo.paste(imagen, mask=imagen.getchannel('A'))
+            imagen = fondo
+        elif imagen.mode != 'RGB':
+            imagen = imagen.convert('RGB')
+
+        variantes = {}
+        # De la más grande a la más chica: cada una sale de la anterior
+        for nombre, limite in sorted(VARIANTES.items(), key=lambda v: -v[1]):
+            if imagen.width > limite:
+                imagen = imagen.resize((limite, max(1, round(imagen.height * limite / imagen.width))), Image.LANCZOS)
+            codificadas = {}
+            for formato, (codigo, opciones) in FORMATOS.items():
+                salida = io.BytesIO()
+                imagen.save(salida, codigo, **opciones)  # sin exif=: no se copian metadatos
+                codificadas[formato] = salida.getvalue()
+            variantes[nombre] = (imagen.width, imagen.height, codificadas)
+    return ancho, alto, variantes
+
+
+class ProcesadorImagenes:
+
+    _pool = None
+    _lock = threading.Lock()
+
+    @classmethod
+    def pool(cls):
+        if cls._pool is None:
+            with cls._lock:
+                if cls._pool is None:
+                    cls._pool = ThreadPoolExecutor(
+                        max_workers=settings.IMAGENES['WORKERS'], thread_name_prefix='imagenes',
+                    )
+        return cls._pool
+
+    @classmethod
+    def encolar(cls, pk):
+        return cls.pool().submit(cls._tarea, pk)
+
+    @classmethod
+    def _tarea(cls, pk):
+        try:
+            return cls.procesar(pk)
+        except Exception:
+            logger.exception(f"Image processing failed (Falló el procesamiento de la imagen) {pk}")
+            return False
+        finally:
+            # Cada hilo del pool tiene su propia conexión
+            connection.close()
+
+    @classmethod
+    def procesar(cls, pk):
+        """Genera y guarda las variantes de una imagen; False si ya no existe"""
+        from .models import ImagenInmueble, invalidar_destacados
+
+        imagen = ImagenInmueble.objects.filter(pk=pk).only('id', 'inmueble_id', 'imagen', 'variantes').first()
+        if imagen is None or not imagen.imagen:
+            return False
+        storage = imagen.imagen.storage
+        inicio = time.perf_counter()
+        with imagen.imagen.open('rb') as archivo:
+            ancho, alto, generadas = generar_variantes(archivo)
+
+        variantes = {}
+        for nombre, (v_ancho, v_alto, codificadas) in generadas.items():
+            variantes[nombre] = {'ancho': v_ancho, 'alto': v_alto}
+            for formato, contenido in codificadas.items():
+                ruta = f'{CARPETA}/{pk}/{nombre}.{"jpg" if formato == "jpeg" else formato}'
+                variantes[nombre][formato] = storage.save(ruta, ContentFile(contenido))
+
+        # Solo si la fila sigue apuntando al mismo archivo (pudo reemplazarse mientras tanto)
+        actualizadas = ImagenInmueble.objects.filter(pk=pk, imagen=imagen.imagen.name).update(
+            ancho=ancho, alto=alto, variantes=variantes, procesada=True,
+        )
+        # Se sueltan las variantes que quedan sin usar (storage direccionado por contenido)
+        sobrantes = imagen.variantes if actualizadas else variantes
+        liberar_archivos(storage, [v[formato] for v in sobrantes.values() for formato in FORMATOS if formato in v])
+        if actualizadas:
+            invalidar_destacados(imagen.inmueble_id)
+        logger.info(
+            f"Image variants generated (Variantes generadas) {pk}: {ancho}x{alto} "
+            f"en {time.perf_counter() - inicio:.2f} s"
+        )
+        return bool(actualizadas)
+
+    @classmethod
+    def pendientes(cls):
+        from .models import ImagenInmueble
+
+        return ImagenInmueble.objects.filter(procesada=False).order_by('id').values_list('id', flat=True)
@@ -0,0 +1,271 @@
+# backend/portal/importacion.py
+
+"""
+Importación masiva de inmuebles desde CSV o JSONL.
+
+El archivo se lee fila a fila (memoria constante, sirve para archivos de
+cualquier tamaño). Cada fila se valida con los mismos campos de
+InmuebleForm (tipos, máximos, choices) y la misma regla de comuna/región,
+pero sin instanciar el formulario completo: los campos se construyen una
+vez y las ubicaciones salen del índice local. Las filas válidas se insertan
+con bulk_create en transacciones por lote; las inválidas van a un reporte
+CSV (fila, campo, error) que también se escribe a medida que se avanza.
+
+Una fila ilegible (JSON o CSV mal formado, texto que no es UTF-8) es un
+error más de esa fila. Si el archivo no se puede seguir leyendo (gzip
+corrupto o truncado), la importación se interrumpe: lo leído hasta ahí
+queda importado y el motivo queda en `interrumpida`.
+"""
+
+import codecs
+import copy
+import csv
+import gzip
+import json
+import logging
+import time
+import zlib
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+
+from .contadores import Contadores
+from .forms import InmuebleForm
+from .fragmentos import Fragmentos, DESTACADOS
+from .models import Inmueble
+from .services import ChileanLocationService
+
+logger = logging.getLogger(__name__)
+
+# Columnas validadas con los campos de InmuebleForm
+CAMPOS = [
+    'nombre', 'descripcion', 'm2_construidos', 'm2_totales', 'estacionamientos',
+    'habitaciones', 'banos', 'direccion', 'precio_mensual', 'tipo_inmueble',
+]
+VERDADEROS = {'1', 'true', 't', 'si', 'sí', 's', 'yes', 'y', 'x'}
+
+
+class ErrorImportacion(Exception):
+    pass
+
+
+def detectar_formato(nombre):
+    nombre = nombre.lower().removesuffix('.gz')
+    if nombre.endswith('.csv'):
+        return 'csv'
+    if nombre.endswith(('.jsonl', '.ndjson', '.json')):
+        return 'jsonl'
+    raise ErrorImportacion(f'Formato no reconocido para "{nombre}" (usa .csv o .jsonl)')
+
+
+class Lineas:
+    """
+    Líneas de texto de un archivo binario, contadas. Las que no son UTF-8
+    se decodifican con reemplazos y su número queda en `invalidas`.
+    """
+
+    def __init__(self, archivo):
+        self.archivo = archivo
+        self.numero = 0
+        self.invalidas = set()
+
+    def __iter__(self):
+        for linea in self.archivo:
+            self.numero += 1
+            if self.numero == 1:
+                linea = linea.removeprefix(codecs.BOM_UTF8)
+            try:
+                yield linea.decode('utf-8')
+            except UnicodeDecodeError:
+                self.invalidas.add(self.numero)
+                yield linea.decode('utf-8', errors='replace')
+
+    def hay_invalidas(self, hasta):
+        """Si alguna línea hasta `hasta` no era UTF-8 (y las olvida)"""
+        encontrada = any(numero <= hasta for numero in self.invalidas)
+        if encontrada:
+            self.invalidas = {numero for numero in self.invalidas if numero > hasta}
+        return encontrada
+
+
+def leer_filas(archivo, formato, comprimido=False):
+    """
+    Genera (número de línea, dict) desde un archivo binario, sin cargarlo
+    entero; (número de línea, excepción) si la fila no se puede leer.
+    Levanta ErrorImportacion si el archivo deja de poder leerse.
+    """
+    if comprimido:
+        archivo = gzip.GzipFile(fileobj=archivo)
+    lineas = Lineas(archivo)
+    try:
+        if formato == 'csv':
+            yield from _filas_csv(lineas)
+        else:
+            yield from _filas_jsonl(lineas)
+    except (OSError, EOFError, zlib.error) as e:
+        # gzip.BadGzipFile es un OSError; EOFError: comprimido truncado
+        raise ErrorImportacion(f'No se pudo seguir leyendo el archivo después de la línea {lineas.numero}: {e}')
+
+
+def _filas_csv(lineas):
+    lector = csv.DictReader(lineas)
+    try:
+        lector.fieldnames
+    except csv.Error as e:
+        raise ErrorImportacion(f'Encabezado CSV inválido: {e}')
+    if lineas.hay_invalidas(lector.line_num):
+        raise ErrorImportacion('El encabezado CSV no está en UTF-8')
+    while True:
+        try:
+            fila = next(lector)
+        except StopIteration:
+            return
+        except csv.Error as e:
+            # El lector sigue desde la línea siguiente
+            fila = ValueError(f'CSV mal formado: {e}')
+        # DictReader.line_num no se actualiza si la fila falla; el del lector de abajo sí
+        numero = lector.reader.line_num
+        if lineas.hay_invalidas(numero):
+            fila = ValueError('el texto no está en UTF-8')
+        yield numero, fila
+
+
+def _filas_jsonl(lineas):
+    for linea in lineas:
+        numero = lineas.numero
+        if lineas.hay_invalidas(numero):
+            yield numero, ValueError('el texto no está en UTF-8')
+            continue
+        if not linea.strip():
+            continue
+        try:
+            fila = json.loads(linea)
+        except ValueError as e:
+            yield numero, e
+            continue
+        yield numero, fila if isinstance(fila, dict) else ValueError('la línea no es un objeto JSON')
+
+
+class ValidadorInmueble:
+    """Valida filas con las reglas de InmuebleForm, reutilizando sus campos"""
+
+    def __init__(self):
+        self.campos = {nombre: copy.deepcopy(InmuebleForm.base_fields[nombre]) for nombre in CAMPOS}
+        self.indice = ChileanLocationService.indice()
+        if not self.indice.regiones:
+            raise ErrorImportacion('No hay datos de ubicación locales; ejecuta sync_dpa primero')
+
+    def validar(self, fila):
+        """Devuelve (datos limpios, errores) con errores = [(campo, mensaje)]"""
+        datos, errores = {}, []
+        for nombre, campo in self.campos.items():
+            valor = fila.get(nombre)
+            if isinstance(valor, str):
+                valor = valor.strip()
+            try:
+                datos[nombre] = campo.clean(valor)
+            except ValidationError as e:
+                errores.extend((nombre, mensaje) for mensaje in e.messages)
+
+        region = str(fila.get('region_codigo') or '').strip()
+        comuna = str(fila.get('comuna_codigo') or '').strip()
+        if region not in self.indice.regiones:
+            errores.append(('region_codigo', f'Región inválida: "{region}"'))
+        elif comuna not in self.indice.comunas:
+            errores.append(('comuna_codigo', f'Comuna inválida: "{comuna}"'))
+        elif self.indice.region_de_comuna(comuna) != region:
+            errores.append(('comuna_codigo', 'La comuna no pertenece a la región seleccionada.'))
+        else:
+            datos.update(
+                region_codigo=region, region_nombre=self.indice.nombre_region(region),
+                comuna_codigo=comuna, comuna_nombre=self.indice.nombre_comuna(comuna),
+            )
+
+        publicado = fila.get('esta_publicado')
+        if publicado is not None and publicado != '':
+            datos['esta_publicado'] = publicado is True or str(publicado).strip().lower() in VERDADEROS
+        return datos, errores
+
+
+class Importacion:
+    """
+    Ejecuta una importación. `reporte` es un archivo de texto opcional donde
+    se escriben los errores; `max_errores_guardados` limita cuántos quedan
+    además en memoria (para mostrarlos en el admin).
+    """
+
+    def __init__(self, propietario=None, publicar=False, batch_size=2000, reporte=None,
+                 simular=False, max_errores_guardados=100):
+        self.propietario = propietario
+        self.publicar = publicar
+        self.batch_size = batch_size
+        self.simular = simular
+        self.max_errores_guardados = max_errores_guardados
+        self.escritor = csv.writer(reporte) if reporte is not None else None
+        if self.escritor:
+            self.escritor.writerow(['fila', 'campo', 'error'])
+        self.errores = []
+        self.leidas = self.insertadas = self.rechazadas = 0
+        self.interrumpida = None
+
+    def _error(self, fila, campo, mensaje):
+        if self.escritor:
+            self.escritor.writerow([fila, campo, mensaje])
+        if len(self.errores) < self.max_errores_guardados:
+            self.errores.append((fila, campo, mensaje))
+
+    def _insertar(self, lote):
+        if lote and not self.simular:
+            with transaction.atomic():
+                Inmueble.objects.bulk_create(lote)
+        self.insertadas += len(lote)
+
+    def ejecutar(self, filas):
+        validador = ValidadorInmueble()
+        inicio = time.perf_counter()
+        lote = []
+        try:
+            for numero, fila in filas:
+                self.leidas += 1
+                if isinstance(fila, Exception):
+                    self.rechazadas += 1
+                    self._error(numero, '', f'Fila ilegible: {fila}')
+                    continue
+
+                datos, errores = validador.validar(fila)
+                if errores:
+                    self.rechazadas += 1
+                    for campo, mensaje in errores:
+                        self._error(numero, campo, mensaje)
+                    continue
+
+                datos.setdefault('esta_publicado', self.publicar)
+                lote.append(Inmueble(propietario=self.propietario, **datos))
+                if len(lote) >= self.batch_size:
+                    self._insertar(lote)
+                    lote = []
+        except ErrorImportacion as e:
+            # Los lotes anteriores ya están confirmados: se importa también lo leído hasta acá
+            self.interrumpida = str(e)
+            self._error('', '', self.interrumpida)
+            logger.warning(f"Listings import interrupted (Importación de inmuebles interrumpida): {e}")
+        self._insertar(lote)
+
+        if self.insertadas and not self.simular:
+            Contadores.invalidar()
+            Fragmentos.invalidar(DESTACADOS)
+        self.segundos = time.perf_counter() - inicio
+        logger.info(
+            f"Listings import finished (Importación de inmuebles terminada): {self.insertadas} insertadas, "
+            f"{self.rechazadas} rechazadas en {self.segundos:.1f} s"
+        )
+        return self
+
+    def resumen(self):
+        return {
+            'leidas': self.leidas,
+            'insertadas': self.insertadas,
+            'rechazadas': self.rechazadas,
+            'segundos': round(self.segundos, 2),
+            'interrumpida': self.interrumpida,
+        }
@@ -0,0 +1,104 @@
+# backend/portal/limpieza.py
+
+"""
+Recolección de media huérfana: archivos de MEDIA_ROOT que ninguna fila usa.
+
+No se arma ningún conjunto en memoria. recorrer() entrega los archivos del
+disco y referencias() las rutas que usa la base (FileFields, rutas de las
+variantes y ArchivoContenido), las dos en orden de bytes (el de
+ORDER BY ... COLLATE "C"), y unir() las cruza como un merge join, así que
+la memoria no depende de cuántos archivos haya: solo del directorio más
+grande y del tamaño de lote del cursor.
+
+Lo usa ``manage.py limpiar_media``.
+"""
+
+import os
+
+from django.apps import apps
+from django.db import connection, models
+
+from .imagenes import FORMATOS
+
+HUERFANO = 'huerfano'
+FALTANTE = 'faltante'
+
+
+def recorrer(raiz, carpeta=''):
+    """
+    Rutas relativas a `raiz` de los archivos bajo `carpeta`, en orden de
+    bytes de la ruta completa. Lee un directorio a la vez; no sigue enlaces.
+    """
+    try:
+        with os.scandir(os.path.join(raiz, carpeta)) as entradas:
+            # Un directorio ordena como su nombre + '/': 'a.jpg' < 'a/...' igual que en la ruta completa
+            nombres = sorted(
+                entrada.name + '/' if entrada.is_dir(follow_symlinks=False) else entrada.name
+                for entrada in entradas
+                if entrada.is_dir(follow_symlinks=False) or entrada.is_file(follow_symlinks=False)
+            )
+    except FileNotFoundError:
+        return
+    for nombre in nombres:
+        if nombre.endswith('/'):
+            yield from recorrer(raiz, carpeta + nombre)
+        else:
+            yield carpeta + nombre
+
+
+def sql_referencias():
+    """Consulta de todas las rutas en uso, sin repetir, en el orden de recorrer()"""
+    from .models import ArchivoContenido, ImagenInmueble
+
+    partes, parametros = [], []
+    for modelo in apps.get_models():
+        for campo in modelo._meta.concrete_fields:
+            if isinstance(campo, models.FileField):
+                partes.append(f'SELECT {campo.column} FROM {modelo._meta.db_table}')
+                if isinstance(campo.default, str):
+                    # El default (p. ej. default-profile.webp) se usa aunque ninguna fila lo tenga todavía
+                    partes.append('SELECT %s')
+                    parametros.append(campo.default)
+    partes.append(
+        f'SELECT v.value ->> f.formato FROM {ImagenInmueble._meta.db_table} i '
+        f'CROSS JOIN jsonb_each(i.variantes) v CROSS JOIN unnest(%s::text[]) AS f (formato)'
+    )
+    parametros.append(list(FORMATOS))
+    partes.append(f'SELECT ruta FROM {ArchivoContenido._meta.db_table}')
+    sql = (
+        'SELECT ruta FROM (' + ' UNION '.join(partes) + ') AS r (ruta) '
+        "WHERE ruta IS NOT NULL AND ruta <> '' ORDER BY ruta COLLATE \"C\""
+    )
+    return sql, parametros
+
+
+def referencias(tamano_lote=5000):
+    """Rutas en uso, en orden, leídas de a `tamano_lote` con un cursor del servidor"""
+    sql, parametros = sql_referencias()
+    with connection.chunked_cursor() as cursor:
+        cursor.execute(sql, parametros)
+        while True:
+            filas = cursor.fetchmany(tamano_lote)
+            if not filas:
+                return
+            for (ruta,) in filas:
+                yield ruta
+
+
+def unir(archivos, usadas):
+    """
+    Merge join de dos secuencias ordenadas: entrega (HUERFANO, ruta) por
+    cada archivo que nadie usa y (FALTANTE, ruta) por cada ruta usada que
+    no está en el disco.
+    """
+    archivos, usadas = iter(archivos), iter(usadas)
+    archivo, usada = next(archivos, None), next(usadas, None)
+    while archivo is not None or usada is not None:
+        if usada is None or (archivo is not None and archivo < usada):
+            yield HUERFANO, archivo
+            archivo = next(archivos, None)
+        elif archivo is None or usada < archivo:
+            yield FALTANTE, usada
+            usada = next(usadas, None)
+        else:
+            archivo, usada = next(archivos, None), next(usadas, None)
@@ -0,0 +1,21 @@
+# backend/portal/management/commands/actualizar_estadisticas_precios.py
+
+import json
+
+from django.core.management.base import BaseCommand
+from portal.estadisticas import EstadisticasPrecios
+
+
+class Command(BaseCommand):
+    help = 'Recalcula el resumen de precios por comuna para los grupos con cambios desde la última ejecución'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Grupos por transacción')
+        parser.add_argument('--completo', action='store_true', help='Recalcular todos los grupos')
+
+    def handle(self, *args, **options):
+        if options['completo']:
+            marcados = EstadisticasPrecios.marcar_todos()
+            self.stdout.write(f'{marcados} grupos marcados como pendientes')
+        resumen = EstadisticasPrecios.actualizar(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(json.dumps(resumen)))
@@ -0,0 +1,41 @@
+# backend/portal/management/commands/backfill_portadas.py
+
+from django.core.management.base import BaseCommand
+from django.db.models import OuterRef, Subquery
+from portal.models import Inmueble, ImagenInmueble
+
+class Command(BaseCommand):
+    help = 'Rellena Inmueble.portada con la primera imagen de cada inmueble (datos existentes)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument(
+            '--todos', action='store_true',
+            help='Recalcular también los inmuebles que ya tienen portada',
+        )
+
+    def handle(self, *args, **options):
+        primera = (
+            ImagenInmueble.objects.filter(inmueble=OuterRef('pk'))
+            .order_by('orden', 'creado', 'id')
+            .values('id')[:1]
+        )
+        queryset = Inmueble.objects.all()
+        if not options['todos']:
+            queryset = queryset.filter(portada__isnull=True, imagenes__isnull=False).distinct()
+
+        # Un UPDATE ... SET portada_id = (subconsulta) por lote de ids, en
+        # orden de pk, para no bloquear la tabla completa de una vez
+        batch_size = options['batch_size']
+        ultimo, total = 0, 0
+        while True:
+            ids = list(
+                queryset.filter(pk__gt=ultimo).order_by('pk').values_list('pk', flat=True)[:batch_size]
+            )
+            if not ids:
+                break
+            total += Inmueble.objects.filter(pk__in=ids).update(portada=Subquery(primera))
+            ultimo = ids[-1]
+            self.stdout.write(f'  ... {total} inmuebles')
+
+        self.stdout.write(self.style.SUCCESS(f'{total} portadas actualizadas'))
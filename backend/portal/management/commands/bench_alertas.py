@@ -0,0 +1,86 @@
+# backend/portal/management/commands/bench_alertas.py
+
+import random
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+from portal.alertas import Criterio, IndiceBusquedas
+from portal.management.commands.generar_datos import TIPOS
+
+
+class Command(BaseCommand):
+    help = 'Benchmark del calce de alertas: índice invertido vs recorrer todas las búsquedas (sin base de datos)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--busquedas', type=int, default=100_000)
+        parser.add_argument('--eventos', type=int, default=2_000, help='Inmuebles publicados a calzar')
+        parser.add_argument('--fuerza-bruta', type=int, default=200, help='Eventos a medir recorriendo todo')
+        parser.add_argument('--semilla', type=int, default=1)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['semilla'])
+        tipos, pesos_tipos = zip(*TIPOS)
+        # 16 regiones y ~350 comunas como el país; la mitad de la demanda en la RM
+        regiones = [f'{r:02d}' for r in range(1, 17)]
+        self.comunas = [(f'{region}{c:03d}', region, rng.uniform(0.7, 1.9)) for region in regiones for c in range(1, 23)]
+        self.pesos = [8 if region == '13' else 8 / 15 for _, region, _ in self.comunas]
+
+        inicio = time.perf_counter()
+        indice = IndiceBusquedas()
+        for pk in range(1, options['busquedas'] + 1):
+            indice.agregar(pk, self.criterio(rng, tipos, pesos_tipos))
+        self.stdout.write(f"Índice de {len(indice)} búsquedas construido en {time.perf_counter() - inicio:.2f} s")
+
+        eventos = [self.inmueble(rng, tipos, pesos_tipos) for _ in range(options['eventos'])]
+
+        candidatos = coincidencias = 0
+        inicio = time.perf_counter()
+        for evento in eventos:
+            coincidencias += len(indice.coincidencias(*evento))
+        indexado = time.perf_counter() - inicio
+        for region, comuna, tipo, precio, *_ in eventos:
+            candidatos += len(indice.candidatos(region, comuna, tipo, float(precio)))
+
+        muestra = eventos[:options['fuerza_bruta']]
+        inicio = time.perf_counter()
+        for evento in muestra:
+            esperado = sorted(pk for pk, c in indice.criterios.items() if c.coincide(*evento[:3], float(evento[3]), *evento[4:]))
+            if esperado != sorted(indice.coincidencias(*evento)):
+                raise CommandError(f'El índice no coincide con la fuerza bruta para {evento}')
+        bruta = (time.perf_counter() - inicio) / max(len(muestra), 1)
+
+        n = len(eventos)
+        self.stdout.write(
+            f"Índice invertido: {n / indexado:,.0f} eventos/s ({indexado / n * 1e3:.3f} ms por evento), "
+            f"{candidatos / n:,.0f} candidatos y {coincidencias / n:,.1f} alertas por evento en promedio"
+        )
+        self.stdout.write(
+            f"Fuerza bruta: {1 / bruta:,.0f} eventos/s ({bruta * 1e3:.2f} ms por evento, "
+            f"{len(indice)} búsquedas revisadas) -> x{bruta / (indexado / n):.0f} más lento"
+        )
+
+    def criterio(self, rng, tipos, pesos_tipos):
+        codigo, region, factor = rng.choices(self.comunas, self.pesos)[0]
+        ubicacion = rng.random()
+        # ~85% por comuna, ~12% solo región, ~3% en todo el país
+        comuna = codigo if ubicacion < 0.85 else ''
+        region = region if ubicacion < 0.97 else ''
+        base = float(np.exp(rng.gauss(13, 0.4))) * factor
+        precio_min = round(base * rng.uniform(0.6, 0.95), -4) if rng.random() < 0.6 else None
+        precio_max = round(base * rng.uniform(1.05, 1.4), -4) if rng.random() < 0.9 else None
+        return Criterio(
+            region, comuna,
+            rng.choices(tipos, pesos_tipos)[0] if rng.random() < 0.8 else '',
+            precio_min, precio_max,
+            rng.randint(1, 3) if rng.random() < 0.6 else None,
+            rng.randint(1, 2) if rng.random() < 0.3 else None,
+        )
+
+    def inmueble(self, rng, tipos, pesos_tipos):
+        codigo, region, factor = rng.choices(self.comunas, self.pesos)[0]
+        return (
+            region, codigo, rng.choices(tipos, pesos_tipos)[0],
+            round(float(np.exp(rng.gauss(13, 0.45))) * factor, -3),
+            rng.randint(1, 5), rng.randint(1, 3),
+        )
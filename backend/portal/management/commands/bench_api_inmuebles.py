@@ -0,0 +1,107 @@
+# backend/portal/management/commands/bench_api_inmuebles.py
+
+import json
+import logging
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+from django.test.utils import setup_test_environment
+from django.urls import reverse
+from portal import payloads
+
+# nombre -> (url_name, querystring); todos se recorren página a página siguiendo el cursor
+ESCENARIOS = {
+    'html_listado': ('inmueble_list', ''),
+    'api_12': ('api_v1_inmuebles', 'limite=12'),
+    'api_100': ('api_v1_inmuebles', 'limite=100'),
+    'api_100_fields': ('api_v1_inmuebles', 'limite=100&fields=id,nombre,precio_mensual,portada_url'),
+}
+
+
+class Command(BaseCommand):
+    help = 'Filas por segundo de la API /api/v1/inmuebles/ contra el listado HTML, recorriendo páginas por cursor'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--paginas', type=int, default=50, help='Páginas por escenario')
+        parser.add_argument('--escenarios', nargs='*', choices=sorted(ESCENARIOS), help='Por defecto todos')
+
+    def handle(self, *args, **options):
+        setup_test_environment()  # response.context en el listado HTML
+        logging.getLogger('django.request').setLevel(logging.CRITICAL)
+        cliente = Client(raise_request_exception=False)
+
+        resultados = {}
+        for nombre in options['escenarios'] or list(ESCENARIOS):
+            url_name, query = ESCENARIOS[nombre]
+            resultados[nombre] = self.recorrer(cliente, reverse(url_name), query, options['paginas'])
+            r = resultados[nombre]
+            self.stdout.write(
+                f"{nombre:<16} {r['paginas']:4d} páginas  {r['filas']:6d} filas  "
+                f"{r['filas_por_segundo']:9.0f} filas/s  {r['kb_por_fila']:.2f} KB/fila"
+            )
+
+        base = resultados.get('html_listado')
+        if base and base['filas_por_segundo']:
+            for nombre, r in resultados.items():
+                if nombre != 'html_listado':
+                    self.stdout.write(f"{nombre}: x{r['filas_por_segundo'] / base['filas_por_segundo']:.1f} vs HTML")
+
+        self.serializacion()
+
+    def recorrer(self, cliente, url, query, paginas):
+        filas = bytes_ = hechas = 0
+        cursor = None
+        inicio = time.perf_counter()
+        while hechas < paginas:
+            parametros = '&'.join(p for p in (query, f'cursor={cursor}' if cursor else '') if p)
+            response = cliente.get(url + (f'?{parametros}' if parametros else ''))
+            if response.status_code != 200:
+                raise CommandError(f'{url} respondió {response.status_code}')
+            hechas += 1
+            bytes_ += len(response.content)
+            if response['Content-Type'].startswith('application/json'):
+                datos = json.loads(response.content)
+                filas += len(datos['resultados'])
+                cursor = datos['siguiente']
+            else:
+                page = response.context['page_obj']
+                filas += len(page.object_list)
+                cursor = getattr(page, 'cursor_siguiente', None)
+            if not cursor:
+                break
+        segundos = time.perf_counter() - inicio
+        return {
+            'paginas': hechas,
+            'filas': filas,
+            'filas_por_segundo': filas / segundos if segundos else 0,
+            'kb_por_fila': bytes_ / 1024 / filas if filas else 0,
+        }
+
+    def serializacion(self):
+        """Costo del encoder solo, sobre una página de 100 filas"""
+        fila = {
+            'id': 123456, 'nombre': 'Departamento céntrico en Ñuñoa', 'direccion': 'Irarrázaval 1234',
+            'comuna_codigo': '13120', 'comuna_nombre': 'Ñuñoa', 'region_codigo': '13',
+            'region_nombre': 'Metropolitana de Santiago', 'tipo_inmueble': 'DEPARTAMENTO',
+            'precio_mensual': str(Decimal('450000.00')), 'habitaciones': 2, 'banos': 1,
+            'estacionamientos': 1, 'm2_construidos': 55.0, 'm2_totales': 60.0,
+            'portada_url': '/media/inmuebles/galeria/foto.jpg', 'creado': '2025-01-01T12:00:00+00:00',
+        }
+        pagina = {'resultados': [dict(fila, id=fila['id'] + n) for n in range(100)], 'siguiente': 'x', 'anterior': None}
+        repeticiones = 2000
+
+        def medir(funcion):
+            inicio = time.perf_counter()
+            for _ in range(repeticiones):
+                funcion(pagina)
+            return (time.perf_counter() - inicio) / repeticiones * 1e6
+
+        estandar = medir(lambda d: json.dumps(d, ensure_ascii=False, separators=(',', ':')).encode('utf-8'))
+        self.stdout.write(f'\njson (stdlib)  {estandar:8.1f} µs por página de 100 filas')
+        if payloads.orjson is None:
+            self.stdout.write('orjson no está instalado: json_bytes usa la biblioteca estándar')
+        else:
+            rapido = medir(payloads.json_bytes)
+            self.stdout.write(f'json_bytes     {rapido:8.1f} µs por página de 100 filas (x{estandar / rapido:.1f})')
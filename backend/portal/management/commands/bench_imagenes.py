@@ -0,0 +1,62 @@
+# backend/portal/management/commands/bench_imagenes.py
+
+import io
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from PIL import Image
+from portal.imagenes import generar_variantes
+
+
+class Command(BaseCommand):
+    help = 'Benchmark de las variantes de imágenes: tiempo por foto y peso de un listado de 12 tarjetas (sin base de datos)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fotos', type=int, default=12)
+        parser.add_argument('--ancho', type=int, default=4000)
+        parser.add_argument('--alto', type=int, default=3000)
+        parser.add_argument('--workers', type=int, default=4)
+
+    def handle(self, *args, **options):
+        fotos = [self.foto(options['ancho'], options['alto'], n) for n in range(options['fotos'])]
+        originales = sum(len(f) for f in fotos)
+        self.stdout.write(
+            f"{len(fotos)} fotos {options['ancho']}x{options['alto']}, "
+            f"{originales / len(fotos) / 1024:.0f} KB promedio"
+        )
+
+        inicio = time.perf_counter()
+        resultados = [generar_variantes(io.BytesIO(f)) for f in fotos]
+        secuencial = time.perf_counter() - inicio
+        inicio = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options['workers']) as pool:
+            list(pool.map(lambda f: generar_variantes(io.BytesIO(f)), fotos))
+        paralelo = time.perf_counter() - inicio
+        self.stdout.write(
+            f"Procesamiento: {secuencial / len(fotos) * 1000:.0f} ms por foto en un hilo, "
+            f"{len(fotos) / paralelo:.1f} fotos/s con {options['workers']} hilos"
+        )
+
+        # Peso de las imágenes de un listado de 12 tarjetas
+        tarjetas = 12
+        por_foto = originales / len(fotos)
+        self.stdout.write(f"Listado de {tarjetas} tarjetas con el original: {por_foto * tarjetas / 1024:8.0f} KB")
+        for nombre in ('card', 'detail'):
+            for formato in ('webp', 'jpeg'):
+                peso = sum(len(r[2][nombre][2][formato]) for r in resultados) / len(resultados) * tarjetas
+                self.stdout.write(
+                    f"  variante {nombre:<6} {formato:<4}:                {peso / 1024:8.0f} KB "
+                    f"(x{por_foto * tarjetas / peso:.0f} menos)"
+                )
+
+    def foto(self, ancho, alto, semilla):
+        """JPEG sintético con detalle parecido a una foto (fractal + ruido), calidad de cámara"""
+        base = Image.effect_mandelbrot((ancho, alto), (-2 + semilla * 0.01, -1.2, 1, 1.2), 80)
+        ruido = Image.effect_noise((ancho, alto), 24)
+        imagen = Image.merge('RGB', (base, Image.blend(base, ruido, 0.3), ruido))
+        salida = io.BytesIO()
+        exif = Image.Exif()
+        exif[0x010f] = 'Camara'
+        imagen.save(salida, 'JPEG', quality=92, exif=exif)
+        return salida.getvalue()
@@ -0,0 +1,88 @@
+# backend/portal/management/commands/bench_inmueble_form.py
+
+import statistics
+import time
+
+import requests
+from django.core.management.base import BaseCommand, CommandError
+from portal.forms import InmuebleForm
+from portal.http_client import cliente_dpa
+from portal.services import ChileanLocationService
+
+def _medir(funcion, iteraciones):
+    tiempos = []
+    for _ in range(iteraciones):
+        inicio = time.perf_counter()
+        funcion()
+        tiempos.append((time.perf_counter() - inicio) * 1000)
+    tiempos.sort()
+    return {
+        'p50': statistics.median(tiempos),
+        'p95': tiempos[min(len(tiempos) - 1, int(len(tiempos) * 0.95))],
+        'max': tiempos[-1],
+    }
+
+class Command(BaseCommand):
+    help = 'Mide la latencia de render y guardado de InmuebleForm (antes: HTTP por llamada, ahora: índice local)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iteraciones', type=int, default=200)
+        parser.add_argument(
+            '--sin-red', action='store_true',
+            help='No medir el camino anterior (llamadas a la API DPA en cada render/guardado)',
+        )
+
+    def handle(self, *args, **options):
+        iteraciones = options['iteraciones']
+        indice = ChileanLocationService.indice()
+        if not indice.regiones_choices:
+            raise CommandError('No hay datos de ubicación; ejecuta sync_dpa o revisa la conexión a la API DPA')
+
+        region_codigo = indice.regiones_choices[0][0]
+        comuna_codigo = indice.comunas_choices[region_codigo][0][0]
+        data = {
+            'nombre': 'Departamento de prueba', 'descripcion': 'Benchmark',
+            'm2_construidos': 60, 'm2_totales': 70, 'estacionamientos': 1,
+            'habitaciones': 2, 'banos': 1, 'direccion': 'Calle 123',
+            'precio_mensual': '450000', 'tipo_inmueble': 'DEPARTAMENTO',
+            'region_codigo': region_codigo, 'comuna_codigo': comuna_codigo,
+        }
+
+        def render():
+            str(InmuebleForm().as_p())
+
+        def guardar():
+            form = InmuebleForm(data=data)
+            if not form.is_valid():
+                raise CommandError(f'Formulario inválido: {form.errors.as_json()}')
+            form.save(commit=False)
+
+        resultados = [
+            ('render (índice local)', _medir(render, iteraciones)),
+            ('guardado (índice local)', _medir(guardar, iteraciones)),
+        ]
+
+        if not options['sin_red']:
+            # Camino anterior: regiones + comunas al renderizar, región + comuna al guardar
+            base = ChileanLocationService.BASE_URL
+            cliente = cliente_dpa()
+            legado = max(1, iteraciones // 20)
+
+            def render_legado():
+                cliente.get(f'{base}/regiones', endpoint='regiones').json()
+                cliente.get(f'{base}/regiones/{region_codigo}/comunas', endpoint='comunas').json()
+
+            def guardar_legado():
+                cliente.get(f'{base}/regiones/{region_codigo}', endpoint='regiones').json()
+                cliente.get(f'{base}/comunas/{comuna_codigo}', endpoint='comunas').json()
+
+            try:
+                resultados.append(('render (HTTP, anterior)', _medir(render_legado, legado)))
+                resultados.append(('guardado (HTTP, anterior)', _medir(guardar_legado, legado)))
+            except requests.RequestException as e:
+                self.stderr.write(f'No se pudo medir el camino anterior: {e}')
+
+        for nombre, r in resultados:
+            self.stdout.write(
+                f"{nombre:<28} p50={r['p50']:9.3f} ms  p95={r['p95']:9.3f} ms  max={r['max']:9.3f} ms"
+            )
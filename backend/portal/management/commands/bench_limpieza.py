@@ -0,0 +1,59 @@
+# backend/portal/management/commands/bench_limpieza.py
+
+import hashlib
+import os
+import resource
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand
+from portal.limpieza import HUERFANO, recorrer, unir
+from portal.storage import ruta_contenido
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmark de limpiar_media: recorre un árbol de N archivos vacíos (sharding por contenido) y lo cruza '
+        'con las rutas en uso, con merge join y con un set en memoria (sin base de datos)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--archivos', type=int, default=200_000)
+        parser.add_argument('--usados', type=float, default=0.9, help='Fracción de archivos en uso')
+
+    def handle(self, *args, **options):
+        n = options['archivos']
+        with tempfile.TemporaryDirectory() as raiz:
+            inicio = time.perf_counter()
+            rutas = sorted(ruta_contenido(hashlib.sha256(str(i).encode()).hexdigest(), '.jpg') for i in range(n))
+            for ruta in rutas:
+                destino = os.path.join(raiz, ruta)
+                os.makedirs(os.path.dirname(destino), exist_ok=True)
+                open(destino, 'wb').close()
+            self.stdout.write(f'{n} archivos creados en {time.perf_counter() - inicio:.1f} s')
+
+            paso = round(1 / (1 - options['usados'])) if options['usados'] < 1 else 0
+            usadas = [ruta for i, ruta in enumerate(rutas) if not paso or i % paso]
+            esperados = n - len(usadas)
+            del rutas
+
+            # Merge join: las rutas en uso llegan en orden, como del cursor del servidor
+            memoria = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            inicio = time.perf_counter()
+            huerfanos = sum(1 for estado, _ in unir(recorrer(raiz), iter(usadas)) if estado == HUERFANO)
+            duracion = time.perf_counter() - inicio
+            extra = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - memoria
+            self.stdout.write(
+                f'merge join:  {huerfanos} huérfanos (esperados {esperados}) en {duracion:.2f} s '
+                f'({n / duracion:,.0f} archivos/s), memoria máxima +{extra / 1024:.1f} MB'
+            )
+
+            # Lo mismo cargando ambos lados en sets (lo que se evita)
+            inicio = time.perf_counter()
+            en_disco = set(recorrer(raiz))
+            huerfanos = len(en_disco - set(usadas))
+            duracion = time.perf_counter() - inicio
+            extra = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - memoria
+            self.stdout.write(
+                f'sets:        {huerfanos} huérfanos en {duracion:.2f} s, memoria máxima +{extra / 1024:.1f} MB'
+            )
@@ -0,0 +1,167 @@
+# backend/portal/management/commands/bench_portal.py
+
+import json
+import logging
+import platform
+import statistics
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.test import Client
+from django.test.utils import setup_test_environment
+from django.urls import reverse
+from django.utils import timezone
+from portal.models import PerfilUsuario
+
+# nombre -> (url_name, querystring, tipo de usuario que hace el request o None = anónimo)
+ESCENARIOS = {
+    'home': ('home', '', None),
+    'listado': ('inmueble_list', '', None),
+    'listado_por_precio': ('inmueble_list', 'orden=precio', None),
+    'busqueda_facetada': ('inmueble_list', 'tipo_inmueble=DEPARTAMENTO&habitaciones=2&rango_precio=300_500', None),
+    'busqueda_texto': ('inmueble_list', 'q=departamento+metro', None),
+    'api_buscar': ('api_inmuebles_buscar', 'q=casa+jardin&habitaciones=3', None),
+    'api_v1_inmuebles': ('api_v1_inmuebles', 'limite=50', None),
+    'api_regiones': ('api_regiones', '', None),
+    'api_comunas': ('api_comunas', 'region=13', None),
+    'mis_inmuebles': ('mis_inmuebles', '', PerfilUsuario.TipoUsuario.ARRENDADOR),
+    'perfil': ('perfil', '', PerfilUsuario.TipoUsuario.ARRENDATARIO),
+    'solicitudes': ('solicitud_list', '', PerfilUsuario.TipoUsuario.ARRENDADOR),
+}
+
+
+def percentil(valores, p):
+    return valores[min(len(valores) - 1, int(len(valores) * p))]
+
+
+class Command(BaseCommand):
+    help = 'Benchmark de carga de las URLs principales (latencia p50/p95/p99, throughput, consultas por request)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200, help='Requests por escenario')
+        parser.add_argument('--concurrencia', type=int, default=8)
+        parser.add_argument('--calentamiento', type=int, default=5, help='Requests por escenario sin medir')
+        parser.add_argument('--escenarios', nargs='*', choices=sorted(ESCENARIOS), help='Por defecto todos')
+        parser.add_argument('--salida', help='Guardar los resultados en este archivo JSON')
+        parser.add_argument('--comparar', help='JSON de una corrida anterior para mostrar las diferencias')
+
+    def handle(self, *args, **options):
+        setup_test_environment()  # permite Client fuera de los tests
+        # Los 4xx/5xx se cuentan en el resumen; sin tracebacks por cada request
+        logging.getLogger('django.request').setLevel(logging.CRITICAL)
+        usuarios = {
+            tipo: PerfilUsuario.objects.filter(tipo_usuario=tipo).order_by('pk').first()
+            for tipo in PerfilUsuario.TipoUsuario.values
+        }
+        nombres = options['escenarios'] or list(ESCENARIOS)
+
+        resultados = {}
+        for nombre in nombres:
+            url_name, query, tipo = ESCENARIOS[nombre]
+            if tipo and usuarios.get(tipo) is None:
+                self.stderr.write(f'{nombre}: no hay usuarios {tipo} (ejecuta generar_datos), se omite')
+                continue
+            url = reverse(url_name) + (f'?{query}' if query else '')
+            resultados[nombre] = self.medir(url, usuarios.get(tipo), options)
+            self.imprimir(nombre, resultados[nombre])
+
+        if not resultados:
+            raise CommandError('No se ejecutó ningún escenario')
+
+        corrida = {
+            'fecha': timezone.now().isoformat(),
+            'commit': self.commit(),
+            'python': platform.python_version(),
+            'parametros': {k: options[k] for k in ('requests', 'concurrencia', 'calentamiento')},
+            'escenarios': resultados,
+        }
+        if options['salida']:
+            with open(options['salida'], 'w', encoding='utf-8') as f:
+                json.dump(corrida, f, indent=2, ensure_ascii=False)
+            self.stdout.write(self.style.SUCCESS(f'Resultados guardados en {options["salida"]}'))
+        if options['comparar']:
+            with open(options['comparar'], encoding='utf-8') as f:
+                self.comparar(json.load(f), corrida)
+
+    def medir(self, url, usuario, options):
+        local = threading.local()
+
+        def cliente():
+            if not hasattr(local, 'cliente'):
+                local.cliente = Client(raise_request_exception=False)
+                if usuario is not None:
+                    local.cliente.force_login(usuario)
+            return local.cliente
+
+        def un_request(_):
+            consultas = [0]
+
+            def contar(execute, sql, params, many, context):
+                consultas[0] += 1
+                return execute(sql, params, many, context)
+
+            inicio = time.perf_counter()
+            with connection.execute_wrapper(contar):
+                response = cliente().get(url)
+            return (time.perf_counter() - inicio) * 1000, consultas[0], response.status_code
+
+        def terminar_hilo(_):
+            connections.close_all()
+
+        with ThreadPoolExecutor(max_workers=options['concurrencia']) as pool:
+            list(pool.map(un_request, range(options['calentamiento'])))
+            inicio = time.perf_counter()
+            mediciones = list(pool.map(un_request, range(options['requests'])))
+            duracion = time.perf_counter() - inicio
+            list(pool.map(terminar_hilo, range(options['concurrencia'])))
+
+        latencias = sorted(m[0] for m in mediciones)
+        consultas = [m[1] for m in mediciones]
+        estados = {}
+        for m in mediciones:
+            estados[str(m[2])] = estados.get(str(m[2]), 0) + 1
+        return {
+            'url': url,
+            'p50_ms': round(percentil(latencias, 0.50), 3),
+            'p95_ms': round(percentil(latencias, 0.95), 3),
+            'p99_ms': round(percentil(latencias, 0.99), 3),
+            'max_ms': round(latencias[-1], 3),
+            'throughput_rps': round(len(mediciones) / duracion, 1),
+            'consultas_promedio': round(statistics.mean(consultas), 2),
+            'consultas_max': max(consultas),
+            'estados': estados,
+        }
+
+    def imprimir(self, nombre, r):
+        errores = sum(n for estado, n in r['estados'].items() if not estado.startswith(('2', '3')))
+        self.stdout.write(
+            f"{nombre:<26} p50={r['p50_ms']:8.2f} ms  p95={r['p95_ms']:8.2f} ms  p99={r['p99_ms']:8.2f} ms  "
+            f"{r['throughput_rps']:7.1f} req/s  {r['consultas_promedio']:6.1f} consultas"
+            + (self.style.ERROR(f'  {errores} errores {r["estados"]}') if errores else '')
+        )
+
+    def comparar(self, anterior, actual):
+        self.stdout.write(f"\nComparación con {anterior.get('commit') or 'corrida anterior'} ({anterior.get('fecha')}):")
+        for nombre, r in actual['escenarios'].items():
+            previo = anterior.get('escenarios', {}).get(nombre)
+            if not previo:
+                continue
+            cambio = (r['p95_ms'] - previo['p95_ms']) / previo['p95_ms'] * 100 if previo['p95_ms'] else 0
+            self.stdout.write(
+                f"{nombre:<26} p95 {previo['p95_ms']:8.2f} -> {r['p95_ms']:8.2f} ms ({cambio:+.0f}%)  "
+                f"consultas {previo['consultas_promedio']:.1f} -> {r['consultas_promedio']:.1f}"
+            )
+
+    def commit(self):
+        try:
+            return subprocess.run(
+                ['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR,
+                capture_output=True, text=True, timeout=5,
+            ).stdout.strip() or None
+        except (OSError, subprocess.SubprocessError):
+            return None
@@ -0,0 +1,81 @@
+# backend/portal/management/commands/bench_similares.py
+
+import random
+import statistics
+import time
+from types import SimpleNamespace
+
+import numpy as np
+from django.core.management.base import BaseCommand
+from portal.recomendaciones import MatrizSimilares
+
+TIPOS = ['CASA', 'DEPARTAMENTO', 'PARCELA']
+
+
+class Command(BaseCommand):
+    help = 'Benchmark de la matriz de propiedades similares con datos sintéticos (sin base de datos)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--filas', type=int, default=1_000_000)
+        parser.add_argument('--consultas', type=int, default=500)
+        parser.add_argument('--cambios', type=int, default=10_000, help='Publicaciones/despublicaciones a aplicar')
+        parser.add_argument('-k', type=int, default=6)
+        parser.add_argument('--semilla', type=int, default=1)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['semilla'])
+        filas = options['filas']
+        # 16 regiones con la mitad de los avisos en la primera (como la RM)
+        regiones = [f'{r:02d}' for r in range(1, 17)]
+        pesos = [8] + [8 / 15] * 15
+
+        inicio = time.perf_counter()
+        datos = [self.fila(rng, pk, regiones, pesos) for pk in range(1, filas + 1)]
+        self.stdout.write(f'{filas} filas sintéticas generadas en {time.perf_counter() - inicio:.1f} s')
+
+        inicio = time.perf_counter()
+        matriz = MatrizSimilares.desde_filas(datos)
+        construccion = time.perf_counter() - inicio
+        memoria = sum(b.ids.nbytes + b.x.nbytes + b.tipo.nbytes + b.comuna.nbytes for b in matriz.bloques.values())
+        self.stdout.write(f'Construcción completa: {construccion:.2f} s, arreglos {memoria / 2**20:.1f} MB')
+
+        latencias = []
+        for _ in range(options['consultas']):
+            pk = rng.randint(1, filas)
+            t = time.perf_counter()
+            matriz.similares(pk, options['k'])
+            latencias.append((time.perf_counter() - t) * 1000)
+        latencias.sort()
+        self.stdout.write(
+            f"Top-{options['k']}: p50={statistics.median(latencias):.2f} ms  "
+            f"p95={latencias[int(len(latencias) * 0.95)]:.2f} ms  max={latencias[-1]:.2f} ms"
+        )
+
+        cambios = options['cambios']
+        inicio = time.perf_counter()
+        for n in range(cambios):
+            pk, region, comuna, tipo, *numericos = self.fila(rng, rng.randint(1, filas), regiones, pesos)
+            inmueble = SimpleNamespace(
+                pk=pk, esta_publicado=n % 2 == 0, region_codigo=region, comuna_codigo=comuna,
+                tipo_inmueble=tipo, **dict(zip(
+                    ['precio_mensual', 'm2_construidos', 'm2_totales', 'habitaciones', 'banos', 'estacionamientos'],
+                    numericos,
+                )),
+            )
+            matriz.actualizar(inmueble)
+        incremental = (time.perf_counter() - inicio) / cambios * 1e6
+        self.stdout.write(
+            f'Cambio incremental (publicar/despublicar): {incremental:.1f} µs por cambio '
+            f'vs {construccion:.2f} s reconstruyendo ({len(matriz)} filas al final)'
+        )
+
+    def fila(self, rng, pk, regiones, pesos):
+        region = rng.choices(regiones, pesos)[0]
+        tipo = rng.choice(TIPOS)
+        habitaciones = rng.randint(1, 5)
+        m2 = round(rng.uniform(25, 60) * habitaciones, 1)
+        precio = round(float(np.exp(rng.gauss(13, 0.5))), -3)
+        return (
+            pk, region, f'{region}{rng.randint(1, 40):03d}', tipo,
+            precio, m2, m2 * rng.uniform(1, 3), habitaciones, rng.randint(1, 3), rng.randint(0, 2),
+        )
@@ -0,0 +1,114 @@
+# backend/portal/management/commands/bench_subidas.py
+
+import io
+import os
+import tempfile
+import threading
+import time
+
+from django.core.files.uploadhandler import load_handler
+from django.core.management.base import BaseCommand
+from django.http.multipartparser import MultiPartParser
+from django.test import override_settings
+from PIL import Image
+from portal.subidas import SubidaImagenesHandler
+
+LIMITE = '----bench-subidas'
+
+
+class CuerpoMultipart(io.RawIOBase):
+    """Cuerpo multipart/form-data de `fotos` archivos generado a medida que se lee (no ocupa memoria)"""
+
+    def __init__(self, fotos, tamano):
+        base = io.BytesIO()
+        Image.effect_mandelbrot((1600, 1200), (-2, -1.2, 1, 1.2), 60).convert('RGB').save(base, 'JPEG', quality=90)
+        self.base = base.getvalue()
+        self.relleno = os.urandom(2**20)
+        self.partes = self.generar(fotos, tamano)
+        self.pendiente = b''
+        self.largo = 0
+
+    def generar(self, fotos, tamano):
+        for n in range(fotos):
+            yield (
+                f'--{LIMITE}\r\nContent-Disposition: form-data; name="imagenes"; filename="foto{n}.jpg"\r\n'
+                f'Content-Type: image/jpeg\r\n\r\n'
+            ).encode()
+            # JPEG válido + bytes después del fin de imagen hasta `tamano` (distintos por foto)
+            yield self.base + n.to_bytes(4, 'big')
+            restante = tamano - len(self.base) - 4
+            while restante > 0:
+                yield self.relleno[:restante]
+                restante -= len(self.relleno)
+            yield b'\r\n'
+        yield f'--{LIMITE}--\r\n'.encode()
+
+    def readable(self):
+        return True
+
+    def readinto(self, destino):
+        while not self.pendiente:
+            self.pendiente = next(self.partes, b'')
+            if not self.pendiente:
+                return 0
+        n = min(len(destino), len(self.pendiente))
+        destino[:n] = self.pendiente[:n]
+        self.pendiente = self.pendiente[n:]
+        self.largo += n
+        return n
+
+
+def rss():
+    with open('/proc/self/statm') as f:
+        return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+
+
+class Command(BaseCommand):
+    help = 'Benchmark de la subida por lotes: memoria y velocidad al parsear N fotos de M MB (sin base de datos)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fotos', type=int, default=50)
+        parser.add_argument('--mb', type=int, default=10)
+
+    def handle(self, *args, **options):
+        fotos, tamano = options['fotos'], options['mb'] * 2**20
+        total = fotos * tamano
+        with tempfile.TemporaryDirectory() as carpeta, override_settings(
+                FILE_UPLOAD_TEMP_DIR=carpeta,
+                DATA_UPLOAD_MAX_NUMBER_FILES=None,
+                SUBIDAS={'MAX_ARCHIVO_MB': options['mb'] + 1, 'MAX_TOTAL_MB': total // 2**20 + 1, 'MAX_ARCHIVOS': fotos}):
+            self.medir('SubidaImagenesHandler', fotos, tamano, lambda: [SubidaImagenesHandler(carpeta=carpeta)])
+            self.medir('handlers por defecto', fotos, tamano, lambda: [
+                load_handler('django.core.files.uploadhandler.MemoryFileUploadHandler'),
+                load_handler('django.core.files.uploadhandler.TemporaryFileUploadHandler'),
+            ])
+
+    def medir(self, nombre, fotos, tamano, handlers):
+        cuerpo = CuerpoMultipart(fotos, tamano)
+        largo = fotos * (tamano + 200)
+        meta = {'CONTENT_TYPE': f'multipart/form-data; boundary={LIMITE}', 'CONTENT_LENGTH': largo}
+
+        # Muestrea la memoria del proceso mientras se parsea
+        inicial = rss()
+        maximo = [inicial]
+        listo = threading.Event()
+
+        def muestrear():
+            while not listo.wait(0.005):
+                maximo[0] = max(maximo[0], rss())
+
+        hilo = threading.Thread(target=muestrear)
+        hilo.start()
+        inicio = time.perf_counter()
+        _, archivos = MultiPartParser(meta, io.BufferedReader(cuerpo, 2**16), handlers()).parse()
+        duracion = time.perf_counter() - inicio
+        listo.set()
+        hilo.join()
+
+        recibidos = archivos.getlist('imagenes')
+        for archivo in recibidos:
+            archivo.close()
+        self.stdout.write(
+            f'{nombre:<24} {len(recibidos)} de {fotos} fotos, {cuerpo.largo / 2**20:.0f} MB en {duracion:.2f} s '
+            f'({cuerpo.largo / 2**20 / duracion:.0f} MB/s); memoria +{(maximo[0] - inicial) / 2**20:.1f} MB'
+        )
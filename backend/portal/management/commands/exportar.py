@@ -0,0 +1,49 @@
+# backend/portal/management/commands/exportar.py
+
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+from portal.exportacion import COLUMNAS, FORMATOS, PERMISOS, VISIBLES, exportar
+from portal.models import Inmueble, PerfilUsuario, SolicitudArriendo
+
+MODELOS = {'inmuebles': Inmueble, 'solicitudes': SolicitudArriendo}
+
+
+class Command(BaseCommand):
+    help = 'Exporta inmuebles o solicitudes a CSV/JSONL en streaming (memoria constante)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('tipo', choices=sorted(COLUMNAS))
+        parser.add_argument('--formato', choices=sorted(FORMATOS), default='csv')
+        parser.add_argument('--gzip', action='store_true')
+        parser.add_argument('--salida', default='-', help='Archivo de salida, "-" para la salida estándar')
+        parser.add_argument(
+            '--usuario',
+            help='Exportar solo lo que ve este usuario en los endpoints de exportación (por defecto, todo)',
+        )
+
+    def handle(self, *args, **options):
+        tipo = options['tipo']
+        queryset = MODELOS[tipo].objects.all()
+        if options['usuario']:
+            queryset = self.queryset_de(tipo, options['usuario'])
+
+        bloques = exportar(queryset, tipo, options['formato'], options['gzip'])
+        salida = sys.stdout.buffer if options['salida'] == '-' else open(options['salida'], 'wb')
+        try:
+            for bloque in bloques:
+                salida.write(bloque)
+        finally:
+            if salida is not sys.stdout.buffer:
+                salida.close()
+
+    def queryset_de(self, tipo, username):
+        """Mismo alcance por rol que el endpoint de exportación"""
+        try:
+            usuario = PerfilUsuario.objects.get(username=username)
+        except PerfilUsuario.DoesNotExist:
+            raise CommandError(f'No existe el usuario "{username}"')
+
+        if PERMISOS[tipo] and not usuario.has_perm(PERMISOS[tipo]):
+            raise CommandError(f'El usuario "{username}" no tiene permiso para exportar {tipo}')
+        return VISIBLES[tipo](usuario)
@@ -0,0 +1,279 @@
+# backend/portal/management/commands/generar_datos.py
+
+import io
+import random
+import time
+from collections import Counter
+from decimal import Decimal
+
+from django.contrib.admin.models import LogEntry
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import Group
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from portal.contadores import Contadores
+from portal.fragmentos import Fragmentos, DESTACADOS
+from portal.models import (
+    AlertaBusqueda, ArchivoContenido, BusquedaGuardada, EventoPublicacion, Inmueble, ImagenInmueble,
+    PerfilUsuario, SolicitudArriendo,
+)
+from PIL import Image
+
+PREFIJO = 'sint_'
+
+# (código comuna, comuna, código región, región, peso ~ población, factor de precio)
+COMUNAS = [
+    ('13101', 'Santiago', '13', 'Metropolitana de Santiago', 50, 1.00),
+    ('13119', 'Maipú', '13', 'Metropolitana de Santiago', 52, 0.80),
+    ('13201', 'Puente Alto', '13', 'Metropolitana de Santiago', 57, 0.70),
+    ('13110', 'La Florida', '13', 'Metropolitana de Santiago', 37, 0.85),
+    ('13114', 'Las Condes', '13', 'Metropolitana de Santiago', 30, 1.60),
+    ('13123', 'Providencia', '13', 'Metropolitana de Santiago', 16, 1.45),
+    ('13120', 'Ñuñoa', '13', 'Metropolitana de Santiago', 21, 1.30),
+    ('13132', 'Vitacura', '13', 'Metropolitana de Santiago', 9, 1.90),
+    ('13124', 'Pudahuel', '13', 'Metropolitana de Santiago', 23, 0.75),
+    ('13125', 'Quilicura', '13', 'Metropolitana de Santiago', 21, 0.75),
+    ('13130', 'San Miguel', '13', 'Metropolitana de Santiago', 11, 1.05),
+    ('05109', 'Viña del Mar', '05', 'Valparaíso', 33, 1.10),
+    ('05101', 'Valparaíso', '05', 'Valparaíso', 30, 0.90),
+    ('08101', 'Concepción', '08', 'Biobío', 22, 0.95),
+    ('02101', 'Antofagasta', '02', 'Antofagasta', 36, 1.15),
+    ('04101', 'La Serena', '04', 'Coquimbo', 22, 0.95),
+    ('09101', 'Temuco', '09', 'La Araucanía', 28, 0.85),
+    ('10101', 'Puerto Montt', '10', 'Los Lagos', 25, 0.90),
+    ('06101', 'Rancagua', '06', "Libertador General Bernardo O'Higgins", 24, 0.80),
+]
+
+PESOS_COMUNAS = [c[4] for c in COMUNAS]
+
+TIPOS = [('DEPARTAMENTO', 60), ('CASA', 35), ('PARCELA', 5)]
+ESTADOS = [
+    (SolicitudArriendo.EstadoSolicitud.PENDIENTE, 50),
+    (SolicitudArriendo.EstadoSolicitud.ACEPTADA, 20),
+    (SolicitudArriendo.EstadoSolicitud.RECHAZADA, 30),
+]
+ROLES = [
+    (PerfilUsuario.TipoUsuario.ARRENDATARIO, 'Arrendatarios', 80),
+    (PerfilUsuario.TipoUsuario.ARRENDADOR, 'Arrendadores', 18),
+    (PerfilUsuario.TipoUsuario.ADMINISTRADOR, 'Administradores', 2),
+]
+CALLES = ['Av. Providencia', 'Los Leones', 'Irarrázaval', 'Gran Avenida', 'Av. Matta', 'Pedro de Valdivia',
+          'Av. Libertad', 'Los Carrera', 'Av. Alemania', 'Colón', 'Av. Argentina', 'Manuel Montt']
+ADJETIVOS = ['luminoso', 'amplio', 'remodelado', 'céntrico', 'tranquilo', 'con vista', 'amoblado', 'nuevo']
+# Colores de las imágenes de muestra (una por color, compartidas por todas las filas)
+COLORES = ['#8fa9c4', '#c4a98f', '#9cc48f', '#c48fa9', '#b5b5b5', '#d9c27a']
+EXTRAS = ['cerca del metro', 'con balcón', 'con terraza', 'con jardín', 'con bodega', 'con piscina',
+          'a pasos de colegios', 'con conserjería 24 horas', 'con quincho', 'pet friendly']
+
+
+class Command(BaseCommand):
+    help = 'Genera datos sintéticos deterministas (usuarios, inmuebles, imágenes, solicitudes) para pruebas de carga'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--usuarios', type=int, default=1000)
+        parser.add_argument('--inmuebles', type=int, default=10000)
+        parser.add_argument('--solicitudes', type=int, default=20000)
+        parser.add_argument('--max-imagenes', type=int, default=4, help='Imágenes por inmueble: 0..N')
+        parser.add_argument('--semilla', type=int, default=42)
+        parser.add_argument('--batch-size', type=int, default=2000)
+        parser.add_argument(
+            '--limpiar', action='store_true',
+            help=f'Eliminar antes los datos generados previamente (usuarios "{PREFIJO}*" y lo que cuelga de ellos)',
+        )
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options['semilla'])
+        self.batch_size = options['batch_size']
+        inicio = time.perf_counter()
+
+        if options['limpiar']:
+            self.limpiar()
+
+        with transaction.atomic():
+            propietarios, arrendatarios = self.crear_usuarios(options['usuarios'])
+            inmuebles = self.crear_inmuebles(options['inmuebles'], propietarios or arrendatarios)
+            self.crear_imagenes(inmuebles, options['max_imagenes'])
+            self.crear_solicitudes(options['solicitudes'], inmuebles, arrendatarios)
+            self.repartir_fechas(inmuebles)
+
+        call_command('backfill_portadas', stdout=self.stdout)
+        Contadores.invalidar()
+        Fragmentos.invalidar(DESTACADOS)
+        self.stdout.write(self.style.SUCCESS(f'Datos generados en {time.perf_counter() - inicio:.1f} s'))
+
+    def elegir(self, opciones):
+        return self.rng.choices([o[0] for o in opciones], weights=[o[-1] for o in opciones])[0]
+
+    def lotes(self, modelo, objetos):
+        """bulk_create por lotes; devuelve los objetos con pk (PostgreSQL)"""
+        creados = []
+        for i in range(0, len(objetos), self.batch_size):
+            creados.extend(modelo.objects.bulk_create(objetos[i:i + self.batch_size]))
+        self.stdout.write(f'  {len(creados)} {modelo._meta.verbose_name_plural}')
+        return creados
+
+    def limpiar(self):
+        # SQL directo: evita cargar y borrar fila a fila con señales. Los
+        # triggers de portal_inmueble/portal_solicitudarriendo mantienen los
+        # contadores y marcan las estadísticas de precios por recalcular.
+        usuarios = f"SELECT id FROM {PerfilUsuario._meta.db_table} WHERE username LIKE '{PREFIJO}%'"
+        inmuebles = f'SELECT id FROM {Inmueble._meta.db_table} WHERE propietario_id IN ({usuarios})'
+        busquedas = f'SELECT id FROM {BusquedaGuardada._meta.db_table} WHERE usuario_id IN ({usuarios})'
+        imagenes = f'SELECT imagen, variantes FROM {ImagenInmueble._meta.db_table} WHERE inmueble_id IN ({inmuebles})'
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {SolicitudArriendo._meta.db_table} '
+                f'WHERE arrendatario_id IN ({usuarios}) OR inmueble_id IN ({inmuebles})'
+            )
+            cursor.execute(
+                f'DELETE FROM {AlertaBusqueda._meta.db_table} '
+                f'WHERE busqueda_id IN ({busquedas}) OR inmueble_id IN ({inmuebles})'
+            )
+            cursor.execute(f'DELETE FROM {BusquedaGuardada._meta.db_table} WHERE usuario_id IN ({usuarios})')
+            cursor.execute(f'DELETE FROM {EventoPublicacion._meta.db_table} WHERE inmueble_id IN ({inmuebles})')
+
+            # Referencias de las imágenes y sus variantes en el storage por contenido; los
+            # archivos que quedan sin usar los borra después ``manage.py limpiar_media``
+            cursor.execute(
+                f'UPDATE {ArchivoContenido._meta.db_table} a '
+                f'SET referencias = GREATEST(a.referencias - r.cantidad, 0) '
+                f'FROM (SELECT ruta, count(*) AS cantidad FROM ('
+                f'SELECT imagen FROM ({imagenes}) i UNION ALL '
+                # Las rutas de las variantes, como las suelta liberar_archivos_imagen
+                f"SELECT r.value #>> '{{}}' FROM ({imagenes}) i CROSS JOIN jsonb_each(i.variantes) v "
+                f"CROSS JOIN jsonb_each(v.value) r WHERE jsonb_typeof(r.value) = 'string'"
+                f') AS t (ruta) GROUP BY ruta) AS r '
+                f'WHERE a.ruta = r.ruta RETURNING a.ruta, a.referencias'
+            )
+            sin_uso = [ruta for ruta, referencias in cursor.fetchall() if referencias == 0]
+            cursor.execute(
+                f'DELETE FROM {ArchivoContenido._meta.db_table} WHERE ruta = ANY(%s) AND referencias = 0', [sin_uso]
+            )
+
+            cursor.execute(f'UPDATE {Inmueble._meta.db_table} SET portada_id = NULL WHERE id IN ({inmuebles})')
+            cursor.execute(f'DELETE FROM {ImagenInmueble._meta.db_table} WHERE inmueble_id IN ({inmuebles})')
+            cursor.execute(f'DELETE FROM {Inmueble._meta.db_table} WHERE propietario_id IN ({usuarios})')
+            cursor.execute(f'DELETE FROM {PerfilUsuario.groups.through._meta.db_table} WHERE perfilusuario_id IN ({usuarios})')
+            cursor.execute(
+                f'DELETE FROM {PerfilUsuario.user_permissions.through._meta.db_table} WHERE perfilusuario_id IN ({usuarios})'
+            )
+            cursor.execute(f'DELETE FROM {LogEntry._meta.db_table} WHERE user_id IN ({usuarios})')
+            cursor.execute(f"DELETE FROM {PerfilUsuario._meta.db_table} WHERE username LIKE '{PREFIJO}%'")
+        self.stdout.write(f'  datos sintéticos anteriores eliminados ({len(sin_uso)} archivos de media sin usar)')
+
+    def crear_usuarios(self, cantidad):
+        password = make_password('sintetico')  # un solo hash para todos: PBKDF2 es lento a propósito
+        usuarios = []
+        for n in range(cantidad):
+            rol = self.elegir(ROLES)
+            usuarios.append(PerfilUsuario(
+                username=f'{PREFIJO}{rol.lower()}_{n:07d}',
+                email=f'{PREFIJO}{n:07d}@ejemplo.cl',
+                first_name=f'Usuario {n}',
+                password=password,
+                tipo_usuario=rol,
+            ))
+        usuarios = self.lotes(PerfilUsuario, usuarios)
+
+        grupos = {nombre: Group.objects.get_or_create(name=nombre)[0] for _, nombre, _ in ROLES}
+        nombre_grupo = {rol: nombre for rol, nombre, _ in ROLES}
+        Membresia = PerfilUsuario.groups.through
+        Membresia.objects.bulk_create(
+            [Membresia(perfilusuario_id=u.pk, group_id=grupos[nombre_grupo[u.tipo_usuario]].pk) for u in usuarios],
+            batch_size=self.batch_size,
+        )
+
+        propietarios = [u.pk for u in usuarios if u.tipo_usuario == PerfilUsuario.TipoUsuario.ARRENDADOR]
+        arrendatarios = [u.pk for u in usuarios if u.tipo_usuario == PerfilUsuario.TipoUsuario.ARRENDATARIO]
+        return propietarios, arrendatarios
+
+    def crear_inmuebles(self, cantidad, propietarios):
+        inmuebles = []
+        for n in range(cantidad):
+            codigo, nombre_comuna, region_codigo, region_nombre, _, factor = self.rng.choices(COMUNAS, weights=PESOS_COMUNAS)[0]
+            tipo = self.elegir(TIPOS)
+            habitaciones = self.rng.choices([1, 2, 3, 4, 5], weights=[20, 35, 30, 10, 5])[0]
+            m2 = round(self.rng.uniform(25, 45) + habitaciones * self.rng.uniform(12, 22), 1)
+            if tipo == 'PARCELA':
+                m2_totales = round(m2 * self.rng.uniform(8, 40), 1)
+            elif tipo == 'CASA':
+                m2_totales = round(m2 * self.rng.uniform(1.3, 3), 1)
+            else:
+                m2_totales = round(m2 * self.rng.uniform(1.0, 1.2), 1)
+            precio = min(Decimal('999000'), Decimal(round(m2 * 7000 * factor * self.rng.uniform(0.85, 1.15), -3)))
+            adjetivo = self.rng.choice(ADJETIVOS)
+            inmuebles.append(Inmueble(
+                propietario_id=self.rng.choice(propietarios) if propietarios else None,
+                nombre=f'{tipo.capitalize()} {adjetivo} en {nombre_comuna}',
+                descripcion=(
+                    f'{tipo.capitalize()} {adjetivo} de {habitaciones} habitaciones, '
+                    + ', '.join(self.rng.sample(EXTRAS, 3)) + '.'
+                ),
+                m2_construidos=m2,
+                m2_totales=m2_totales,
+                estacionamientos=self.rng.choices([0, 1, 2], weights=[40, 45, 15])[0],
+                habitaciones=habitaciones,
+                banos=max(1, habitaciones - self.rng.randint(0, 2)),
+                direccion=f'{self.rng.choice(CALLES)} {self.rng.randint(1, 9999)}',
+                precio_mensual=precio,
+                region_codigo=region_codigo,
+                region_nombre=region_nombre,
+                comuna_codigo=codigo,
+                comuna_nombre=nombre_comuna,
+                tipo_inmueble=tipo,
+                esta_publicado=self.rng.random() < 0.85,
+            ))
+        return [i.pk for i in self.lotes(Inmueble, inmuebles)]
+
+    def crear_imagenes(self, inmuebles, maximo):
+        imagenes = []
+        for inmueble_id in inmuebles:
+            for orden in range(self.rng.randint(0, maximo)):
+                imagenes.append(ImagenInmueble(inmueble_id=inmueble_id, orden=orden))
+        if not imagenes:
+            return
+
+        # Archivos reales, uno por color: con el storage por contenido cada fila
+        # es una referencia más al mismo archivo
+        colores = [self.rng.choice(COLORES) for _ in imagenes]
+        storage = ImagenInmueble._meta.get_field('imagen').storage
+        nombres = {}
+        for color, cantidad in sorted(Counter(colores).items()):
+            contenido = io.BytesIO()
+            Image.new('RGB', (1200, 800), color).save(contenido, 'JPEG', quality=85)
+            nombres[color] = storage.save(f'inmuebles/galeria/{PREFIJO}muestra.jpg', ContentFile(contenido.getvalue()))
+            if cantidad > 1:
+                # save() ya sumó la primera
+                storage.sumar_referencia(nombres[color], storage.size(nombres[color]), cantidad=cantidad - 1)
+        for imagen, color in zip(imagenes, colores):
+            imagen.imagen = nombres[color]
+        self.lotes(ImagenInmueble, imagenes)
+
+    def crear_solicitudes(self, cantidad, inmuebles, arrendatarios):
+        if not inmuebles or not arrendatarios:
+            return
+        solicitudes = [
+            SolicitudArriendo(
+                inmueble_id=self.rng.choice(inmuebles),
+                arrendatario_id=self.rng.choice(arrendatarios),
+                mensaje='Hola, me interesa la propiedad. ¿Está disponible para visitarla?',
+                estado=self.elegir(ESTADOS),
+            )
+            for _ in range(cantidad)
+        ]
+        self.lotes(SolicitudArriendo, solicitudes)
+
+    def repartir_fechas(self, inmuebles):
+        # auto_now_add fija "ahora" en bulk_create: se reparten en el último año,
+        # de forma determinista según el id
+        if not inmuebles:
+            return
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"UPDATE {Inmueble._meta.db_table} "
+                f"SET creado = now() - ((id * 7919) %% 31536000) * interval '1 second' "
+                f"WHERE id BETWEEN %s AND %s",
+                [min(inmuebles), max(inmuebles)],
+            )
@@ -0,0 +1,63 @@
+# backend/portal/management/commands/importar_inmuebles.py
+
+import json
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+from portal.importacion import ErrorImportacion, Importacion, detectar_formato, leer_filas
+from portal.models import PerfilUsuario
+
+class Command(BaseCommand):
+    help = 'Importa inmuebles desde un CSV o JSONL (también .gz), validando cada fila con las reglas de InmuebleForm'
+
+    def add_arguments(self, parser):
+        parser.add_argument('archivo', help='Ruta del archivo, o "-" para leer de la entrada estándar')
+        parser.add_argument('--formato', choices=['csv', 'jsonl'], help='Por defecto según la extensión')
+        parser.add_argument('--propietario', help='username del propietario de los inmuebles importados')
+        parser.add_argument('--publicar', action='store_true', help='Publicar las filas sin columna esta_publicado')
+        parser.add_argument('--batch-size', type=int, default=2000)
+        parser.add_argument('--reporte', help='CSV donde escribir los errores por fila (fila, campo, error)')
+        parser.add_argument('--simular', action='store_true', help='Solo validar, sin insertar')
+
+    def handle(self, *args, **options):
+        propietario = None
+        if options['propietario']:
+            try:
+                propietario = PerfilUsuario.objects.get(username=options['propietario'])
+            except PerfilUsuario.DoesNotExist:
+                raise CommandError(f'No existe el usuario "{options["propietario"]}"')
+
+        ruta = options['archivo']
+        try:
+            formato = options['formato'] or detectar_formato(ruta)
+        except ErrorImportacion as e:
+            raise CommandError(str(e))
+
+        reporte = open(options['reporte'], 'w', newline='', encoding='utf-8') if options['reporte'] else None
+        archivo = sys.stdin.buffer if ruta == '-' else open(ruta, 'rb')
+        try:
+            importacion = Importacion(
+                propietario=propietario,
+                publicar=options['publicar'],
+                batch_size=options['batch_size'],
+                reporte=reporte,
+                simular=options['simular'],
+                max_errores_guardados=10,
+            ).ejecutar(leer_filas(archivo, formato, comprimido=ruta.endswith('.gz')))
+        except ErrorImportacion as e:
+            raise CommandError(str(e))
+        finally:
+            archivo.close()
+            if reporte:
+                reporte.close()
+
+        for fila, campo, mensaje in importacion.errores:
+            self.stderr.write(f'  fila {fila} {campo}: {mensaje}')
+        if importacion.rechazadas > len(importacion.errores) and not options['reporte']:
+            self.stderr.write('  ... usa --reporte para ver todos los errores')
+
+        resumen = importacion.resumen()
+        resumen['filas_por_segundo'] = round(resumen['leidas'] / resumen['segundos']) if resumen['segundos'] else None
+        self.stdout.write(self.style.SUCCESS(json.dumps(resumen, ensure_ascii=False)))
+        if importacion.interrumpida:
+            raise CommandError(f'Importación interrumpida: {importacion.interrumpida}')
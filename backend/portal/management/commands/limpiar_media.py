@@ -0,0 +1,91 @@
+# backend/portal/management/commands/limpiar_media.py
+
+import os
+import time
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from portal.limpieza import FALTANTE, recorrer, referencias, unir
+from portal.storage import es_contenido
+
+
+class Command(BaseCommand):
+    help = (
+        'Borra de MEDIA_ROOT los archivos que ninguna fila usa (imágenes de inmuebles y perfiles borrados, '
+        'temporales de subidas cortadas); cruza el disco y la base en orden, sin cargarlos en memoria'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--simular', action='store_true', help='Solo cuenta lo que borraría')
+        parser.add_argument(
+            '--gracia', type=float, default=24,
+            help='Horas: no borra archivos modificados hace menos (subidas aún sin confirmar)',
+        )
+        parser.add_argument('--por-segundo', type=float, default=100, help='Máximo de borrados por segundo (0: sin límite)')
+        parser.add_argument('--limite', type=int, default=0, help='Máximo de archivos a borrar (0: todos)')
+        parser.add_argument('--lote', type=int, default=5000, help='Filas por lote al leer las rutas en uso')
+
+    def handle(self, *args, **options):
+        raiz = default_storage.location
+        corte = time.time() - options['gracia'] * 3600
+        intervalo = 1 / options['por_segundo'] if options['por_segundo'] > 0 else 0
+        siguiente = time.monotonic()
+        revisados = huerfanos = recientes = borrados = en_uso = faltantes = 0
+        bytes_huerfanos = bytes_borrados = 0
+
+        def contar(rutas):
+            nonlocal revisados
+            for ruta in rutas:
+                revisados += 1
+                if revisados % 100_000 == 0:
+                    self.stdout.write(f'{revisados} archivos revisados...')
+                yield ruta
+
+        for estado, ruta in unir(contar(recorrer(raiz)), referencias(options['lote'])):
+            if estado == FALTANTE:
+                faltantes += 1
+                if faltantes <= 20:
+                    self.stdout.write(self.style.WARNING(f'En uso pero no existe: {ruta}'))
+                continue
+
+            try:
+                datos = os.stat(os.path.join(raiz, ruta))
+            except FileNotFoundError:
+                continue  # se borró mientras tanto
+            huerfanos += 1
+            bytes_huerfanos += datos.st_size
+            if datos.st_mtime > corte:
+                recientes += 1
+                continue
+            if options['simular'] or (options['limite'] and borrados >= options['limite']):
+                continue
+
+            if intervalo:
+                espera = siguiente - time.monotonic()
+                if espera > 0:
+                    time.sleep(espera)
+                siguiente = max(siguiente, time.monotonic()) + intervalo
+            if es_contenido(ruta):
+                # Con su fila bloqueada, por si una subida del mismo contenido llega ahora
+                if not default_storage.borrar_si_huerfano(ruta):
+                    en_uso += 1
+                    continue
+            else:
+                try:
+                    os.remove(os.path.join(raiz, ruta))
+                except FileNotFoundError:
+                    continue
+            borrados += 1
+            bytes_borrados += datos.st_size
+
+        resumen = (
+            f'{revisados} archivos revisados, {huerfanos} huérfanos ({bytes_huerfanos / 2**20:.1f} MB), '
+            f'{recientes} dentro del período de gracia; {faltantes} rutas en uso sin archivo'
+        )
+        if options['simular']:
+            self.stdout.write(self.style.SUCCESS(f'Simulación: {resumen}'))
+            return
+        self.stdout.write(self.style.SUCCESS(
+            f'{resumen}. Borrados: {borrados} ({bytes_borrados / 2**20:.1f} MB); '
+            f'{en_uso} se volvieron a usar durante la limpieza'
+        ))
@@ -0,0 +1,26 @@
+# backend/portal/management/commands/procesar_alertas.py
+
+import signal
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from portal.alertas import MotorAlertas
+
+
+class Command(BaseCommand):
+    help = 'Worker de alertas: calza los inmuebles recién publicados contra las búsquedas guardadas'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=settings.ALERTAS['BATCH_SIZE'])
+        parser.add_argument('--espera', type=float, default=settings.ALERTAS['ESPERA'],
+                            help='Segundos máximos entre revisiones sin NOTIFY')
+        parser.add_argument('--una-vez', action='store_true', help='Vacía la cola y termina (para cron)')
+
+    def handle(self, *args, **options):
+        detenido = []
+        for senal in (signal.SIGTERM, signal.SIGINT):
+            signal.signal(senal, lambda *_: detenido.append(True))
+
+        motor = MotorAlertas(batch_size=options['batch_size'])
+        motor.ejecutar(espera=options['espera'], una_vez=options['una_vez'], detener=lambda: bool(detenido))
+        self.stdout.write(self.style.SUCCESS(f'Worker de alertas detenido ({len(motor.indice)} búsquedas en el índice)'))
@@ -0,0 +1,27 @@
+# backend/portal/management/commands/procesar_imagenes.py
+
+import time
+
+from django.core.management.base import BaseCommand
+from portal.imagenes import ProcesadorImagenes
+from portal.models import ImagenInmueble
+
+
+class Command(BaseCommand):
+    help = 'Genera las variantes (thumb/card/detail) de las imágenes que no las tienen'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--todas', action='store_true', help='Reprocesa también las ya procesadas')
+
+    def handle(self, *args, **options):
+        if options['todas']:
+            ImagenInmueble.objects.update(procesada=False)
+        pendientes = list(ProcesadorImagenes.pendientes())
+        inicio = time.perf_counter()
+        # En el mismo pool que usan las subidas (IMAGENES['WORKERS'] hilos)
+        futuros = [ProcesadorImagenes.encolar(pk) for pk in pendientes]
+        procesadas = sum(1 for futuro in futuros if futuro.result())
+        segundos = time.perf_counter() - inicio
+        self.stdout.write(self.style.SUCCESS(
+            f'{procesadas} de {len(pendientes)} imágenes procesadas en {segundos:.1f} s'
+        ))
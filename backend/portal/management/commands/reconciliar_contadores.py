@@ -0,0 +1,15 @@
+# backend/portal/management/commands/reconciliar_contadores.py
+
+from django.core.management.base import BaseCommand
+from portal.contadores import Contadores
+
+class Command(BaseCommand):
+    help = 'Recalcula los contadores del home contra los COUNT(*) reales (programar en cron)'
+
+    def handle(self, *args, **options):
+        diferencias = Contadores.reconciliar()
+        for nombre, (antes, real) in diferencias.items():
+            self.stdout.write(self.style.WARNING(f'{nombre}: {antes} -> {real}'))
+        self.stdout.write(self.style.SUCCESS(
+            f'Contadores reconciliados ({len(diferencias)} corregidos)'
+        ))
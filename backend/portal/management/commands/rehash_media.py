@@ -0,0 +1,102 @@
+# backend/portal/management/commands/rehash_media.py
+
+import os
+
+from django.apps import apps
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+from django.db import models, transaction
+from portal.models import ImagenInmueble
+from portal.storage import CARPETA, AlmacenamientoContenido, es_contenido
+
+
+class Command(BaseCommand):
+    help = (
+        'Migra la media existente al storage direccionado por contenido: guarda cada archivo por su hash, '
+        'deduplica, actualiza las filas y borra los originales'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--simular', action='store_true', help='Solo cuenta lo que haría')
+        parser.add_argument('--conservar', action='store_true', help='No borra los archivos originales')
+
+    def handle(self, *args, **options):
+        if not isinstance(default_storage, AlmacenamientoContenido):
+            raise CommandError('El storage por defecto no es portal.storage.AlmacenamientoContenido (ver STORAGES)')
+        self.simular = options['simular']
+        self.migrados = {}  # nombre antiguo -> nombre por contenido
+        self.faltantes = 0
+        self.bytes_antes = 0
+
+        for modelo, campo in self.campos():
+            default = campo.default if isinstance(campo.default, str) else None
+            filas = (
+                modelo._default_manager.exclude(**{campo.name: ''}).exclude(**{f'{campo.name}__startswith': f'{CARPETA}/'})
+                .exclude(**{campo.name: default} if default else {}).values_list('pk', campo.name)
+            )
+            cambiadas = 0
+            for pk, nombre in filas.iterator():
+                nuevo = self.migrar(nombre)
+                if nuevo and not self.simular:
+                    modelo._default_manager.filter(pk=pk, **{campo.name: nombre}).update(**{campo.name: nuevo})
+                    cambiadas += 1
+            self.stdout.write(f'{modelo._meta.label}.{campo.name}: {cambiadas} filas actualizadas')
+
+        cambiadas = 0
+        # Rutas de las variantes (JSON, no FileField)
+        for imagen in ImagenInmueble.objects.exclude(variantes={}).only('id', 'variantes').iterator():
+            variantes = {
+                nombre: {clave: (self.migrar(valor) or valor) if isinstance(valor, str) else valor
+                         for clave, valor in variante.items()}
+                for nombre, variante in imagen.variantes.items()
+            }
+            if variantes != imagen.variantes and not self.simular:
+                ImagenInmueble.objects.filter(pk=imagen.pk).update(variantes=variantes)
+                cambiadas += 1
+        self.stdout.write(f'portal.ImagenInmueble.variantes: {cambiadas} filas actualizadas')
+
+        if not self.simular and not options['conservar']:
+            for nombre in self.migrados:
+                os.remove(default_storage.path(nombre))
+        if self.simular:
+            self.stdout.write(self.style.SUCCESS(
+                f'Se migrarían {len(self.migrados)} archivos ({self.bytes_antes / 2**20:.1f} MB); '
+                f'{self.faltantes} referencias a archivos inexistentes'
+            ))
+            return
+        unicos = set(self.migrados.values())
+        self.stdout.write(self.style.SUCCESS(
+            f'{len(self.migrados)} archivos -> {len(unicos)} por contenido '
+            f'({self.bytes_antes / 2**20:.1f} MB -> {sum(default_storage.size(n) for n in unicos) / 2**20:.1f} MB); '
+            f'{self.faltantes} referencias a archivos inexistentes'
+        ))
+
+    def campos(self):
+        for modelo in apps.get_models():
+            for campo in modelo._meta.concrete_fields:
+                if isinstance(campo, models.FileField):
+                    yield modelo, campo
+
+    def migrar(self, nombre):
+        """Nuevo nombre de `nombre` (None si el archivo no existe); suma una referencia por llamada"""
+        if es_contenido(nombre):
+            return None
+        if nombre in self.migrados:
+            nuevo = self.migrados[nombre]
+            if not self.simular:
+                # Otra fila con el mismo archivo: una referencia más, sin volver a leerlo
+                default_storage.sumar_referencia(nuevo, default_storage.size(nuevo))
+            return nuevo
+        if not default_storage.exists(nombre):
+            self.faltantes += 1
+            if self.faltantes <= 20:
+                self.stdout.write(self.style.WARNING(f'No existe: {nombre}'))
+            return None
+        self.bytes_antes += default_storage.size(nombre)
+        if self.simular:
+            nuevo = nombre
+        else:
+            with transaction.atomic(), default_storage.open(nombre, 'rb') as archivo:
+                nuevo = default_storage.save(nombre, archivo)
+        self.migrados[nombre] = nuevo
+        return nuevo
@@ -0,0 +1,91 @@
+# backend/portal/management/commands/sync_dpa.py
+
+import json
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from portal.gazetteer import escribir_snapshot
+from portal.models import Region, Comuna
+from portal.services import ChileanLocationService
+
+class Command(BaseCommand):
+    help = 'Sincroniza las tablas Region y Comuna con la DPA (API externa o archivo JSON)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--archivo',
+            help='JSON local con {"regiones": [...], "comunas_por_region": {...}} para correr sin red',
+        )
+        parser.add_argument(
+            '--exportar',
+            help='Guardar en este archivo el árbol DPA descargado (para usarlo luego con --archivo)',
+        )
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument(
+            '--snapshot', action='store_true',
+            help='Escribir también el snapshot local (DPA_SNAPSHOT_PATH) con los mismos datos',
+        )
+
+    def handle(self, *args, **options):
+        if options['archivo']:
+            with open(options['archivo'], encoding='utf-8') as f:
+                data = json.load(f)
+            regiones = data['regiones']
+            comunas_por_region = data['comunas_por_region']
+        else:
+            try:
+                regiones, comunas_por_region = ChileanLocationService.fetch_gazetteer()
+            except Exception as e:
+                raise CommandError(f'No se pudo descargar la DPA: {e}')
+
+        if not regiones:
+            raise CommandError('No hay regiones para sincronizar')
+
+        if options['exportar']:
+            with open(options['exportar'], 'w', encoding='utf-8') as f:
+                json.dump({'regiones': regiones, 'comunas_por_region': comunas_por_region}, f, ensure_ascii=False)
+
+        with CaptureQueriesContext(connection) as queries:
+            n_regiones, n_comunas = self.sincronizar(regiones, comunas_por_region, options['batch_size'])
+
+        if options['snapshot']:
+            escribir_snapshot(settings.DPA_SNAPSHOT_PATH, regiones, comunas_por_region)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'{n_regiones} regiones y {n_comunas} comunas sincronizadas ({len(queries)} consultas)'
+        ))
+
+    @transaction.atomic
+    def sincronizar(self, regiones, comunas_por_region, batch_size):
+        # Regiones creadas a mano (sin código) que coinciden por nombre
+        # reciben su código oficial, para no chocar con la unicidad de `nombre`
+        nombres = {r['nombre']: str(r['codigo']) for r in regiones}
+        sin_codigo = list(Region.objects.filter(codigo=None, nombre__in=nombres))
+        for region in sin_codigo:
+            region.codigo = nombres[region.nombre]
+        Region.objects.bulk_update(sin_codigo, ['codigo'], batch_size=batch_size)
+
+        Region.objects.bulk_create(
+            [Region(codigo=str(r['codigo']), nro_region=str(r['codigo']), nombre=r['nombre']) for r in regiones],
+            batch_size=batch_size,
+            update_conflicts=True,
+            unique_fields=['codigo'],
+            update_fields=['nro_region', 'nombre'],
+        )
+        region_ids = dict(Region.objects.exclude(codigo=None).values_list('codigo', 'id'))
+
+        comunas = [
+            Comuna(codigo=str(c['codigo']), nombre=c['nombre'], region_id=region_ids[str(codigo_region)])
+            for codigo_region, lista in comunas_por_region.items()
+            for c in lista
+        ]
+        Comuna.objects.bulk_create(
+            comunas,
+            batch_size=batch_size,
+            update_conflicts=True,
+            unique_fields=['codigo'],
+            update_fields=['nombre', 'region'],
+        )
+        return len(regiones), len(comunas)
@@ -0,0 +1,169 @@
+# backend/portal/middleware.py
+
+"""
+Presupuesto de consultas SQL por vista y detector de N+1.
+
+Para cada request muestreado se registran (con ``connection.execute_wrapper``,
+sin necesitar DEBUG) la cantidad de consultas, el tiempo total en la base y
+las consultas repetidas con la misma "huella" (SQL sin parámetros). Si una
+huella se repite QUERY_BUDGET['N_MAS_UNO'] veces se marca como N+1 junto con
+la línea de template o de código que la disparó. Las estadísticas se agregan
+por ``resolver_match.url_name`` y se consultan en /api/metricas/consultas/.
+"""
+
+import logging
+import random
+import re
+import sys
+import threading
+import time
+
+from django.conf import settings
+from django.db import connection
+
+logger = logging.getLogger(__name__)
+
+_IN_LISTA = re.compile(r'\((?:%s,\s*)+%s\)')
+_LITERALES = re.compile(r"'(?:[^']|'')*'|\b\d+\b")
+_PROPIOS = ('/portal/', '/proyecto/')
+
+
+def huella(sql):
+    """SQL normalizado: sin literales y con las listas IN (...) colapsadas"""
+    return _LITERALES.sub('?', _IN_LISTA.sub('(...)', sql))
+
+
+def origen():
+    """
+    Dónde se originó la consulta: el nodo de template en render (nombre y
+    línea) o, si no hay, el primer frame de código propio del proyecto.
+    """
+    codigo = None
+    frame = sys._getframe(2)
+    while frame is not None:
+        if frame.f_code.co_name == 'render_annotated':
+            nodo = frame.f_locals.get('self')
+            template = getattr(getattr(nodo, 'origin', None), 'template_name', None)
+            if template and getattr(nodo, 'token', None) is not None:
+                return f'{template}:{nodo.token.lineno}'
+        ruta = frame.f_code.co_filename
+        if codigo is None and any(p in ruta for p in _PROPIOS) and not ruta.endswith('middleware.py'):
+            codigo = f'{ruta.rsplit("/backend/", 1)[-1]}:{frame.f_lineno} ({frame.f_code.co_name})'
+        frame = frame.f_back
+    return codigo or 'desconocido'
+
+
+class RegistroConsultas:
+    """execute_wrapper que acumula las consultas de un request"""
+
+    def __init__(self, umbral_n_mas_uno):
+        self.umbral = umbral_n_mas_uno
+        self.total = 0
+        self.tiempo = 0.0
+        self.por_huella = {}
+        self.n_mas_uno = {}  # huella -> origen
+
+    def __call__(self, execute, sql, params, many, context):
+        inicio = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.tiempo += time.perf_counter() - inicio
+            self.total += 1
+            clave = huella(sql)
+            repeticiones = self.por_huella.get(clave, 0) + 1
+            self.por_huella[clave] = repeticiones
+            # El stack solo se recorre una vez por huella sospechosa
+            if repeticiones == self.umbral:
+                self.n_mas_uno[clave] = origen()
+
+
+class EstadisticasConsultas:
+    """Agregado en memoria del proceso, por url_name"""
+
+    _lock = threading.Lock()
+    _vistas = {}
+
+    @classmethod
+    def registrar(cls, vista, registro, presupuesto):
+        with cls._lock:
+            stats = cls._vistas.setdefault(vista, {
+                'requests': 0, 'consultas': 0, 'max_consultas': 0, 'tiempo_db_ms': 0.0,
+                'presupuesto': presupuesto, 'excedidos': 0, 'n_mas_uno': {},
+            })
+            stats['requests'] += 1
+            stats['consultas'] += registro.total
+            stats['max_consultas'] = max(stats['max_consultas'], registro.total)
+            stats['tiempo_db_ms'] += registro.tiempo * 1000
+            stats['presupuesto'] = presupuesto
+            if registro.total > presupuesto:
+                stats['excedidos'] += 1
+            for clave, donde in registro.n_mas_uno.items():
+                patron = stats['n_mas_uno'].setdefault(clave, {'origen': donde, 'veces': 0})
+                patron['veces'] += 1
+
+    @classmethod
+    def resumen(cls):
+        with cls._lock:
+            return {
+                vista: {
+                    **stats,
+                    'promedio_consultas': round(stats['consultas'] / stats['requests'], 2),
+                    'promedio_tiempo_db_ms': round(stats['tiempo_db_ms'] / stats['requests'], 3),
+                    'tiempo_db_ms': round(stats['tiempo_db_ms'], 3),
+                    'n_mas_uno': [
+                        {'sql': sql[:300], **patron} for sql, patron in stats['n_mas_uno'].items()
+                    ],
+                }
+                for vista, stats in cls._vistas.items()
+            }
+
+    @classmethod
+    def reiniciar(cls):
+        with cls._lock:
+            cls._vistas.clear()
+
+
+class PresupuestoConsultasMiddleware:
+    """
+    Mide las consultas SQL de una fracción de los requests (QUERY_BUDGET
+    ['MUESTREO']; 1.0 en desarrollo) y avisa en el log cuando una vista
+    excede su presupuesto o tiene patrones N+1.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        config = settings.QUERY_BUDGET
+        self.muestreo = config['MUESTREO']
+        self.por_defecto = config['POR_DEFECTO']
+        self.vistas = config['VISTAS']
+        self.umbral = config['N_MAS_UNO']
+        self.cabeceras = config['CABECERAS']
+
+    def __call__(self, request):
+        if not self.muestreo or random.random() >= self.muestreo:
+            return self.get_response(request)
+
+        registro = RegistroConsultas(self.umbral)
+        with connection.execute_wrapper(registro):
+            response = self.get_response(request)
+
+        match = getattr(request, 'resolver_match', None)
+        vista = (match.url_name or match.view_name) if match else 'sin_ruta'
+        presupuesto = self.vistas.get(vista, self.por_defecto)
+        EstadisticasConsultas.registrar(vista, registro, presupuesto)
+
+        if registro.total > presupuesto:
+            logger.warning(
+                f"Query budget exceeded (Presupuesto de consultas excedido): {vista} "
+                f"{registro.total}/{presupuesto} consultas, {registro.tiempo * 1000:.1f} ms"
+            )
+        for clave, donde in registro.n_mas_uno.items():
+            logger.warning(
+                f"Possible N+1 (Posible N+1): {vista} x{registro.por_huella[clave]} en {donde}: {clave[:200]}"
+            )
+
+        if self.cabeceras:
+            response['X-Consultas'] = str(registro.total)
+            response['X-Tiempo-DB-ms'] = f'{registro.tiempo * 1000:.1f}'
+        return response
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.24 on 2026-10-17 23:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('portal', '0006_remove_inmueble_imagen_imageninmueble'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='comuna',
+            name='codigo',
+            field=models.CharField(blank=True, max_length=10, null=True, unique=True),
+        ),
+        migrations.AddField(
+            model_name='region',
+            name='codigo',
+            field=models.CharField(blank=True, max_length=10, null=True, unique=True),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 4.2.24 on 2026-10-17 23:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('portal', '0007_region_codigo_comuna_codigo'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='inmueble',
+            index=models.Index(fields=['-creado', '-id'], name='inmueble_creado_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='inmueble',
+            index=models.Index(fields=['precio_mensual', 'id'], name='inmueble_precio_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='inmueble',
+            index=models.Index(condition=models.Q(('esta_publicado', True)), fields=['-creado', '-id'], name='inmueble_pub_creado_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='inmueble',
+            index=models.Index(condition=models.Q(('esta_publicado', True)), fields=['precio_mensual', 'id'], name='inmueble_pub_precio_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='inmueble',
+            index=models.Index(fields=['propietario', '-creado', '-id'], name='inmueble_prop_creado_id_idx'),
+        ),
+    ]
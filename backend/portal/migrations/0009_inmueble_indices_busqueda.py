@@ -0,0 +1,29 @@
+# Generated by Django 4.2.24 on 2026-10-17 23:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('portal', '0008_inmueble_indices_paginacion'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='inmueble',
+            index=models.Index(condition=models.Q(('esta_publicado', True)), fields=['comuna_codigo', 'tipo_inmueble', 'precio_mensual'], name='inmueble_pub_comuna_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='inmueble',
+            index=models.Index(condition=models.Q(('esta_publicado', True)), fields=['region_codigo', 'tipo_inmueble', 'precio_mensual'], name='inmueble_pub_region_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='inmueble',
+            index=models.Index(condition=models.Q(('esta_publicado', True)), fields=['tipo_inmueble', 'precio_mensual'], name='inmueble_pub_tipo_precio_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='inmueble',
+            index=models.Index(condition=models.Q(('esta_publicado', True)), fields=['comuna_codigo', 'habitaciones', 'banos'], name='inmueble_pub_comuna_hab_idx'),
+        ),
+    ]
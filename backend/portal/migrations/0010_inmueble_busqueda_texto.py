@@ -0,0 +1,81 @@
+# Generated by Django 4.2.24 on 2026-10-17 23:55
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations
+
+# Configuración de texto: español con stemming y sin tildes (si existe unaccent)
+CONFIGURACION = """
+DO $$
+BEGIN
+    CREATE TEXT SEARCH CONFIGURATION spanish_unaccent (COPY = pg_catalog.spanish);
+    IF EXISTS (SELECT 1 FROM pg_available_extensions WHERE name = 'unaccent') THEN
+        CREATE EXTENSION IF NOT EXISTS unaccent;
+        ALTER TEXT SEARCH CONFIGURATION spanish_unaccent
+            ALTER MAPPING FOR hword, hword_part, word WITH unaccent, spanish_stem;
+    ELSE
+        RAISE WARNING 'unaccent extension not available; spanish_unaccent will keep accents';
+    END IF;
+END
+$$;
+"""
+
+
+def vector(p=''):
+    return f"""
+        setweight(to_tsvector('spanish_unaccent', coalesce({p}nombre, '')), 'A') ||
+        setweight(to_tsvector('spanish_unaccent', coalesce({p}direccion, '') || ' ' || coalesce({p}comuna_nombre, '')), 'B') ||
+        setweight(to_tsvector('spanish_unaccent', coalesce({p}descripcion, '')), 'C')
+    """
+
+
+# Solo recalcula cuando cambia alguno de los textos; si no, conserva el
+# vector existente aunque el ORM escriba otro valor en la columna
+TRIGGER = f"""
+CREATE FUNCTION portal_inmueble_busqueda() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT' OR OLD.busqueda IS NULL
+       OR NEW.nombre IS DISTINCT FROM OLD.nombre
+       OR NEW.direccion IS DISTINCT FROM OLD.direccion
+       OR NEW.comuna_nombre IS DISTINCT FROM OLD.comuna_nombre
+       OR NEW.descripcion IS DISTINCT FROM OLD.descripcion THEN
+        NEW.busqueda := {vector('NEW.')};
+    ELSE
+        NEW.busqueda := OLD.busqueda;
+    END IF;
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER portal_inmueble_busqueda_trg
+    BEFORE INSERT OR UPDATE ON portal_inmueble
+    FOR EACH ROW EXECUTE FUNCTION portal_inmueble_busqueda();
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('portal', '0009_inmueble_indices_busqueda'),
+    ]
+
+    operations = [
+        migrations.RunSQL(CONFIGURACION, 'DROP TEXT SEARCH CONFIGURATION IF EXISTS spanish_unaccent;'),
+        migrations.AddField(
+            model_name='inmueble',
+            name='busqueda',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        # Backfill antes de crear el índice: construirlo una vez es más barato
+        # que mantenerlo fila a fila
+        migrations.RunSQL(f'UPDATE portal_inmueble SET busqueda = {vector()};', migrations.RunSQL.noop),
+        migrations.RunSQL(
+            TRIGGER,
+            'DROP TRIGGER IF EXISTS portal_inmueble_busqueda_trg ON portal_inmueble;'
+            'DROP FUNCTION IF EXISTS portal_inmueble_busqueda();',
+        ),
+        migrations.AddIndex(
+            model_name='inmueble',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['busqueda'], name='inmueble_busqueda_gin'),
+        ),
+    ]
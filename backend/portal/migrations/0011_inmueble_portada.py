@@ -0,0 +1,19 @@
+# Generated by Django 4.2.24 on 2026-10-17 23:56
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('portal', '0010_inmueble_busqueda_texto'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='inmueble',
+            name='portada',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='portal.imageninmueble'),
+        ),
+    ]
@@ -0,0 +1,78 @@
+# Generated by Django 4.2.24 on 2026-10-17 23:57
+
+from django.db import migrations, models
+
+# (contador, tabla, condición de fila que cuenta)
+CONTADORES = [
+    ('inmuebles_publicados', 'portal_inmueble', 'esta_publicado'),
+    ('usuarios', 'portal_perfilusuario', 'TRUE'),
+    ('regiones', 'portal_region', 'TRUE'),
+    ('solicitudes', 'portal_solicitudarriendo', 'TRUE'),
+]
+
+
+def sql_contador(nombre, tabla, condicion):
+    """
+    Triggers por sentencia con tablas de transición: un solo UPDATE del
+    contador por INSERT/UPDATE/DELETE, aunque la sentencia toque miles de
+    filas (bulk_create, queryset.update/delete).
+    """
+    funcion = f'portal_contador_{nombre}'
+    sql = f"""
+    CREATE FUNCTION {funcion}() RETURNS trigger AS $$
+    DECLARE
+        delta bigint := 0;
+    BEGIN
+        IF TG_OP IN ('INSERT', 'UPDATE') THEN
+            SELECT delta + count(*) INTO delta FROM nuevas WHERE {condicion};
+        END IF;
+        IF TG_OP IN ('DELETE', 'UPDATE') THEN
+            SELECT delta - count(*) INTO delta FROM viejas WHERE {condicion};
+        END IF;
+        IF delta <> 0 THEN
+            UPDATE portal_contador SET valor = valor + delta WHERE nombre = '{nombre}';
+        END IF;
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql;
+
+    CREATE TRIGGER {funcion}_ins AFTER INSERT ON {tabla}
+        REFERENCING NEW TABLE AS nuevas FOR EACH STATEMENT EXECUTE FUNCTION {funcion}();
+    CREATE TRIGGER {funcion}_del AFTER DELETE ON {tabla}
+        REFERENCING OLD TABLE AS viejas FOR EACH STATEMENT EXECUTE FUNCTION {funcion}();
+    """
+    if condicion != 'TRUE':
+        sql += f"""
+    CREATE TRIGGER {funcion}_upd AFTER UPDATE ON {tabla}
+        REFERENCING OLD TABLE AS viejas NEW TABLE AS nuevas FOR EACH STATEMENT EXECUTE FUNCTION {funcion}();
+    """
+    sql += f"""
+    INSERT INTO portal_contador (nombre, valor, reconciliado)
+        SELECT '{nombre}', count(*), now() FROM {tabla} WHERE {condicion};
+    """
+    reverse = f"""
+    DROP TRIGGER IF EXISTS {funcion}_ins ON {tabla};
+    DROP TRIGGER IF EXISTS {funcion}_del ON {tabla};
+    DROP TRIGGER IF EXISTS {funcion}_upd ON {tabla};
+    DROP FUNCTION IF EXISTS {funcion}();
+    """
+    return migrations.RunSQL(sql, reverse)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('portal', '0011_inmueble_portada'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Contador',
+            fields=[
+                ('nombre', models.CharField(max_length=50, primary_key=True, serialize=False)),
+                ('valor', models.BigIntegerField(default=0)),
+                ('reconciliado', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+        *[sql_contador(*contador) for contador in CONTADORES],
+    ]
@@ -0,0 +1,119 @@
+# Generated by Django 4.2.24 on 2026-10-18 00:15
+
+from django.db import migrations, models
+
+# Grupo de un inmueble en el resumen de precios (ver EstadisticaPrecio.MAX_HABITACIONES)
+GRUPO = "comuna_codigo, tipo_inmueble, LEAST(habitaciones, 4)"
+RELEVANTES = ['esta_publicado', 'precio_mensual', 'm2_construidos', 'comuna_codigo', 'tipo_inmueble', 'habitaciones']
+CAMBIO = "({}) IS DISTINCT FROM ({})".format(
+    ', '.join(f'v.{c}' for c in RELEVANTES), ', '.join(f'n.{c}' for c in RELEVANTES),
+)
+
+# Triggers por sentencia que marcan como pendientes los grupos tocados: los
+# de las filas nuevas y los de las viejas (un inmueble que cambia de comuna
+# o se despublica también cambia el grupo donde estaba)
+SQL_PENDIENTES = f"""
+CREATE FUNCTION portal_estadisticaprecio_pendiente() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        INSERT INTO portal_estadisticapreciopendiente (comuna_codigo, tipo_inmueble, habitaciones)
+            SELECT DISTINCT {GRUPO} FROM nuevas
+            WHERE esta_publicado AND comuna_codigo IS NOT NULL
+            ON CONFLICT DO NOTHING;
+    ELSIF TG_OP = 'DELETE' THEN
+        INSERT INTO portal_estadisticapreciopendiente (comuna_codigo, tipo_inmueble, habitaciones)
+            SELECT DISTINCT {GRUPO} FROM viejas
+            WHERE esta_publicado AND comuna_codigo IS NOT NULL
+            ON CONFLICT DO NOTHING;
+    ELSE
+        -- Solo las filas donde cambió algo que afecta al resumen
+        INSERT INTO portal_estadisticapreciopendiente (comuna_codigo, tipo_inmueble, habitaciones)
+            SELECT DISTINCT g.comuna_codigo, g.tipo_inmueble, g.habitaciones FROM (
+                SELECT v.comuna_codigo, v.tipo_inmueble, LEAST(v.habitaciones, 4), v.esta_publicado
+                FROM viejas v JOIN nuevas n ON n.id = v.id
+                WHERE {CAMBIO}
+                UNION ALL
+                SELECT n.comuna_codigo, n.tipo_inmueble, LEAST(n.habitaciones, 4), n.esta_publicado
+                FROM viejas v JOIN nuevas n ON n.id = v.id
+                WHERE {CAMBIO}
+            ) AS g (comuna_codigo, tipo_inmueble, habitaciones, esta_publicado)
+            WHERE g.esta_publicado AND g.comuna_codigo IS NOT NULL
+            ON CONFLICT DO NOTHING;
+    END IF;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER portal_estadisticaprecio_ins AFTER INSERT ON portal_inmueble
+    REFERENCING NEW TABLE AS nuevas FOR EACH STATEMENT EXECUTE FUNCTION portal_estadisticaprecio_pendiente();
+CREATE TRIGGER portal_estadisticaprecio_upd AFTER UPDATE ON portal_inmueble
+    REFERENCING OLD TABLE AS viejas NEW TABLE AS nuevas FOR EACH STATEMENT EXECUTE FUNCTION portal_estadisticaprecio_pendiente();
+CREATE TRIGGER portal_estadisticaprecio_del AFTER DELETE ON portal_inmueble
+    REFERENCING OLD TABLE AS viejas FOR EACH STATEMENT EXECUTE FUNCTION portal_estadisticaprecio_pendiente();
+
+-- Primera ejecución: todos los grupos existentes quedan pendientes
+INSERT INTO portal_estadisticapreciopendiente (comuna_codigo, tipo_inmueble, habitaciones)
+    SELECT DISTINCT {GRUPO} FROM portal_inmueble
+    WHERE esta_publicado AND comuna_codigo IS NOT NULL
+    ON CONFLICT DO NOTHING;
+"""
+
+SQL_PENDIENTES_REVERSE = """
+DROP TRIGGER IF EXISTS portal_estadisticaprecio_ins ON portal_inmueble;
+DROP TRIGGER IF EXISTS portal_estadisticaprecio_upd ON portal_inmueble;
+DROP TRIGGER IF EXISTS portal_estadisticaprecio_del ON portal_inmueble;
+DROP FUNCTION IF EXISTS portal_estadisticaprecio_pendiente();
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('portal', '0012_contador'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EstadisticaPrecio',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('comuna_codigo', models.CharField(max_length=10)),
+                ('comuna_nombre', models.CharField(blank=True, max_length=100)),
+                ('region_codigo', models.CharField(blank=True, max_length=10)),
+                ('region_nombre', models.CharField(blank=True, max_length=100)),
+                ('tipo_inmueble', models.CharField(choices=[('CASA', 'Casa'), ('DEPARTAMENTO', 'Departamento'), ('PARCELA', 'Parcela')], max_length=20)),
+                ('habitaciones', models.PositiveSmallIntegerField()),
+                ('cantidad', models.PositiveIntegerField()),
+                ('precio_promedio', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('precio_mediana', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('precio_p25', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('precio_p75', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('cantidad_m2', models.PositiveIntegerField(default=0)),
+                ('precio_m2_promedio', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('precio_m2_mediana', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('actualizado', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='EstadisticaPrecioPendiente',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('comuna_codigo', models.CharField(max_length=10)),
+                ('tipo_inmueble', models.CharField(max_length=20)),
+                ('habitaciones', models.PositiveSmallIntegerField()),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='estadisticapreciopendiente',
+            constraint=models.UniqueConstraint(fields=('comuna_codigo', 'tipo_inmueble', 'habitaciones'), name='estadisticapendiente_grupo_unico'),
+        ),
+        migrations.AddIndex(
+            model_name='estadisticaprecio',
+            index=models.Index(fields=['region_codigo', 'comuna_codigo'], name='estadisticaprecio_region_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='estadisticaprecio',
+            constraint=models.UniqueConstraint(fields=('comuna_codigo', 'tipo_inmueble', 'habitaciones'), name='estadisticaprecio_grupo_unico'),
+        ),
+        migrations.RunSQL(SQL_PENDIENTES, SQL_PENDIENTES_REVERSE),
+    ]
@@ -0,0 +1,95 @@
+# Generated by Django 4.2.24 on 2026-10-18 00:18
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+# Encola los inmuebles que pasan a publicados (INSERT publicado o UPDATE de
+# esta_publicado false -> true) y despierta al worker con NOTIFY
+SQL_EVENTOS = """
+CREATE FUNCTION portal_evento_publicacion() RETURNS trigger AS $$
+DECLARE
+    filas bigint;
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        INSERT INTO portal_eventopublicacion (inmueble_id, creado)
+            SELECT id, now() FROM nuevas WHERE esta_publicado;
+    ELSE
+        INSERT INTO portal_eventopublicacion (inmueble_id, creado)
+            SELECT n.id, now() FROM nuevas n JOIN viejas v ON v.id = n.id
+            WHERE n.esta_publicado AND NOT v.esta_publicado;
+    END IF;
+    GET DIAGNOSTICS filas = ROW_COUNT;
+    IF filas > 0 THEN
+        PERFORM pg_notify('portal_alertas', '');
+    END IF;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER portal_evento_publicacion_ins AFTER INSERT ON portal_inmueble
+    REFERENCING NEW TABLE AS nuevas FOR EACH STATEMENT EXECUTE FUNCTION portal_evento_publicacion();
+CREATE TRIGGER portal_evento_publicacion_upd AFTER UPDATE ON portal_inmueble
+    REFERENCING OLD TABLE AS viejas NEW TABLE AS nuevas FOR EACH STATEMENT EXECUTE FUNCTION portal_evento_publicacion();
+"""
+
+SQL_EVENTOS_REVERSE = """
+DROP TRIGGER IF EXISTS portal_evento_publicacion_ins ON portal_inmueble;
+DROP TRIGGER IF EXISTS portal_evento_publicacion_upd ON portal_inmueble;
+DROP FUNCTION IF EXISTS portal_evento_publicacion();
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('portal', '0013_estadisticas_precios'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EventoPublicacion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('creado', models.DateTimeField(auto_now_add=True)),
+                ('inmueble', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='portal.inmueble')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='BusquedaGuardada',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nombre', models.CharField(blank=True, max_length=100)),
+                ('region_codigo', models.CharField(blank=True, max_length=10)),
+                ('comuna_codigo', models.CharField(blank=True, max_length=10)),
+                ('tipo_inmueble', models.CharField(blank=True, choices=[('CASA', 'Casa'), ('DEPARTAMENTO', 'Departamento'), ('PARCELA', 'Parcela')], max_length=20)),
+                ('precio_min', models.DecimalField(blank=True, decimal_places=2, max_digits=8, null=True)),
+                ('precio_max', models.DecimalField(blank=True, decimal_places=2, max_digits=8, null=True)),
+                ('habitaciones', models.PositiveSmallIntegerField(blank=True, null=True)),
+                ('banos', models.PositiveSmallIntegerField(blank=True, null=True)),
+                ('activa', models.BooleanField(default=True)),
+                ('creado', models.DateTimeField(auto_now_add=True)),
+                ('actualizado', models.DateTimeField(auto_now=True)),
+                ('usuario', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='busquedas_guardadas', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='AlertaBusqueda',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('creado', models.DateTimeField(auto_now_add=True)),
+                ('vista', models.BooleanField(default=False)),
+                ('busqueda', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='alertas', to='portal.busquedaguardada')),
+                ('inmueble', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='portal.inmueble')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='busquedaguardada',
+            index=models.Index(fields=['actualizado'], name='busquedaguardada_act_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='alertabusqueda',
+            constraint=models.UniqueConstraint(fields=('busqueda', 'inmueble'), name='alertabusqueda_unica'),
+        ),
+        migrations.RunSQL(SQL_EVENTOS, SQL_EVENTOS_REVERSE),
+    ]
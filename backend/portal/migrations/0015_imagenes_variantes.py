@@ -0,0 +1,37 @@
+# Generated by Django 4.2.24 on 2026-10-18 00:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('portal', '0014_busquedas_guardadas'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='imageninmueble',
+            name='alto',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='imageninmueble',
+            name='ancho',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='imageninmueble',
+            name='procesada',
+            field=models.BooleanField(default=False, editable=False),
+        ),
+        migrations.AddField(
+            model_name='imageninmueble',
+            name='variantes',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='imageninmueble',
+            index=models.Index(condition=models.Q(('procesada', False)), fields=['id'], name='imagen_pendiente_idx'),
+        ),
+    ]
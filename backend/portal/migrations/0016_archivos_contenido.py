@@ -0,0 +1,23 @@
+# Generated by Django 4.2.24 on 2026-10-18 00:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('portal', '0015_imagenes_variantes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivoContenido',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('ruta', models.CharField(max_length=100, unique=True)),
+                ('referencias', models.PositiveIntegerField(default=0)),
+                ('tamano', models.BigIntegerField()),
+                ('creado', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+    ]
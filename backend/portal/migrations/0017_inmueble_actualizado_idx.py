@@ -0,0 +1,17 @@
+# Generated by Django 4.2.24 on 2026-10-18 00:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('portal', '0016_archivos_contenido'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='inmueble',
+            index=models.Index(fields=['actualizado'], name='inmueble_actualizado_idx'),
+        ),
+    ]
@@ -3,6 +3,7 @@ from django.contrib.auth.mixins import UserPassesTestMixin, AccessMixin, UserPas
 from django.core.exceptions import PermissionDenied
 from django.shortcuts import redirect
 from .models import PerfilUsuario
+from .permisos import PermisosUsuario
 
 class PermisoRequeridoMixin(UserPassesTestMixin):
     """Mixin para verificar permisos específicos"""
@@ -16,16 +17,23 @@ class PermisoRequeridoMixin(UserPassesTestMixin):
         if not user.is_authenticated:
             return False
         
+        # Instantánea cacheada: con la caché caliente no hay consultas (ni en los
+        # has_perm que haga después la vista)
+        instantanea = PermisosUsuario.de(user)
+        
         # Verificar permiso específico
         if self.permiso_requerido and not user.has_perm(self.permiso_requerido):
             return False
         
         # Verificar grupo
-        if self.grupo_requerido and not user.groups.filter(name=self.grupo_requerido).exists():
+        if self.grupo_requerido and self.grupo_requerido not in instantanea.grupos:
             return False
         
-        # Verificar tipo de usuario
-        if self.tipo_usuario_requerido and user.tipo_usuario != self.tipo_usuario_requerido:
+        # Verificar tipo de usuario (uno o una tupla de tipos aceptados)
+        requerido = self.tipo_usuario_requerido
+        if isinstance(requerido, str):
+            requerido = (requerido,)
+        if requerido and instantanea.tipo_usuario not in requerido:
             return False
         
         return True
@@ -36,18 +44,13 @@ class PermisoRequeridoMixin(UserPassesTestMixin):
         return redirect('login')
 
 # Mixins específicos para permisos comunes
-class PuedeGestionarInmueblesMixin(UserPassesTestMixin):
-    def test_func(self):
-        user = self.request.user
-        # Administradores y arrendadores pueden gestionar inmuebles
-        return (user.tipo_usuario == PerfilUsuario.TipoUsuario.ADMINISTRADOR or 
-                user.tipo_usuario == PerfilUsuario.TipoUsuario.ARRENDADOR)
+class PuedeGestionarInmueblesMixin(PermisoRequeridoMixin):
+    # Administradores y arrendadores pueden gestionar inmuebles
+    tipo_usuario_requerido = (PerfilUsuario.TipoUsuario.ADMINISTRADOR, PerfilUsuario.TipoUsuario.ARRENDADOR)
 
-class PuedeVerTodosInmueblesMixin(UserPassesTestMixin):
-    def test_func(self):
-        user = self.request.user
-        # Administradores pueden ver todos los inmuebles
-        return user.tipo_usuario == PerfilUsuario.TipoUsuario.ADMINISTRADOR
+class PuedeVerTodosInmueblesMixin(PermisoRequeridoMixin):
+    # Administradores pueden ver todos los inmuebles
+    tipo_usuario_requerido = PerfilUsuario.TipoUsuario.ADMINISTRADOR
 
 class PuedeGestionarSolicitudesMixin(PermisoRequeridoMixin):
     permiso_requerido = 'portal.gestionar_solicitud'
@@ -55,11 +58,9 @@ class PuedeGestionarSolicitudesMixin(PermisoRequeridoMixin):
 class PuedeAprobarSolicitudesMixin(PermisoRequeridoMixin):
     permiso_requerido = 'portal.aprobar_solicitud'
 
-class PuedeGestionarUsuariosMixin(UserPassesTestMixin):
-    def test_func(self):
-        user = self.request.user
-        # Solo administradores pueden gestionar usuarios
-        return user.tipo_usuario == PerfilUsuario.TipoUsuario.ADMINISTRADOR
+class PuedeGestionarUsuariosMixin(PermisoRequeridoMixin):
+    # Solo administradores pueden gestionar usuarios
+    tipo_usuario_requerido = PerfilUsuario.TipoUsuario.ADMINISTRADOR
 
 class PuedeVerTodosUsuariosMixin(PermisoRequeridoMixin):
     permiso_requerido = 'portal.ver_todos_usuarios'
@@ -71,9 +72,8 @@ class PuedeGestionarComunasMixin(PermisoRequeridoMixin):
     permiso_requerido = 'portal.gestionar_comuna'
 
 # Mixins por tipo de usuario
-class EsAdministradorMixin(UserPassesTestMixin):
-    def test_func(self):
-        return self.request.user.tipo_usuario == PerfilUsuario.TipoUsuario.ADMINISTRADOR
+class EsAdministradorMixin(PermisoRequeridoMixin):
+    tipo_usuario_requerido = 'ADMINISTRADOR'
 
 class EsArrendadorMixin(PermisoRequeridoMixin):
     tipo_usuario_requerido = 'ARRENDADOR'
@@ -90,11 +90,3 @@ class GrupoArrendadoresMixin(PermisoRequeridoMixin):
 
 class GrupoArrendatariosMixin(PermisoRequeridoMixin):
     grupo_requerido = 'Arrendatarios'
-
-class EsArrendadorMixin(UserPassesTestMixin):
-    def test_func(self):
-        return self.request.user.tipo_usuario == PerfilUsuario.TipoUsuario.ARRENDADOR
-
-class EsArrendatarioMixin(UserPassesTestMixin):
-    def test_func(self):
-        return self.request.user.tipo_usuario == PerfilUsuario.TipoUsuario.ARRENDATARIO
\ No newline at end of file
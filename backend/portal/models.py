@@ -4,15 +4,22 @@ from django.utils.translation import gettext_lazy as _
 from django.contrib.auth.models import AbstractUser, Group, Permission
 from django.conf import settings
 import uuid
-from django.db.models.signals import post_migrate
+from django.db.models.signals import post_migrate, pre_save, post_save, post_delete, m2m_changed
 from django.dispatch import receiver
 from django.db import transaction
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
+from .fragmentos import Fragmentos, DESTACADOS
+from .recomendaciones import Similares
+from .storage import liberar_archivos
+from .permisos import PermisosUsuario
 
 # Create your models here.
 
 class Region(models.Model):
     nro_region = models.CharField(max_length=5)
     nombre = models.CharField(max_length=100, unique=True)
+    codigo = models.CharField(max_length=10, unique=True, null=True, blank=True)  # Código oficial DPA
 
     class Meta:
         permissions = [
@@ -25,6 +32,7 @@ class Region(models.Model):
 class Comuna(models.Model):
     nombre = models.CharField(max_length=50)
     region = models.ForeignKey(Region, on_delete=models.PROTECT, related_name="comunas")
+    codigo = models.CharField(max_length=10, unique=True, null=True, blank=True)  # Código oficial DPA
 
     class Meta:
         permissions = [
@@ -35,6 +43,17 @@ class Comuna(models.Model):
         return f"{self.nombre} ||| número de región es: {self.region.nombre}"
 
 # modelo de inmueble
+class InmuebleManager(models.Manager):
+    """
+    Difiere `busqueda`: el tsvector solo se usa dentro de las consultas de
+    texto, así que ni se lee en cada listado ni se reescribe en cada save()
+    (con campos diferidos save() actualiza solo los cargados).
+    """
+
+    def get_queryset(self):
+        return super().get_queryset().defer('busqueda')
+
+
 class Inmueble(models.Model):
     class Tipo_de_inmueble(models.TextChoices):
         casa = "CASA", _("Casa")
@@ -60,6 +79,17 @@ class Inmueble(models.Model):
     comuna_nombre = models.CharField(max_length=100, blank=True, null=True)
     tipo_inmueble = models.CharField(max_length=20, choices=Tipo_de_inmueble.choices)
     esta_publicado = models.BooleanField(default=False)
+    # tsvector ponderado (nombre A, dirección/comuna B, descripción C); lo
+    # mantiene un trigger de PostgreSQL, ver migración 0010
+    busqueda = SearchVectorField(null=True, editable=False)
+    # Imagen de portada desnormalizada (primera por orden); la mantienen las
+    # señales de ImagenInmueble para que los listados la traigan con select_related
+    portada = models.ForeignKey(
+        'ImagenInmueble', on_delete=models.SET_NULL, null=True, blank=True,
+        related_name='+', editable=False,
+    )
+
+    objects = InmuebleManager()
     
     class Meta:
         permissions = [
@@ -67,14 +97,71 @@ class Inmueble(models.Model):
             ("ver_todos_inmuebles", "Puede ver todos los inmuebles"),
             ("publicar_inmueble", "Puede publicar inmuebles"),
         ]
+        indexes = [
+            # Paginación por cursor: (creado, id) y (precio_mensual, id)
+            models.Index(fields=['-creado', '-id'], name='inmueble_creado_id_idx'),
+            models.Index(fields=['precio_mensual', 'id'], name='inmueble_precio_id_idx'),
+            models.Index(
+                fields=['-creado', '-id'], name='inmueble_pub_creado_id_idx',
+                condition=models.Q(esta_publicado=True),
+            ),
+            models.Index(
+                fields=['precio_mensual', 'id'], name='inmueble_pub_precio_id_idx',
+                condition=models.Q(esta_publicado=True),
+            ),
+            # "Mis inmuebles" de un arrendador
+            models.Index(fields=['propietario', '-creado', '-id'], name='inmueble_prop_creado_id_idx'),
+            # Búsqueda facetada de publicados: igualdad por ubicación/tipo, rango por precio
+            models.Index(
+                fields=['comuna_codigo', 'tipo_inmueble', 'precio_mensual'], name='inmueble_pub_comuna_idx',
+                condition=models.Q(esta_publicado=True),
+            ),
+            models.Index(
+                fields=['region_codigo', 'tipo_inmueble', 'precio_mensual'], name='inmueble_pub_region_idx',
+                condition=models.Q(esta_publicado=True),
+            ),
+            models.Index(
+                fields=['tipo_inmueble', 'precio_mensual'], name='inmueble_pub_tipo_precio_idx',
+                condition=models.Q(esta_publicado=True),
+            ),
+            models.Index(
+                fields=['comuna_codigo', 'habitaciones', 'banos'], name='inmueble_pub_comuna_hab_idx',
+                condition=models.Q(esta_publicado=True),
+            ),
+            # Búsqueda por texto completo
+            GinIndex(fields=['busqueda'], name='inmueble_busqueda_gin'),
+            # Cambios recientes, para sincronizar la matriz de similares (portal/recomendaciones.py)
+            models.Index(fields=['actualizado'], name='inmueble_actualizado_idx'),
+        ]
     
     def __str__(self):
         return f" {self.id} {self.propietario} {self.nombre}"
     
     @property
     def imagen_principal(self):
-        """Devuelve la primera imagen como principal"""
-        return self.imagenes.first().imagen if self.imagenes.exists() else None
+        """Devuelve la imagen de portada (sin consultas si se usó select_related('portada'))"""
+        return self.portada.imagen if self.portada_id else None
+
+    @property
+    def portada_url(self):
+        imagen = self.imagen_principal
+        return imagen.url if imagen else ''
+
+    @classmethod
+    def publicados(cls, queryset=None):
+        """Lo que ve el público (home, visitantes anónimos y las APIs), sobre `queryset` si se da"""
+        return (cls.objects.all() if queryset is None else queryset).filter(esta_publicado=True)
+
+    @classmethod
+    def actualizar_portada(cls, inmueble_id):
+        """Recalcula la portada de un inmueble: su primera imagen según el orden"""
+        primera = (
+            ImagenInmueble.objects.filter(inmueble_id=inmueble_id)
+            .order_by('orden', 'creado', 'id')
+            .values_list('id', flat=True)
+            .first()
+        )
+        cls.objects.filter(pk=inmueble_id).update(portada_id=primera)
 
 class ImagenInmueble(models.Model):
     inmueble = models.ForeignKey(
@@ -86,13 +173,110 @@ class ImagenInmueble(models.Model):
     descripcion = models.CharField(max_length=200, blank=True)
     orden = models.PositiveIntegerField(default=0)  # Para ordenar imágenes
     creado = models.DateTimeField(auto_now_add=True)
+    # Los llena portal/imagenes.py después de subir la imagen: dimensiones del
+    # original y variantes redimensionadas, nombre -> {ancho, alto, webp, jpeg}
+    ancho = models.PositiveIntegerField(null=True, blank=True, editable=False)
+    alto = models.PositiveIntegerField(null=True, blank=True, editable=False)
+    variantes = models.JSONField(default=dict, blank=True, editable=False)
+    procesada = models.BooleanField(default=False, editable=False)
 
     class Meta:
         ordering = ['orden', 'creado']
+        indexes = [
+            models.Index(fields=['id'], condition=models.Q(procesada=False), name='imagen_pendiente_idx'),
+        ]
 
     def __str__(self):
         return f"Imagen de {self.inmueble.nombre}"
 
+    def url_variante(self, nombre, formato='jpeg'):
+        """URL de una variante; el original mientras no se haya procesado"""
+        ruta = self.variantes.get(nombre, {}).get(formato)
+        return self.imagen.storage.url(ruta) if ruta else self.imagen.url
+
+    def srcset(self, formato='jpeg'):
+        """Candidatos para el atributo srcset, de la variante más chica a la más grande"""
+        return ', '.join(
+            f"{self.imagen.storage.url(v[formato])} {v['ancho']}w"
+            for v in sorted(self.variantes.values(), key=lambda v: v['ancho'])
+        )
+
+
+# Portada de Inmueble: se recalcula al crear, reordenar o eliminar imágenes
+@receiver(post_save, sender=ImagenInmueble)
+def actualizar_portada_al_guardar(sender, instance, raw=False, **kwargs):
+    if not raw:
+        Inmueble.actualizar_portada(instance.inmueble_id)
+
+
+# Variantes redimensionadas: en el pool de portal/imagenes.py, fuera del request
+@receiver(post_save, sender=ImagenInmueble)
+def procesar_imagen_al_guardar(sender, instance, raw=False, **kwargs):
+    if not raw and not instance.procesada:
+        from .imagenes import ProcesadorImagenes
+        transaction.on_commit(lambda: ProcesadorImagenes.encolar(instance.pk))
+
+
+@receiver(post_delete, sender=ImagenInmueble)
+def actualizar_portada_al_eliminar(sender, instance, **kwargs):
+    Inmueble.actualizar_portada(instance.inmueble_id)
+
+
+# Storage direccionado por contenido (portal/storage.py): las referencias a
+# los archivos se sueltan recién cuando se confirma el borrado
+@receiver(post_delete, sender=ImagenInmueble)
+def liberar_archivos_imagen(sender, instance, **kwargs):
+    rutas = [instance.imagen.name] + [ruta for v in instance.variantes.values() for ruta in v.values() if isinstance(ruta, str)]
+    storage = instance.imagen.storage
+    transaction.on_commit(lambda: liberar_archivos(storage, rutas))
+
+
+# Fragmento "destacados" del home: se invalida solo si el cambio puede afectarlo,
+# una vez confirmada la transacción (antes, un request podría recalcularlo con
+# los datos viejos y dejarlo guardado como vigente)
+def invalidar_destacados(inmueble_id, inmueble=None):
+    transaction.on_commit(lambda: _invalidar_destacados(inmueble_id, inmueble))
+
+
+def _invalidar_destacados(inmueble_id, inmueble):
+    ultimo = Fragmentos.ultimo(DESTACADOS)
+    if ultimo is None or inmueble_id in ultimo['ids']:
+        Fragmentos.invalidar(DESTACADOS)
+    elif inmueble is not None and inmueble.esta_publicado and (
+            ultimo['corte'] is None or inmueble.creado >= ultimo['corte']):
+        # Publicado y lo bastante reciente para entrar entre los destacados
+        Fragmentos.invalidar(DESTACADOS)
+
+
+@receiver(post_save, sender=Inmueble)
+def invalidar_destacados_al_guardar(sender, instance, raw=False, **kwargs):
+    if not raw:
+        invalidar_destacados(instance.pk, instance)
+
+
+@receiver(post_delete, sender=Inmueble)
+def invalidar_destacados_al_eliminar(sender, instance, **kwargs):
+    invalidar_destacados(instance.pk)
+
+
+@receiver([post_save, post_delete], sender=ImagenInmueble)
+def invalidar_destacados_por_imagen(sender, instance, **kwargs):
+    invalidar_destacados(instance.inmueble_id)
+
+
+# Matriz de propiedades similares: publicar/despublicar/editar la actualiza
+# en el lugar, una vez confirmada la transacción
+@receiver(post_save, sender=Inmueble)
+def actualizar_similares_al_guardar(sender, instance, raw=False, **kwargs):
+    if not raw:
+        transaction.on_commit(lambda: Similares.al_guardar(instance))
+
+
+@receiver(post_delete, sender=Inmueble)
+def actualizar_similares_al_eliminar(sender, instance, **kwargs):
+    pk = instance.pk
+    transaction.on_commit(lambda: Similares.al_borrar(pk))
+
 
 class SolicitudArriendo(models.Model):
     class EstadoSolicitud(models.TextChoices):
@@ -141,6 +325,197 @@ class PerfilUsuario(AbstractUser):
     def __str__(self):
         return f"{self.get_full_name()} | {self.tipo_usuario}"
 
+    # Permisos desde la instantánea cacheada (portal/permisos.py): ModelBackend
+    # encuentra sus cachés ya llenas y no consulta la base
+    def has_perm(self, perm, obj=None):
+        if obj is None and self.pk:
+            PermisosUsuario.de(self)
+        return super().has_perm(perm, obj)
+
+    def has_module_perms(self, app_label):
+        if self.pk:
+            PermisosUsuario.de(self)
+        return super().has_module_perms(app_label)
+
+    def get_all_permissions(self, obj=None):
+        if obj is None and self.pk:
+            PermisosUsuario.de(self)
+        return super().get_all_permissions(obj)
+
+@receiver(pre_save, sender=PerfilUsuario)
+def liberar_imagen_perfil_reemplazada(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw or not instance.pk or (update_fields is not None and 'imagen' not in update_fields):
+        return
+    anterior = sender.objects.filter(pk=instance.pk).values_list('imagen', flat=True).first()
+    if anterior and anterior != instance.imagen.name and anterior != sender._meta.get_field('imagen').default:
+        storage = instance.imagen.storage
+        transaction.on_commit(lambda: liberar_archivos(storage, [anterior]))
+
+
+@receiver(post_delete, sender=PerfilUsuario)
+def liberar_imagen_perfil(sender, instance, **kwargs):
+    if instance.imagen.name != sender._meta.get_field('imagen').default:
+        storage = instance.imagen.storage
+        rutas = [instance.imagen.name]
+        transaction.on_commit(lambda: liberar_archivos(storage, rutas))
+
+
+# Instantáneas de permisos (portal/permisos.py): un cambio en el usuario o en
+# sus grupos/permisos invalida la suya; uno en un grupo, las de todos
+@receiver(post_save, sender=PerfilUsuario)
+def invalidar_permisos_usuario(sender, instance, raw=False, update_fields=None, **kwargs):
+    # El login guarda solo last_login: no cambia nada de la instantánea
+    if raw or (update_fields is not None and not {'tipo_usuario', 'is_active', 'is_superuser'} & set(update_fields)):
+        return
+    PermisosUsuario.invalidar(instance.pk)
+
+
+@receiver(m2m_changed, sender=PerfilUsuario.groups.through)
+@receiver(m2m_changed, sender=PerfilUsuario.user_permissions.through)
+def invalidar_permisos_membresia(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        PermisosUsuario.invalidar(instance.pk)
+    elif pk_set:
+        PermisosUsuario.invalidar(*pk_set)
+    else:
+        # group.user_set.clear(): no se sabe a quiénes afectó
+        PermisosUsuario.invalidar_todos()
+
+
+@receiver(m2m_changed, sender=Group.permissions.through)
+def invalidar_permisos_grupo(sender, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        PermisosUsuario.invalidar_todos()
+
+
+@receiver([post_save, post_delete], sender=Group)
+def invalidar_permisos_por_grupo(sender, raw=False, **kwargs):
+    if not raw:
+        PermisosUsuario.invalidar_todos()
+
+
+class ArchivoContenido(models.Model):
+    """Archivo de media guardado por su hash y cuántos campos lo usan (lo mantiene portal/storage.py)"""
+    ruta = models.CharField(max_length=100, unique=True)
+    referencias = models.PositiveIntegerField(default=0)
+    tamano = models.BigIntegerField()
+    creado = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.ruta} ({self.referencias})"
+
+
+class Contador(models.Model):
+    """Conteos de la plataforma mantenidos por triggers (ver portal/contadores.py)"""
+    nombre = models.CharField(max_length=50, primary_key=True)
+    valor = models.BigIntegerField(default=0)
+    reconciliado = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.nombre}: {self.valor}"
+
+
+class EstadisticaPrecio(models.Model):
+    """
+    Resumen de precios de los inmuebles publicados por (comuna, tipo,
+    habitaciones), con 4 = "4 o más". Lo recalcula portal/estadisticas.py
+    solo para los grupos marcados en EstadisticaPrecioPendiente.
+    """
+    MAX_HABITACIONES = 4
+
+    comuna_codigo = models.CharField(max_length=10)
+    comuna_nombre = models.CharField(max_length=100, blank=True)
+    region_codigo = models.CharField(max_length=10, blank=True)
+    region_nombre = models.CharField(max_length=100, blank=True)
+    tipo_inmueble = models.CharField(max_length=20, choices=Inmueble.Tipo_de_inmueble.choices)
+    habitaciones = models.PositiveSmallIntegerField()
+    cantidad = models.PositiveIntegerField()
+    precio_promedio = models.DecimalField(max_digits=10, decimal_places=2)
+    precio_mediana = models.DecimalField(max_digits=10, decimal_places=2)
+    precio_p25 = models.DecimalField(max_digits=10, decimal_places=2)
+    precio_p75 = models.DecimalField(max_digits=10, decimal_places=2)
+    # Precio por m² construido (solo inmuebles con m2_construidos > 0)
+    cantidad_m2 = models.PositiveIntegerField(default=0)
+    precio_m2_promedio = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    precio_m2_mediana = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    actualizado = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['comuna_codigo', 'tipo_inmueble', 'habitaciones'], name='estadisticaprecio_grupo_unico',
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['region_codigo', 'comuna_codigo'], name='estadisticaprecio_region_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.comuna_nombre} {self.tipo_inmueble} {self.habitaciones}: {self.precio_mediana}"
+
+
+class BusquedaGuardada(models.Model):
+    """
+    Criterios de búsqueda de un usuario para avisarle cuando se publique un
+    inmueble que calce. Criterio vacío = cualquiera; los mínimos son "al
+    menos N". El calce lo hace el worker de portal/alertas.py.
+    """
+    usuario = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="busquedas_guardadas")
+    nombre = models.CharField(max_length=100, blank=True)
+    region_codigo = models.CharField(max_length=10, blank=True)
+    comuna_codigo = models.CharField(max_length=10, blank=True)
+    tipo_inmueble = models.CharField(max_length=20, choices=Inmueble.Tipo_de_inmueble.choices, blank=True)
+    precio_min = models.DecimalField(max_digits=8, decimal_places=2, null=True, blank=True)
+    precio_max = models.DecimalField(max_digits=8, decimal_places=2, null=True, blank=True)
+    habitaciones = models.PositiveSmallIntegerField(null=True, blank=True)
+    banos = models.PositiveSmallIntegerField(null=True, blank=True)
+    activa = models.BooleanField(default=True)
+    creado = models.DateTimeField(auto_now_add=True)
+    actualizado = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['actualizado'], name='busquedaguardada_act_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.usuario} | {self.nombre or self.pk}"
+
+
+class AlertaBusqueda(models.Model):
+    """Un inmueble publicado que calzó con una búsqueda guardada"""
+    busqueda = models.ForeignKey(BusquedaGuardada, on_delete=models.CASCADE, related_name="alertas")
+    inmueble = models.ForeignKey(Inmueble, on_delete=models.CASCADE, related_name="+")
+    creado = models.DateTimeField(auto_now_add=True)
+    vista = models.BooleanField(default=False)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['busqueda', 'inmueble'], name='alertabusqueda_unica'),
+        ]
+
+
+class EventoPublicacion(models.Model):
+    """Cola de inmuebles recién publicados; la llena un trigger y la consume procesar_alertas"""
+    inmueble = models.ForeignKey(Inmueble, on_delete=models.CASCADE, related_name="+")
+    creado = models.DateTimeField(auto_now_add=True)
+
+
+class EstadisticaPrecioPendiente(models.Model):
+    """Grupos de EstadisticaPrecio por recalcular; los inserta un trigger sobre portal_inmueble"""
+    comuna_codigo = models.CharField(max_length=10)
+    tipo_inmueble = models.CharField(max_length=20)
+    habitaciones = models.PositiveSmallIntegerField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['comuna_codigo', 'tipo_inmueble', 'habitaciones'], name='estadisticapendiente_grupo_unico',
+            ),
+        ]
+
 # Señal para crear grupos y permisos automáticamente después de las migraciones
 @receiver(post_migrate)
 def crear_grupos_y_permisos(sender, **kwargs):
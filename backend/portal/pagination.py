@@ -0,0 +1,164 @@
+# backend/portal/pagination.py
+
+"""
+Paginación por cursor (keyset).
+
+En vez de OFFSET + COUNT(*), cada página se pide "a partir de" la última
+fila vista: ``WHERE (creado, id) < (cursor)`` con el mismo ORDER BY que el
+índice. Así la página 1000 cuesta lo mismo que la primera.
+"""
+
+import base64
+import json
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+# orden -> (campo, descendente); el desempate siempre es por id
+ORDENES = {
+    'recientes': ('creado', True),
+    'antiguos': ('creado', False),
+    'precio': ('precio_mensual', False),
+    'precio_desc': ('precio_mensual', True),
+    # anotación `rango` (ts_rank) de search.buscar_texto
+    'relevancia': ('rango', True),
+}
+ORDEN_POR_DEFECTO = 'recientes'
+
+
+class CursorInvalido(Exception):
+    pass
+
+
+def codificar_cursor(valores, hacia_atras=False):
+    raw = json.dumps([*valores, 1 if hacia_atras else 0], separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decodificar_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        datos = json.loads(raw)
+    except (ValueError, TypeError):
+        raise CursorInvalido(cursor)
+    # Siempre [valor, id, 0|1]: cualquier otra forma es un cursor alterado
+    if not isinstance(datos, list) or len(datos) != 3 or datos[2] not in (0, 1) or isinstance(datos[2], bool):
+        raise CursorInvalido(cursor)
+    *valores, hacia_atras = datos
+    return valores, bool(hacia_atras)
+
+
+class KeysetPage:
+    """Página compatible con lo que usan los templates (has_next, has_previous...)"""
+
+    es_keyset = True
+
+    def __init__(self, object_list, cursor_anterior, cursor_siguiente, parametros):
+        self.object_list = object_list
+        self.cursor_anterior = cursor_anterior
+        self.cursor_siguiente = cursor_siguiente
+        self._parametros = parametros
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self.cursor_siguiente is not None
+
+    def has_previous(self):
+        return self.cursor_anterior is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+    def _url(self, cursor):
+        parametros = self._parametros.copy()
+        parametros.pop('page', None)
+        parametros['cursor'] = cursor
+        return parametros.urlencode()
+
+    def url_siguiente(self):
+        return self._url(self.cursor_siguiente) if self.has_next() else ''
+
+    def url_anterior(self):
+        return self._url(self.cursor_anterior) if self.has_previous() else ''
+
+
+class KeysetPaginator:
+    """
+    Paginador por cursor sobre (campo, id). No ejecuta COUNT(*): pide
+    per_page + 1 filas para saber si hay página siguiente.
+    """
+
+    def __init__(self, queryset, per_page, orden=None):
+        self.queryset = queryset
+        self.per_page = per_page
+        anotaciones = queryset.query.annotations
+        if orden not in ORDENES or (ORDENES[orden][0] == 'rango' and 'rango' not in anotaciones):
+            # Con búsqueda de texto el orden natural es por relevancia
+            orden = 'relevancia' if 'rango' in anotaciones else ORDEN_POR_DEFECTO
+        self.orden = orden
+        self.campo, self.descendente = ORDENES[self.orden]
+        self._anotado = self.campo in anotaciones
+        if self._anotado:
+            self._field = anotaciones[self.campo].output_field
+        else:
+            self._field = queryset.model._meta.get_field(self.campo)
+
+    def _ordenar(self, queryset, invertir):
+        descendente = self.descendente != invertir
+        prefijo = '-' if descendente else ''
+        return queryset.order_by(f'{prefijo}{self.campo}', f'{prefijo}id'), descendente
+
+    def _despues_de(self, queryset, valor, pk, descendente):
+        # (campo, id) > / < (valor, pk); la primera condición deja al
+        # planificador hacer un range scan sobre el índice (campo, id)
+        if descendente:
+            return queryset.filter(
+                Q(**{f'{self.campo}__lte': valor}),
+                Q(**{f'{self.campo}__lt': valor}) | Q(**{self.campo: valor, 'id__lt': pk}),
+            )
+        return queryset.filter(
+            Q(**{f'{self.campo}__gte': valor}),
+            Q(**{f'{self.campo}__gt': valor}) | Q(**{self.campo: valor, 'id__gt': pk}),
+        )
+
+    def _clave(self, obj):
+        valor = getattr(obj, self.campo)
+        if self._anotado or valor is None:
+            return [valor, obj.pk]
+        return [self._field.value_to_string(obj), obj.pk]
+
+    def page(self, cursor=None, parametros=None):
+        hacia_atras = False
+        queryset = self.queryset
+        if cursor:
+            valores, hacia_atras = decodificar_cursor(cursor)
+            try:
+                if isinstance(valores[1], bool) or not isinstance(valores[1], int):
+                    raise TypeError(valores[1])
+                valor, pk = self._field.to_python(valores[0]), valores[1]
+            except (ValidationError, ValueError, TypeError, IndexError):
+                raise CursorInvalido(cursor)
+            queryset, descendente = self._ordenar(queryset, invertir=hacia_atras)
+            queryset = self._despues_de(queryset, valor, pk, descendente)
+        else:
+            queryset, _ = self._ordenar(queryset, invertir=False)
+
+        filas = list(queryset[:self.per_page + 1])
+        hay_mas = len(filas) > self.per_page
+        filas = filas[:self.per_page]
+        if hacia_atras:
+            filas.reverse()
+
+        cursor_siguiente = cursor_anterior = None
+        if filas:
+            if hay_mas or hacia_atras:
+                cursor_siguiente = codificar_cursor(self._clave(filas[-1]))
+            if cursor and (hay_mas or not hacia_atras):
+                cursor_anterior = codificar_cursor(self._clave(filas[0]), hacia_atras=True)
+
+        return KeysetPage(filas, cursor_anterior, cursor_siguiente, parametros)
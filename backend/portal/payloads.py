@@ -0,0 +1,117 @@
+# backend/portal/payloads.py
+
+"""
+Respuestas JSON pre-serializadas y pre-comprimidas.
+
+Los datos de regiones y comunas cambian quizás una vez al año, así que se
+serializan, comprimen (gzip y brotli) y se les calcula un ETag fuerte una
+sola vez por versión de los datos; cada petición sólo elige la variante y
+responde 304 si el cliente ya la tiene.
+"""
+
+import gzip
+import hashlib
+import json
+
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.cache import get_conditional_response, parse_etags, patch_vary_headers
+from django.utils.http import http_date
+
+try:
+    import brotli
+except ImportError:  # brotli es opcional: sin él se sirve gzip o identidad
+    brotli = None
+
+try:
+    import orjson
+except ImportError:  # orjson es opcional: sin él se usa json de la biblioteca estándar
+    orjson = None
+
+CACHE_CONTROL = 'public, max-age=86400, stale-while-revalidate=604800'
+
+
+def json_bytes(data):
+    """JSON compacto en UTF-8; con orjson si está instalado (varias veces más rápido)"""
+    if orjson is not None:
+        return orjson.dumps(data)
+    return json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def respuesta_json(request, data, last_modified=None, cache_control='public, max-age=60'):
+    """
+    Respuesta JSON con ETag fuerte del cuerpo (y Last-Modified si se da,
+    como datetime). Responde 304 según If-None-Match / If-Modified-Since.
+    """
+    cuerpo = json_bytes(data)
+    etag = f'"{hashlib.sha256(cuerpo).hexdigest()[:32]}"'
+    ultima = int(last_modified.timestamp()) if last_modified else None
+    response = get_conditional_response(request, etag=etag, last_modified=ultima)
+    if response is None:
+        response = HttpResponse(cuerpo, content_type='application/json')
+    response['ETag'] = etag
+    if ultima is not None:
+        response['Last-Modified'] = http_date(ultima)
+    response['Cache-Control'] = cache_control
+    return response
+
+
+class Payload:
+    """Un cuerpo JSON con sus variantes comprimidas y ETags por codificación"""
+
+    def __init__(self, data):
+        self.cuerpo = json_bytes(data)
+        digest = hashlib.sha256(self.cuerpo).hexdigest()[:32]
+        self.variantes = {None: (self.cuerpo, f'"{digest}"')}
+        self.variantes['gzip'] = (gzip.compress(self.cuerpo, 9, mtime=0), f'"{digest}-gz"')
+        if brotli is not None:
+            self.variantes['br'] = (brotli.compress(self.cuerpo, quality=11), f'"{digest}-br"')
+        self.etags = {etag for _, etag in self.variantes.values()}
+
+    def elegir(self, accept_encoding):
+        """Codificación preferida entre las que acepta el cliente"""
+        aceptadas = set()
+        for parte in accept_encoding.split(','):
+            nombre, _, parametros = parte.strip().partition(';')
+            if parametros.strip().replace(' ', '') in ('q=0', 'q=0.0'):
+                continue
+            aceptadas.add(nombre.strip().lower())
+        for codificacion in ('br', 'gzip'):
+            if codificacion in self.variantes and codificacion in aceptadas:
+                return codificacion
+        return None
+
+    def respuesta(self, request):
+        codificacion = self.elegir(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        cuerpo, etag = self.variantes[codificacion]
+
+        if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+        if if_none_match:
+            etags = parse_etags(if_none_match)
+            # Comparación débil (RFC 9110): W/"x" equivale a "x"
+            if '*' in etags or any(e.removeprefix('W/') in self.etags for e in etags):
+                response = HttpResponseNotModified()
+                response['ETag'] = etag
+                response['Cache-Control'] = CACHE_CONTROL
+                patch_vary_headers(response, ('Accept-Encoding',))
+                return response
+
+        response = HttpResponse(cuerpo, content_type='application/json')
+        if codificacion:
+            response['Content-Encoding'] = codificacion
+        response['ETag'] = etag
+        response['Cache-Control'] = CACHE_CONTROL
+        patch_vary_headers(response, ('Accept-Encoding',))
+        return response
+
+
+class PayloadsUbicaciones:
+    """Payloads de /api/regiones/ y /api/comunas/ (todas y por región) de una versión"""
+
+    def __init__(self, regiones, comunas_por_region):
+        self.regiones = Payload(regiones)
+        self.comunas = Payload([c for r in regiones for c in comunas_por_region.get(r['codigo'], [])])
+        self.por_region = {codigo: Payload(comunas) for codigo, comunas in comunas_por_region.items()}
+        self.vacio = Payload([])
+
+    def comunas_de(self, region_codigo):
+        return self.por_region.get(region_codigo, self.vacio)
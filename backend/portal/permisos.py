@@ -0,0 +1,106 @@
+# backend/portal/permisos.py
+
+"""
+Instantánea de autorización por usuario, cacheada entre requests.
+
+ModelBackend arma los permisos de un usuario con joins en cada request (y
+los mixins consultaban además sus grupos). Acá se calculan una vez, junto
+con los nombres de sus grupos y su tipo_usuario, y se guardan en la caché
+bajo ``portal:permisos:<pk>``. PerfilUsuario llena con ellos las cachés de
+ModelBackend en el objeto (_perm_cache, ...), así que has_perm, `perms` en
+las plantillas y PermisoRequeridoMixin no hacen consultas con la caché
+caliente.
+
+Invalidar: cambiar un usuario o sus grupos/permisos borra su instantánea;
+cambiar un grupo o sus permisos afecta a todos sus miembros, así que se
+cambia la versión global y todas quedan viejas (lo hacen las señales en
+models.py, al confirmar la transacción). TTL en
+PERMISOS['TTL'] por si algo cambia por SQL directo o una instantánea
+recalculada justo antes de confirmar un cambio queda guardada.
+"""
+
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+PREFIJO = 'portal:permisos'
+CLAVE_VERSION = f'{PREFIJO}:version'
+
+
+class Instantanea:
+    """Permisos ('app.codename'), grupos y tipo de usuario de un usuario"""
+    __slots__ = ('version', 'permisos_usuario', 'permisos_grupo', 'grupos', 'tipo_usuario')
+
+    def __init__(self, version, permisos_usuario, permisos_grupo, grupos, tipo_usuario):
+        self.version = version
+        self.permisos_usuario = frozenset(permisos_usuario)
+        self.permisos_grupo = frozenset(permisos_grupo)
+        self.grupos = frozenset(grupos)
+        self.tipo_usuario = tipo_usuario
+
+    @property
+    def permisos(self):
+        return self.permisos_usuario | self.permisos_grupo
+
+
+class PermisosUsuario:
+
+    @classmethod
+    def _clave(cls, pk):
+        return f'{PREFIJO}:{pk}'
+
+    @classmethod
+    def de(cls, user):
+        """
+        Instantánea de `user` (una por request: queda guardada en el objeto).
+        Con la caché caliente cuesta una lectura de caché y ninguna consulta.
+        """
+        instantanea = getattr(user, '_instantanea_permisos', None)
+        if instantanea is not None:
+            return instantanea
+
+        valores = cache.get_many([CLAVE_VERSION, cls._clave(user.pk)])
+        version = valores.get(CLAVE_VERSION)
+        if version is None:
+            version = time.time_ns()
+            if not cache.add(CLAVE_VERSION, version, None):
+                version = cache.get(CLAVE_VERSION, version)
+        instantanea = valores.get(cls._clave(user.pk))
+        if instantanea is None or instantanea.version != version:
+            instantanea = cls.construir(user, version)
+            cache.set(cls._clave(user.pk), instantanea, settings.PERMISOS['TTL'])
+
+        user._instantanea_permisos = instantanea
+        if user.is_active:
+            # Lo que ModelBackend habría calculado con consultas
+            user._user_perm_cache = set(instantanea.permisos_usuario)
+            user._group_perm_cache = set(instantanea.permisos_grupo)
+            user._perm_cache = set(instantanea.permisos)
+        return instantanea
+
+    @classmethod
+    def construir(cls, user, version):
+        # Importado acá: el módulo de backends necesita el modelo de usuario ya registrado
+        from django.contrib.auth.backends import ModelBackend
+
+        backend = ModelBackend()
+        # Sin las cachés del objeto, para leer el estado actual de la base
+        for atributo in ('_user_perm_cache', '_group_perm_cache', '_perm_cache'):
+            user.__dict__.pop(atributo, None)
+        return Instantanea(
+            version, backend.get_user_permissions(user), backend.get_group_permissions(user),
+            user.groups.values_list('name', flat=True), user.tipo_usuario,
+        )
+
+    @classmethod
+    def invalidar(cls, *pks):
+        """Borra la instantánea de esos usuarios (al confirmar la transacción en curso)"""
+        claves = [cls._clave(pk) for pk in pks]
+        transaction.on_commit(lambda: cache.delete_many(claves))
+
+    @classmethod
+    def invalidar_todos(cls):
+        """Deja viejas todas las instantáneas (p. ej. cambió un grupo o sus permisos)"""
+        transaction.on_commit(lambda: cache.set(CLAVE_VERSION, time.time_ns(), None))
@@ -0,0 +1,333 @@
+# backend/portal/recomendaciones.py
+
+"""
+Recomendaciones de "propiedades similares" con NumPy.
+
+Cada proceso mantiene en memoria una matriz de características de los
+inmuebles publicados, separada por región (las recomendaciones nunca
+cruzan de región). Por fila:
+
+- precio_mensual, m2_construidos y m2_totales en escala logarítmica, y
+  habitaciones, baños y estacionamientos tal cual; se normalizan por la
+  desviación estándar global al consultar, con sumas que se mantienen
+  incrementalmente.
+- tipo_inmueble y comuna como códigos enteros. Para la distancia equivalen
+  a un one-hot (dos one-hot distintos están a distancia² 2), pero sin
+  guardar cientos de columnas casi vacías por fila.
+
+Los k vecinos más cercanos salen de una sola pasada vectorizada sobre la
+región (distancias + argpartition). Publicar, despublicar, editar o borrar
+un inmueble actualiza la matriz en el lugar (señales en models.py); los
+cambios hechos por otros procesos se recogen cada
+RECOMENDACIONES['SINCRONIZAR'] segundos consultando `actualizado` (con
+índice). Un borrado en otro proceso no deja rastro en `actualizado`: esos
+ids se quitan de la matriz cuando una consulta ya no los encuentra.
+
+La matriz se construye en un hilo aparte la primera vez que se pide; hasta
+que está lista no hay recomendaciones (el request no espera).
+"""
+
+import logging
+import threading
+import time
+from datetime import timedelta
+
+import numpy as np
+from django.conf import settings
+from django.db import connection
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+NUMERICOS = ['precio_mensual', 'm2_construidos', 'm2_totales', 'habitaciones', 'banos', 'estacionamientos']
+LOGARITMICOS = {'precio_mensual', 'm2_construidos', 'm2_totales'}
+# Peso de cada característica en la distancia (tras normalizar)
+PESOS = np.array([3.0, 1.5, 0.5, 1.0, 0.7, 0.3])
+PESO_TIPO = 2.0
+PESO_COMUNA = 1.0
+COLUMNAS = ['id', 'region_codigo', 'comuna_codigo', 'tipo_inmueble', *NUMERICOS]
+# Las filas se vuelven a leer con este margen: una transacción que confirma
+# tarde puede traer un `actualizado` anterior a la última sincronización
+MARGEN_SINCRONIZACION = timedelta(seconds=5)
+
+
+def caracteristicas(fila):
+    """Vector numérico de una fila (valores en el orden de NUMERICOS)"""
+    return [
+        np.log1p(max(float(v or 0), 0.0)) if nombre in LOGARITMICOS else float(v or 0)
+        for nombre, v in zip(NUMERICOS, fila)
+    ]
+
+
+class BloqueRegion:
+    """
+    Filas de una región en arreglos con capacidad que crece al doble. Las
+    características van por columna (una fila de `x` por característica):
+    la distancia se acumula columna a columna sobre memoria contigua.
+    """
+
+    def __init__(self, capacidad=64):
+        self.n = 0
+        self.ids = np.zeros(capacidad, dtype=np.int64)
+        self.x = np.zeros((len(NUMERICOS), capacidad), dtype=np.float32)
+        self.tipo = np.zeros(capacidad, dtype=np.int16)
+        self.comuna = np.zeros(capacidad, dtype=np.int32)
+
+    @classmethod
+    def desde_arreglos(cls, ids, x, tipo, comuna):
+        bloque = cls(capacidad=max(64, len(ids)))
+        bloque.n = len(ids)
+        bloque.ids[:bloque.n] = ids
+        bloque.x[:, :bloque.n] = x.T
+        bloque.tipo[:bloque.n] = tipo
+        bloque.comuna[:bloque.n] = comuna
+        return bloque
+
+    def _crecer(self):
+        capacidad = len(self.ids) * 2
+        for nombre in ('ids', 'x', 'tipo', 'comuna'):
+            viejo = getattr(self, nombre)
+            nuevo = np.zeros((*viejo.shape[:-1], capacidad), dtype=viejo.dtype)
+            nuevo[..., :self.n] = viejo[..., :self.n]
+            setattr(self, nombre, nuevo)
+
+    def agregar(self, pk, x, tipo, comuna):
+        if self.n == len(self.ids):
+            self._crecer()
+        i = self.n
+        self.ids[i], self.x[:, i], self.tipo[i], self.comuna[i] = pk, x, tipo, comuna
+        self.n += 1
+        return i
+
+    def quitar(self, i):
+        """Quita la fila i moviendo la última a su lugar; devuelve el id movido o None"""
+        ultimo = self.n - 1
+        movido = None
+        if i != ultimo:
+            self.ids[i], self.x[:, i] = self.ids[ultimo], self.x[:, ultimo]
+            self.tipo[i], self.comuna[i] = self.tipo[ultimo], self.comuna[ultimo]
+            movido = int(self.ids[i])
+        self.n = ultimo
+        return movido
+
+
+class MatrizSimilares:
+    """Índice de vecinos por región; seguro para usar desde varios hilos"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.bloques = {}   # region_codigo -> BloqueRegion
+        self.posicion = {}  # id -> (region_codigo, fila)
+        self.tipos = {}     # tipo_inmueble -> código
+        self.comunas = {}   # comuna_codigo -> código
+        self.suma = np.zeros(len(NUMERICOS))
+        self.suma_cuadrados = np.zeros(len(NUMERICOS))
+        self.marca = None   # desde qué `actualizado` falta sincronizar
+        self.sincronizado = 0.0
+
+    def __len__(self):
+        return len(self.posicion)
+
+    def _codigo(self, tabla, valor):
+        return tabla.setdefault(valor, len(tabla))
+
+    # --- construcción y cambios -------------------------------------------
+
+    @classmethod
+    def desde_filas(cls, filas):
+        """Construye la matriz desde tuplas en el orden de COLUMNAS"""
+        matriz = cls()
+        por_region = {}
+        for pk, region, comuna, tipo, *numericos in filas:
+            if not region:
+                continue
+            grupo = por_region.setdefault(region, ([], [], [], []))
+            grupo[0].append(pk)
+            grupo[1].append(caracteristicas(numericos))
+            grupo[2].append(matriz._codigo(matriz.tipos, tipo))
+            grupo[3].append(matriz._codigo(matriz.comunas, comuna))
+        for region, (ids, x, tipo, comuna) in por_region.items():
+            x = np.asarray(x, dtype=np.float64).reshape(-1, len(NUMERICOS))
+            matriz.bloques[region] = BloqueRegion.desde_arreglos(ids, x, tipo, comuna)
+            matriz.suma += x.sum(axis=0)
+            matriz.suma_cuadrados += (x ** 2).sum(axis=0)
+            matriz.posicion.update((pk, (region, i)) for i, pk in enumerate(ids))
+        return matriz
+
+    def _quitar(self, pk):
+        region, i = self.posicion.pop(pk)
+        bloque = self.bloques[region]
+        x = bloque.x[:, i].astype(np.float64)
+        self.suma -= x
+        self.suma_cuadrados -= x ** 2
+        movido = bloque.quitar(i)
+        if movido is not None:
+            self.posicion[movido] = (region, i)
+
+    def quitar(self, pk):
+        with self._lock:
+            if pk in self.posicion:
+                self._quitar(pk)
+
+    def actualizar(self, inmueble):
+        """Agrega, reemplaza o quita un inmueble según si está publicado"""
+        with self._lock:
+            if inmueble.pk in self.posicion:
+                self._quitar(inmueble.pk)
+            if inmueble.esta_publicado and inmueble.region_codigo:
+                x = caracteristicas([getattr(inmueble, nombre) for nombre in NUMERICOS])
+                bloque = self.bloques.setdefault(inmueble.region_codigo, BloqueRegion())
+                i = bloque.agregar(
+                    inmueble.pk, x,
+                    self._codigo(self.tipos, inmueble.tipo_inmueble),
+                    self._codigo(self.comunas, inmueble.comuna_codigo),
+                )
+                self.posicion[inmueble.pk] = (inmueble.region_codigo, i)
+                # Las sumas se llevan con el valor guardado (float32), igual que al quitar
+                x = bloque.x[:, i].astype(np.float64)
+                self.suma += x
+                self.suma_cuadrados += x ** 2
+
+    # --- consultas ----------------------------------------------------------
+
+    def _escala(self):
+        """Peso / varianza por característica (normalización z sin restar la media)"""
+        n = max(len(self.posicion), 1)
+        varianza = np.maximum(self.suma_cuadrados / n - (self.suma / n) ** 2, 1e-6)
+        return (PESOS / varianza).astype(np.float32)
+
+    def similares(self, pk, k=6):
+        """Ids de los k inmuebles más parecidos a `pk` en su región, del más cercano al más lejano"""
+        with self._lock:
+            if pk not in self.posicion:
+                return []
+            region, i = self.posicion[pk]
+            bloque = self.bloques[region]
+            n = bloque.n
+            k = min(k, n - 1)
+            if k <= 0:
+                return []
+            # Una pasada por columna, con operaciones en el lugar sobre float32
+            distancias = np.zeros(n, dtype=np.float32)
+            temporal = np.empty(n, dtype=np.float32)
+            for columna, escala in zip(bloque.x, self._escala()):
+                np.subtract(columna[:n], columna[i], out=temporal)
+                np.square(temporal, out=temporal)
+                temporal *= escala
+                distancias += temporal
+            distancias += np.where(bloque.tipo[:n] != bloque.tipo[i], np.float32(2 * PESO_TIPO), np.float32(0))
+            distancias += np.where(bloque.comuna[:n] != bloque.comuna[i], np.float32(2 * PESO_COMUNA), np.float32(0))
+            distancias[i] = np.inf
+            candidatos = np.argpartition(distancias, k - 1)[:k]
+            orden = candidatos[np.argsort(distancias[candidatos], kind='stable')]
+            return bloque.ids[orden].tolist()
+
+
+class Similares:
+    """Matriz del proceso: se construye en segundo plano en el primer uso y se mantiene al día"""
+
+    _matriz = None
+    _construyendo = False
+    _lock = threading.Lock()
+
+    @classmethod
+    def matriz(cls):
+        """La matriz al día, o None mientras se construye (el primer llamado la encarga)"""
+        if cls._matriz is None:
+            cls.encargar()
+            return None
+        cls.sincronizar()
+        return cls._matriz
+
+    @classmethod
+    def encargar(cls):
+        """Construye la matriz en un hilo aparte, si no existe ni se está construyendo"""
+        with cls._lock:
+            if cls._matriz is not None or cls._construyendo:
+                return
+            cls._construyendo = True
+        threading.Thread(target=cls._construir_en_segundo_plano, name='similares', daemon=True).start()
+
+    @classmethod
+    def _construir_en_segundo_plano(cls):
+        try:
+            matriz = cls.construir()
+            with cls._lock:
+                cls._matriz = matriz
+        except Exception:
+            logger.exception("Similar-listings matrix build failed (Falló la construcción de la matriz de similares)")
+        finally:
+            with cls._lock:
+                cls._construyendo = False
+            # El hilo tiene su propia conexión
+            connection.close()
+
+    @classmethod
+    def construir(cls):
+        from .models import Inmueble
+
+        inicio = time.perf_counter()
+        consulta = Inmueble.publicados().order_by().values_list(*COLUMNAS)
+        marca = timezone.now() - MARGEN_SINCRONIZACION
+        matriz = MatrizSimilares.desde_filas(consulta.iterator(chunk_size=5000))
+        matriz.marca = marca
+        matriz.sincronizado = time.monotonic()
+        logger.info(
+            f"Similar-listings matrix built (Matriz de similares construida): "
+            f"{len(matriz)} inmuebles en {time.perf_counter() - inicio:.2f} s"
+        )
+        return matriz
+
+    @classmethod
+    def sincronizar(cls):
+        """Aplica los cambios de otros procesos (inmuebles con `actualizado` posterior a la marca)"""
+        from .models import Inmueble
+
+        matriz = cls._matriz
+        intervalo = settings.RECOMENDACIONES['SINCRONIZAR']
+        if matriz is None or time.monotonic() - matriz.sincronizado < intervalo:
+            return
+        matriz.sincronizado = time.monotonic()
+        desde, matriz.marca = matriz.marca, timezone.now() - MARGEN_SINCRONIZACION
+        cambiados = Inmueble.objects.filter(actualizado__gt=desde).only(
+            'id', 'esta_publicado', 'actualizado', *COLUMNAS[1:],
+        )
+        for inmueble in cambiados:
+            matriz.actualizar(inmueble)
+
+    @classmethod
+    def al_guardar(cls, inmueble):
+        if cls._matriz is not None:
+            cls._matriz.actualizar(inmueble)
+
+    @classmethod
+    def al_borrar(cls, pk):
+        if cls._matriz is not None:
+            cls._matriz.quitar(pk)
+
+    @classmethod
+    def para(cls, inmueble, k=None):
+        """Inmuebles publicados similares a `inmueble`, con su portada, en orden de similitud"""
+        from .models import Inmueble
+
+        k = k or settings.RECOMENDACIONES['K']
+        matriz = cls.matriz()
+        if matriz is None:
+            return []
+        while True:
+            # Un par extra por si alguno ya no está publicado y este proceso aún no lo sabe
+            ids = matriz.similares(inmueble.pk, k + 2)
+            if not ids:
+                return []
+            encontrados = Inmueble.publicados().select_related('portada').in_bulk(ids)
+            faltantes = [pk for pk in ids if pk not in encontrados]
+            # Borrados o despublicados en otro proceso: fuera de la matriz
+            for pk in faltantes:
+                matriz.quitar(pk)
+            if len(encontrados) >= k or not faltantes:
+                return [encontrados[pk] for pk in ids if pk in encontrados][:k]
+
+    @classmethod
+    def reiniciar(cls):
+        with cls._lock:
+            cls._matriz = None
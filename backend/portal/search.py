@@ -0,0 +1,138 @@
+# backend/portal/search.py
+
+"""
+Búsqueda facetada de inmuebles publicados.
+
+Los filtros se traducen a condiciones que calzan con los índices parciales
+de Inmueble (``WHERE esta_publicado``) y las facetas se calculan con una
+sola consulta agrupada, no una por faceta. El texto libre (``q``) usa el
+tsvector ``Inmueble.busqueda`` (índice GIN) y se ordena por ts_rank.
+"""
+
+from decimal import Decimal
+
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db.models import Case, CharField, Count, F, FloatField, Value, When
+from django.db.models.functions import Cast
+
+from .models import Inmueble
+
+# (clave, etiqueta, mínimo, máximo) en pesos; máximo None = sin tope
+RANGOS_PRECIO = [
+    ('hasta_300', 'Hasta $300.000', None, Decimal('300000')),
+    ('300_500', '$300.000 - $500.000', Decimal('300000'), Decimal('500000')),
+    ('500_800', '$500.000 - $800.000', Decimal('500000'), Decimal('800000')),
+    ('desde_800', 'Más de $800.000', Decimal('800000'), None),
+]
+
+# Configuración de texto creada en la migración 0010 (español + unaccent)
+CONFIG_BUSQUEDA = 'spanish_unaccent'
+
+# parámetro del formulario -> lookup del ORM
+FILTROS = {
+    'comuna_codigo': 'comuna_codigo',
+    'region_codigo': 'region_codigo',
+    'tipo_inmueble': 'tipo_inmueble',
+    'precio_min': 'precio_mensual__gte',
+    'precio_max': 'precio_mensual__lte',
+    'habitaciones': 'habitaciones__gte',
+    'banos': 'banos__gte',
+    'estacionamientos': 'estacionamientos__gte',
+    'm2_construidos_min': 'm2_construidos__gte',
+    'm2_construidos_max': 'm2_construidos__lte',
+    'm2_totales_min': 'm2_totales__gte',
+    'm2_totales_max': 'm2_totales__lte',
+}
+
+
+def hay_filtros(cleaned_data):
+    return any(cleaned_data.get(campo) not in (None, '') for campo in [*FILTROS, 'rango_precio', 'q'])
+
+
+def filtrar_inmuebles(queryset, cleaned_data):
+    """Aplica los filtros de BusquedaInmuebleForm (ya validados) al queryset"""
+    condiciones = {
+        lookup: cleaned_data[campo]
+        for campo, lookup in FILTROS.items()
+        if cleaned_data.get(campo) not in (None, '')
+    }
+    for clave, _, minimo, maximo in RANGOS_PRECIO:
+        if cleaned_data.get('rango_precio') == clave:
+            if minimo is not None:
+                condiciones['precio_mensual__gte'] = max(minimo, condiciones.get('precio_mensual__gte', minimo))
+            if maximo is not None:
+                condiciones['precio_mensual__lt'] = maximo
+    queryset = queryset.filter(**condiciones)
+    if cleaned_data.get('q'):
+        queryset = buscar_texto(queryset, cleaned_data['q'])
+    return queryset
+
+
+def buscar_texto(queryset, texto):
+    """
+    Filtra por coincidencia con el tsvector (usa el índice GIN) y anota
+    `rango` con ts_rank para ordenar por relevancia (orden 'relevancia').
+    """
+    consulta = SearchQuery(texto, search_type='websearch', config=CONFIG_BUSQUEDA)
+    # ts_rank devuelve real; como double el valor sobrevive intacto en el cursor
+    rango = Cast(SearchRank(F('busqueda'), consulta), FloatField())
+    return queryset.filter(busqueda=consulta).annotate(rango=rango)
+
+
+def _rango_precio():
+    casos = []
+    for clave, _, minimo, maximo in RANGOS_PRECIO:
+        condicion = {}
+        if minimo is not None:
+            condicion['precio_mensual__gte'] = minimo
+        if maximo is not None:
+            condicion['precio_mensual__lt'] = maximo
+        casos.append(When(**condicion, then=Value(clave)))
+    return Case(*casos, output_field=CharField())
+
+
+def facetas(queryset):
+    """
+    Conteos por comuna, región, tipo, habitaciones y rango de precio del
+    resultado, con una única consulta GROUP BY sobre todas las dimensiones
+    que luego se suma en Python.
+    """
+    grupos = (
+        queryset.order_by()
+        .annotate(rango_precio=_rango_precio())
+        .values(
+            'comuna_codigo', 'comuna_nombre', 'region_codigo', 'region_nombre',
+            'tipo_inmueble', 'habitaciones', 'rango_precio',
+        )
+        .annotate(total=Count('id'))
+    )
+
+    comunas, regiones, tipos, habitaciones, precios = {}, {}, {}, {}, {}
+    for g in grupos:
+        n = g['total']
+        if g['comuna_codigo']:
+            comuna = comunas.setdefault(g['comuna_codigo'], {'codigo': g['comuna_codigo'], 'nombre': g['comuna_nombre'], 'total': 0})
+            comuna['total'] += n
+        if g['region_codigo']:
+            region = regiones.setdefault(g['region_codigo'], {'codigo': g['region_codigo'], 'nombre': g['region_nombre'], 'total': 0})
+            region['total'] += n
+        tipos[g['tipo_inmueble']] = tipos.get(g['tipo_inmueble'], 0) + n
+        habitaciones[g['habitaciones']] = habitaciones.get(g['habitaciones'], 0) + n
+        precios[g['rango_precio']] = precios.get(g['rango_precio'], 0) + n
+
+    etiquetas_tipo = dict(Inmueble.Tipo_de_inmueble.choices)
+    return {
+        'comuna': sorted(comunas.values(), key=lambda c: -c['total']),
+        'region': sorted(regiones.values(), key=lambda r: -r['total']),
+        'tipo_inmueble': [
+            {'valor': valor, 'nombre': str(etiquetas_tipo.get(valor, valor)), 'total': total}
+            for valor, total in sorted(tipos.items(), key=lambda t: -t[1])
+        ],
+        'habitaciones': [
+            {'valor': valor, 'total': total} for valor, total in sorted(habitaciones.items())
+        ],
+        'rango_precio': [
+            {'valor': clave, 'nombre': etiqueta, 'total': precios[clave]}
+            for clave, etiqueta, _, _ in RANGOS_PRECIO if clave in precios
+        ],
+    }
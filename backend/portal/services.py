@@ -3,41 +3,226 @@
 import requests
 from django.conf import settings
 import logging
+import threading
+import time
+from asgiref.sync import sync_to_async
+from .gazetteer import GazetteerStore
+from .http_client import cliente_dpa
+from .payloads import PayloadsUbicaciones
+from .singleflight import SingleFlight
+from .models import Region, Comuna
 
 logger = logging.getLogger(__name__)
 
+class IndiceUbicaciones:
+    """
+    Índice en memoria del proceso, indexado por código DPA, para los
+    formularios: choices ya armados y resolución código -> nombre sin I/O.
+    """
+
+    def __init__(self, regiones, comunas_por_region):
+        self.regiones = {r['codigo']: r['nombre'] for r in regiones}
+        self.comunas = {}
+        self.comunas_choices = {}
+        for codigo_region, comunas in comunas_por_region.items():
+            self.comunas_choices[codigo_region] = tuple((c['codigo'], c['nombre']) for c in comunas)
+            for c in comunas:
+                self.comunas[c['codigo']] = (c['nombre'], codigo_region)
+        self.regiones_choices = tuple((r['codigo'], r['nombre']) for r in regiones)
+
+    def nombre_region(self, codigo):
+        return self.regiones.get(codigo)
+
+    def nombre_comuna(self, codigo):
+        comuna = self.comunas.get(codigo)
+        return comuna[0] if comuna else None
+
+    def region_de_comuna(self, codigo):
+        comuna = self.comunas.get(codigo)
+        return comuna[1] if comuna else None
+
+
 class ChileanLocationService:
     BASE_URL = "https://apis.digital.gob.cl/dpa"
-    
+
+    _store = None
+    _vuelos = SingleFlight()
+    _indice = None
+    _payloads = None
+    _indice_clave = None
+    _indice_lock = threading.Lock()
+    # En modo 'db' el índice se reconstruye cada este número de segundos
+    intervalo_indice_db = 300
+
+    @classmethod
+    def store(cls):
+        """Snapshot DPA compartido (mmap) del proceso"""
+        if cls._store is None:
+            cls._store = GazetteerStore(
+                path=settings.DPA_SNAPSHOT_PATH,
+                ttl=settings.DPA_SNAPSHOT_TTL,
+                fetch=cls.fetch_gazetteer,
+            )
+        return cls._store
+
+    @classmethod
+    def snapshot(cls):
+        return cls.store().get()
+
+    @classmethod
+    async def asnapshot(cls):
+        return await cls.store().aget()
+
+    @classmethod
+    def usa_base_de_datos(cls):
+        """True si las ubicaciones se leen de las tablas Region/Comuna (sync_dpa)"""
+        return settings.DPA_LOCATION_BACKEND == 'db'
+
     @classmethod
     def get_regiones(cls):
-        """Obtener todas las regiones de Chile desde API externa"""
-        try:
-            response = requests.get(f"{cls.BASE_URL}/regiones", timeout=10)
-            response.raise_for_status()
-            return response.json()
-        except requests.RequestException as e:
-            logger.error(f"Error fetching regions (Error al obtener regiones): {e}")
-            return []
-    
+        """Obtener todas las regiones de Chile desde el snapshot local"""
+        if cls.usa_base_de_datos():
+            return cls._regiones_db(Region.objects.all())
+        snapshot = cls.snapshot()
+        return snapshot.regiones() if snapshot else []
+
     @classmethod
     def get_comunas_by_region(cls, region_code):
         """Obtener comunas de una región específica"""
-        try:
-            response = requests.get(f"{cls.BASE_URL}/regiones/{region_code}/comunas", timeout=10)
-            response.raise_for_status()
-            return response.json()
-        except requests.RequestException as e:
-            logger.error(f"Error fetching communes for region (Error al obtener las comunas para la región) {region_code}: {e}")
-            return []
-    
+        if cls.usa_base_de_datos():
+            return cls._comunas_db(Comuna.objects.filter(region__codigo=region_code))
+        snapshot = cls.snapshot()
+        return snapshot.comunas(region_code) if snapshot else []
+
     @classmethod
     def get_all_comunas(cls):
         """Obtener todas las comunas de Chile"""
+        if cls.usa_base_de_datos():
+            return cls._comunas_db(Comuna.objects.all())
+        snapshot = cls.snapshot()
+        return snapshot.todas_las_comunas() if snapshot else []
+
+    @classmethod
+    def get_region(cls, region_code):
+        """Obtener una región por su código DPA (o None)"""
+        if cls.usa_base_de_datos():
+            regiones = cls._regiones_db(Region.objects.filter(codigo=region_code))
+            return regiones[0] if regiones else None
+        snapshot = cls.snapshot()
+        return snapshot.region(region_code) if snapshot else None
+
+    @classmethod
+    def get_comuna(cls, comuna_code):
+        """Obtener una comuna por su código DPA (o None)"""
+        if cls.usa_base_de_datos():
+            comunas = cls._comunas_db(Comuna.objects.filter(codigo=comuna_code))
+            return comunas[0] if comunas else None
+        snapshot = cls.snapshot()
+        return snapshot.comuna(comuna_code) if snapshot else None
+
+    @classmethod
+    async def aget_regiones(cls):
+        """Versión async de get_regiones (coalesce la descarga en frío)"""
+        if cls.usa_base_de_datos():
+            return await sync_to_async(cls.get_regiones)()
+        snapshot = await cls.asnapshot()
+        return snapshot.regiones() if snapshot else []
+
+    @classmethod
+    async def aget_comunas_by_region(cls, region_code):
+        """Versión async de get_comunas_by_region"""
+        if cls.usa_base_de_datos():
+            return await sync_to_async(cls.get_comunas_by_region)(region_code)
+        snapshot = await cls.asnapshot()
+        return snapshot.comunas(region_code) if snapshot else []
+
+    @classmethod
+    async def aget_all_comunas(cls):
+        """Versión async de get_all_comunas"""
+        if cls.usa_base_de_datos():
+            return await sync_to_async(cls.get_all_comunas)()
+        snapshot = await cls.asnapshot()
+        return snapshot.todas_las_comunas() if snapshot else []
+
+    @classmethod
+    def version_datos(cls):
+        """Identifica la versión vigente de los datos (snapshot nuevo o intervalo en modo 'db')"""
+        if cls.usa_base_de_datos():
+            return ('db', int(time.monotonic() // cls.intervalo_indice_db))
+        snapshot = cls.snapshot()
+        return ('snapshot', snapshot.firma if snapshot else None)
+
+    @classmethod
+    def _actualizar_derivados(cls):
+        """
+        Reconstruye el índice y los payloads JSON una sola vez por versión
+        de los datos; mientras la versión no cambie se reutilizan.
+        """
+        clave = cls.version_datos()
+        if cls._indice is None or cls._indice_clave != clave:
+            with cls._indice_lock:
+                if cls._indice is None or cls._indice_clave != clave:
+                    regiones = cls.get_regiones()
+                    comunas_por_region = {
+                        r['codigo']: cls.get_comunas_by_region(r['codigo']) for r in regiones
+                    }
+                    cls._indice = IndiceUbicaciones(regiones, comunas_por_region)
+                    cls._payloads = PayloadsUbicaciones(regiones, comunas_por_region)
+                    cls._indice_clave = clave
+
+    @classmethod
+    def indice(cls):
+        """Índice de ubicaciones del proceso, indexado por código DPA"""
+        cls._actualizar_derivados()
+        return cls._indice
+
+    @classmethod
+    def payloads(cls):
+        """Respuestas JSON pre-serializadas y comprimidas para la API de ubicaciones"""
+        cls._actualizar_derivados()
+        return cls._payloads
+
+    # Mismas claves que el snapshot; las tablas no guardan coordenadas ni la
+    # provincia (codigo_padre de una comuna), así que van nulas
+    @staticmethod
+    def _regiones_db(queryset):
+        filas = queryset.exclude(codigo=None).order_by('codigo').values_list('codigo', 'nombre')
+        return [
+            {'codigo': codigo, 'tipo': 'region', 'nombre': nombre, 'lat': None, 'lng': None, 'codigo_padre': '00'}
+            for codigo, nombre in filas
+        ]
+
+    @staticmethod
+    def _comunas_db(queryset):
+        filas = (
+            queryset.exclude(codigo=None)
+            .order_by('region__codigo', 'codigo')
+            .values_list('codigo', 'nombre')
+        )
+        return [
+            {'codigo': codigo, 'tipo': 'comuna', 'nombre': nombre, 'lat': None, 'lng': None, 'codigo_padre': None}
+            for codigo, nombre in filas
+        ]
+
+    @classmethod
+    def fetch_gazetteer(cls):
+        """Descargar regiones y comunas desde la API externa para el snapshot"""
         try:
-            response = requests.get(f"{cls.BASE_URL}/comunas", timeout=15)
+            regiones = cls._get_json(f"{cls.BASE_URL}/regiones", 'regiones')
+            comunas_por_region = {
+                region['codigo']: cls._get_json(f"{cls.BASE_URL}/regiones/{region['codigo']}/comunas", 'comunas')
+                for region in regiones
+            }
+        except requests.RequestException as e:
+            logger.error(f"Error fetching DPA data (Error al obtener datos DPA): {e}")
+            raise
+        return regiones, comunas_por_region
+
+    @classmethod
+    def _get_json(cls, url, endpoint):
+        """GET a la API DPA; peticiones concurrentes a la misma URL comparten una sola llamada"""
+        def obtener():
+            response = cliente_dpa().get(url, endpoint=endpoint)
             response.raise_for_status()
             return response.json()
-        except requests.RequestException as e:
-            logger.error(f"Error fetching all communes (Error al obtener todas las comunas): {e}")
-            return []
\ No newline at end of file
+        return cls._vuelos.do(url, obtener)
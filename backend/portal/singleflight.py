@@ -0,0 +1,59 @@
+# backend/portal/singleflight.py
+
+"""
+Coalescencia de llamadas concurrentes ("single-flight").
+
+Si varias peticiones piden la misma clave mientras ya hay una búsqueda en
+curso, esperan ese mismo resultado en vez de lanzar otra. Sirve igual para
+hilos (workers WSGI) y para tareas asyncio (vistas async / ASGI): ambos
+esperan sobre el mismo ``concurrent.futures.Future``.
+"""
+
+import asyncio
+import threading
+from concurrent.futures import Future
+
+
+class SingleFlight:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._en_vuelo = {}
+
+    def _unirse(self, clave):
+        """Devuelve (future, es_lider) para la clave"""
+        with self._lock:
+            future = self._en_vuelo.get(clave)
+            if future is not None:
+                return future, False
+            future = Future()
+            self._en_vuelo[clave] = future
+            return future, True
+
+    def _ejecutar(self, clave, future, funcion):
+        try:
+            future.set_result(funcion())
+        except BaseException as e:
+            future.set_exception(e)
+        finally:
+            with self._lock:
+                self._en_vuelo.pop(clave, None)
+
+    def do(self, clave, funcion):
+        """Ejecuta `funcion` una sola vez por clave entre los hilos concurrentes"""
+        future, lider = self._unirse(clave)
+        if lider:
+            self._ejecutar(clave, future, funcion)
+        return future.result()
+
+    async def do_async(self, clave, funcion):
+        """Igual que `do`, pero sin bloquear el event loop (funcion es bloqueante)"""
+        future, lider = self._unirse(clave)
+        if lider:
+            loop = asyncio.get_running_loop()
+            loop.run_in_executor(None, self._ejecutar, clave, future, funcion)
+        return await asyncio.wrap_future(future)
+
+    def en_vuelo(self):
+        with self._lock:
+            return len(self._en_vuelo)
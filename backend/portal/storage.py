@@ -0,0 +1,179 @@
+# backend/portal/storage.py
+
+"""
+Almacenamiento de media direccionado por contenido.
+
+Cada archivo se guarda como contenido/ab/cd/<sha256>.<ext>, sin importar
+el upload_to ni el nombre con que se subió: dos subidas iguales terminan en
+el mismo archivo, y como el nombre cambia si cambia el contenido, las URLs
+se pueden cachear para siempre (ver servir_media en views.py).
+
+ArchivoContenido lleva cuántas referencias tiene cada archivo: `save()`
+suma una y `delete()` resta una; el archivo se borra del disco al llegar a
+cero. Sumar/restar y escribir/borrar el archivo ocurren con la fila
+bloqueada, así una subida igual que llega mientras se borra la última
+referencia no queda apuntando a un archivo eliminado.
+
+Los ImageField no cambian: es el storage por defecto (STORAGES en
+settings). Los archivos anteriores se migran con ``manage.py rehash_media``.
+"""
+
+import hashlib
+import os
+import re
+import tempfile
+from collections import Counter
+
+from django.core.files.storage import FileSystemStorage
+from django.db import connection, transaction
+
+CARPETA = 'contenido'
+PATRON = re.compile(rf'^{CARPETA}/[0-9a-f]{{2}}/[0-9a-f]{{2}}/[0-9a-f]{{64}}(\.[a-z0-9]+)?$')
+
+# Ordenado por ruta: dos lotes simultáneos bloquean las filas en el mismo orden
+SQL_SUMAR = """
+INSERT INTO portal_archivocontenido (ruta, referencias, tamano, creado)
+SELECT ruta, referencias, tamano, now()
+FROM unnest(%s::varchar[], %s::int[], %s::bigint[]) AS t (ruta, referencias, tamano)
+ORDER BY ruta
+ON CONFLICT (ruta) DO UPDATE SET referencias = portal_archivocontenido.referencias + EXCLUDED.referencias
+"""
+SQL_RESTAR = """
+UPDATE portal_archivocontenido SET referencias = referencias - 1 WHERE ruta = %s RETURNING referencias
+"""
+
+
+def ruta_contenido(digest, extension=''):
+    return f'{CARPETA}/{digest[:2]}/{digest[2:4]}/{digest}{extension}'
+
+
+def es_contenido(nombre):
+    """Si `nombre` es una ruta direccionada por contenido (inmutable)"""
+    return bool(nombre) and PATRON.match(nombre) is not None
+
+
+class AlmacenamientoContenido(FileSystemStorage):
+
+    def get_available_name(self, name, max_length=None):
+        # El nombre definitivo sale del contenido en _save; no hay colisiones que evitar
+        return name
+
+    def carpeta_temporal(self):
+        carpeta = self.path(os.path.join(CARPETA, 'tmp'))
+        os.makedirs(carpeta, exist_ok=True)
+        return carpeta
+
+    def _save(self, name, content):
+        return self.guardar_varios([(name, content)])[0]
+
+    def guardar_varios(self, archivos):
+        """
+        save() de varios (nombre, contenido) con una sola consulta para las
+        referencias; devuelve los nombres definitivos en el mismo orden.
+        """
+        preparados = [self._preparar(nombre, contenido) for nombre, contenido in archivos]
+        try:
+            self.sumar_referencias([(nombre, tamano, origen, 1) for nombre, tamano, origen, _ in preparados])
+        finally:
+            for _, _, origen, propio in preparados:
+                if propio and os.path.exists(origen):
+                    os.remove(origen)
+        return [nombre for nombre, _, _, _ in preparados]
+
+    def _preparar(self, name, content):
+        """(nombre por contenido, tamaño, archivo en disco a mover, si ese archivo es un temporal propio)"""
+        extension = os.path.splitext(name)[1].lower()
+        if not re.fullmatch(r'\.[a-z0-9]{1,8}', extension):
+            extension = ''
+        carpeta_temporal = self.carpeta_temporal()
+
+        digest = hashlib.sha256()
+        tamano = 0
+        if hasattr(content, 'seek') and content.seekable():
+            content.seek(0)
+        if hasattr(content, 'temporary_file_path') and \
+                os.stat(content.temporary_file_path()).st_dev == os.stat(carpeta_temporal).st_dev:
+            # Ya está en este disco (p. ej. subidas por lotes): se lee para el hash y se mueve sin copiarlo
+            for chunk in content.chunks():
+                digest.update(chunk)
+                tamano += len(chunk)
+            return ruta_contenido(digest.hexdigest(), extension), tamano, content.temporary_file_path(), False
+
+        # Una sola pasada: se calcula el hash mientras se copia a un temporal
+        with tempfile.NamedTemporaryFile(dir=carpeta_temporal, delete=False) as temporal:
+            for chunk in content.chunks():
+                digest.update(chunk)
+                temporal.write(chunk)
+                tamano += len(chunk)
+        return ruta_contenido(digest.hexdigest(), extension), tamano, temporal.name, True
+
+    def sumar_referencia(self, nombre, tamano, origen=None, cantidad=1):
+        """+`cantidad` referencias a `nombre`; si el archivo no está en disco lo mueve desde `origen`"""
+        self.sumar_referencias([(nombre, tamano, origen, cantidad)])
+
+    def sumar_referencias(self, entradas):
+        """sumar_referencia() de varias (nombre, tamaño, origen, cantidad) en una consulta"""
+        cantidades = Counter()
+        tamanos = {}
+        origenes = {}
+        for nombre, tamano, origen, cantidad in entradas:
+            cantidades[nombre] += cantidad
+            tamanos[nombre] = tamano
+            if origen is not None:
+                origenes.setdefault(nombre, origen)
+        nombres = sorted(cantidades)
+        # Sin savepoint: si algo falla, falla la transacción que lo contiene
+        with transaction.atomic(savepoint=False), connection.cursor() as cursor:
+            cursor.execute(SQL_SUMAR, [nombres, [cantidades[n] for n in nombres], [tamanos[n] for n in nombres]])
+            for nombre in nombres:
+                self._mover(nombre, origenes.get(nombre))
+
+    def _mover(self, nombre, origen):
+        destino = self.path(nombre)
+        if os.path.exists(destino):
+            return
+        if origen is None:
+            raise FileNotFoundError(destino)
+        os.makedirs(os.path.dirname(destino), exist_ok=True)
+        if self.directory_permissions_mode is not None:
+            os.chmod(os.path.dirname(destino), self.directory_permissions_mode)
+        os.replace(origen, destino)
+        if self.file_permissions_mode is not None:
+            os.chmod(destino, self.file_permissions_mode)
+
+    def delete(self, name):
+        """Resta una referencia; el archivo se borra cuando nadie más lo usa"""
+        if not es_contenido(name):
+            return super().delete(name)
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(SQL_RESTAR, [name])
+            fila = cursor.fetchone()
+            if fila is not None and fila[0] > 0:
+                return
+            # Sin referencias (o sin fila: quedó de una transacción revertida)
+            super().delete(name)
+            cursor.execute('DELETE FROM portal_archivocontenido WHERE ruta = %s', [name])
+
+
+    def borrar_si_huerfano(self, name):
+        """
+        Borra un archivo por contenido sin referencias (p. ej. de una
+        transacción revertida); False si alguien lo usa. Con 0 referencias,
+        la fila se crea solo para bloquearla: una subida del mismo contenido
+        espera y, al seguir, ve que el archivo ya no está y lo vuelve a mover.
+        """
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(SQL_SUMAR, [[name], [0], [0]])
+            cursor.execute('SELECT referencias FROM portal_archivocontenido WHERE ruta = %s', [name])
+            if cursor.fetchone()[0] > 0:
+                return False
+            super().delete(name)
+            cursor.execute('DELETE FROM portal_archivocontenido WHERE ruta = %s', [name])
+            return True
+
+
+def liberar_archivos(storage, rutas):
+    """Suelta una referencia por ruta (llamar con la transacción ya confirmada)"""
+    for ruta in rutas:
+        if ruta:
+            storage.delete(ruta)
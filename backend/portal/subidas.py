@@ -0,0 +1,181 @@
+# backend/portal/subidas.py
+
+"""
+Subida de varias imágenes de un inmueble en un solo request.
+
+SubidaImagenesHandler reemplaza a los upload handlers por defecto en esa
+vista: escribe cada parte a disco a medida que llega (nunca en memoria),
+directo en la carpeta temporal del storage para que guardarla sea mover el
+archivo y no copiarlo, y corta apenas un archivo o el request pasan los
+límites de SUBIDAS en settings. El tipo se revisa por los bytes mágicos del
+primer chunk y, al terminar, Pillow lee solo la cabecera (formato y
+dimensiones) sin decodificar la imagen.
+
+guardar_imagenes() crea las filas con un bulk_create, numeradas a
+continuación de las que ya tiene el inmueble, y encola las variantes
+(portal/imagenes.py) al confirmar, porque bulk_create no dispara post_save.
+"""
+
+import logging
+import tempfile
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import TemporaryUploadedFile, UploadedFile
+from django.core.files.uploadhandler import FileUploadHandler, SkipFile, StopUpload
+from django.db import transaction
+from django.db.models import Max
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+# Formato de Pillow -> bytes mágicos con que empieza el archivo (None: cualquier byte)
+FIRMAS = {
+    'JPEG': [b'\xff\xd8\xff'],
+    'PNG': [b'\x89PNG\r\n\x1a\n'],
+    'WEBP': [b'RIFF', None, None, None, None, b'WEBP'],
+}
+LARGO_FIRMA = 12
+MB = 2**20
+
+
+def formato_por_firma(cabecera):
+    """Formato de imagen según los primeros bytes, o None si no es uno aceptado"""
+    for formato, partes in FIRMAS.items():
+        posicion = 0
+        for parte in partes:
+            largo = 1 if parte is None else len(parte)
+            if parte is not None and cabecera[posicion:posicion + largo] != parte:
+                break
+            posicion += largo
+        else:
+            return formato
+    return None
+
+
+class ArchivoTemporal(TemporaryUploadedFile):
+    """TemporaryUploadedFile creado en `carpeta` en vez de FILE_UPLOAD_TEMP_DIR"""
+
+    def __init__(self, name, content_type, size, charset, content_type_extra=None, carpeta=None):
+        archivo = tempfile.NamedTemporaryFile(suffix='.upload', dir=carpeta)
+        UploadedFile.__init__(self, archivo, name, content_type, size, charset, content_type_extra)
+
+
+class SubidaImagenesHandler(FileUploadHandler):
+    """
+    Upload handler con memoria acotada: cada archivo va a disco en chunks.
+    Los archivos rechazados quedan en `rechazados` como (nombre, motivo); si
+    el request pasa el total, `excedido` queda en True y se deja de leer.
+    """
+
+    def __init__(self, request=None, carpeta=None):
+        super().__init__(request)
+        config = settings.SUBIDAS
+        self.max_archivo = config['MAX_ARCHIVO_MB'] * MB
+        self.max_total = config['MAX_TOTAL_MB'] * MB
+        self.max_archivos = config['MAX_ARCHIVOS']
+        if carpeta is None and hasattr(default_storage, 'carpeta_temporal'):
+            carpeta = default_storage.carpeta_temporal()
+        self.carpeta = carpeta or settings.FILE_UPLOAD_TEMP_DIR
+        self.rechazados = []
+        self.excedido = False
+        self.total = 0
+        self.recibidos = 0
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        # Se crea antes de revisar los límites: al rechazarlo, el parser cierra (y borra) este archivo
+        self.file = ArchivoTemporal(
+            self.file_name, self.content_type, 0, self.charset, self.content_type_extra, carpeta=self.carpeta,
+        )
+        self.cabecera = b''
+        self.recibidos += 1
+        if self.recibidos > self.max_archivos:
+            self.rechazar(f'se aceptan hasta {self.max_archivos} archivos por envío')
+        if self.content_length is not None and self.content_length > self.max_archivo:
+            self.rechazar(f'pesa más de {self.max_archivo // MB} MB')
+
+    def receive_data_chunk(self, raw_data, start):
+        self.total += len(raw_data)
+        if self.total > self.max_total:
+            self.excedido = True
+            raise StopUpload(connection_reset=True)
+        if start + len(raw_data) > self.max_archivo:
+            self.rechazar(f'pesa más de {self.max_archivo // MB} MB')
+        if len(self.cabecera) < LARGO_FIRMA:
+            self.cabecera += raw_data[:LARGO_FIRMA - len(self.cabecera)]
+            if len(self.cabecera) >= LARGO_FIRMA and formato_por_firma(self.cabecera) is None:
+                self.rechazar('no es una imagen JPEG, PNG o WebP')
+        self.file.write(raw_data)
+
+    def file_complete(self, file_size):
+        self.file.seek(0)
+        self.file.size = file_size
+        try:
+            validar_cabecera(self.file)
+        except ValueError as e:
+            self.file.close()
+            self.rechazados.append((self.file_name, str(e)))
+            return None
+        self.file.seek(0)
+        return self.file
+
+    def upload_interrupted(self):
+        if hasattr(self, 'file'):
+            self.file.close()
+
+    def rechazar(self, motivo):
+        """Descarta el archivo en curso; el parser consume el resto de la parte sin guardarla"""
+        self.rechazados.append((self.file_name, motivo))
+        raise SkipFile()
+
+
+def validar_cabecera(archivo):
+    """
+    Formato y dimensiones de la imagen leyendo solo su cabecera (Pillow no
+    decodifica los píxeles hasta que se le piden). ValueError si no sirve.
+    """
+    try:
+        with Image.open(archivo) as imagen:
+            formato, (ancho, alto) = imagen.format, imagen.size
+    except (OSError, SyntaxError, Image.DecompressionBombError):
+        raise ValueError('no se pudo leer la imagen')
+    if formato not in FIRMAS:
+        raise ValueError('no es una imagen JPEG, PNG o WebP')
+    if ancho * alto > Image.MAX_IMAGE_PIXELS:
+        raise ValueError(f'la imagen es demasiado grande ({ancho}x{alto})')
+    return formato, ancho, alto
+
+
+def guardar_imagenes(inmueble, archivos, descripcion=''):
+    """
+    Crea una ImagenInmueble por archivo, a continuación de las que ya tiene
+    el inmueble, en una transacción; devuelve las filas creadas.
+    """
+    from .imagenes import ProcesadorImagenes
+    from .models import ImagenInmueble, Inmueble, invalidar_destacados
+
+    campo = ImagenInmueble._meta.get_field('imagen')
+    with transaction.atomic():
+        # Bloquea el inmueble: dos lotes simultáneos no reciben el mismo orden
+        Inmueble.objects.select_for_update().filter(pk=inmueble.pk).values_list('pk', flat=True).get()
+        ultimo = ImagenInmueble.objects.filter(inmueble=inmueble).aggregate(ultimo=Max('orden'))['ultimo']
+        siguiente = 0 if ultimo is None else ultimo + 1
+        imagenes = [
+            ImagenInmueble(inmueble=inmueble, descripcion=descripcion, orden=siguiente + n)
+            for n in range(len(archivos))
+        ]
+        # Si la transacción se revierte, los archivos ya movidos quedan en disco sin fila en ArchivoContenido
+        nombres = campo.storage.guardar_varios(
+            [(campo.generate_filename(imagen, archivo.name), archivo) for imagen, archivo in zip(imagenes, archivos)]
+        )
+        for imagen, nombre in zip(imagenes, nombres):
+            imagen.imagen = nombre
+        ImagenInmueble.objects.bulk_create(imagenes)
+
+        Inmueble.actualizar_portada(inmueble.pk)
+        invalidar_destacados(inmueble.pk)
+        ids = [imagen.pk for imagen in imagenes]
+        transaction.on_commit(lambda: [ProcesadorImagenes.encolar(pk) for pk in ids])
+    logger.info(f"Batch image upload (Subida de imágenes por lote) inmueble {inmueble.pk}: {len(ids)} imágenes")
+    return imagenes
@@ -0,0 +1,44 @@
+# backend/portal/templatetags/imagenes.py
+
+from django import template
+from django.forms.utils import flatatt
+from django.templatetags.static import static
+from django.utils.html import format_html
+
+register = template.Library()
+
+# Ancho con que se muestra cada variante en las plantillas (atributo sizes)
+SIZES = {
+    'thumb': '80px',
+    'card': '(min-width: 992px) 360px, (min-width: 768px) 50vw, 100vw',
+    'detail': '(min-width: 992px) 760px, 100vw',
+}
+
+# Lo que se muestra si el inmueble aún no tiene imágenes
+SIN_IMAGEN = 'portal/images/default-property.jpg'
+
+
+@register.simple_tag
+def imagen_responsiva(imagen, variante='card', sizes=None, **atributos):
+    """
+    <picture> con srcset WebP y JPEG de una ImagenInmueble; mientras no
+    tenga variantes, un <img> con el original. Los argumentos extra van
+    como atributos del <img> (class, alt, id, width, ...). Sin imagen, la
+    de SIN_IMAGEN.
+    """
+    atributos.setdefault('loading', 'lazy')
+    if imagen is None:
+        return format_html('<img src="{}"{}>', static(SIN_IMAGEN), flatatt(atributos))
+    if not imagen.variantes.get(variante):
+        return format_html('<img src="{}"{}>', imagen.imagen.url, flatatt(atributos))
+    sizes = sizes or SIZES.get(variante, '100vw')
+    elegida = imagen.variantes[variante]
+    # width/height evitan saltos al cargar; si se pide otro ancho, el alto sigue la proporción
+    ancho = int(atributos.get('width') or elegida['ancho'])
+    atributos.update(width=ancho, height=round(elegida['alto'] * ancho / elegida['ancho']))
+    return format_html(
+        '<picture><source type="image/webp" srcset="{}" sizes="{}">'
+        '<img src="{}" srcset="{}" sizes="{}"{}></picture>',
+        imagen.srcset('webp'), sizes,
+        imagen.url_variante(variante), imagen.srcset('jpeg'), sizes, flatatt(atributos),
+    )
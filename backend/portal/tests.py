@@ -1,3 +1,1894 @@
-from django.test import TestCase
+import asyncio
+import base64
+import csv
+import gzip
+import hashlib
+import html
+import io
+import json
+import os
+import re
+import struct
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock, skipIf
 
-# Create your tests here.
+import numpy as np
+import requests
+from PIL import Image
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.contrib.auth.models import AnonymousUser, Permission
+from django.contrib.staticfiles import finders
+from django.core.exceptions import PermissionDenied
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.http import HttpResponse
+from django.http.multipartparser import MultiPartParser
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.test.client import BOUNDARY, encode_multipart
+from django.templatetags.static import static
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.views import View
+
+from .alertas import Criterio, IndiceBusquedas
+from .contadores import Contadores
+from .estadisticas import resumir
+from .forms import BusquedaInmuebleForm, InmuebleForm
+from .gazetteer import GazetteerSnapshot, GazetteerStore, SnapshotError, escribir_snapshot
+from .imagenes import VARIANTES, generar_variantes
+from .importacion import Importacion, leer_filas
+from .middleware import EstadisticasConsultas, PresupuestoConsultasMiddleware
+from .mixins import (
+    EsAdministradorMixin, EsArrendadorMixin, EsArrendatarioMixin, PuedeGestionarInmueblesMixin,
+    PuedeGestionarUsuariosMixin, PuedeVerTodosInmueblesMixin,
+)
+from .limpieza import FALTANTE, HUERFANO, recorrer, unir
+from .models import ArchivoContenido, BusquedaGuardada, Comuna, Contador, ImagenInmueble, Inmueble, PerfilUsuario, Region, SolicitudArriendo
+from .payloads import PayloadsUbicaciones, brotli
+from .pagination import CursorInvalido, KeysetPaginator, codificar_cursor, decodificar_cursor
+from .permisos import Instantanea, PermisosUsuario
+from .recomendaciones import MatrizSimilares, Similares
+from .http_client import CircuitBreaker, CircuitOpenError, HttpClient
+from .services import ChileanLocationService, IndiceUbicaciones
+from .search import buscar_texto, facetas, filtrar_inmuebles, hay_filtros
+from .singleflight import SingleFlight
+from .views import InmueblesListView
+from .storage import ruta_contenido
+from .subidas import SubidaImagenesHandler
+from .templatetags.imagenes import SIN_IMAGEN, imagen_responsiva
+
+class StubDPA:
+    """Servidor HTTP local que imita la API DPA para las pruebas"""
+
+    def __init__(self):
+        self.llamadas = {}
+        self.fallos = {}  # ruta -> cantidad de respuestas 503 antes de responder bien
+        self.retardo = 0
+        self.lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'  # keep-alive
+
+            def do_GET(self):
+                with stub.lock:
+                    stub.llamadas[self.path] = stub.llamadas.get(self.path, 0) + 1
+                    fallar = stub.fallos.get(self.path, 0)
+                    if fallar:
+                        stub.fallos[self.path] = fallar - 1
+                if stub.retardo:
+                    threading.Event().wait(stub.retardo)
+                if fallar:
+                    self.send_response(503)
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+                body = json.dumps(stub.responder(self.path)).encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f'http://127.0.0.1:{self.server.server_port}/dpa'
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def responder(self, path):
+        if path == '/dpa/regiones':
+            return [{'codigo': '13', 'nombre': 'Metropolitana'}, {'codigo': '05', 'nombre': 'Valparaíso'}]
+        if path.startswith('/dpa/regiones/') and path.endswith('/comunas'):
+            region = path.split('/')[3]
+            return [{'codigo': f'{region}101', 'nombre': f'Comuna {region}', 'codigo_padre': f'{region}1'}]
+        return {}
+
+    def cerrar(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class HttpClientTests(SimpleTestCase):
+
+    def setUp(self):
+        self.stub = StubDPA()
+        self.addCleanup(self.stub.cerrar)
+
+    def test_reutiliza_conexiones_del_pool(self):
+        cliente = HttpClient(backoff=0)
+        for _ in range(5):
+            self.assertEqual(cliente.get(f'{self.stub.url}/regiones').status_code, 200)
+        pool = cliente.metricas()['pool'][0]
+        self.assertEqual(pool['conexiones_creadas'], 1)
+        self.assertEqual(pool['solicitudes'], 5)
+
+    def test_reintenta_errores_transitorios(self):
+        self.stub.fallos['/dpa/regiones'] = 2
+        cliente = HttpClient(reintentos=2, backoff=0)
+        response = cliente.get(f'{self.stub.url}/regiones')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.stub.llamadas['/dpa/regiones'], 3)
+        self.assertEqual(cliente.metricas()['reintentos'], 2)
+
+    def test_breaker_abre_y_falla_rapido(self):
+        self.stub.fallos['/dpa/regiones'] = 100
+        cliente = HttpClient(reintentos=0, breaker=CircuitBreaker(umbral=0.5, minimo=3, apertura=60))
+        for _ in range(3):
+            with self.assertRaises(Exception):
+                cliente.get(f'{self.stub.url}/regiones')
+        self.assertEqual(cliente.breaker.estado, CircuitBreaker.ABIERTO)
+
+        with self.assertRaises(CircuitOpenError):
+            cliente.get(f'{self.stub.url}/regiones')
+        self.assertEqual(self.stub.llamadas['/dpa/regiones'], 3)
+        self.assertEqual(cliente.metricas()['rechazadas_por_breaker'], 1)
+
+    def test_breaker_semiabierto_se_cierra_con_exito(self):
+        self.stub.fallos['/dpa/regiones'] = 1
+        cliente = HttpClient(reintentos=0, breaker=CircuitBreaker(umbral=0.5, minimo=1, apertura=0))
+        with self.assertRaises(Exception):
+            cliente.get(f'{self.stub.url}/regiones')
+        self.assertEqual(cliente.breaker.estado, CircuitBreaker.ABIERTO)
+        self.assertEqual(cliente.get(f'{self.stub.url}/regiones').status_code, 200)
+        self.assertEqual(cliente.breaker.estado, CircuitBreaker.CERRADO)
+
+    def test_error_inesperado_en_la_prueba_no_traba_el_breaker(self):
+        cliente = HttpClient(reintentos=0, breaker=CircuitBreaker(umbral=0.5, minimo=1, apertura=0))
+        cliente.breaker.registrar(False)
+        self.assertEqual(cliente.breaker.estado, CircuitBreaker.ABIERTO)
+
+        with mock.patch.object(cliente.session, 'get', side_effect=requests.exceptions.ChunkedEncodingError):
+            with self.assertRaises(requests.exceptions.ChunkedEncodingError):
+                cliente.get(f'{self.stub.url}/regiones')
+        with mock.patch.object(cliente.session, 'get', side_effect=ValueError('respuesta inválida')):
+            with self.assertRaises(ValueError):
+                cliente.get(f'{self.stub.url}/regiones')
+        # La prueba falló y se registró: el breaker vuelve a dejar pasar una y se cierra con éxito
+        self.assertEqual(cliente.get(f'{self.stub.url}/regiones').status_code, 200)
+        self.assertEqual(cliente.breaker.estado, CircuitBreaker.CERRADO)
+
+
+class SingleFlightTests(SimpleTestCase):
+
+    def setUp(self):
+        self.stub = StubDPA()
+        self.stub.retardo = 0.3
+        self.addCleanup(self.stub.cerrar)
+        directorio = tempfile.mkdtemp()
+        self.path = os.path.join(directorio, 'dpa.snapshot')
+
+        ajustes = override_settings(DPA_SNAPSHOT_PATH=self.path, DPA_LOCATION_BACKEND='snapshot')
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+        for patch in [
+            mock.patch.object(ChileanLocationService, 'BASE_URL', self.stub.url),
+            mock.patch.object(ChileanLocationService, '_store', None),
+        ]:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def test_coalesce_hilos(self):
+        vuelo = SingleFlight()
+        llamadas = []
+        barrera = threading.Event()
+
+        def lenta():
+            llamadas.append(1)
+            barrera.wait(0.2)
+            return 42
+
+        with ThreadPoolExecutor(max_workers=10) as pool:
+            resultados = list(pool.map(lambda _: vuelo.do('clave', lenta), range(10)))
+        self.assertEqual(resultados, [42] * 10)
+        self.assertEqual(len(llamadas), 1)
+        self.assertEqual(vuelo.en_vuelo(), 0)
+
+    def test_una_llamada_por_clave_en_frio(self):
+        """Hilos y tareas async concurrentes con la caché fría: una sola llamada por URL"""
+
+        async def tareas_async():
+            return await asyncio.gather(*[
+                ChileanLocationService.aget_comunas_by_region('13') for _ in range(10)
+            ])
+
+        with ThreadPoolExecutor(max_workers=11) as pool:
+            hilos = [pool.submit(ChileanLocationService.get_comunas_by_region, '13') for _ in range(10)]
+            asincronas = pool.submit(asyncio.run, tareas_async())
+            resultados = [h.result() for h in hilos] + asincronas.result()
+
+        self.assertEqual(len(resultados), 20)
+        for comunas in resultados:
+            self.assertEqual([c['codigo'] for c in comunas], ['13101'])
+        self.assertEqual(self.stub.llamadas, {
+            '/dpa/regiones': 1,
+            '/dpa/regiones/13/comunas': 1,
+            '/dpa/regiones/05/comunas': 1,
+        })
+
+
+class ResumenPreciosTests(SimpleTestCase):
+
+    def test_coincide_con_numpy_por_grupo(self):
+        rng = np.random.default_rng(1)
+        grupos = np.repeat(np.arange(30), rng.integers(1, 40, 30))
+        precios = rng.uniform(100_000, 900_000, len(grupos)).round()
+        m2 = np.where(rng.random(len(grupos)) < 0.2, 0, rng.uniform(20, 200, len(grupos)))
+        orden = np.lexsort((precios, grupos))
+        grupos, precios, m2 = grupos[orden], precios[orden], m2[orden]
+
+        inicios, stats = resumir(grupos, precios, m2)
+        self.assertEqual(len(inicios), 30)
+        for n, g in enumerate(grupos[inicios]):
+            fila = grupos == g
+            self.assertEqual(stats['cantidad'][n], fila.sum())
+            self.assertAlmostEqual(stats['precio_promedio'][n], precios[fila].mean())
+            for clave, q in [('precio_p25', 25), ('precio_mediana', 50), ('precio_p75', 75)]:
+                self.assertAlmostEqual(stats[clave][n], np.percentile(precios[fila], q))
+            con_m2 = fila & (m2 > 0)
+            self.assertEqual(stats['cantidad_m2'][n], con_m2.sum())
+            if con_m2.any():
+                self.assertAlmostEqual(stats['precio_m2_mediana'][n], np.median(precios[con_m2] / m2[con_m2]))
+            else:
+                self.assertTrue(np.isnan(stats['precio_m2_mediana'][n]))
+
+
+class IndiceBusquedasTests(SimpleTestCase):
+
+    def test_coincide_con_fuerza_bruta(self):
+        rng = np.random.default_rng(2)
+        comunas = ['13101', '13114', '05109']
+        indice = IndiceBusquedas()
+        for pk in range(1, 2001):
+            comuna = str(rng.choice(comunas)) if rng.random() < 0.7 else ''
+            region = comuna[:2] if comuna else ('13' if rng.random() < 0.5 else '')
+            precio_min = float(rng.integers(1, 8)) * 100_000 if rng.random() < 0.5 else None
+            precio_max = (precio_min or 0) + float(rng.integers(1, 20)) * 100_000 if rng.random() < 0.7 else None
+            indice.agregar(pk, Criterio(
+                region, comuna, str(rng.choice(['CASA', 'DEPARTAMENTO', ''])), precio_min, precio_max,
+                int(rng.integers(0, 4)), None,
+            ))
+        for pk in range(1, 2001, 7):
+            indice.quitar(pk)
+
+        for _ in range(200):
+            comuna = str(rng.choice(comunas))
+            inmueble = (comuna[:2], comuna, str(rng.choice(['CASA', 'DEPARTAMENTO'])),
+                        float(rng.integers(50, 3000)) * 1000, int(rng.integers(0, 5)), 1)
+            esperado = {pk for pk, c in indice.criterios.items() if c.coincide(*inmueble)}
+            self.assertEqual(set(indice.coincidencias(*inmueble)), esperado)
+
+
+class VariantesImagenTests(SimpleTestCase):
+
+    def test_orienta_redimensiona_y_quita_exif(self):
+        exif = Image.Exif()
+        exif[0x0112] = 6  # rotada 90°: el original 2000x1000 se ve de 1000x2000
+        exif[0x010f] = 'Camara'
+        original = io.BytesIO()
+        Image.new('RGB', (2000, 1000), 'navy').save(original, 'JPEG', exif=exif)
+        original.seek(0)
+
+        ancho, alto, variantes = generar_variantes(original)
+        self.assertEqual((ancho, alto), (1000, 2000))
+        self.assertEqual(set(variantes), set(VARIANTES))
+        for nombre, (v_ancho, v_alto, codificadas) in variantes.items():
+            self.assertEqual(v_ancho, min(VARIANTES[nombre], 1000))
+            self.assertEqual(v_alto, v_ancho * 2)
+            for contenido in codificadas.values():
+                with Image.open(io.BytesIO(contenido)) as imagen:
+                    self.assertEqual(imagen.size, (v_ancho, v_alto))
+                    self.assertEqual(len(imagen.getexif()), 0)
+
+    def test_sin_portada_muestra_la_imagen_por_defecto(self):
+        html = imagen_responsiva(None, 'card', alt='Casa', **{'class': 'card-img-top'})
+        self.assertEqual(
+            html, f'<img src="{static(SIN_IMAGEN)}" alt="Casa" class="card-img-top" loading="lazy">')
+        self.assertTrue(finders.find(SIN_IMAGEN))
+
+
+@override_settings(SUBIDAS={'MAX_ARCHIVO_MB': 1, 'MAX_TOTAL_MB': 3, 'MAX_ARCHIVOS': 3})
+class SubidaImagenesTests(SimpleTestCase):
+
+    def setUp(self):
+        carpeta = tempfile.TemporaryDirectory()
+        self.addCleanup(carpeta.cleanup)
+        self.carpeta = carpeta.name
+
+    def archivo(self, nombre, contenido=None, formato='PNG'):
+        if contenido is None:
+            salida = io.BytesIO()
+            Image.new('RGB', (40, 30), 'teal').save(salida, formato)
+            contenido = salida.getvalue()
+        archivo = io.BytesIO(contenido)
+        archivo.name = nombre
+        return archivo
+
+    def subir(self, archivos):
+        cuerpo = encode_multipart(BOUNDARY, {'imagenes': archivos})
+        handler = SubidaImagenesHandler(carpeta=self.carpeta)
+        meta = {'CONTENT_TYPE': f'multipart/form-data; boundary={BOUNDARY}', 'CONTENT_LENGTH': len(cuerpo)}
+        _, recibidos = MultiPartParser(meta, io.BytesIO(cuerpo), [handler]).parse()
+        recibidos = recibidos.getlist('imagenes')
+        self.addCleanup(lambda: [archivo.close() for archivo in recibidos])
+        return handler, recibidos
+
+    @override_settings(SUBIDAS={'MAX_ARCHIVO_MB': 1, 'MAX_TOTAL_MB': 3, 'MAX_ARCHIVOS': 5})
+    def test_acepta_imagenes_y_rechaza_el_resto(self):
+        handler, recibidos = self.subir([
+            self.archivo('a.png'),
+            self.archivo('texto.jpg', b'esto no es una imagen, aunque diga .jpg'),
+            self.archivo('b.webp', formato='WEBP'),
+            self.archivo('grande.png', b'\x89PNG\r\n\x1a\n' + bytes(2**20)),
+            self.archivo('d.jpg', formato='JPEG'),
+        ])
+        self.assertEqual([archivo.name for archivo in recibidos], ['a.png', 'b.webp', 'd.jpg'])
+        self.assertEqual([nombre for nombre, _ in handler.rechazados], ['texto.jpg', 'grande.png'])
+        for archivo in recibidos:
+            self.assertEqual(os.path.dirname(archivo.temporary_file_path()), self.carpeta)
+        # Los rechazados no dejan temporales
+        self.assertEqual(len(os.listdir(self.carpeta)), 3)
+
+    def test_limite_de_archivos_y_total(self):
+        handler, recibidos = self.subir([self.archivo(f'{n}.png') for n in range(5)])
+        self.assertEqual(len(recibidos), 3)
+        self.assertEqual(len(handler.rechazados), 2)
+
+        relleno = [self.archivo(f'{n}.png', b'\x89PNG\r\n\x1a\n' + bytes(2**20 - 100)) for n in range(3)]
+        with override_settings(SUBIDAS={'MAX_ARCHIVO_MB': 1, 'MAX_TOTAL_MB': 2, 'MAX_ARCHIVOS': 3}):
+            handler, recibidos = self.subir(relleno)
+        self.assertTrue(handler.excedido)
+        self.assertLess(len(recibidos), 3)
+
+
+class ImagenesLoteTests(TestCase):
+
+    def test_login_antes_que_el_propietario(self):
+        propietario = PerfilUsuario.objects.create(
+            username='arrendador', tipo_usuario=PerfilUsuario.TipoUsuario.ARRENDADOR)
+        inmueble = Inmueble.objects.create(nombre='Casa', descripcion='-', direccion='Calle 1',
+                                           precio_mensual=500000, propietario=propietario)
+        # Anónimos al login, exista o no el inmueble
+        for pk in (inmueble.pk, inmueble.pk + 1000):
+            response = self.client.post(reverse('agregar_imagenes', args=[pk]))
+            self.assertRedirects(response, reverse('login'), fetch_redirect_response=False)
+
+        otro = PerfilUsuario.objects.create(username='otro', tipo_usuario=PerfilUsuario.TipoUsuario.ARRENDADOR)
+        self.client.force_login(otro)
+        self.assertEqual(self.client.post(reverse('agregar_imagenes', args=[inmueble.pk])).status_code, 403)
+        self.assertEqual(self.client.post(reverse('agregar_imagenes', args=[inmueble.pk + 1000])).status_code, 404)
+
+
+class LimpiezaMediaTests(SimpleTestCase):
+
+    def test_recorrer_en_orden_de_bytes(self):
+        with tempfile.TemporaryDirectory() as raiz:
+            # 'a.jpg' < 'a/b.jpg' < 'a0.jpg' en orden de bytes, aunque el directorio 'a' se llame 'a'
+            rutas = ['a.jpg', 'a/b.jpg', 'a/c/d.jpg', 'a0.jpg', 'B.png', 'contenido/tmp/x', 'ñ.webp']
+            for ruta in rutas:
+                os.makedirs(os.path.join(raiz, os.path.dirname(ruta)), exist_ok=True)
+                open(os.path.join(raiz, ruta), 'wb').close()
+            os.makedirs(os.path.join(raiz, 'vacio'))
+            self.assertEqual(list(recorrer(raiz)), sorted(rutas, key=lambda r: r.encode()))
+            self.assertEqual(list(recorrer(os.path.join(raiz, 'no-existe'))), [])
+
+    def test_unir(self):
+        archivos = ['a', 'b', 'c', 'e', 'g']
+        usadas = ['b', 'd', 'e', 'f']
+        self.assertEqual(list(unir(archivos, usadas)), [
+            (HUERFANO, 'a'), (HUERFANO, 'c'), (FALTANTE, 'd'), (FALTANTE, 'f'), (HUERFANO, 'g'),
+        ])
+        self.assertEqual(list(unir([], ['x'])), [(FALTANTE, 'x')])
+        self.assertEqual(list(unir(['x'], [])), [(HUERFANO, 'x')])
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'permisos'}})
+class PermisosUsuarioTests(SimpleTestCase):
+
+    class Usuario:
+        def __init__(self, pk):
+            self.pk = pk
+            self.is_active = True
+
+    def setUp(self):
+        self.construir = mock.patch.object(
+            PermisosUsuario, 'construir',
+            side_effect=lambda user, version: Instantanea(version, {'portal.a'}, {'portal.b'}, {'Grupo'}, 'ARRENDADOR'),
+        ).start()
+        # Sin transacción abierta on_commit ejecuta al momento
+        mock.patch('portal.permisos.transaction.on_commit', side_effect=lambda funcion: funcion()).start()
+        self.addCleanup(mock.patch.stopall)
+
+    def test_cachea_entre_requests_e_invalida(self):
+        instantanea = PermisosUsuario.de(self.Usuario(1))
+        self.assertEqual(instantanea.permisos, {'portal.a', 'portal.b'})
+        self.assertIn('Grupo', instantanea.grupos)
+
+        # Otro request (otro objeto usuario): sale de la caché y llena las de ModelBackend
+        usuario = self.Usuario(1)
+        PermisosUsuario.de(usuario)
+        self.assertEqual(self.construir.call_count, 1)
+        self.assertEqual(usuario._perm_cache, {'portal.a', 'portal.b'})
+
+        PermisosUsuario.invalidar(1)
+        PermisosUsuario.de(self.Usuario(1))
+        PermisosUsuario.de(self.Usuario(2))
+        self.assertEqual(self.construir.call_count, 3)
+
+        PermisosUsuario.invalidar_todos()
+        PermisosUsuario.de(self.Usuario(1))
+        PermisosUsuario.de(self.Usuario(2))
+        self.assertEqual(self.construir.call_count, 5)
+
+
+class MixinsPermisosTests(TestCase):
+
+    def vista(self, mixin, usuario):
+        class Vista(mixin, View):
+            def get(self, request):
+                return HttpResponse('ok')
+
+        request = RequestFactory().get('/')
+        request.user = usuario
+        return Vista.as_view()(request)
+
+    def test_usan_la_instantanea_de_permisos(self):
+        admin = PerfilUsuario.objects.create(username='admin', tipo_usuario=PerfilUsuario.TipoUsuario.ADMINISTRADOR)
+        arrendador = PerfilUsuario.objects.create(
+            username='arrendador', tipo_usuario=PerfilUsuario.TipoUsuario.ARRENDADOR)
+        arrendatario = PerfilUsuario.objects.create(
+            username='arrendatario', tipo_usuario=PerfilUsuario.TipoUsuario.ARRENDATARIO)
+        casos = [
+            (PuedeGestionarInmueblesMixin, [admin, arrendador], [arrendatario]),
+            (PuedeVerTodosInmueblesMixin, [admin], [arrendador, arrendatario]),
+            (PuedeGestionarUsuariosMixin, [admin], [arrendador, arrendatario]),
+            (EsAdministradorMixin, [admin], [arrendador, arrendatario]),
+            (EsArrendadorMixin, [arrendador], [admin, arrendatario]),
+            (EsArrendatarioMixin, [arrendatario], [admin, arrendador]),
+        ]
+        for mixin, aceptados, rechazados in casos:
+            with self.subTest(mixin.__name__):
+                for usuario in aceptados:
+                    self.assertEqual(self.vista(mixin, usuario).status_code, 200)
+                for usuario in rechazados:
+                    with self.assertRaises(PermissionDenied):
+                        self.vista(mixin, usuario)
+                # Anónimos al login, no un error
+                response = self.vista(mixin, AnonymousUser())
+                self.assertEqual(response.status_code, 302)
+                self.assertEqual(response.url, reverse('login'))
+
+        # El tipo sale de la instantánea cacheada, no del atributo del objeto
+        arrendador.tipo_usuario = PerfilUsuario.TipoUsuario.ADMINISTRADOR
+        with self.assertNumQueries(0):
+            self.assertEqual(self.vista(EsArrendadorMixin, arrendador).status_code, 200)
+
+
+class DestacadosTests(TestCase):
+
+    def test_invalida_solo_al_confirmar(self):
+        with mock.patch('portal.models.Fragmentos.invalidar') as invalidar:
+            with self.captureOnCommitCallbacks(execute=True):
+                Inmueble.objects.create(
+                    nombre='Casa', descripcion='-', direccion='Calle 1', precio_mensual=500000,
+                    tipo_inmueble=Inmueble.Tipo_de_inmueble.casa, esta_publicado=True,
+                )
+                # Dentro de la transacción nadie ve el cambio todavía
+                invalidar.assert_not_called()
+            invalidar.assert_called_with('destacados')
+
+            invalidar.reset_mock()
+            with self.captureOnCommitCallbacks(execute=False):
+                Inmueble.objects.create(
+                    nombre='Depto', descripcion='-', direccion='Calle 2', precio_mensual=400000,
+                    tipo_inmueble=Inmueble.Tipo_de_inmueble.depto, esta_publicado=True,
+                )
+            # Revertida (o nunca confirmada): no se invalida
+            invalidar.assert_not_called()
+
+
+def fila_similar(pk, region='13', comuna='13101', tipo='DEPARTAMENTO', precio=500000, m2=60, habitaciones=2):
+    """Fila en el orden de recomendaciones.COLUMNAS"""
+    return (pk, region, comuna, tipo, precio, m2, m2 * 1.1, habitaciones, 1, 1)
+
+
+class MatrizSimilaresTests(SimpleTestCase):
+
+    def setUp(self):
+        self.matriz = MatrizSimilares.desde_filas([
+            fila_similar(1, precio=500000),
+            fila_similar(2, precio=510000),
+            fila_similar(3, precio=900000, m2=120, habitaciones=4),
+            fila_similar(4, precio=505000, tipo='CASA'),
+            fila_similar(5, precio=500000, region='05', comuna='05109'),
+            fila_similar(6, region=None),  # sin región: no se indexa
+        ])
+
+    def inmueble(self, pk, publicado=True, region='13', precio=500000):
+        _, region, comuna, tipo, *numericos = fila_similar(pk, region=region, precio=precio)
+        return SimpleNamespace(
+            pk=pk, esta_publicado=publicado, region_codigo=region, comuna_codigo=comuna, tipo_inmueble=tipo,
+            **dict(zip(['precio_mensual', 'm2_construidos', 'm2_totales', 'habitaciones', 'banos', 'estacionamientos'], numericos)),
+        )
+
+    def test_construye_por_region(self):
+        self.assertEqual(len(self.matriz), 5)
+        self.assertEqual(self.matriz.bloques['13'].n, 4)
+        self.assertEqual(self.matriz.similares(5), [])  # solo en su región
+        self.assertEqual(self.matriz.similares(6), [])
+
+    def test_top_k_en_orden(self):
+        # Mismo tipo y precio parecido primero; otro tipo después; el más distinto al final
+        self.assertEqual(self.matriz.similares(1, k=3), [2, 4, 3])
+        self.assertEqual(self.matriz.similares(1, k=1), [2])
+        self.assertEqual(len(self.matriz.similares(1, k=50)), 3)
+
+    def test_actualizacion_incremental(self):
+        self.matriz.actualizar(self.inmueble(7, precio=501000))
+        self.assertEqual(self.matriz.similares(1, k=1), [7])
+
+        # Quitar una fila del medio mueve la última a su lugar
+        self.matriz.quitar(2)
+        self.assertNotIn(2, self.matriz.similares(1, k=10))
+        self.assertEqual(self.matriz.similares(7, k=1), [1])
+
+        # Despublicar, cambiar de región y volver a publicar
+        self.matriz.actualizar(self.inmueble(7, publicado=False))
+        self.assertNotIn(7, self.matriz.similares(1, k=10))
+        self.matriz.actualizar(self.inmueble(7, region='05'))
+        self.assertEqual(self.matriz.similares(5), [7])
+
+        # Las sumas incrementales coinciden con una matriz construida de cero
+        filas = [fila_similar(1, precio=500000), fila_similar(3, precio=900000, m2=120, habitaciones=4),
+                 fila_similar(4, precio=505000, tipo='CASA'), fila_similar(5, precio=500000, region='05', comuna='05109'),
+                 fila_similar(7, precio=500000, region='05', comuna='05109')]
+        nueva = MatrizSimilares.desde_filas(filas)
+        np.testing.assert_allclose(self.matriz.suma, nueva.suma, rtol=1e-5)
+        np.testing.assert_allclose(self.matriz.suma_cuadrados, nueva.suma_cuadrados, rtol=1e-5)
+
+
+class SimilaresTests(TestCase):
+
+    def tearDown(self):
+        Similares.reiniciar()
+
+    def crear(self, **campos):
+        return Inmueble.objects.create(
+            nombre='Depto', descripcion='-', direccion='Calle 1', precio_mensual=500000, region_codigo='13',
+            comuna_codigo='13101', tipo_inmueble='DEPARTAMENTO', esta_publicado=True, **campos,
+        )
+
+    def test_primer_uso_no_espera_la_construccion(self):
+        with mock.patch('portal.recomendaciones.threading.Thread') as hilo:
+            self.assertEqual(Similares.para(SimpleNamespace(pk=1)), [])
+            Similares.para(SimpleNamespace(pk=1))
+        # Un solo hilo encargado aunque se pida dos veces
+        hilo.return_value.start.assert_called_once_with()
+
+    def test_quita_los_borrados_en_otro_proceso(self):
+        vivos = [self.crear(m2_construidos=60 + n) for n in range(3)]
+        borrado = max(i.pk for i in vivos) + 1000  # nunca existió en esta base
+        matriz = MatrizSimilares.desde_filas(
+            [fila_similar(i.pk, m2=60 + n) for n, i in enumerate(vivos)] + [fila_similar(borrado, m2=60)]
+        )
+        matriz.sincronizado = time.monotonic()
+        Similares._matriz = matriz
+
+        similares = Similares.para(vivos[0], k=2)
+        self.assertEqual([i.pk for i in similares], [vivos[1].pk, vivos[2].pk])
+        self.assertNotIn(borrado, matriz.posicion)
+
+
+class ImportacionTests(TestCase):
+    ENCABEZADO = (
+        'nombre,descripcion,m2_construidos,m2_totales,estacionamientos,habitaciones,banos,'
+        'direccion,precio_mensual,tipo_inmueble,region_codigo,comuna_codigo\n'
+    )
+
+    def setUp(self):
+        indice = IndiceUbicaciones(
+            [{'codigo': '13', 'nombre': 'Metropolitana'}, {'codigo': '05', 'nombre': 'Valparaíso'}],
+            {'13': [{'codigo': '13101', 'nombre': 'Santiago'}], '05': [{'codigo': '05101', 'nombre': 'Valparaíso'}]},
+        )
+        mock.patch.object(ChileanLocationService, 'indice', return_value=indice).start()
+        self.addCleanup(mock.patch.stopall)
+
+    def fila_csv(self, nombre, precio='450000', comuna='13101'):
+        return f'{nombre},Depto céntrico,50,55,1,2,1,Calle 1,{precio},DEPARTAMENTO,13,{comuna}\n'
+
+    def fila_json(self, nombre, **cambios):
+        fila = {
+            'nombre': nombre, 'descripcion': 'Casa', 'm2_construidos': 80, 'm2_totales': 200, 'estacionamientos': 2,
+            'habitaciones': 3, 'banos': 2, 'direccion': 'Calle 2', 'precio_mensual': 600000,
+            'tipo_inmueble': 'CASA', 'region_codigo': '05', 'comuna_codigo': '05101',
+        }
+        fila.update(cambios)
+        return json.dumps(fila) + '\n'
+
+    def importar(self, contenido, formato='csv', comprimido=False, **opciones):
+        if isinstance(contenido, str):
+            contenido = contenido.encode('utf-8')
+        if comprimido:
+            contenido = gzip.compress(contenido)
+        return Importacion(**opciones).ejecutar(leer_filas(io.BytesIO(contenido), formato, comprimido))
+
+    def test_csv_con_filas_invalidas(self):
+        importacion = self.importar(
+            '\ufeff' + self.ENCABEZADO + self.fila_csv('A') + self.fila_csv('B', precio='caro')
+            + self.fila_csv('C', comuna='05101') + self.fila_csv('D')
+        )
+        self.assertEqual((importacion.leidas, importacion.insertadas, importacion.rechazadas), (4, 2, 2))
+        self.assertEqual([(fila, campo) for fila, campo, _ in importacion.errores],
+                         [(3, 'precio_mensual'), (4, 'comuna_codigo')])
+        self.assertEqual(sorted(Inmueble.objects.values_list('nombre', flat=True)), ['A', 'D'])
+        self.assertEqual(Inmueble.objects.get(nombre='A').comuna_nombre, 'Santiago')
+
+    def test_jsonl(self):
+        importacion = self.importar(
+            self.fila_json('A') + '\n' + '{"nombre": \n' + '[1, 2]\n' + self.fila_json('B', esta_publicado='sí'),
+            formato='jsonl',
+        )
+        self.assertEqual((importacion.insertadas, importacion.rechazadas), (2, 2))
+        self.assertEqual([fila for fila, _, _ in importacion.errores], [3, 4])
+        self.assertTrue(Inmueble.objects.get(nombre='B').esta_publicado)
+        self.assertFalse(Inmueble.objects.get(nombre='A').esta_publicado)
+
+    def test_gzip(self):
+        importacion = self.importar(self.ENCABEZADO + self.fila_csv('A') + self.fila_csv('B'), comprimido=True)
+        self.assertEqual(importacion.insertadas, 2)
+        self.assertIsNone(importacion.interrumpida)
+
+    def test_gzip_truncado_o_corrupto(self):
+        contenido = self.ENCABEZADO + ''.join(self.fila_csv(f'F{n}') for n in range(2000))
+        comprimido = gzip.compress(contenido.encode('utf-8'))
+        importacion = Importacion().ejecutar(leer_filas(io.BytesIO(comprimido[:len(comprimido) // 2]), 'csv', True))
+        # Se interrumpe, pero lo leído antes del corte queda importado
+        self.assertIsNotNone(importacion.interrumpida)
+        self.assertGreater(importacion.insertadas, 0)
+        self.assertEqual(Inmueble.objects.count(), importacion.insertadas)
+
+        importacion = Importacion().ejecutar(leer_filas(io.BytesIO(b'no es gzip'), 'csv', True))
+        self.assertIn('gzip', importacion.interrumpida)
+        self.assertEqual(importacion.errores[-1][2], importacion.interrumpida)
+
+    def test_texto_que_no_es_utf8(self):
+        latin1 = self.fila_csv('Ñuñoa').encode('latin-1')
+        contenido = (self.ENCABEZADO + self.fila_csv('A')).encode('utf-8') + latin1 + self.fila_csv('B').encode('utf-8')
+        importacion = self.importar(contenido)
+        self.assertEqual((importacion.insertadas, importacion.rechazadas), (2, 1))
+        self.assertEqual(importacion.errores[0][0], 3)
+        self.assertIn('UTF-8', importacion.errores[0][2])
+
+        contenido = self.fila_json('C').encode('utf-8') + self.fila_json('X').replace('X', 'Ñuñoa').encode('latin-1')
+        importacion = self.importar(contenido, formato='jsonl')
+        self.assertEqual((importacion.insertadas, importacion.rechazadas), (1, 1))
+        self.assertEqual(importacion.errores[0][0], 2)
+
+        importacion = self.importar('nombre,direcci\xf3n\n'.encode('latin-1'))
+        self.assertIn('encabezado', importacion.interrumpida)
+
+    def test_csv_mal_formado(self):
+        # Un campo más largo que csv.field_size_limit()
+        importacion = self.importar(self.ENCABEZADO + 'X,' + 'a' * (csv.field_size_limit() + 1) + '\n' + self.fila_csv('A'))
+        self.assertEqual(importacion.insertadas, 1)
+        self.assertEqual(importacion.errores[0][0], 2)
+        self.assertIn('CSV', importacion.errores[0][2])
+
+    def test_lotes_confirmados_por_separado(self):
+        contenido = self.ENCABEZADO + ''.join(self.fila_csv(f'F{n}') for n in range(5))
+        bulk_create = Inmueble.objects.bulk_create
+        llamadas = []
+
+        def fallar_en_el_segundo(lote, *args, **kwargs):
+            llamadas.append(len(lote))
+            if len(llamadas) == 2:
+                raise RuntimeError('base caída')
+            return bulk_create(lote, *args, **kwargs)
+
+        with mock.patch.object(Inmueble.objects, 'bulk_create', side_effect=fallar_en_el_segundo):
+            with self.assertRaises(RuntimeError):
+                self.importar(contenido, batch_size=2)
+        # El primer lote ya estaba confirmado; el segundo se revirtió entero
+        self.assertEqual(list(Inmueble.objects.values_list('nombre', flat=True).order_by('nombre')), ['F0', 'F1'])
+
+        importacion = self.importar(contenido, batch_size=2, simular=True)
+        self.assertEqual(importacion.insertadas, 5)
+        self.assertEqual(Inmueble.objects.count(), 2)
+
+
+class InmuebleFormTests(TestCase):
+    DATOS = {
+        'nombre': 'Depto', 'descripcion': 'Céntrico', 'm2_construidos': 50, 'm2_totales': 55,
+        'estacionamientos': 1, 'habitaciones': 2, 'banos': 1, 'direccion': 'Calle 1',
+        'precio_mensual': 450000, 'tipo_inmueble': 'DEPARTAMENTO',
+    }
+
+    def setUp(self):
+        indice = IndiceUbicaciones(
+            [{'codigo': '13', 'nombre': 'Metropolitana'}, {'codigo': '05', 'nombre': 'Valparaíso'}],
+            {'13': [{'codigo': '13101', 'nombre': 'Santiago'}], '05': [{'codigo': '05101', 'nombre': 'Valparaíso'}]},
+        )
+        mock.patch.object(ChileanLocationService, 'indice', return_value=indice).start()
+        self.addCleanup(mock.patch.stopall)
+        self.arrendador = PerfilUsuario.objects.create(
+            username='arrendador', tipo_usuario=PerfilUsuario.TipoUsuario.ARRENDADOR)
+
+    def formulario(self, **ubicacion):
+        return InmuebleForm(data={**self.DATOS, **ubicacion}, user=self.arrendador)
+
+    def test_choices_desde_el_indice(self):
+        form = InmuebleForm(user=self.arrendador)
+        self.assertNotIn('propietario', form.fields)
+        self.assertEqual(form.fields['region_codigo'].choices,
+                         [('', 'Selecciona una región'), ('13', 'Metropolitana'), ('05', 'Valparaíso')])
+        self.assertEqual(form.fields['comuna_codigo'].choices, [('', 'Primero selecciona una región')])
+
+        # Con región enviada (o de la instancia) se cargan sus comunas
+        self.assertEqual(self.formulario(region_codigo='05').fields['comuna_codigo'].choices,
+                         [('', 'Selecciona una comuna'), ('05101', 'Valparaíso')])
+        instancia = Inmueble(region_codigo='13', comuna_codigo='13101')
+        form = InmuebleForm(instance=instancia, user=self.arrendador)
+        self.assertEqual(form.fields['comuna_codigo'].initial, '13101')
+        self.assertEqual(form.fields['comuna_codigo'].choices[1:], [('13101', 'Santiago')])
+
+    def test_region_sin_comunas_en_el_indice(self):
+        form = self.formulario(region_codigo='99', comuna_codigo='99101')
+        self.assertEqual(form.fields['comuna_codigo'].choices, [('', 'Error cargando comunas')])
+        self.assertFalse(form.is_valid())
+        self.assertIn('region_codigo', form.errors)
+
+    def test_indice_vacio(self):
+        ChileanLocationService.indice.return_value = IndiceUbicaciones([], {})
+        form = self.formulario(region_codigo='13', comuna_codigo='13101')
+        self.assertEqual(form.fields['region_codigo'].choices, [('', 'Error cargando regiones')])
+        self.assertFalse(form.is_valid())
+
+    def test_comuna_de_otra_region(self):
+        # 05101 no está entre las opciones de la región 13: lo rechaza el ChoiceField
+        form = self.formulario(region_codigo='13', comuna_codigo='05101')
+        self.assertFalse(form.is_valid())
+        self.assertIn('comuna_codigo', form.errors)
+
+        # Aunque las opciones la acepten, clean() comprueba la región de la comuna en el índice
+        form = self.formulario(region_codigo='13', comuna_codigo='05101')
+        form.fields['comuna_codigo'].choices.append(('05101', 'Valparaíso'))
+        self.assertFalse(form.is_valid())
+        self.assertEqual(form.errors['comuna_codigo'], ['La comuna no pertenece a la región seleccionada.'])
+
+    def test_guarda_nombres_del_indice(self):
+        form = self.formulario(region_codigo='05', comuna_codigo='05101')
+        self.assertTrue(form.is_valid(), form.errors)
+        inmueble = form.save(commit=False)
+        self.assertEqual((inmueble.region_nombre, inmueble.comuna_nombre), ('Valparaíso', 'Valparaíso'))
+
+
+class AlmacenamientoContenidoTests(TestCase):
+
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        configuracion = override_settings(MEDIA_ROOT=media.name)
+        configuracion.enable()
+        self.addCleanup(configuracion.disable)
+
+    def referencias(self, nombre):
+        return ArchivoContenido.objects.filter(ruta=nombre).values_list('referencias', flat=True).first()
+
+    def test_subidas_iguales_comparten_archivo(self):
+        primero = default_storage.save('foto_perfil/a.JPG', ContentFile(b'mismo contenido'))
+        segundo = default_storage.save('inmuebles/galeria/b.jpg', ContentFile(b'mismo contenido'))
+        otro = default_storage.save('inmuebles/galeria/b.jpg', ContentFile(b'otro contenido'))
+
+        self.assertEqual(primero, ruta_contenido(hashlib.sha256(b'mismo contenido').hexdigest(), '.jpg'))
+        self.assertEqual(primero, segundo)
+        self.assertNotEqual(primero, otro)
+        self.assertEqual(self.referencias(primero), 2)
+        self.assertEqual(self.referencias(otro), 1)
+        # Sin temporales sueltos
+        self.assertEqual(os.listdir(default_storage.carpeta_temporal()), [])
+
+    def test_referencias_al_reemplazar_y_borrar(self):
+        uno = PerfilUsuario.objects.create(username='uno')
+        dos = PerfilUsuario.objects.create(username='dos')
+        with self.captureOnCommitCallbacks(execute=True):
+            uno.imagen.save('a.jpg', ContentFile(b'foto'))
+            dos.imagen.save('b.jpg', ContentFile(b'foto'))
+        compartida = uno.imagen.name
+        self.assertEqual(self.referencias(compartida), 2)
+
+        # Reemplazar la de uno suelta su referencia, pero dos la sigue usando
+        with self.captureOnCommitCallbacks(execute=True):
+            uno.imagen.save('c.jpg', ContentFile(b'otra foto'))
+        self.assertEqual(self.referencias(compartida), 1)
+        self.assertTrue(default_storage.exists(compartida))
+
+        # Borrar la última referencia borra el archivo y su fila
+        with self.captureOnCommitCallbacks(execute=True):
+            dos.delete()
+        self.assertIsNone(self.referencias(compartida))
+        self.assertFalse(default_storage.exists(compartida))
+
+        # Hasta que la transacción se confirma no se suelta nada
+        with self.captureOnCommitCallbacks(execute=False):
+            uno.delete()
+        self.assertEqual(self.referencias(uno.imagen.name), 1)
+
+    def test_borrar_si_huerfano_no_borra_contenido_compartido(self):
+        usado = default_storage.save('a.jpg', ContentFile(b'en uso'))
+        self.assertFalse(default_storage.borrar_si_huerfano(usado))
+        self.assertTrue(default_storage.exists(usado))
+        self.assertEqual(self.referencias(usado), 1)
+
+        # Archivo sin fila (p. ej. de una transacción revertida)
+        huerfano = ruta_contenido(hashlib.sha256(b'huerfano').hexdigest(), '.jpg')
+        os.makedirs(os.path.dirname(default_storage.path(huerfano)))
+        with open(default_storage.path(huerfano), 'wb') as archivo:
+            archivo.write(b'huerfano')
+        self.assertTrue(default_storage.borrar_si_huerfano(huerfano))
+        self.assertFalse(default_storage.exists(huerfano))
+        self.assertIsNone(self.referencias(huerfano))
+
+    def test_rehash_media_es_idempotente(self):
+        for nombre in ('foto_perfil/a.jpg', 'foto_perfil/b.jpg', 'inmuebles/galeria/c.jpg', 'inmuebles/variantes/1/chica.jpg'):
+            os.makedirs(os.path.dirname(default_storage.path(nombre)), exist_ok=True)
+            with open(default_storage.path(nombre), 'wb') as archivo:
+                archivo.write(b'igual')
+        uno = PerfilUsuario.objects.create(username='uno', imagen='foto_perfil/a.jpg')
+        dos = PerfilUsuario.objects.create(username='dos', imagen='foto_perfil/b.jpg')
+        inmueble = Inmueble.objects.create(
+            nombre='Casa', descripcion='-', direccion='Calle 1', precio_mensual=500000, tipo_inmueble='CASA',
+        )
+        imagen = ImagenInmueble.objects.create(
+            inmueble=inmueble, imagen='inmuebles/galeria/c.jpg',
+            variantes={'chica': {'ancho': 1, 'alto': 1, 'jpeg': 'inmuebles/variantes/1/chica.jpg'}},
+        )
+        PerfilUsuario.objects.create(username='tres', imagen='foto_perfil/no-existe.jpg')
+
+        call_command('rehash_media', stdout=io.StringIO())
+        nuevo = ruta_contenido(hashlib.sha256(b'igual').hexdigest(), '.jpg')
+        uno.refresh_from_db()
+        dos.refresh_from_db()
+        imagen.refresh_from_db()
+        self.assertEqual({uno.imagen.name, dos.imagen.name, imagen.imagen.name, imagen.variantes['chica']['jpeg']}, {nuevo})
+        self.assertEqual(self.referencias(nuevo), 4)
+        self.assertFalse(default_storage.exists('foto_perfil/a.jpg'))
+        self.assertEqual(PerfilUsuario.objects.get(username='tres').imagen.name, 'foto_perfil/no-existe.jpg')
+
+        # Una segunda pasada no cambia nada ni suma referencias
+        call_command('rehash_media', stdout=io.StringIO())
+        imagen.refresh_from_db()
+        self.assertEqual(imagen.variantes['chica']['jpeg'], nuevo)
+        self.assertEqual(self.referencias(nuevo), 4)
+        self.assertEqual(ArchivoContenido.objects.count(), 1)
+
+
+REGIONES_DPA = [
+    {'codigo': '13', 'nombre': 'Metropolitana de Santiago', 'lat': -33.4, 'lng': -70.6},
+    {'codigo': '05', 'nombre': 'Valparaíso', 'lat': -33.0, 'lng': -71.6},
+    {'codigo': '16', 'nombre': 'Ñuble', 'lat': -36.6, 'lng': -72.1},
+]
+COMUNAS_DPA = {
+    '13': [
+        {'codigo': '13120', 'nombre': 'Ñuñoa', 'codigo_padre': '131', 'lat': -33.45, 'lng': -70.6},
+        {'codigo': '13101', 'nombre': 'Santiago', 'codigo_padre': '131'},
+    ],
+    '05': [{'codigo': '05109', 'nombre': 'Viña del Mar', 'codigo_padre': '051'}],
+    '16': [],
+}
+
+
+class GazetteerSnapshotTests(SimpleTestCase):
+
+    def setUp(self):
+        carpeta = tempfile.TemporaryDirectory()
+        self.addCleanup(carpeta.cleanup)
+        self.path = os.path.join(carpeta.name, 'dpa.snapshot')
+
+    def abrir(self):
+        snapshot = GazetteerSnapshot(self.path)
+        self.addCleanup(snapshot._mm.close)
+        return snapshot
+
+    def test_ida_y_vuelta(self):
+        escribir_snapshot(self.path, REGIONES_DPA, COMUNAS_DPA, generado=1_700_000_000.0)
+        snapshot = self.abrir()
+        self.assertEqual((snapshot.n_regiones, snapshot.n_comunas, snapshot.generado), (3, 3, 1_700_000_000.0))
+
+        # Regiones por código y comunas agrupadas por región, también ordenadas
+        self.assertEqual([r['codigo'] for r in snapshot.regiones()], ['05', '13', '16'])
+        self.assertEqual([c['codigo'] for c in snapshot.comunas('13')], ['13101', '13120'])
+        self.assertEqual([c['codigo'] for c in snapshot.todas_las_comunas()], ['05109', '13101', '13120'])
+        self.assertEqual(snapshot.comunas('16'), [])
+        self.assertEqual(snapshot.region('16')['nombre'], 'Ñuble')
+        self.assertEqual(snapshot.comuna('13120'), {
+            'codigo': '13120', 'tipo': 'comuna', 'nombre': 'Ñuñoa', 'lat': -33.45, 'lng': -70.6, 'codigo_padre': '131',
+        })
+        self.assertEqual(snapshot.region_de_comuna('05109'), '05')
+        self.assertEqual(snapshot.comuna('05109')['lat'], 0.0)  # sin coordenadas
+
+    def test_cabecera_y_offsets(self):
+        escribir_snapshot(self.path, REGIONES_DPA, COMUNAS_DPA, generado=1.0)
+        with open(self.path, 'rb') as f:
+            datos = f.read()
+        magic, version, _, _, n_regiones, n_comunas, off_strings = struct.unpack_from('<4sHHdIII', datos)
+        self.assertEqual((magic, version, n_regiones, n_comunas), (b'DPA1', 1, 3, 3))
+        self.assertEqual(off_strings, struct.calcsize('<4sHHdIII') + 3 * struct.calcsize('<8sIHIIdd')
+                         + 3 * struct.calcsize('<8s8s8sIHdd') + 3 * 4)
+        nombres = ''.join(r['nombre'] for r in sorted(REGIONES_DPA, key=lambda r: r['codigo'])).encode('utf-8')
+        self.assertEqual(len(datos) - off_strings, len(nombres) + len('Viña del MarSantiagoÑuñoa'.encode('utf-8')))
+
+    def test_busqueda_binaria(self):
+        regiones = [{'codigo': f'{r:02d}', 'nombre': f'Región {r}'} for r in range(1, 60, 2)]
+        comunas = {
+            r['codigo']: [{'codigo': f"{r['codigo']}{c:03d}", 'nombre': f"Comuna {r['codigo']}-{c}"} for c in range(7, 0, -1)]
+            for r in regiones
+        }
+        escribir_snapshot(self.path, list(reversed(regiones)), comunas)
+        snapshot = self.abrir()
+        for region in regiones:
+            self.assertEqual(snapshot.region(region['codigo'])['nombre'], region['nombre'])
+            for comuna in comunas[region['codigo']]:
+                self.assertEqual(snapshot.comuna(comuna['codigo'])['nombre'], comuna['nombre'])
+                self.assertEqual(snapshot.region_de_comuna(comuna['codigo']), region['codigo'])
+        # Antes del primero, entre dos, después del último
+        for codigo in ('00', '02', '60', '99'):
+            self.assertIsNone(snapshot.region(codigo))
+        for codigo in ('00000', '01000', '01008', '02001', '59008', '99999'):
+            self.assertIsNone(snapshot.comuna(codigo))
+            self.assertIsNone(snapshot.region_de_comuna(codigo))
+
+    def test_archivo_truncado_o_corrupto(self):
+        escribir_snapshot(self.path, REGIONES_DPA, COMUNAS_DPA)
+        with open(self.path, 'rb') as f:
+            datos = f.read()
+        for contenido in (datos[:-3], datos[:len(datos) // 2], datos[:10], b'XXXX' + datos[4:], b''):
+            with open(self.path, 'wb') as f:
+                f.write(contenido)
+            with self.assertRaises(SnapshotError):
+                GazetteerSnapshot(self.path)
+
+
+class GazetteerStoreTests(SimpleTestCase):
+
+    def setUp(self):
+        carpeta = tempfile.TemporaryDirectory()
+        self.addCleanup(carpeta.cleanup)
+        self.path = os.path.join(carpeta.name, 'dpa.snapshot')
+        self.descargas = 0
+        self.fallar = False
+        self.liberar = threading.Event()
+        self.liberar.set()
+
+    def fetch(self):
+        self.liberar.wait(5)
+        self.descargas += 1
+        if self.fallar:
+            raise requests.ConnectionError('sin red')
+        return [{'codigo': '13', 'nombre': f'Metropolitana {self.descargas}'}], {'13': []}
+
+    def store(self, ttl=60):
+        store = GazetteerStore(self.path, ttl=ttl, fetch=self.fetch, reintento=300)
+        store.intervalo_revision = 0
+        return store
+
+    def esperar_refresco(self, store):
+        for hilo in threading.enumerate():
+            if hilo.name == 'dpa-refresh':
+                hilo.join(5)
+
+    def test_en_frio_descarga_y_bloquea(self):
+        store = self.store()
+        self.assertEqual(store.get().region('13')['nombre'], 'Metropolitana 1')
+        self.assertTrue(os.path.exists(self.path))
+        store.get()
+        self.assertEqual(self.descargas, 1)
+
+    def test_vencido_sirve_el_anterior_mientras_renueva(self):
+        escribir_snapshot(self.path, [{'codigo': '13', 'nombre': 'Viejo'}], {'13': []}, generado=time.time() - 3600)
+        store = self.store()
+        self.liberar.clear()
+        # No espera la descarga: responde con el vencido y renueva en otro hilo
+        self.assertEqual(store.get().region('13')['nombre'], 'Viejo')
+        self.assertEqual(store.get().region('13')['nombre'], 'Viejo')
+        self.liberar.set()
+        self.esperar_refresco(store)
+        self.assertEqual(self.descargas, 1)
+        self.assertEqual(store.get().region('13')['nombre'], 'Metropolitana 1')
+
+    def test_si_la_api_falla_conserva_el_ultimo_bueno(self):
+        escribir_snapshot(self.path, [{'codigo': '13', 'nombre': 'Viejo'}], {'13': []}, generado=time.time() - 3600)
+        store = self.store()
+        self.fallar = True
+        self.assertFalse(store.refrescar())
+        self.assertEqual(store.get().region('13')['nombre'], 'Viejo')
+        # No reintenta hasta pasado `reintento`
+        store.get()
+        self.esperar_refresco(store)
+        self.assertEqual(self.descargas, 1)
+
+    def test_archivo_corrupto_no_reemplaza_al_vigente(self):
+        escribir_snapshot(self.path, [{'codigo': '13', 'nombre': 'Bueno'}], {'13': []})
+        store = self.store()
+        self.assertEqual(store.get().region('13')['nombre'], 'Bueno')
+        # Reemplazado (no truncado en el lugar: el vigente lo tiene mapeado) por uno corrupto
+        with open(self.path, 'rb') as f:
+            datos = f.read()
+        with open(f'{self.path}.tmp', 'wb') as f:
+            f.write(datos[:len(datos) - 2])
+        os.replace(f'{self.path}.tmp', self.path)
+        self.assertEqual(store.get().region('13')['nombre'], 'Bueno')
+
+
+class SyncDPATests(TestCase):
+
+    def setUp(self):
+        carpeta = tempfile.TemporaryDirectory()
+        self.addCleanup(carpeta.cleanup)
+        self.carpeta = carpeta.name
+        self.archivo = os.path.join(carpeta.name, 'dpa.json')
+        self.escribir(REGIONES_DPA, COMUNAS_DPA)
+
+    def escribir(self, regiones, comunas_por_region):
+        with open(self.archivo, 'w', encoding='utf-8') as f:
+            json.dump({'regiones': regiones, 'comunas_por_region': comunas_por_region}, f)
+
+    def test_sincroniza_y_es_idempotente(self):
+        # Región creada a mano, sin código: recibe el oficial en vez de duplicarse
+        Region.objects.create(nro_region='V', nombre='Valparaíso')
+        call_command('sync_dpa', archivo=self.archivo, stdout=io.StringIO())
+        self.assertEqual(Region.objects.count(), 3)
+        self.assertEqual(Region.objects.get(nombre='Valparaíso').codigo, '05')
+        self.assertEqual(Comuna.objects.get(codigo='13120').region.codigo, '13')
+
+        # Con un nombre cambiado y una comuna que cambia de región
+        comunas = {**COMUNAS_DPA, '13': [{'codigo': '13101', 'nombre': 'Santiago Centro'}],
+                   '16': [{'codigo': '13120', 'nombre': 'Ñuñoa'}]}
+        self.escribir(REGIONES_DPA, comunas)
+        call_command('sync_dpa', archivo=self.archivo, stdout=io.StringIO())
+        self.assertEqual((Region.objects.count(), Comuna.objects.count()), (3, 3))
+        self.assertEqual(Comuna.objects.get(codigo='13101').nombre, 'Santiago Centro')
+        self.assertEqual(Comuna.objects.get(codigo='13120').region.codigo, '16')
+
+    def test_escribe_el_snapshot(self):
+        path = os.path.join(self.carpeta, 'dpa.snapshot')
+        with override_settings(DPA_SNAPSHOT_PATH=path):
+            call_command('sync_dpa', archivo=self.archivo, snapshot=True, stdout=io.StringIO())
+        snapshot = GazetteerSnapshot(path)
+        self.addCleanup(snapshot._mm.close)
+        self.assertEqual(snapshot.comuna('13120')['nombre'], 'Ñuñoa')
+
+    def test_modo_db_con_las_claves_del_snapshot(self):
+        path = os.path.join(self.carpeta, 'dpa.snapshot')
+        with override_settings(DPA_SNAPSHOT_PATH=path):
+            call_command('sync_dpa', archivo=self.archivo, snapshot=True, stdout=io.StringIO())
+        snapshot = GazetteerSnapshot(path)
+        self.addCleanup(snapshot._mm.close)
+        mock.patch.object(ChileanLocationService, 'snapshot', return_value=snapshot).start()
+        self.addCleanup(mock.patch.stopall)
+
+        with override_settings(DPA_LOCATION_BACKEND='snapshot'):
+            regiones, comunas = ChileanLocationService.get_regiones(), ChileanLocationService.get_all_comunas()
+        with override_settings(DPA_LOCATION_BACKEND='db'):
+            regiones_db, comunas_db = ChileanLocationService.get_regiones(), ChileanLocationService.get_all_comunas()
+        self.assertEqual([sorted(r) for r in regiones_db], [sorted(r) for r in regiones])
+        self.assertEqual([sorted(c) for c in comunas_db], [sorted(c) for c in comunas])
+        # Sin coordenadas ni provincia en las tablas; el resto coincide
+        self.assertEqual(regiones_db, [{**r, 'lat': None, 'lng': None} for r in regiones])
+        self.assertEqual(
+            sorted(comunas_db, key=lambda c: c['codigo']),
+            sorted(({**c, 'lat': None, 'lng': None, 'codigo_padre': None} for c in comunas), key=lambda c: c['codigo']),
+        )
+
+
+class PayloadsUbicacionesTests(SimpleTestCase):
+
+    def setUp(self):
+        self.payloads = PayloadsUbicaciones(REGIONES_DPA, COMUNAS_DPA)
+        mock.patch.object(ChileanLocationService, 'payloads', return_value=self.payloads).start()
+        self.addCleanup(mock.patch.stopall)
+
+    def get(self, url, **cabeceras):
+        return self.client.get(url, **{f'HTTP_{k.upper()}': v for k, v in cabeceras.items()})
+
+    @skipIf(brotli is None, 'brotli no está instalado')
+    def test_elige_la_codificacion_segun_accept_encoding(self):
+        casos = [
+            ('gzip, deflate, br', 'br', brotli.decompress),
+            ('gzip;q=1.0, br;q=0', 'gzip', gzip.decompress),
+            ('identity', None, lambda cuerpo: cuerpo),
+            ('', None, lambda cuerpo: cuerpo),
+        ]
+        etags = set()
+        for accept_encoding, codificacion, descomprimir in casos:
+            with self.subTest(accept_encoding=accept_encoding):
+                response = self.get('/api/regiones/', accept_encoding=accept_encoding)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response.get('Content-Encoding'), codificacion)
+                self.assertIn('Accept-Encoding', response['Vary'])
+                self.assertEqual(json.loads(descomprimir(response.content)), REGIONES_DPA)
+                etags.add((codificacion, response['ETag']))
+        # Un ETag por variante: una caché no mezcla cuerpos comprimidos y planos
+        self.assertEqual(len({etag for _, etag in etags}), 3)
+
+    def test_sin_brotli_sirve_gzip(self):
+        with mock.patch('portal.payloads.brotli', None):
+            payload = PayloadsUbicaciones(REGIONES_DPA, COMUNAS_DPA).regiones
+        self.assertNotIn('br', payload.variantes)
+        self.assertEqual(payload.elegir('br, gzip'), 'gzip')
+
+    def test_if_none_match_responde_304(self):
+        response = self.get('/api/comunas/?region=13', accept_encoding='gzip')
+        self.assertEqual([c['codigo'] for c in json.loads(gzip.decompress(response.content))], ['13120', '13101'])
+        etag = response['ETag']
+
+        for if_none_match in (etag, f'W/{etag}', f'"otro", {etag}', '*'):
+            with self.subTest(if_none_match=if_none_match):
+                response = self.get('/api/comunas/?region=13', accept_encoding='gzip', if_none_match=if_none_match)
+                self.assertEqual(response.status_code, 304)
+                self.assertEqual(response.content, b'')
+                self.assertEqual(response['ETag'], etag)
+                self.assertIn('Accept-Encoding', response['Vary'])
+
+        # Otra región (o un ETag viejo) no coincide
+        response = self.get('/api/comunas/?region=05', if_none_match=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.content)[0]['nombre'], 'Viña del Mar')
+        self.assertEqual(json.loads(self.get('/api/comunas/?region=99').content), [])
+
+
+class ListadoInmueblesTests(TestCase):
+
+    def setUp(self):
+        mock.patch.object(InmueblesListView, 'paginate_by', 2).start()
+        self.addCleanup(mock.patch.stopall)
+        self.arrendador = PerfilUsuario.objects.create(
+            username='arrendador', tipo_usuario=PerfilUsuario.TipoUsuario.ARRENDADOR)
+        for n in range(5):
+            Inmueble.objects.create(
+                nombre=f'Casa {n}', descripcion='-', direccion='Calle 1', precio_mensual=500000 + n,
+                tipo_inmueble='CASA', esta_publicado=n != 4, propietario=self.arrendador if n >= 3 else None,
+            )
+
+    def nombres(self, response):
+        return [inmueble.nombre for inmueble in response.context['inmuebles']]
+
+    def enlace(self, response, etiqueta):
+        encontrado = re.search(rf'href="\?([^"]*)"[^>]*>\s*(?:<span[^>]*>[^<]*</span>\s*)?{etiqueta}', response.content.decode())
+        return html.unescape(encontrado.group(1)) if encontrado else None
+
+    def recorrer(self, url, siguiente):
+        """Nombres por página siguiendo los enlaces "siguiente" del HTML"""
+        paginas = []
+        response = self.client.get(url)
+        while True:
+            self.assertEqual(response.status_code, 200)
+            paginas.append(self.nombres(response))
+            consulta = self.enlace(response, siguiente)
+            if consulta is None:
+                return paginas, response
+            response = self.client.get(f'{url}?{consulta}')
+
+    def test_sigue_los_enlaces_de_cursor(self):
+        paginas, ultima = self.recorrer('/listar_inmuebles/', 'Siguientes')
+        self.assertTemplateUsed(ultima, 'inmuebles/inmueble_list.html')
+        self.assertEqual(paginas, [['Casa 3', 'Casa 2'], ['Casa 1', 'Casa 0']])
+
+        # "Anteriores" vuelve a la primera página
+        response = self.client.get(f'/listar_inmuebles/?{self.enlace(ultima, "Anteriores")}')
+        self.assertEqual(self.nombres(response), ['Casa 3', 'Casa 2'])
+        self.assertIsNone(self.enlace(response, 'Anteriores'))
+
+        # El orden y los filtros se conservan en los enlaces
+        paginas, _ = self.recorrer('/listar_inmuebles/?orden=precio&tipo_inmueble=CASA', 'Siguientes')
+        self.assertEqual(paginas, [['Casa 0', 'Casa 1'], ['Casa 2', 'Casa 3']])
+
+    def test_mis_inmuebles(self):
+        response = self.client.get('/mis-inmuebles/')
+        self.assertRedirects(response, '/account/login/', fetch_redirect_response=False)
+
+        self.client.force_login(self.arrendador)
+        paginas, ultima = self.recorrer('/mis-inmuebles/', 'Siguiente')
+        self.assertTemplateUsed(ultima, 'inmuebles/mis_inmuebles.html')
+        self.assertEqual(paginas, [['Casa 4', 'Casa 3']])
+        self.assertEqual(
+            [ultima.context[clave] for clave in ('total_propiedades', 'propiedades_publicadas', 'propiedades_no_publicadas')],
+            [2, 1, 1],
+        )
+        response = self.client.get('/mis-inmuebles/?estado=no_publicado')
+        self.assertEqual(self.nombres(response), ['Casa 4'])
+
+    def test_cursor_invalido(self):
+        self.assertEqual(self.client.get('/listar_inmuebles/?cursor=no-es-un-cursor').status_code, 404)
+
+
+class BusquedaFacetadaTests(TestCase):
+    # (nombre, comuna, tipo, precio, habitaciones, m2 construidos)
+    INMUEBLES = [
+        ('Depto Centro', '13101', 'DEPARTAMENTO', 280000, 1, 40),
+        ('Depto Parque', '13101', 'DEPARTAMENTO', 450000, 2, 60),
+        ('Casa Norte', '13120', 'CASA', 650000, 3, 120),
+        ('Casa Sur', '13120', 'CASA', 900000, 4, 180),
+        ('Parcela Costa', '05109', 'PARCELA', 500000, 2, 90),
+    ]
+    COMUNAS = {'13101': ('13', 'Santiago'), '13120': ('13', 'Ñuñoa'), '05109': ('05', 'Viña del Mar')}
+
+    def setUp(self):
+        for nombre, comuna, tipo, precio, habitaciones, m2 in self.INMUEBLES:
+            region, comuna_nombre = self.COMUNAS[comuna]
+            Inmueble.objects.create(
+                nombre=nombre, descripcion='-', direccion='Calle 1', precio_mensual=precio, tipo_inmueble=tipo,
+                habitaciones=habitaciones, m2_construidos=m2, esta_publicado=True,
+                comuna_codigo=comuna, comuna_nombre=comuna_nombre, region_codigo=region,
+                region_nombre='Metropolitana' if region == '13' else 'Valparaíso',
+            )
+        # No publicado: nunca aparece en el listado público
+        Inmueble.objects.create(nombre='Casa Borrador', descripcion='-', direccion='Calle 1', precio_mensual=650000,
+                                tipo_inmueble='CASA', comuna_codigo='13120', region_codigo='13')
+
+    def buscar(self, **parametros):
+        form = BusquedaInmuebleForm(parametros)
+        self.assertTrue(form.is_valid(), form.errors)
+        queryset = filtrar_inmuebles(Inmueble.publicados(), form.cleaned_data)
+        return sorted(queryset.values_list('nombre', flat=True))
+
+    def test_los_filtros_acotan_el_resultado(self):
+        self.assertEqual(self.buscar(tipo_inmueble='CASA'), ['Casa Norte', 'Casa Sur'])
+        self.assertEqual(self.buscar(comuna_codigo='13101', habitaciones='2'), ['Depto Parque'])
+        self.assertEqual(self.buscar(region_codigo='13', precio_max='500000'), ['Depto Centro', 'Depto Parque'])
+        # El rango es [mínimo, máximo): 500.000 cae en 500_800; un precio_min mayor manda
+        self.assertEqual(self.buscar(rango_precio='500_800'), ['Casa Norte', 'Parcela Costa'])
+        self.assertEqual(self.buscar(rango_precio='500_800', precio_min='600000'), ['Casa Norte'])
+        self.assertEqual(self.buscar(m2_construidos_min='60', m2_construidos_max='120'),
+                         ['Casa Norte', 'Depto Parque', 'Parcela Costa'])
+        self.assertEqual(self.buscar(tipo_inmueble='CASA', habitaciones='5'), [])
+
+    def test_formulario(self):
+        # orden y cursor no son filtros: sin ellos no hay modo búsqueda
+        form = BusquedaInmuebleForm({'orden': 'precio', 'cursor': 'x'})
+        self.assertTrue(form.is_valid())
+        self.assertFalse(hay_filtros(form.cleaned_data))
+        form = BusquedaInmuebleForm({'habitaciones': '0'})
+        self.assertTrue(form.is_valid())
+        self.assertTrue(hay_filtros(form.cleaned_data))
+
+        form = BusquedaInmuebleForm({'precio_min': '500000', 'precio_max': '100000'})
+        self.assertFalse(form.is_valid())
+        self.assertIn('precio_max', form.errors)
+        self.assertFalse(BusquedaInmuebleForm({'tipo_inmueble': 'CASTILLO'}).is_valid())
+
+    def test_facetas_en_una_consulta(self):
+        with self.assertNumQueries(1):
+            resultado = facetas(Inmueble.publicados())
+        self.assertEqual(sorted((c['codigo'], c['total']) for c in resultado['comuna']),
+                         [('05109', 1), ('13101', 2), ('13120', 2)])
+        self.assertEqual([(r['codigo'], r['total']) for r in resultado['region']], [('13', 4), ('05', 1)])
+        self.assertEqual(sorted((t['valor'], t['nombre'], t['total']) for t in resultado['tipo_inmueble']),
+                         [('CASA', 'Casa', 2), ('DEPARTAMENTO', 'Departamento', 2), ('PARCELA', 'Parcela', 1)])
+        self.assertEqual([(h['valor'], h['total']) for h in resultado['habitaciones']],
+                         [(1, 1), (2, 2), (3, 1), (4, 1)])
+        self.assertEqual([(p['valor'], p['total']) for p in resultado['rango_precio']],
+                         [('hasta_300', 1), ('300_500', 1), ('500_800', 2), ('desde_800', 1)])
+
+        # Sobre un resultado filtrado cuentan solo sus filas
+        with self.assertNumQueries(1):
+            resultado = facetas(Inmueble.publicados().filter(region_codigo='13', tipo_inmueble='CASA'))
+        self.assertEqual([(c['codigo'], c['total']) for c in resultado['comuna']], [('13120', 2)])
+        self.assertEqual([(p['valor'], p['total']) for p in resultado['rango_precio']],
+                         [('500_800', 1), ('desde_800', 1)])
+
+    def test_listado_con_filtros_y_facetas(self):
+        response = self.client.get('/listar_inmuebles/?region_codigo=13&habitaciones=2')
+        self.assertEqual(sorted(i.nombre for i in response.context['inmuebles']), ['Casa Norte', 'Casa Sur', 'Depto Parque'])
+        self.assertEqual([(t['valor'], t['total']) for t in response.context['facetas']['tipo_inmueble']],
+                         [('CASA', 2), ('DEPARTAMENTO', 1)])
+        self.assertContains(response, 'Casa (2)')
+        self.assertContains(response, 'Ñuñoa (2)')
+
+        # Sin filtros no se calculan facetas
+        response = self.client.get('/listar_inmuebles/')
+        self.assertNotIn('facetas', response.context)
+        self.assertEqual(len(response.context['inmuebles']), 5)
+
+
+class BusquedaTextoTests(TestCase):
+
+    def crear(self, nombre, descripcion='-', **campos):
+        return Inmueble.objects.create(
+            nombre=nombre, descripcion=descripcion, direccion='Calle 1', precio_mensual=500000,
+            tipo_inmueble='CASA', esta_publicado=True, **campos,
+        )
+
+    def vector(self, inmueble):
+        return Inmueble.objects.values_list('busqueda', flat=True).get(pk=inmueble.pk)
+
+    def test_el_trigger_mantiene_el_vector(self):
+        inmueble = self.crear('Casa con piscina', 'Amplio patio', comuna_nombre='Providencia')
+        vector = self.vector(inmueble)
+        self.assertIn("'piscin':", vector)
+        self.assertIn("'provident':", vector)
+
+        # Cambia un texto: se recalcula
+        inmueble.descripcion = 'Quincho y terraza'
+        inmueble.save()
+        self.assertIn("'quinch':", self.vector(inmueble))
+        self.assertNotIn("'pati':", self.vector(inmueble))
+
+        # Cambia otro campo (o el ORM escribe un vector viejo): se conserva
+        Inmueble.objects.filter(pk=inmueble.pk).update(precio_mensual=1, busqueda=None)
+        self.assertIn("'quinch':", self.vector(inmueble))
+
+    def test_el_vector_no_se_carga_ni_se_reescribe(self):
+        inmueble = Inmueble.objects.get(pk=self.crear('Casa').pk)
+        self.assertIn('busqueda', inmueble.get_deferred_fields())
+        inmueble.nombre = 'Casa con piscina'
+        with CaptureQueriesContext(connection) as consultas:
+            inmueble.save()
+        self.assertNotIn('"busqueda"', consultas[0]['sql'])
+        self.assertEqual(list(buscar_texto(Inmueble.objects.all(), 'piscina')), [inmueble])
+
+    def test_ranking_por_peso(self):
+        descripcion = self.crear('Casa amplia', 'Tiene piscina temperada')
+        nombre = self.crear('Casa con piscina')
+        self.crear('Departamento centrico')
+        resultado = list(buscar_texto(Inmueble.objects.all(), 'piscina').order_by('-rango'))
+        # El nombre pesa más (A) que la descripción (C); lo que no calza no aparece
+        self.assertEqual(resultado, [nombre, descripcion])
+        self.assertIsInstance(resultado[0].rango, float)
+        self.assertGreater(resultado[0].rango, resultado[1].rango)
+        # websearch: "-palabra" excluye
+        self.assertEqual(list(buscar_texto(Inmueble.objects.all(), 'piscina -temperada')), [nombre])
+
+    def test_cursor_por_relevancia(self):
+        # Rangos repetidos: el desempate por id mantiene un orden total
+        for n in range(3):
+            self.crear(f'Casa con piscina {n}')
+            self.crear(f'Casa {n}', 'con piscina')
+        self.crear('Departamento')
+        queryset = buscar_texto(Inmueble.publicados(), 'piscina')
+        vistos, cursor = [], None
+        while True:
+            pagina = KeysetPaginator(queryset, per_page=4).page(cursor)
+            vistos.extend(pagina.object_list)
+            cursor = pagina.cursor_siguiente
+            if cursor is None:
+                break
+        esperado = sorted(queryset, key=lambda i: (-i.rango, -i.pk))
+        self.assertEqual(vistos, esperado)
+        self.assertEqual(KeysetPaginator(queryset, per_page=4).orden, 'relevancia')
+
+        # En el listado, ?q= ordena por relevancia y pagina con cursor
+        with mock.patch.object(InmueblesListView, 'paginate_by', 4):
+            response = self.client.get('/listar_inmuebles/?q=piscina')
+            self.assertEqual(list(response.context['inmuebles']), esperado[:4])
+            siguiente = self.client.get(f"/listar_inmuebles/?{response.context['page_obj'].url_siguiente()}")
+        self.assertEqual(list(siguiente.context['inmuebles']), esperado[4:])
+
+
+class PresupuestoConsultasTests(TestCase):
+    CONFIG = {'MUESTREO': 1.0, 'POR_DEFECTO': 20, 'VISTAS': {'vista_prueba': 3}, 'N_MAS_UNO': 4, 'CABECERAS': True}
+
+    def setUp(self):
+        EstadisticasConsultas.reiniciar()
+        self.addCleanup(EstadisticasConsultas.reiniciar)
+
+    def ejecutar(self, consultas, **config):
+        """Pasa un request por el middleware con una vista que hace `consultas`"""
+        def vista(request):
+            self.wrappers = list(connection.execute_wrappers)
+            consultas()
+            return HttpResponse('ok')
+
+        request = RequestFactory().get('/prueba/')
+        request.resolver_match = SimpleNamespace(url_name='vista_prueba', view_name='prueba')
+        with override_settings(QUERY_BUDGET={**self.CONFIG, **config}):
+            return PresupuestoConsultasMiddleware(vista)(request)
+
+    def test_dentro_del_presupuesto(self):
+        with self.assertNoLogs('portal.middleware', 'WARNING'):
+            response = self.ejecutar(lambda: [Region.objects.count(), Comuna.objects.count()])
+        self.assertEqual(response['X-Consultas'], '2')
+        stats = EstadisticasConsultas.resumen()['vista_prueba']
+        self.assertEqual((stats['requests'], stats['max_consultas'], stats['excedidos']), (1, 2, 0))
+
+    def test_presupuesto_excedido(self):
+        with self.assertLogs('portal.middleware', 'WARNING') as logs:
+            self.ejecutar(lambda: [Region.objects.count(), Comuna.objects.count(), Inmueble.objects.count(),
+                                   PerfilUsuario.objects.count()])
+        self.assertIn('vista_prueba 4/3 consultas', logs.output[0])
+        stats = EstadisticasConsultas.resumen()['vista_prueba']
+        self.assertEqual((stats['presupuesto'], stats['excedidos'], stats['n_mas_uno']), (3, 1, []))
+
+    def test_detecta_n_mas_uno(self):
+        regiones = [Region.objects.create(nro_region=str(n), nombre=f'Región {n}') for n in range(5)]
+
+        def consultas():
+            # Misma consulta con distinto parámetro: una "huella" repetida
+            for region in regiones:
+                list(Comuna.objects.filter(region=region))
+
+        with self.assertLogs('portal.middleware', 'WARNING') as logs:
+            self.ejecutar(consultas, VISTAS={'vista_prueba': 10})
+        self.assertEqual(len(logs.output), 1)
+        self.assertIn('Possible N+1', logs.output[0])
+        self.assertIn('x5', logs.output[0])
+        [patron] = EstadisticasConsultas.resumen()['vista_prueba']['n_mas_uno']
+        self.assertEqual(patron['veces'], 1)
+        self.assertIn('portal/tests.py', patron['origen'])
+        self.assertIn('"portal_comuna"."region_id" = %s', patron['sql'])
+
+    def test_sin_muestreo_no_mide(self):
+        with self.assertNoLogs('portal.middleware', 'WARNING'):
+            response = self.ejecutar(lambda: [Region.objects.count() for _ in range(30)], MUESTREO=0)
+        self.assertEqual(self.wrappers, [])
+        self.assertNotIn('X-Consultas', response)
+        self.assertEqual(EstadisticasConsultas.resumen(), {})
+
+        # Sin CABECERAS se mide pero no se exponen
+        response = self.ejecutar(Region.objects.count, CABECERAS=False)
+        self.assertNotIn('X-Consultas', response)
+        self.assertEqual(EstadisticasConsultas.resumen()['vista_prueba']['consultas'], 1)
+
+
+class GenerarDatosTests(TestCase):
+
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        configuracion = override_settings(MEDIA_ROOT=media.name)
+        configuracion.enable()
+        self.addCleanup(configuracion.disable)
+
+    def generar(self, **opciones):
+        parametros = {'usuarios': 20, 'inmuebles': 15, 'solicitudes': 30, 'max_imagenes': 2, 'semilla': 7}
+        call_command('generar_datos', **{**parametros, **opciones}, stdout=io.StringIO())
+
+    def sinteticos(self):
+        inmuebles = Inmueble.objects.filter(propietario__username__startswith='sint_')
+        return {
+            'usuarios': PerfilUsuario.objects.filter(username__startswith='sint_').count(),
+            'inmuebles': inmuebles.count(),
+            'imagenes': ImagenInmueble.objects.filter(inmueble__in=inmuebles).count(),
+            'solicitudes': SolicitudArriendo.objects.filter(inmueble__in=inmuebles).count(),
+        }
+
+    def test_genera_y_limpia_solo_lo_generado(self):
+        # Datos propios que --limpiar no debe tocar
+        usuario = PerfilUsuario.objects.create(username='real', tipo_usuario=PerfilUsuario.TipoUsuario.ARRENDADOR)
+        inmueble = Inmueble.objects.create(nombre='Casa real', descripcion='-', direccion='Calle 1',
+                                           precio_mensual=500000, tipo_inmueble='CASA', propietario=usuario)
+        imagen = ImagenInmueble.objects.create(
+            inmueble=inmueble, imagen=default_storage.save('inmuebles/galeria/real.jpg', ContentFile(b'foto real')))
+        solicitud = SolicitudArriendo.objects.create(inmueble=inmueble, arrendatario=usuario, mensaje='Hola')
+
+        self.generar()
+        generados = self.sinteticos()
+        self.assertEqual((generados['usuarios'], generados['inmuebles'], generados['solicitudes']), (20, 15, 30))
+        self.assertGreater(generados['imagenes'], 0)
+        # Imágenes reales en el storage por contenido, una referencia por fila
+        muestras = ArchivoContenido.objects.exclude(ruta=imagen.imagen.name)
+        self.assertEqual(sum(muestras.values_list('referencias', flat=True)), generados['imagenes'])
+        self.assertTrue(all(default_storage.exists(ruta) for ruta in muestras.values_list('ruta', flat=True)))
+        self.assertFalse(Inmueble.objects.filter(imagenes__isnull=False, portada=None).exists())
+        self.assertEqual(Contadores.reconciliar(), {})
+
+        # Repetir con --limpiar reemplaza los datos en vez de duplicarlos
+        self.generar(limpiar=True)
+        self.assertEqual(self.sinteticos(), generados)
+        self.assertEqual(sum(muestras.values_list('referencias', flat=True)), generados['imagenes'])
+
+        # --limpiar sin generar nada deja solo los datos propios
+        BusquedaGuardada.objects.create(usuario=PerfilUsuario.objects.filter(username__startswith='sint_').first(),
+                                        nombre='Sintética')
+        self.generar(limpiar=True, usuarios=0, inmuebles=0, solicitudes=0)
+        self.assertEqual(self.sinteticos(), {'usuarios': 0, 'inmuebles': 0, 'imagenes': 0, 'solicitudes': 0})
+        self.assertFalse(BusquedaGuardada.objects.exists())
+        self.assertEqual(list(Inmueble.objects.all()), [inmueble])
+        self.assertEqual(list(ImagenInmueble.objects.all()), [imagen])
+        self.assertEqual(list(SolicitudArriendo.objects.all()), [solicitud])
+        self.assertEqual(list(ArchivoContenido.objects.values_list('ruta', 'referencias')), [(imagen.imagen.name, 1)])
+        self.assertEqual(Contadores.reconciliar(), {})
+
+
+class ExportacionTests(TestCase):
+
+    def setUp(self):
+        self.arrendador = PerfilUsuario.objects.create(
+            username='arrendador', tipo_usuario=PerfilUsuario.TipoUsuario.ARRENDADOR)
+        self.otro = PerfilUsuario.objects.create(username='otro', tipo_usuario=PerfilUsuario.TipoUsuario.ARRENDADOR)
+        self.arrendatario = PerfilUsuario.objects.create(
+            username='arrendatario', tipo_usuario=PerfilUsuario.TipoUsuario.ARRENDATARIO)
+        self.admin = PerfilUsuario.objects.create(
+            username='admin', tipo_usuario=PerfilUsuario.TipoUsuario.ADMINISTRADOR)
+        for usuario, permisos in [(self.arrendador, ['gestionar_inmueble', 'gestionar_solicitud']),
+                                  (self.otro, ['gestionar_inmueble', 'gestionar_solicitud']),
+                                  (self.admin, ['ver_todos_inmuebles', 'gestionar_solicitud'])]:
+            usuario.user_permissions.set(Permission.objects.filter(content_type__app_label='portal', codename__in=permisos))
+
+        def crear(nombre, propietario, publicado=True, tipo='CASA'):
+            return Inmueble.objects.create(
+                nombre=nombre, descripcion='Con "comillas", y comas', direccion='Calle 1', precio_mensual=500000,
+                tipo_inmueble=tipo, esta_publicado=publicado, propietario=propietario,
+            )
+        propio = crear('Casa propia', self.arrendador)
+        crear('Depto propio', self.arrendador, publicado=False, tipo='DEPARTAMENTO')
+        ajeno = crear('Casa ajena', self.otro)
+        crear('Borrador ajeno', self.otro, publicado=False)
+        SolicitudArriendo.objects.create(inmueble=propio, arrendatario=self.arrendatario, mensaje='Hola')
+        SolicitudArriendo.objects.create(inmueble=ajeno, arrendatario=self.arrendatario, mensaje='Hola')
+
+    def descargar(self, url, usuario=None):
+        if usuario:
+            self.client.force_login(usuario)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response, b''.join(response.streaming_content)
+
+    def nombres_csv(self, contenido):
+        return sorted(fila['nombre'] for fila in csv.DictReader(io.StringIO(contenido.decode('utf-8'))))
+
+    def test_alcance_por_rol(self):
+        response = self.client.get('/exportar_inmuebles/')
+        self.assertRedirects(response, '/account/login/', fetch_redirect_response=False)
+
+        _, contenido = self.descargar('/exportar_inmuebles/', self.arrendador)
+        self.assertEqual(self.nombres_csv(contenido), ['Casa propia', 'Depto propio'])
+        _, contenido = self.descargar('/exportar_inmuebles/', self.arrendatario)
+        self.assertEqual(self.nombres_csv(contenido), ['Casa ajena', 'Casa propia'])
+        _, contenido = self.descargar('/exportar_inmuebles/', self.admin)
+        self.assertEqual(len(self.nombres_csv(contenido)), 4)
+        # Los filtros de la querystring se suman al alcance
+        _, contenido = self.descargar('/exportar_inmuebles/?tipo_inmueble=CASA', self.arrendador)
+        self.assertEqual(self.nombres_csv(contenido), ['Casa propia'])
+
+        _, contenido = self.descargar('/exportar_solicitudes/', self.arrendador)
+        filas = list(csv.DictReader(io.StringIO(contenido.decode('utf-8'))))
+        self.assertEqual([fila['inmueble__nombre'] for fila in filas], ['Casa propia'])
+        # Sin el permiso de solicitudes: 403
+        self.client.force_login(self.arrendatario)
+        self.assertEqual(self.client.get('/exportar_solicitudes/').status_code, 403)
+
+    def test_formatos(self):
+        response, contenido = self.descargar('/exportar_inmuebles/?formato=csv', self.arrendador)
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        self.assertIn('filename="inmuebles.csv"', response['Content-Disposition'])
+        encabezado, *filas = list(csv.reader(io.StringIO(contenido.decode('utf-8'))))
+        self.assertEqual(encabezado[:3], ['id', 'nombre', 'descripcion'])
+        self.assertEqual(filas[0][2], 'Con "comillas", y comas')
+
+        response, contenido = self.descargar('/exportar_inmuebles/?formato=jsonl')
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson; charset=utf-8')
+        filas = [json.loads(linea) for linea in contenido.decode('utf-8').splitlines()]
+        self.assertEqual([f['nombre'] for f in filas], ['Casa propia', 'Depto propio'])
+        self.assertEqual((filas[0]['precio_mensual'], filas[0]['propietario__username']), ('500000.00', 'arrendador'))
+
+        response, contenido = self.descargar('/exportar_inmuebles/?formato=jsonl&gzip=1')
+        self.assertEqual(response['Content-Type'], 'application/gzip')
+        self.assertIn('filename="inmuebles.jsonl.gz"', response['Content-Disposition'])
+        self.assertEqual(len(gzip.decompress(contenido).splitlines()), 2)
+
+        self.assertEqual(self.client.get('/exportar_inmuebles/?formato=xml').status_code, 400)
+
+    def test_comando(self):
+        with tempfile.TemporaryDirectory() as carpeta:
+            salida = os.path.join(carpeta, 'inmuebles.jsonl.gz')
+            call_command('exportar', 'inmuebles', formato='jsonl', gzip=True, salida=salida, usuario='arrendador')
+            with gzip.open(salida, 'rt', encoding='utf-8') as f:
+                self.assertEqual([json.loads(linea)['nombre'] for linea in f], ['Casa propia', 'Depto propio'])
+
+            salida = os.path.join(carpeta, 'solicitudes.csv')
+            call_command('exportar', 'solicitudes', salida=salida)
+            with open(salida, encoding='utf-8') as f:
+                self.assertEqual(len(list(csv.DictReader(f))), 2)
+
+        with self.assertRaisesMessage(CommandError, 'No existe el usuario "nadie"'):
+            call_command('exportar', 'inmuebles', usuario='nadie')
+        with self.assertRaisesMessage(CommandError, 'no tiene permiso para exportar solicitudes'):
+            call_command('exportar', 'solicitudes', usuario='arrendatario')
+
+
+class ApiInmueblesV1Tests(TestCase):
+
+    def setUp(self):
+        self.propietario = PerfilUsuario.objects.create(
+            username='arrendador', tipo_usuario=PerfilUsuario.TipoUsuario.ARRENDADOR)
+        self.otro = PerfilUsuario.objects.create(username='otro', tipo_usuario=PerfilUsuario.TipoUsuario.ARRENDADOR)
+        self.publicados = [self.crear(f'Depto {n}', precio_mensual=400000 + n * 10000) for n in range(5)]
+        self.borrador = self.crear('Depto borrador', esta_publicado=False)
+
+    def tearDown(self):
+        Similares.reiniciar()
+
+    def crear(self, nombre, esta_publicado=True, **campos):
+        campos.setdefault('precio_mensual', 500000)
+        return Inmueble.objects.create(
+            nombre=nombre, descripcion='Descripción larga', direccion='Calle 1', region_codigo='13',
+            comuna_codigo='13101', tipo_inmueble='DEPARTAMENTO', esta_publicado=esta_publicado,
+            propietario=self.propietario, **campos,
+        )
+
+    def test_fields_se_proyecta_con_only(self):
+        with CaptureQueriesContext(connection) as consultas:
+            response = self.client.get('/api/v1/inmuebles/', {'fields': 'id,nombre'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(set(response.json()['resultados'][0]), {'id', 'nombre'})
+        sql = next(q['sql'] for q in consultas.captured_queries if 'FROM "portal_inmueble"' in q['sql'])
+        self.assertIn('"nombre"', sql)
+        self.assertNotIn('"descripcion"', sql)
+        self.assertNotIn('"direccion"', sql)
+
+        response = self.client.get(f'/api/v1/inmuebles/{self.publicados[0].pk}/', {'fields': 'nombre'})
+        self.assertEqual(response.json(), {'nombre': 'Depto 0'})
+
+    def test_rechaza_campos_desconocidos(self):
+        for url in ('/api/v1/inmuebles/', f'/api/v1/inmuebles/{self.publicados[0].pk}/',
+                    f'/api/v1/inmuebles/{self.publicados[0].pk}/similares/'):
+            response = self.client.get(url, {'fields': 'nombre,propietario'})
+            self.assertEqual(response.status_code, 400, url)
+            self.assertIn('propietario', response.json()['errores']['parametros'][0])
+
+    def test_paginacion_por_cursor(self):
+        vistos, cursor = [], None
+        while True:
+            parametros = {'limite': 2, 'orden': 'precio', 'fields': 'id'}
+            if cursor:
+                parametros['cursor'] = cursor
+            data = self.client.get('/api/v1/inmuebles/', parametros).json()
+            self.assertLessEqual(len(data['resultados']), 2)
+            vistos += [r['id'] for r in data['resultados']]
+            cursor = data['siguiente']
+            if not cursor:
+                break
+        # Todos los publicados, una sola vez y en orden de precio; el borrador nunca
+        self.assertEqual(vistos, [i.pk for i in self.publicados])
+
+        response = self.client.get('/api/v1/inmuebles/', {'cursor': 'no es un cursor'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('cursor', response.json()['errores'])
+
+    def test_etag_responde_304(self):
+        url = f'/api/v1/inmuebles/{self.publicados[0].pk}/'
+        response = self.client.get(url)
+        etag = response['ETag']
+        self.assertTrue(response.has_header('Last-Modified'))
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+
+        # Otro cuerpo, otro ETag
+        Inmueble.objects.filter(pk=self.publicados[0].pk).update(nombre='Depto renombrado')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_no_publicados_ocultos(self):
+        for usuario in (None, self.otro):
+            if usuario:
+                self.client.force_login(usuario)
+            ids = [r['id'] for r in self.client.get('/api/v1/inmuebles/', {'limite': 100}).json()['resultados']]
+            self.assertNotIn(self.borrador.pk, ids)
+            self.assertEqual(self.client.get(f'/api/v1/inmuebles/{self.borrador.pk}/').status_code, 404)
+            self.assertEqual(self.client.get(f'/api/v1/inmuebles/{self.borrador.pk}/similares/').status_code, 404)
+
+    def test_similares_sin_no_publicados(self):
+        matriz = MatrizSimilares.desde_filas(
+            [fila_similar(i.pk, m2=60 + n) for n, i in enumerate(self.publicados)] + [fila_similar(self.borrador.pk, m2=60)]
+        )
+        matriz.sincronizado = time.monotonic()
+        Similares._matriz = matriz
+
+        response = self.client.get(f'/api/v1/inmuebles/{self.publicados[0].pk}/similares/', {'k': 3, 'fields': 'id'})
+        self.assertEqual(response.status_code, 200)
+        ids = [r['id'] for r in response.json()['resultados']]
+        self.assertEqual(len(ids), 3)
+        self.assertNotIn(self.borrador.pk, ids)
+        self.assertNotIn(self.publicados[0].pk, ids)
+
+
+class CursorTests(SimpleTestCase):
+
+    def test_ida_y_vuelta(self):
+        for valores, hacia_atras in ((['2026-01-02T03:04:05+00:00', 17], False), (['450000.00', 3], True), ([None, 1], False)):
+            cursor = codificar_cursor(valores, hacia_atras)
+            self.assertNotIn('=', cursor)  # va en la URL sin relleno
+            self.assertEqual(decodificar_cursor(cursor), (valores, hacia_atras))
+
+    def test_rechaza_cursores_invalidos_o_alterados(self):
+        alterados = [
+            '', '!!!', 'no es base64', 'ñ',
+            codificar_cursor(['x', 1])[:-3],  # cortado
+            base64.urlsafe_b64encode(b'{"a": 1}').decode(),
+            base64.urlsafe_b64encode(b'"abc"').decode(),
+            base64.urlsafe_b64encode(b'[1, 2, 3, 4]').decode(),
+            base64.urlsafe_b64encode(b'["x", 1, 7]').decode(),
+            base64.urlsafe_b64encode(b'["x", 1, true]').decode(),
+            base64.urlsafe_b64encode(b'\xff\xfe').decode(),
+        ]
+        for cursor in alterados:
+            with self.assertRaises(CursorInvalido, msg=cursor):
+                decodificar_cursor(cursor)
+
+
+class KeysetPaginatorTests(TestCase):
+
+    def setUp(self):
+        # Precios y fechas repetidos: el orden lo desempata el id
+        self.ids = []
+        for n in range(7):
+            inmueble = Inmueble.objects.create(
+                nombre=f'I{n}', descripcion='-', direccion='Calle', tipo_inmueble='CASA',
+                precio_mensual=400000 if n < 5 else 300000,
+            )
+            self.ids.append(inmueble.pk)
+        Inmueble.objects.filter(pk__in=self.ids[:4]).update(creado='2026-01-01T00:00:00Z')
+
+    def recorrer(self, orden):
+        paginador = KeysetPaginator(Inmueble.objects.all(), per_page=2, orden=orden)
+        paginas, cursor = [], None
+        while True:
+            pagina = paginador.page(cursor)
+            paginas.append([i.pk for i in pagina])
+            if not pagina.has_next():
+                return paginador, paginas
+            cursor = pagina.cursor_siguiente
+
+    def test_desempata_por_id_sin_repetir_ni_saltar(self):
+        _, paginas = self.recorrer('precio')
+        vistos = [pk for pagina in paginas for pk in pagina]
+        self.assertEqual(vistos, self.ids[5:] + self.ids[:5])
+        self.assertEqual(len(paginas), 4)
+
+        _, paginas = self.recorrer('recientes')
+        vistos = [pk for pagina in paginas for pk in pagina]
+        self.assertEqual(vistos, list(reversed(self.ids[4:])) + list(reversed(self.ids[:4])))
+
+    def test_pagina_anterior(self):
+        paginador = KeysetPaginator(Inmueble.objects.all(), per_page=2, orden='precio')
+        primera = paginador.page()
+        self.assertFalse(primera.has_previous())
+        segunda = paginador.page(primera.cursor_siguiente)
+        tercera = paginador.page(segunda.cursor_siguiente)
+        anterior = paginador.page(tercera.cursor_anterior)
+        self.assertEqual([i.pk for i in anterior], [i.pk for i in segunda])
+        self.assertEqual([i.pk for i in paginador.page(anterior.cursor_anterior)], [i.pk for i in primera])
+
+    def test_rechaza_valores_que_no_son_del_campo(self):
+        paginador = KeysetPaginator(Inmueble.objects.all(), per_page=2, orden='precio')
+        for valores in (['caro', 1], ['400000', '1'], ['400000', None], ['400000', True], [[1], 1]):
+            with self.assertRaises(CursorInvalido, msg=valores):
+                paginador.page(codificar_cursor(valores))
+        # Un cursor de otro orden (fecha en vez de precio) tampoco sirve
+        recientes = KeysetPaginator(Inmueble.objects.all(), per_page=2, orden='recientes').page()
+        with self.assertRaises(CursorInvalido):
+            paginador.page(recientes.cursor_siguiente)
+
+
+class PortadaTests(TestCase):
+
+    def setUp(self):
+        self.inmueble = Inmueble.objects.create(
+            nombre='Casa', descripcion='-', direccion='Calle 1', precio_mensual=500000, tipo_inmueble='CASA',
+        )
+
+    def imagen(self, orden):
+        return ImagenInmueble.objects.create(inmueble=self.inmueble, imagen=f'inmuebles/galeria/{orden}.jpg', orden=orden)
+
+    def portada(self):
+        return Inmueble.objects.values_list('portada_id', flat=True).get(pk=self.inmueble.pk)
+
+    def test_se_reasigna_al_borrar_o_reemplazar(self):
+        segunda = self.imagen(2)
+        self.assertEqual(self.portada(), segunda.pk)
+        primera = self.imagen(1)
+        self.assertEqual(self.portada(), primera.pk)
+
+        # Reemplazar la portada: otra imagen pasa a ser la primera
+        nueva = self.imagen(0)
+        self.assertEqual(self.portada(), nueva.pk)
+        # Reordenar
+        nueva.orden = 5
+        nueva.save()
+        self.assertEqual(self.portada(), primera.pk)
+
+        # Borrar la portada deja la siguiente, también con delete() del queryset
+        primera.delete()
+        self.assertEqual(self.portada(), segunda.pk)
+        ImagenInmueble.objects.filter(pk=segunda.pk).delete()
+        self.assertEqual(self.portada(), nueva.pk)
+        nueva.delete()
+        self.assertIsNone(self.portada())
+
+    def test_tarjetas_del_listado_sin_n_mas_uno(self):
+        def consultas(cantidad):
+            Inmueble.objects.exclude(pk=self.inmueble.pk).delete()
+            for n in range(cantidad):
+                inmueble = Inmueble.objects.create(
+                    nombre=f'Casa {n}', descripcion='-', direccion='Calle 1', precio_mensual=500000,
+                    tipo_inmueble='CASA', esta_publicado=True,
+                )
+                ImagenInmueble.objects.create(inmueble=inmueble, imagen=f'inmuebles/galeria/{n}.jpg', orden=0)
+            with CaptureQueriesContext(connection) as capturadas:
+                response = self.client.get('/listar_inmuebles/')
+            self.assertTemplateUsed(response, 'inmuebles/inmueble_list.html')
+            for n in range(cantidad):
+                self.assertContains(response, f'src="/media/inmuebles/galeria/{n}.jpg"')
+            return len(capturadas)
+
+        self.assertEqual(consultas(2), consultas(6))
+
+    def test_listado_sin_consultas_extra(self):
+        self.imagen(0)
+        inmueble = Inmueble.objects.select_related('portada').get(pk=self.inmueble.pk)
+        with self.assertNumQueries(0):
+            self.assertEqual(inmueble.imagen_principal.name, 'inmuebles/galeria/0.jpg')
+
+
+class ContadoresTests(TestCase):
+
+    def contadores(self):
+        return dict(Contador.objects.values_list('nombre', 'valor'))
+
+    def inmueble(self, **campos):
+        return Inmueble(nombre='Casa', descripcion='-', direccion='Calle 1', precio_mensual=500000,
+                        tipo_inmueble='CASA', **campos)
+
+    def test_los_triggers_mantienen_los_conteos(self):
+        antes = self.contadores()
+        usuario = PerfilUsuario.objects.create(username='arrendatario')
+        publicado = self.inmueble(esta_publicado=True)
+        publicado.save()
+        self.inmueble().save()
+        Inmueble.objects.bulk_create([self.inmueble(esta_publicado=True) for _ in range(3)])
+        SolicitudArriendo.objects.create(inmueble=publicado, arrendatario=usuario, mensaje='Hola')
+        Region.objects.create(nro_region='XX', nombre='Región de prueba')
+
+        despues = self.contadores()
+        self.assertEqual(despues['inmuebles_publicados'] - antes['inmuebles_publicados'], 4)
+        self.assertEqual(despues['usuarios'] - antes['usuarios'], 1)
+        self.assertEqual(despues['solicitudes'] - antes['solicitudes'], 1)
+        self.assertEqual(despues['regiones'] - antes['regiones'], 1)
+
+        # Despublicar y borrar por queryset (sin señales) también cuenta
+        Inmueble.objects.filter(pk=publicado.pk).update(esta_publicado=False)
+        Inmueble.objects.filter(esta_publicado=True).order_by('pk')[:1].get().delete()
+        self.assertEqual(self.contadores()['inmuebles_publicados'] - antes['inmuebles_publicados'], 2)
+        usuario.delete()  # en cascada: su solicitud
+        self.assertEqual(self.contadores()['usuarios'], antes['usuarios'])
+        self.assertEqual(self.contadores()['solicitudes'], antes['solicitudes'])
+
+        # Sin deriva respecto de COUNT(*)
+        self.assertEqual(Contadores.reconciliar(), {})
+        self.assertEqual(Contadores.valores(), self.contadores())
+
+    def test_reconciliar_corrige_la_deriva(self):
+        Inmueble.objects.bulk_create([self.inmueble(esta_publicado=True) for _ in range(2)])
+        Contador.objects.filter(nombre='inmuebles_publicados').update(valor=99)
+        self.assertEqual(Contadores.reconciliar(), {'inmuebles_publicados': (99, 2)})
+        self.assertEqual(Contadores.valores()['inmuebles_publicados'], 2)
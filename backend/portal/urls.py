@@ -2,7 +2,11 @@
 
 from django.urls import path
 from django.views.generic import RedirectView
-from .api_views import RegionAPIView, ComunaAPIView
+from .api_views import (
+    RegionAPIView, ComunaAPIView, MetricasDPAAPIView, InmuebleBusquedaAPIView,
+    MetricasConsultasAPIView, InmuebleListAPIView, InmuebleDetailAPIView,
+    InmuebleSimilaresAPIView, EstadisticasPreciosAPIView,
+)
 from .views import (
     cargar_comunas,
     SolicitudArriendoCreateView,
@@ -10,6 +14,12 @@ from .views import (
     CustomLoginView, CustomLogoutView,
     register_view,
     InmueblesListView,
+    InmueblesExportView,
+    InmuebleDetailView,
+    EstadisticasPreciosView,
+    BusquedasGuardadasView,
+    BusquedaGuardadaDeleteView,
+    SolicitudesExportView,
     InmuebleCreateView,
     InmuebleUpdateView,
     InmuebleDeleteView,
@@ -36,6 +46,7 @@ from .views import (
     UsuarioListView,
     ImagenInmuebleCreateView,
     ImagenInmuebleDeleteView,
+    ImagenesLoteView,
     UsuarioUpdateView,
     UsuarioDeleteView,
     PerfilJsonView,
@@ -65,9 +76,14 @@ urlpatterns = [
 
     # inmueble
     path('listar_inmuebles/', InmueblesListView.as_view(), name='inmueble_list'),
+    path('inmueble/<int:pk>/', InmuebleDetailView.as_view(), name='inmueble_detail'),
+    path('estadisticas/precios/', EstadisticasPreciosView.as_view(), name='estadisticas_precios'),
     path('crear_inmueble/', InmuebleCreateView.as_view(), name='inmueble_create'),
     path('actualizar_inmueble/<int:pk>/', InmuebleUpdateView.as_view(), name='actualizar_inmueble'),
     path('borrar_inmueble/<int:pk>/', InmuebleDeleteView.as_view(), name='borrar_inmueble'),
+    path('exportar_inmuebles/', InmueblesExportView.as_view(), name='inmueble_export'),
+    path('mis-busquedas/', BusquedasGuardadasView.as_view(), name='busquedas_guardadas'),
+    path('mis-busquedas/<int:pk>/eliminar/', BusquedaGuardadaDeleteView.as_view(), name='busqueda_guardada_delete'),
 ##########################################################
 
     # solicitud arriendo
@@ -75,6 +91,7 @@ urlpatterns = [
     path('crear_solicitud/', SolicitudArriendoCreateView.as_view(), name='solicitud_create'),
     path('actualizar_solicitud/<int:pk>/', SolicitudArriendoUpdateView.as_view(), name='solicitud_update'),
     path('borrar_solicitud/<int:pk>/', SolicitudArriendoDeleteView.as_view(), name='solicitud_delete'),
+    path('exportar_solicitudes/', SolicitudesExportView.as_view(), name='solicitud_export'),
 ##########################################################
 
     # perfil usuario
@@ -93,6 +110,13 @@ urlpatterns = [
     # API endpoints
     path('api/regiones/', RegionAPIView.as_view(), name='api_regiones'),
     path('api/comunas/', ComunaAPIView.as_view(), name='api_comunas'),
+    path('api/metricas/dpa/', MetricasDPAAPIView.as_view(), name='api_metricas_dpa'),
+    path('api/metricas/consultas/', MetricasConsultasAPIView.as_view(), name='api_metricas_consultas'),
+    path('api/inmuebles/buscar/', InmuebleBusquedaAPIView.as_view(), name='api_inmuebles_buscar'),
+    path('api/v1/inmuebles/', InmuebleListAPIView.as_view(), name='api_v1_inmuebles'),
+    path('api/v1/inmuebles/<int:pk>/', InmuebleDetailAPIView.as_view(), name='api_v1_inmueble'),
+    path('api/v1/inmuebles/<int:pk>/similares/', InmuebleSimilaresAPIView.as_view(), name='api_v1_inmueble_similares'),
+    path('api/v1/estadisticas/precios/', EstadisticasPreciosAPIView.as_view(), name='api_v1_estadisticas_precios'),
 
 #########################################################################
     # Cargar comunas dinámicamente
@@ -108,6 +132,7 @@ urlpatterns = [
 ##########################################################################
     # Imagen inmueble
     path('inmueble/<int:inmueble_pk>/agregar-imagen/', ImagenInmuebleCreateView.as_view(), name='agregar_imagen'),
+    path('inmueble/<int:inmueble_pk>/agregar-imagenes/', ImagenesLoteView.as_view(), name='agregar_imagenes'),
     path('imagen/<int:pk>/eliminar/', ImagenInmuebleDeleteView.as_view(), name='eliminar_imagen'),
     path('mis-inmuebles/', InmueblesListView.as_view(), name='mis_inmuebles'),
 
@@ -1,9 +1,12 @@
 # backend/portal/views.py
 
+from django.conf import settings
 from django.db import transaction
+from django.db.models import Count, Q
 from django.urls import reverse_lazy
-from django.http import JsonResponse
+from django.http import JsonResponse, Http404
 from django.views import View
+from django.views.static import serve
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib import messages
 from django.contrib.auth import login, logout
@@ -14,9 +17,20 @@ from django.contrib.auth.mixins import LoginRequiredMixin
 from django.contrib.auth.models import Group, Permission, User
 from django.core.exceptions import PermissionDenied
 from django.utils.decorators import method_decorator
+from django.utils.safestring import mark_safe
+from django.template.loader import render_to_string
 from .forms import LoginForm, RegisterForm
 from django.views.decorators.csrf import csrf_protect
 from .services import ChileanLocationService
+from .pagination import KeysetPaginator, CursorInvalido
+from .search import facetas, filtrar_inmuebles, hay_filtros
+from .contadores import Contadores
+from .fragmentos import Fragmentos, DESTACADOS
+from .exportacion import FORMATOS, inmuebles_visibles, respuesta_exportacion, solicitudes_visibles
+from .recomendaciones import Similares
+from .estadisticas import EstadisticasPrecios
+from .storage import CARPETA as CARPETA_CONTENIDO, es_contenido
+from .subidas import SubidaImagenesHandler, guardar_imagenes
 from django.views.decorators.csrf import csrf_exempt
 from .mixins import (
     PermisoRequeridoMixin, PuedeGestionarInmueblesMixin, PuedeVerTodosInmueblesMixin,
@@ -32,6 +46,9 @@ from .models import (
     SolicitudArriendo,
     PerfilUsuario,
     ImagenInmueble,
+    EstadisticaPrecio,
+    BusquedaGuardada,
+    AlertaBusqueda,
 )
 
 from .forms import (
@@ -41,10 +58,13 @@ from .forms import (
     SolicitudArriendoForm,
     PerfilUsuarioForm,
     ImagenInmuebleForm,
+    BusquedaInmuebleForm,
+    BusquedaGuardadaForm,
 )
 
 from django.views.generic import (
     ListView,
+    DetailView,
     CreateView,
     UpdateView,
     DeleteView
@@ -52,12 +72,24 @@ from django.views.generic import (
 
 def cargar_comunas(request):
     """Vista para cargar comunas basado en la región seleccionada"""
+    # Mismo payload pre-calculado que /api/comunas/?region=...
+    payloads = ChileanLocationService.payloads()
     region_code = request.GET.get('region')
     if region_code:
-        comunas = ChileanLocationService.get_comunas_by_region(region_code)
-        data = [{'codigo': c['codigo'], 'nombre': c['nombre']} for c in comunas]
-        return JsonResponse(data, safe=False)
-    return JsonResponse([], safe=False)
+        return payloads.comunas_de(region_code).respuesta(request)
+    return payloads.vacio.respuesta(request)
+
+def servir_media(request, path):
+    """
+    Media direccionada por contenido (portal/storage.py): el nombre cambia
+    si cambia el archivo, así que la respuesta se cachea un año sin revalidar
+    """
+    ruta = f'{CARPETA_CONTENIDO}/{path}'
+    if not es_contenido(ruta):
+        raise Http404
+    response = serve(request, ruta, document_root=settings.MEDIA_ROOT)
+    response['Cache-Control'] = 'public, max-age=31536000, immutable'
+    return response
 
 ##########################################################
 # CRUD USUARIOS
@@ -211,41 +243,192 @@ class ComunaDeleteView(PuedeGestionarComunasMixin, DeleteView):
 
 class InmueblesListView(PermisoRequeridoMixin, ListView):
     model = Inmueble
-    template_name = 'web/home.html' # Ojo: esta vista se usa para el home, pero su nombre es InmueblesListView.
-                                   # Podría ser confuso.
+    template_name = 'inmuebles/inmueble_list.html'
+    # /mis-inmuebles/ usa la misma vista con su propia plantilla
+    plantillas_por_ruta = {'mis_inmuebles': 'inmuebles/mis_inmuebles.html'}
     context_object_name = 'inmuebles'
+    paginate_by = 12
     
     def test_func(self):
-        # Todos los usuarios autenticados y no autenticados pueden ver inmuebles publicados en el home.
-        # Si esta vista es específicamente para listar "todos" los inmuebles gestionables,
-        # entonces el permiso 'portal.ver_todos_inmuebles' o 'portal.gestionar_inmueble' debería aplicarse.
-        # Para el home, creo que es mejor que sea accesible por todos.
-        return True # Permitir a todos ver el home. La lógica de queryset filtra lo que ven.
+        # Todos los usuarios autenticados y no autenticados pueden ver el listado de inmuebles publicados.
+        # La lógica de queryset filtra lo que ven; "Mis Propiedades" requiere sesión.
+        return self.request.user.is_authenticated or self.request.resolver_match.url_name != 'mis_inmuebles'
+
+    def get_template_names(self):
+        return [self.plantillas_por_ruta.get(self.request.resolver_match.url_name, self.template_name)]
 
     def get_queryset(self):
-        queryset = super().get_queryset()
+        queryset = self.get_queryset_visible()
+
+        # Modo búsqueda: filtros facetados sobre lo que el usuario puede ver
+        self.busqueda = BusquedaInmuebleForm(self.request.GET or None)
+        self.modo_busqueda = self.busqueda.is_valid() and hay_filtros(self.busqueda.cleaned_data)
+        if self.modo_busqueda:
+            queryset = filtrar_inmuebles(queryset, self.busqueda.cleaned_data)
+        estado = self.request.GET.get('estado')
+        if estado in ('publicado', 'no_publicado'):
+            queryset = queryset.filter(esta_publicado=estado == 'publicado')
+        return queryset
+
+    def get_queryset_visible(self):
+        # La portada viene en el mismo JOIN: sin consultas extra por tarjeta
+        queryset = super().get_queryset().select_related('portada')
         user = self.request.user
         
         # Si la vista es la del HOME, queremos que todos vean los publicados
         if self.request.resolver_match.url_name == 'home':
-             return queryset.filter(esta_publicado=True)
+             return Inmueble.publicados(queryset)
 
         # Si esta vista se usa para una gestión de inmuebles (ej: '/listar_inmuebles/'), 
-        # entonces aplicamos la lógica de permisos.
+        # entonces aplicamos la lógica de permisos (la misma de las exportaciones).
+        return inmuebles_visibles(user, queryset)
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['busqueda'] = self.busqueda
+        if self.modo_busqueda:
+            # Conteos por faceta del resultado completo, en una sola consulta agrupada
+            context['facetas'] = facetas(self.object_list)
+        if self.request.resolver_match.url_name == 'mis_inmuebles':
+            # Resumen de lo que gestiona el usuario, sin los filtros de la búsqueda
+            visibles = self.get_queryset_visible().select_related(None)
+            context.update(visibles.aggregate(
+                total_propiedades=Count('id', distinct=True),
+                propiedades_publicadas=Count('id', distinct=True, filter=Q(esta_publicado=True)),
+                propiedades_no_publicadas=Count('id', distinct=True, filter=Q(esta_publicado=False)),
+                total_solicitudes=Count('solicitudes'),
+            ))
+            context['tipos_inmueble'] = Inmueble.Tipo_de_inmueble.choices
+        return context
+
+    def paginate_queryset(self, queryset, page_size):
+        # ?page=N mantiene la paginación numerada clásica (OFFSET + COUNT);
+        # por defecto se pagina por cursor sobre (creado, id) o (precio_mensual, id),
+        # sin COUNT(*) y con el mismo costo en cualquier página
+        if 'page' in self.request.GET:
+            return super().paginate_queryset(queryset.order_by('-creado', '-id'), page_size)
+
+        paginator = KeysetPaginator(queryset, page_size, orden=self.request.GET.get('orden'))
+        try:
+            page = paginator.page(self.request.GET.get('cursor'), parametros=self.request.GET)
+        except CursorInvalido:
+            raise Http404("Cursor de paginación inválido")
+        return (paginator, page, page.object_list, page.has_other_pages())
+
+
+class ExportacionMixin:
+    """
+    Exporta el queryset de la vista de listado (mismo alcance por rol y
+    mismos filtros de la querystring) como CSV/JSONL en streaming.
+    ?formato=csv|jsonl, ?gzip=1 para comprimir.
+    """
+    tipo_exportacion = None
+
+    def get(self, request, *args, **kwargs):
+        formato = request.GET.get('formato', 'csv')
+        if formato not in FORMATOS:
+            return JsonResponse({'error': f'Formato no soportado: {formato}'}, status=400)
+        return respuesta_exportacion(
+            self.get_queryset(), self.tipo_exportacion, formato, gzip=request.GET.get('gzip') in ('1', 'true'),
+        )
+
+
+class InmueblesExportView(ExportacionMixin, InmueblesListView):
+    tipo_exportacion = 'inmuebles'
+
+    def test_func(self):
+        # A diferencia del listado, exportar requiere sesión
+        return self.request.user.is_authenticated
+
+    def get_queryset_visible(self):
+        # La portada no se exporta: sin el JOIN de select_related
+        return super().get_queryset_visible().select_related(None)
+
+
+class InmuebleDetailView(DetailView):
+    model = Inmueble
+    template_name = 'inmuebles/inmueble_detail.html'
+    context_object_name = 'inmueble'
+
+    def get_queryset(self):
+        queryset = super().get_queryset().select_related('portada', 'propietario')
+        user = self.request.user
+        # Los no publicados solo los ven su propietario y los administradores
+        if user.is_authenticated and (
+                user.has_perm('portal.ver_todos_inmuebles') or user.tipo_usuario == 'ADMINISTRADOR'):
+            return queryset
         if user.is_authenticated:
-            # Administradores ven todos los inmuebles
-            if user.has_perm('portal.ver_todos_inmuebles') or user.tipo_usuario == 'ADMINISTRADOR':
-                return queryset
-            
-            # Arrendadores ven solo sus inmuebles
-            if user.has_perm('portal.gestionar_inmueble') or user.tipo_usuario == 'ARRENDADOR':
-                return queryset.filter(propietario=user)
-            
-            # Arrendatarios, si llegan aquí, solo verían publicados (aunque ya se filtró en el home)
-            return queryset.filter(esta_publicado=True) 
-        
-        # Usuarios no autenticados solo ven publicados (si 'esta_publicado' existe)
-        return queryset.filter(esta_publicado=True) if hasattr(Inmueble, 'esta_publicado') else queryset.none()
+            return queryset.filter(Q(esta_publicado=True) | Q(propietario=user))
+        return Inmueble.publicados(queryset)
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['similares'] = Similares.para(self.object) if self.object.esta_publicado else []
+        return context
+
+
+class EstadisticasPreciosView(PermisoRequeridoMixin, ListView):
+    """Dashboard de precios por comuna, tipo y habitaciones (desde el resumen precalculado)"""
+    model = EstadisticaPrecio
+    template_name = 'inmuebles/estadisticas_precios.html'
+    context_object_name = 'estadisticas'
+    paginate_by = 50
+
+    def test_func(self):
+        user = self.request.user
+        return user.is_authenticated and (user.is_superuser or user.tipo_usuario in (
+            PerfilUsuario.TipoUsuario.ARRENDADOR, PerfilUsuario.TipoUsuario.ADMINISTRADOR,
+        ))
+
+    def get_queryset(self):
+        return EstadisticasPrecios.filtrar(super().get_queryset(), self.request.GET)
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['filtros'] = self.request.GET
+        context['tipos'] = Inmueble.Tipo_de_inmueble.choices
+        context['regiones'] = EstadisticaPrecio.objects.order_by('region_codigo').values_list(
+            'region_codigo', 'region_nombre').distinct()
+        return context
+
+
+class BusquedasGuardadasView(LoginRequiredMixin, CreateView):
+    """Búsquedas guardadas del usuario y los inmuebles que calzaron (las alertas las genera procesar_alertas)"""
+    model = BusquedaGuardada
+    form_class = BusquedaGuardadaForm
+    template_name = 'inmuebles/busquedas_guardadas.html'
+    success_url = reverse_lazy('busquedas_guardadas')
+
+    def get_initial(self):
+        return BusquedaGuardadaForm.inicial(self.request.GET)
+
+    def form_valid(self, form):
+        form.instance.usuario = self.request.user
+        messages.success(self.request, 'Búsqueda guardada: te avisaremos cuando se publique un inmueble que calce.')
+        return super().form_valid(form)
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        user = self.request.user
+        context['busquedas'] = user.busquedas_guardadas.filter(activa=True).order_by('-creado')
+        alertas = AlertaBusqueda.objects.filter(busqueda__usuario=user, busqueda__activa=True)
+        context['alertas'] = list(
+            alertas.select_related('busqueda', 'inmueble', 'inmueble__portada').defer('inmueble__busqueda')
+            .order_by('-creado')[:50]
+        )
+        # Se marcan como vistas al mostrarlas
+        alertas.filter(vista=False, pk__in=[a.pk for a in context['alertas']]).update(vista=True)
+        return context
+
+
+class BusquedaGuardadaDeleteView(LoginRequiredMixin, View):
+    def post(self, request, pk):
+        busqueda = get_object_or_404(BusquedaGuardada, pk=pk, usuario=request.user, activa=True)
+        # Se desactiva (no se borra) para que el worker la saque de su índice al sincronizar
+        busqueda.activa = False
+        busqueda.save(update_fields=['activa', 'actualizado'])
+        messages.success(request, 'Búsqueda eliminada.')
+        return redirect('busquedas_guardadas')
 
 
 class InmuebleCreateView(PuedeGestionarInmueblesMixin, CreateView):
@@ -357,6 +540,57 @@ class ImagenInmuebleDeleteView(EsArrendadorMixin, DeleteView):
         messages.success(self.request, 'Imagen eliminada correctamente.')
         return reverse_lazy('actualizar_inmueble', kwargs={'pk': self.object.inmueble.pk})
 
+@method_decorator(csrf_exempt, name='dispatch')
+class ImagenesLoteView(EsArrendadorMixin, View):
+    """
+    Sube varias imágenes de un inmueble en un solo request (campo `imagenes`
+    con multiple) sin cargarlas en memoria (portal/subidas.py). Responde
+    JSON si el cliente lo pide con Accept: application/json.
+    """
+    http_method_names = ['post']
+
+    def post(self, request, *args, **kwargs):
+        # Acá y no en dispatch: EsArrendadorMixin ya mandó a los anónimos al login
+        self.inmueble = get_object_or_404(Inmueble, pk=kwargs['inmueble_pk'])
+        # Verificar que el usuario es el propietario del inmueble
+        if self.inmueble.propietario != request.user:
+            raise PermissionDenied("No tienes permiso para agregar imágenes a este inmueble")
+        limite = settings.SUBIDAS['MAX_TOTAL_MB']
+        if int(request.META.get('CONTENT_LENGTH') or 0) > limite * 2**20:
+            # Se rechaza sin leer el cuerpo
+            return self.respuesta([], [('', f'El envío pesa más de {limite} MB')], status=413)
+        # El handler tiene que estar puesto antes de leer request.POST; por eso el CSRF
+        # (que lo lee) se revisa acá y no en el middleware
+        handler = SubidaImagenesHandler(request)
+        request.upload_handlers = [handler]
+        return csrf_protect(self.guardar)(request, handler)
+
+    def guardar(self, request, handler):
+        archivos = request.FILES.getlist('imagenes')
+        try:
+            if handler.excedido:
+                return self.respuesta([], [('', f"El envío pesa más de {settings.SUBIDAS['MAX_TOTAL_MB']} MB")], status=413)
+            creadas = []
+            if archivos:
+                creadas = guardar_imagenes(self.inmueble, archivos, request.POST.get('descripcion', '')[:200])
+            return self.respuesta(creadas, handler.rechazados)
+        finally:
+            # Borra los temporales que no se movieron al storage
+            for archivo in archivos:
+                archivo.close()
+
+    def respuesta(self, creadas, rechazadas, status=None):
+        if self.request.headers.get('Accept', '').startswith('application/json'):
+            return JsonResponse({
+                'creadas': [{'id': imagen.pk, 'orden': imagen.orden, 'url': imagen.imagen.url} for imagen in creadas],
+                'rechazadas': [{'archivo': nombre, 'motivo': motivo} for nombre, motivo in rechazadas],
+            }, status=status or (201 if creadas else 400))
+        if creadas:
+            messages.success(self.request, f'{len(creadas)} imágenes agregadas correctamente.')
+        for nombre, motivo in rechazadas:
+            messages.error(self.request, f'{nombre}: {motivo}' if nombre else motivo)
+        return redirect('actualizar_inmueble', pk=self.inmueble.pk)
+
 #########################################################
 #CRUD SOLICITUD ARRIENDO
 ##########################################################
@@ -367,19 +601,11 @@ class SolicitudArriendoListView(PuedeGestionarSolicitudesMixin, ListView):
     context_object_name = 'solicitudes'
     
     def get_queryset(self):
-        queryset = super().get_queryset()
-        user = self.request.user
-        
-        # Administradores ven todas las solicitudes
-        if user.is_superuser or user.has_perm('portal.ver_todos_inmuebles'): # 'ver_todos_inmuebles' como proxy para admin
-            return queryset
-        
-        # Arrendadores ven solicitudes de sus inmuebles
-        if user.has_perm('portal.gestionar_inmueble'): # 'gestionar_inmueble' como proxy para arrendador
-            return queryset.filter(inmueble__propietario=user)
-        
-        # Arrendatarios ven solo sus propias solicitudes
-        return queryset.filter(arrendatario=user)
+        # Administradores ven todas, arrendadores las de sus inmuebles y arrendatarios las propias
+        return solicitudes_visibles(self.request.user, super().get_queryset())
+
+class SolicitudesExportView(ExportacionMixin, SolicitudArriendoListView):
+    tipo_exportacion = 'solicitudes'
 
 class SolicitudArriendoCreateView(LoginRequiredMixin, CreateView):
     model = SolicitudArriendo
@@ -518,6 +744,7 @@ class PerfilView(UpdateView): # Aquí debería ser DetailView o una View combina
         enviadas = (
             u.solicitudes_enviadas
             .select_related('inmueble')
+            .defer('inmueble__busqueda')
             .order_by('-creado')
         )
 
@@ -526,6 +753,7 @@ class PerfilView(UpdateView): # Aquí debería ser DetailView o una View combina
             SolicitudArriendo.objects
             .filter(inmueble__propietario=u)
             .select_related('inmueble', 'arrendatario')
+            .defer('inmueble__busqueda')
             .order_by('-creado')
         )
 
@@ -625,14 +853,29 @@ class CustomLogoutView(LogoutView):
 # Vista para la página de inicio
 #########################################################
 # Esta vista mostrará las propiedades destacadas para todos los usuarios.
+def construir_destacados(cantidad=6):
+    """HTML de las propiedades destacadas más los datos que usan las señales para invalidarlo"""
+    inmuebles = list(
+        Inmueble.objects.filter(esta_publicado=True).select_related('portada').order_by('-creado', '-id')[:cantidad]
+    )
+    return {
+        'html': render_to_string('web/_destacados.html', {'inmuebles_destacados': inmuebles}),
+        'ids': [inmueble.pk for inmueble in inmuebles],
+        # creado del último destacado: uno más antiguo no puede entrar al bloque
+        'corte': inmuebles[-1].creado if len(inmuebles) == cantidad else None,
+    }
+
 def home_view(request):
-    inmuebles = Inmueble.objects.filter(esta_publicado=True)[:6]  # Limita a 6 propiedades
+    # Bloque de destacados desde la caché de fragmentos (se invalida por señales)
+    destacados = Fragmentos.obtener(DESTACADOS, construir_destacados)
+    # Contadores mantenidos por triggers y cacheados: sin COUNT(*) por visita
+    contadores = Contadores.valores()
     context = {
-        'inmuebles_destacados': inmuebles,
-        'total_propiedades': Inmueble.objects.filter(esta_publicado=True).count(),
-        'total_usuarios': PerfilUsuario.objects.count(),
-        'total_regiones': Region.objects.count(),
-        'total_solicitudes': SolicitudArriendo.objects.count(),
+        'destacados_html': mark_safe(destacados['html']),
+        'total_propiedades': contadores['inmuebles_publicados'],
+        'total_usuarios': contadores['usuarios'],
+        'total_regiones': contadores['regiones'],
+        'total_solicitudes': contadores['solicitudes'],
     }
     return render(request, 'web/home.html', context)
 
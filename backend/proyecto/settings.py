@@ -30,7 +30,7 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 SECRET_KEY = os.environ.get('SECRET_KEY')
 
 # SECURITY WARNING: don't run with debug turned on in production!
-DEBUG = os.environ.get('DEBUG')
+DEBUG = os.environ.get('DEBUG', '').lower() in ('1', 'true', 'yes')
 
 ALLOWED_HOSTS = ['*']
 
@@ -45,11 +45,13 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'portal',
 ]
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'portal.middleware.PresupuestoConsultasMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -132,6 +134,111 @@ USE_TZ = True
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Media direccionada por contenido y deduplicada (portal/storage.py)
+STORAGES = {
+    'default': {'BACKEND': 'portal.storage.AlmacenamientoContenido'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+}
+
+
+# Snapshot local de regiones y comunas (API DPA)
+# Archivo compartido vía mmap por todos los workers; se renueva pasado el TTL
+DPA_SNAPSHOT_PATH = os.environ.get('DPA_SNAPSHOT_PATH', os.path.join(BASE_DIR, 'var', 'dpa.snapshot'))
+DPA_SNAPSHOT_TTL = int(os.environ.get('DPA_SNAPSHOT_TTL', 7 * 24 * 60 * 60))
+# 'snapshot' (por defecto) o 'db' para responder desde las tablas Region/Comuna
+# cargadas con `python manage.py sync_dpa`
+DPA_LOCATION_BACKEND = os.environ.get('DPA_LOCATION_BACKEND', 'snapshot')
+
+# Cliente HTTP compartido para la API DPA (pool, timeouts, reintentos, circuit breaker)
+DPA_HTTP = {
+    'POOL_MAXSIZE': int(os.environ.get('DPA_HTTP_POOL_MAXSIZE', 10)),
+    'REINTENTOS': int(os.environ.get('DPA_HTTP_REINTENTOS', 2)),
+    # (conexión, lectura) en segundos por endpoint
+    'TIMEOUTS': {
+        'regiones': (3.05, 5),
+        'comunas': (3.05, 10),
+    },
+    'UMBRAL_ERRORES': 0.5,
+    'APERTURA_SEGUNDOS': 30,
+}
+
+# Contadores del home (tabla Contador mantenida por triggers): segundos que
+# se sirven desde la caché antes de volver a leer la tabla
+CONTADORES_CACHE_TTL = int(os.environ.get('CONTADORES_CACHE_TTL', 30))
+
+# Fragmentos cacheados del home (portal/fragmentos.py)
+FRAGMENTOS_TTL = int(os.environ.get('FRAGMENTOS_TTL', 600))
+
+# Presupuesto de consultas SQL por vista (portal/middleware.py). En
+# producción solo se mide una muestra de los requests
+QUERY_BUDGET = {
+    'MUESTREO': float(os.environ.get('QUERY_BUDGET_MUESTREO', 1.0 if DEBUG else 0.05)),
+    'POR_DEFECTO': int(os.environ.get('QUERY_BUDGET_POR_DEFECTO', 20)),
+    # url_name -> máximo de consultas esperado
+    'VISTAS': {
+        'home': 2,
+        'inmueble_list': 6,
+        'mis_inmuebles': 6,
+        'api_inmuebles_buscar': 4,
+        'api_v1_inmuebles': 1,
+        'api_v1_inmueble': 1,
+        'api_v1_inmueble_similares': 2,
+        'inmueble_detail': 6,
+        'estadisticas_precios': 8,
+        'api_v1_estadisticas_precios': 1,
+        'busquedas_guardadas': 5,
+        'agregar_imagenes': 12,
+        'api_regiones': 0,
+        'api_comunas': 0,
+        'cargar_comunas': 0,
+    },
+    # repeticiones de la misma consulta en un request que cuentan como N+1
+    'N_MAS_UNO': int(os.environ.get('QUERY_BUDGET_N_MAS_UNO', 5)),
+    'CABECERAS': DEBUG,
+}
+
+# Propiedades similares (portal.recomendaciones): cuántas mostrar y cada
+# cuántos segundos cada proceso recoge los cambios hechos por otros
+RECOMENDACIONES = {
+    'K': int(os.environ.get('RECOMENDACIONES_K', 6)),
+    'SINCRONIZAR': float(os.environ.get('RECOMENDACIONES_SINCRONIZAR', 30)),
+}
+
+# Variantes de imágenes (portal.imagenes): hilos del pool por proceso
+IMAGENES = {
+    'WORKERS': int(os.environ.get('IMAGENES_WORKERS', 2)),
+}
+
+# Instantáneas de permisos por usuario (portal.permisos): segundos en caché
+# como respaldo; los cambios hechos por la aplicación las invalidan al momento
+PERMISOS = {
+    'TTL': int(os.environ.get('PERMISOS_TTL', 300)),
+}
+
+# Subida de imágenes por lotes (portal.subidas): límites por archivo y por request
+SUBIDAS = {
+    'MAX_ARCHIVO_MB': int(os.environ.get('SUBIDAS_MAX_ARCHIVO_MB', 15)),
+    'MAX_TOTAL_MB': int(os.environ.get('SUBIDAS_MAX_TOTAL_MB', 600)),
+    'MAX_ARCHIVOS': int(os.environ.get('SUBIDAS_MAX_ARCHIVOS', 50)),
+}
+
+# Alertas de búsquedas guardadas (worker: manage.py procesar_alertas).
+# ESPERA: segundos máximos entre revisiones si no llega un NOTIFY
+ALERTAS = {
+    'BATCH_SIZE': int(os.environ.get('ALERTAS_BATCH_SIZE', 200)),
+    'ESPERA': float(os.environ.get('ALERTAS_ESPERA', 5)),
+}
+
+# Caché: en memoria del proceso por defecto; en producción una compartida
+# entre workers (p.ej. CACHE_BACKEND=django.core.cache.backends.redis.RedisCache
+# y CACHE_LOCATION=redis://redis:6379/1) para que las invalidaciones se vean en todos
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('CACHE_LOCATION', ''),
+    }
+}
+
 
 # Static files (CSS, JavaScript, Images)
 # https://docs.djangoproject.com/en/5.2/howto/static-files/
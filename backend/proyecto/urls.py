@@ -19,10 +19,14 @@ from django.contrib import admin
 from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
+from portal.storage import CARPETA as CARPETA_CONTENIDO
+from portal.views import servir_media
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('', include('portal.urls')),  # INCLUYE las URLs de portal
+    # Media inmutable (direccionada por contenido): se sirve con caché de un año
+    path(f"{settings.MEDIA_URL.strip('/')}/{CARPETA_CONTENIDO}/<path:path>", servir_media, name='media_contenido'),
 ]
 
 